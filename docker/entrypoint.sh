@@ -2,10 +2,35 @@
 
 set -e
 
+# Metrics are written to the directory by any python process, including
+# the cli commands below, thus it must exist before they are run
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    chown sys_magenta_os2phonebook:sys_magenta_os2phonebook "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 python /app/cli.py pingdb
 
 chown -R sys_magenta_os2phonebook:sys_magenta_os2phonebook /app
 chown -R sys_magenta_os2phonebook:sys_magenta_os2phonebook /log
 chown -R sys_magenta_os2phonebook:sys_magenta_os2phonebook /entrypoint
 
+# Snapshots are written by the service account
+if [ -n "$OS2PHONEBOOK_SNAPSHOT_DIR" ]; then
+    mkdir -p "$OS2PHONEBOOK_SNAPSHOT_DIR"
+    chown sys_magenta_os2phonebook:sys_magenta_os2phonebook "$OS2PHONEBOOK_SNAPSHOT_DIR"
+fi
+
+# Load the last snapshots into indices which are missing or empty,
+# e.g. when Elasticsearch was started without its data
+sudo -u sys_magenta_os2phonebook -E python /app/cli.py restore || \
+    echo "Restoring the snapshots failed, starting without them"
+
+# Metrics of previous runs and of the cli commands must not be aggregated
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    chown sys_magenta_os2phonebook:sys_magenta_os2phonebook "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 sudo -u sys_magenta_os2phonebook -E "$@"
@@ -0,0 +1,110 @@
+"""Synthetic datasets scaled up from the test fixtures.
+
+The fixture documents are copied with new identifiers, thus the documents
+have the size and shape of real data. Identifiers are generated from
+a seeded random number generator, so every run uses the same dataset.
+
+"""
+
+import copy
+import random
+from uuid import UUID
+from tests.fixtures.elasticsearch_data import (
+    all_org_units_from_elasticsearch,
+    one_employee_from_elasticsearch,
+    one_unit_from_elasticsearch,
+)
+
+# Number of hits in a search response, see `DataStore.query_for_*`
+SEARCH_SIZE = 15
+
+
+def identifiers(size: int, seed: int = 0) -> list:
+    """Reproducible uuids"""
+    generator = random.Random(seed)
+
+    return [str(UUID(int=generator.getrandbits(128))) for _ in range(size)]
+
+
+def org_units(size: int) -> list:
+    """Org units as returned by `/api/org_units`"""
+    hits = all_org_units_from_elasticsearch()["hits"]["hits"]
+    units = [hit["_source"] for hit in hits]
+
+    return [
+        dict(units[number % len(units)], uuid=uuid)
+        for number, uuid in enumerate(identifiers(size))
+    ]
+
+
+def org_unit_documents(size: int) -> dict:
+    """Complete org unit documents by uuid"""
+    org_unit = one_unit_from_elasticsearch()["_source"]
+
+    result = {}
+    for uuid in identifiers(size, seed=1):
+        document = copy.deepcopy(org_unit)
+        document["uuid"] = uuid
+        result[uuid] = document
+
+    return result
+
+
+def employees(size: int) -> dict:
+    """Employees as sent to `/api/load-employees`"""
+    employee = one_employee_from_elasticsearch()["_source"]
+
+    result = {}
+    for uuid in identifiers(size, seed=2):
+        document = copy.deepcopy(employee)
+        document["uuid"] = uuid
+        result[uuid] = document
+
+    return result
+
+
+def hit(index: str, document: dict) -> dict:
+    """Wrap a document as an Elasticsearch hit"""
+    return {
+        "_index": index,
+        "_type": "_doc",
+        "_id": document["uuid"],
+        "_score": 1.0,
+        "_source": document,
+    }
+
+
+def kle_hit(document: dict) -> dict:
+    """Wrap an org unit as a hit of the nested kle query"""
+    result = hit("org_units", {"uuid": document["uuid"], "name": "KLE"})
+    result["inner_hits"] = {
+        "kles": {
+            "hits": {
+                "total": {"value": 2, "relation": "eq"},
+                "hits": [
+                    {
+                        "_nested": {"field": "kles", "offset": offset},
+                        "_source": {"title": title},
+                    }
+                    for offset, title in enumerate(
+                        ["00.01 Skoleadministration", "17.01 Skolevæsenet"]
+                    )
+                ],
+            }
+        }
+    }
+    return result
+
+
+def search_response(hits: list) -> dict:
+    """Wrap hits as an Elasticsearch search response"""
+    return {
+        "took": 2,
+        "timed_out": False,
+        "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+        "hits": {
+            "total": {"value": len(hits), "relation": "eq"},
+            "max_score": 1.0,
+            "hits": hits,
+        },
+    }
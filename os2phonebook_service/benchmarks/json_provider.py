@@ -0,0 +1,102 @@
+"""Benchmark the JSON provider against the standard library.
+
+The fixture datasets are scaled up to a realistic size,
+by copying the fixture documents with new identifiers.
+
+Run from the service directory:
+
+    $ python -m benchmarks.json_provider --size 10000
+
+"""
+
+import json
+import argparse
+from timeit import repeat
+from unittest import mock
+from flask import Flask, jsonify
+from os2phonebook import json_provider
+from benchmarks.datasets import employees, org_units
+from tests.fixtures.elasticsearch_data import all_org_units_from_elasticsearch
+
+
+def org_units_search_response(size: int) -> bytes:
+    """Elasticsearch search response holding the org units"""
+    response = all_org_units_from_elasticsearch()
+    response["hits"]["hits"] = [
+        {"_index": "org_units", "_id": unit["uuid"], "_source": unit}
+        for unit in org_units(size)
+    ]
+    return json.dumps(response).encode("utf-8")
+
+
+def cases(size: int) -> dict:
+    """Benchmark cases by name"""
+
+    app = Flask(__name__)
+    json_provider.init_app(app)
+
+    units = org_units(size)
+    search_response = org_units_search_response(size)
+
+    load_documents = employees(size)
+    load_lines = [
+        json.dumps(document).encode("utf-8")
+        for document in load_documents.values()
+    ]
+
+    serializer = json_provider.Serializer()
+
+    def jsonify_org_units():
+        with app.app_context():
+            jsonify(units).get_data()
+
+    def parse_search_response():
+        serializer.loads(search_response)
+
+    def parse_load_ndjson():
+        for line in load_lines:
+            json_provider.loads(line)
+
+    def serialize_bulk_actions():
+        for document in load_documents.values():
+            serializer.dumps(document)
+
+    return {
+        "jsonify /api/org_units": jsonify_org_units,
+        "parse ES search response": parse_search_response,
+        "parse load body (ndjson)": parse_load_ndjson,
+        "serialize bulk actions": serialize_bulk_actions,
+    }
+
+
+def measure(function, number: int) -> float:
+    """Best time of a function in milliseconds"""
+    return min(repeat(function, number=number, repeat=5)) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--number", type=int, default=3)
+    args = parser.parse_args()
+
+    if json_provider.orjson is None:
+        parser.exit(1, "orjson is not installed, nothing to compare\n")
+
+    print(f"{args.size} documents, best of 5 rounds of {args.number}\n")
+    print(f"{'case':<28}{'json (ms)':>12}{'orjson (ms)':>14}{'speedup':>10}")
+
+    for name, function in cases(args.size).items():
+        with mock.patch.object(json_provider, "orjson", None):
+            baseline = measure(function, args.number)
+
+        fast = measure(function, args.number)
+
+        print(
+            f"{name:<28}{baseline:>12.1f}{fast:>14.1f}"
+            f"{baseline / fast:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Elasticsearch stand-in answering with recorded responses.
+
+The stand-in replaces the HTTP connection of the Elasticsearch client,
+thus everything above it, e.g. the transport, request serialization and
+response deserialization, runs as against a live cluster, without
+the network and the cluster.
+
+Responses are recorded (serialized) up front, except for the searches
+depending on the request, e.g. the pages of `/api/org_units`.
+
+"""
+
+import json
+import re
+from bisect import bisect_right
+from elasticsearch import Elasticsearch
+from elasticsearch.connection import Connection
+from os2phonebook.datastore import TimedTransport, client_options
+from benchmarks.datasets import (
+    SEARCH_SIZE,
+    hit,
+    kle_hit,
+    search_response,
+)
+
+# Response to the product check of the client, see `Transport`
+INFO_RESPONSE = {
+    "name": "stand-in",
+    "cluster_name": "os2phonebook",
+    "version": {"number": "7.6.2", "build_flavor": "default"},
+    "tagline": "You Know, for Search",
+}
+
+
+class RecordedConnection(Connection):
+    """Connection answering requests from the routes of the class
+
+    Routes are tuples of a method, a path pattern and either a recorded
+    response (str) or a responder called with the path and the request
+    body (bytes).
+
+    """
+
+    routes = []
+
+    def perform_request(
+        self,
+        method,
+        url,
+        params=None,
+        body=None,
+        timeout=None,
+        ignore=(),
+        headers=None,
+    ):
+        for route_method, pattern, response in self.routes:
+            if route_method == method and pattern.match(url):
+                if callable(response):
+                    response = response(url, body)
+                return 200, {"content-type": "application/json"}, response
+
+        self._raise_error(404, json.dumps({"error": f"{method} {url}"}))
+
+
+class StandIn(object):
+    """Recorded responses of an Elasticsearch holding a dataset
+
+    Args:
+        employees (dict): Employee documents by uuid
+        org_units (list): Org units as returned by `/api/org_units`
+        org_unit_documents (dict): Org unit documents by uuid
+
+    Example:
+
+        stand_in = StandIn(employees(1000), org_units(1000), {})
+        db = DataStore(stand_in.client())
+
+    """
+
+    def __init__(self, employees: dict, org_units: list, org_unit_documents):
+        self.employees = employees
+        self.org_units = sorted(org_units, key=lambda unit: unit["uuid"])
+        self.org_unit_uuids = [unit["uuid"] for unit in self.org_units]
+
+        employee_matches = list(employees.values())[:SEARCH_SIZE]
+        org_unit_matches = list(org_unit_documents.values())[:SEARCH_SIZE]
+
+        # Recorded search responses by index, the kle search is nested
+        self.search_responses = {
+            index: json.dumps(dict(search_response(hits), status=200))
+            for index, hits in [
+                (
+                    "employees",
+                    [hit("employees", doc) for doc in employee_matches],
+                ),
+                (
+                    "org_units",
+                    [hit("org_units", doc) for doc in org_unit_matches],
+                ),
+                ("kles", [kle_hit(doc) for doc in org_unit_matches]),
+            ]
+        }
+
+        self.routes = [
+            ("GET", re.compile(r"^/$"), json.dumps(INFO_RESPONSE)),
+            (
+                "GET",
+                re.compile(r"^/employees/_doc/"),
+                self.recorded_document("employees", employees),
+            ),
+            (
+                "GET",
+                re.compile(r"^/org_units/_doc/"),
+                self.recorded_document("org_units", org_unit_documents),
+            ),
+            ("POST", re.compile(r"^/employees/_mget$"), self.mget_employees),
+            (
+                "POST",
+                re.compile(r"^/dataset_versions/_mget$"),
+                json.dumps({"docs": []}),
+            ),
+            ("POST", re.compile(r"^/_msearch$"), self.msearch),
+            ("POST", re.compile(r"^/[\w-]+/_search$"), self.search),
+        ]
+
+    def recorded_document(self, index: str, documents: dict) -> str:
+        """Recorded response of a get of the first document"""
+        document = next(iter(documents.values()))
+
+        return json.dumps(dict(hit(index, document), found=True))
+
+    def mget_employees(self, path: str, body: bytes) -> str:
+        """Response of an mget of employees"""
+        ids = json.loads(body)["docs"]
+
+        return json.dumps(
+            {
+                "docs": [
+                    (
+                        dict(hit("employees", self.employees[doc["_id"]]))
+                        if doc["_id"] in self.employees
+                        else {"_index": "employees", "_id": doc["_id"]}
+                    )
+                    for doc in ids
+                ]
+            }
+        )
+
+    def search_result(self, index: str, query: dict) -> str:
+        """Response of a search"""
+        if "sort" in query:
+            return self.org_units_page(query)
+
+        if "nested" in query["query"]:
+            return self.search_responses["kles"]
+
+        return self.search_responses[index]
+
+    def org_units_page(self, query: dict) -> str:
+        """A page of org units after the `search_after` cursor"""
+        start = 0
+        if "search_after" in query:
+            start = bisect_right(self.org_unit_uuids, query["search_after"][0])
+        end = start + query["size"]
+
+        hits = [
+            dict(hit("org_units", unit), sort=[unit["uuid"]])
+            for unit in self.org_units[start:end]
+        ]
+        return json.dumps(dict(search_response(hits), status=200))
+
+    def search(self, path: str, body: bytes) -> str:
+        """Response of a search, the index is the first part of the path"""
+        index = path.split("/")[1]
+
+        return self.search_result(index, json.loads(body))
+
+    def msearch(self, path: str, body: bytes) -> str:
+        """Response of an msearch, a header line precedes every query"""
+        lines = [json.loads(line) for line in body.splitlines()]
+
+        responses = ",".join(
+            self.search_result(header["index"], query)
+            for header, query in zip(lines[::2], lines[1::2])
+        )
+        return f'{{"took": 2, "responses": [{responses}]}}'
+
+    def client(self) -> Elasticsearch:
+        """Elasticsearch client connected to the stand-in"""
+        connection_class = type(
+            "StandInConnection", (RecordedConnection,), {"routes": self.routes}
+        )
+
+        return Elasticsearch(
+            [{"host": "stand-in", "port": 9200}],
+            transport_class=TimedTransport,
+            connection_class=connection_class,
+            **client_options(),
+        )
@@ -0,0 +1,376 @@
+"""Benchmark the query builders, search processing and endpoints.
+
+The benchmarks run without a live cluster, against an Elasticsearch
+stand-in answering with recorded responses (see `benchmarks.stand_in`),
+on datasets scaled up from the test fixtures (see `benchmarks.datasets`).
+The searches are run against the in-memory backend too, which unlike the
+stand-in evaluates every query on the dataset.
+
+Results are written as json, to be kept and compared between releases.
+Run from the service directory:
+
+    $ python -m benchmarks.suite --size 10000 --output results.json
+    $ python -m benchmarks.suite --compare results.json --threshold 1.25
+
+The comparison exits with status 1 if any case got slower than the
+threshold allows, relative to the best time of the baseline.
+
+"""
+
+import sys
+import json
+import platform
+import argparse
+from datetime import datetime
+from statistics import median
+from timeit import Timer
+from typing import Callable, Dict, List, Optional
+from flask import Flask, jsonify
+from os2phonebook import __version__, json_provider
+from os2phonebook.app import initiate_application
+from os2phonebook.datastore import DataStore
+from os2phonebook.memory_datastore import MemoryDataStore, MemoryStore
+from benchmarks import datasets
+from benchmarks.stand_in import StandIn
+
+# Representative search value by search type
+SEARCH_VALUES = {
+    "employee_by_name": "Jan Elkjær",
+    "employee_by_phone": "+45 6453 5362",
+    "employee_by_email": "jann@kolding.dk",
+    "employee_by_engagement": "Lærer",
+    "org_unit_by_name": "Budget og Planlægning",
+    "org_unit_by_kle": "Skole",
+}
+
+# Number of uuids in a batch request
+BATCH_SIZE = 100
+
+
+def query_cases(db: DataStore) -> Dict[str, Callable]:
+    """Every `query_for_*` builder, exact and fuzzy"""
+    cases = {}
+
+    for search_type, search_value in SEARCH_VALUES.items():
+        query_method = db.get_query_method(search_type)
+
+        for search_pass, fuzzy_search in (("exact", False), ("fuzzy", True)):
+
+            def build(
+                method=query_method, value=search_value, fuzzy=fuzzy_search
+            ):
+                method(value, fuzzy)
+
+            cases[f"{query_method.__name__}[{search_pass}]"] = build
+
+    return cases
+
+
+def process_cases(db: DataStore, stand_in: StandIn) -> Dict[str, Callable]:
+    """The hit processors of `DataStore.search`, e.g. the kle processor"""
+    cases = {}
+
+    for search_type, search_value in SEARCH_VALUES.items():
+        index, query, processor = db._prepare_search(
+            search_type, search_value, False
+        )
+        response = json.loads(stand_in.search_result(index, query))
+        hits = response["hits"]["hits"]
+
+        def process(processor=processor, hits=hits):
+            [processor(document) for document in hits]
+
+        cases[f"process {search_type}"] = process
+
+    return cases
+
+
+def search_cases(db: DataStore) -> Dict[str, Callable]:
+    """`DataStore` searches, including the client and deserialization"""
+    cases = {}
+
+    for search_type, search_value in SEARCH_VALUES.items():
+
+        def search(search_type=search_type, search_value=search_value):
+            db.search(search_type, search_value)
+
+        cases[f"search {search_type}"] = search
+
+    def search_with_fallback():
+        db.search_with_fallback(
+            "employee_by_name", SEARCH_VALUES["employee_by_name"]
+        )
+
+    def search_everything():
+        db.search_everything("Skole", limit=5)
+
+    def get_all_org_units():
+        db.get_all_org_units()
+
+    cases["search_with_fallback employee_by_name"] = search_with_fallback
+    cases["search_everything"] = search_everything
+    cases["get_all_org_units"] = get_all_org_units
+
+    return cases
+
+
+def serialize_cases(org_units: list) -> Dict[str, Callable]:
+    """`jsonify` of the org unit list"""
+    app = Flask(__name__)
+    json_provider.init_app(app)
+
+    def jsonify_org_units():
+        with app.app_context():
+            jsonify(org_units).get_data()
+
+    return {f"jsonify {len(org_units)} org units": jsonify_org_units}
+
+
+def endpoint_cases(app, stand_in: StandIn) -> Dict[str, Callable]:
+    """Flask endpoints via the test client"""
+    client = app.test_client()
+    uuids = list(stand_in.employees)[:BATCH_SIZE]
+
+    requests = {
+        "GET /api/org_units": lambda: client.get("/api/org_units"),
+        "GET /api/org_units?limit=100": lambda: client.get(
+            "/api/org_units?limit=100"
+        ),
+        "GET /api/org_unit/<uuid>": lambda: client.get(
+            f"/api/org_unit/{stand_in.org_units[0]['uuid']}"
+        ),
+        "GET /api/employee/<uuid>": lambda: client.get(
+            f"/api/employee/{uuids[0]}"
+        ),
+        f"POST /api/employees/batch ({len(uuids)})": lambda: client.post(
+            "/api/employees/batch", json={"uuids": uuids}
+        ),
+        "POST /api/search/all": lambda: client.post(
+            "/api/search/all", json={"search_value": "Skole"}
+        ),
+    }
+
+    for search_type, search_value in SEARCH_VALUES.items():
+        body = {"search_type": search_type, "search_value": search_value}
+        requests[f"POST /api/search {search_type}"] = (
+            lambda body=body: client.post("/api/search", json=body)
+        )
+
+    def checked(name, request):
+        def case():
+            response = request()
+            if response.status_code != 200:
+                raise RuntimeError(f"{name}: {response.status_code}")
+
+        return case
+
+    return {name: checked(name, request) for name, request in requests.items()}
+
+
+def memory_datastore(employees: dict, org_unit_documents: dict):
+    """`MemoryDataStore` holding the dataset"""
+    db = MemoryDataStore(MemoryStore())
+
+    for alias, documents in (
+        ("employees", employees),
+        ("org_units", org_unit_documents),
+    ):
+        db.reindex(
+            alias,
+            lambda documents=documents: (
+                {"_id": uuid, "_source": document}
+                for uuid, document in documents.items()
+            ),
+        )
+
+    return db
+
+
+def build_cases(size: int) -> Dict[str, Dict[str, Callable]]:
+    """Benchmark cases by group and name"""
+    employees = datasets.employees(size)
+    stand_in = StandIn(
+        employees,
+        datasets.org_units(size),
+        datasets.org_unit_documents(datasets.SEARCH_SIZE),
+    )
+
+    # Searches are not cached, to measure the full path
+    db = DataStore(stand_in.client())
+
+    app = initiate_application(
+        {
+            "OS2PHONEBOOK_COMPANY_NAME": "Benchmark",
+            "ELASTICSEARCH_HOST": "stand-in",
+            "ELASTICSEARCH_PORT": 9200,
+            "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "false",
+            "OS2PHONEBOOK_SEARCH_CACHE_SIZE": 0,
+        }
+    )
+    app.connection = stand_in.client()
+
+    return {
+        "query": query_cases(db),
+        "process": process_cases(db, stand_in),
+        "search": search_cases(db),
+        "memory": search_cases(
+            memory_datastore(employees, datasets.org_unit_documents(size))
+        ),
+        "serialize": serialize_cases(stand_in.org_units),
+        "endpoint": endpoint_cases(app, stand_in),
+    }
+
+
+def measure(function: Callable, number: int = None, repeat: int = 5) -> dict:
+    """Time a function
+
+    Args:
+        function (func): Function to time
+        number (int): Calls per round, by default as many as take
+            at least 0.2 seconds (see `timeit.Timer.autorange`).
+        repeat (int): Number of rounds
+
+    Returns:
+        dict: Calls per round, rounds and the best and median time
+            per call in milliseconds.
+
+    """
+    timer = Timer(function)
+
+    if number is None:
+        number, _ = timer.autorange()
+
+    times = [
+        duration / number * 1000
+        for duration in timer.repeat(number=number, repeat=repeat)
+    ]
+
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best_ms": min(times),
+        "median_ms": median(times),
+    }
+
+
+def run(
+    size: int,
+    groups: List[str] = None,
+    number: int = None,
+    repeat: int = 5,
+    progress=None,
+) -> dict:
+    """Run the benchmarks
+
+    Args:
+        size (int): Number of employees and org units in the dataset
+        groups (List[str]): Groups to run, by default every group
+        number (int): Calls per round, see `measure`
+        repeat (int): Number of rounds
+        progress (func): Called with every result as it is measured
+
+    Returns:
+        dict: Machine-readable results, including the environment.
+
+    """
+    results = []
+
+    for group, cases in build_cases(size).items():
+        if groups and group not in groups:
+            continue
+
+        for name, function in cases.items():
+            result = dict(
+                {"group": group, "name": name},
+                **measure(function, number, repeat),
+            )
+            results.append(result)
+
+            if progress is not None:
+                progress(result)
+
+    return {
+        "os2phonebook": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_provider": json_provider.provider_name(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "size": size,
+        "results": results,
+    }
+
+
+def compare(
+    report: dict, baseline: dict, threshold: float
+) -> List[Dict[str, Optional[float]]]:
+    """Compare the best times of a run against a baseline
+
+    Args:
+        report (dict): Results, see `run`
+        baseline (dict): Results of an earlier run
+        threshold (float): Maximal ratio of the best times
+
+    Returns:
+        list: Cases slower than the threshold allows, with their ratio.
+
+    """
+    baseline_times = {
+        (result["group"], result["name"]): result["best_ms"]
+        for result in baseline["results"]
+    }
+
+    regressions = []
+    for result in report["results"]:
+        key = (result["group"], result["name"])
+        if key not in baseline_times:
+            continue
+
+        ratio = result["best_ms"] / baseline_times[key]
+        if ratio > threshold:
+            regressions.append(
+                {"group": key[0], "name": key[1], "ratio": ratio}
+            )
+
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--group", action="append", dest="groups")
+    parser.add_argument("--number", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=argparse.FileType("w"))
+    parser.add_argument("--compare", type=argparse.FileType("r"))
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    def progress(result):
+        print(
+            f"{result['group']:<10}{result['name']:<48}"
+            f"{result['best_ms']:>10.3f} ms",
+            file=sys.stderr,
+        )
+
+    report = run(args.size, args.groups, args.number, args.repeat, progress)
+
+    json.dump(report, args.output or sys.stdout, indent=2)
+    if args.output is None:
+        print()
+
+    if args.compare is None:
+        return 0
+
+    regressions = compare(report, json.load(args.compare), args.threshold)
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['group']} {regression['name']} "
+            f"{regression['ratio']:.2f}x",
+            file=sys.stderr,
+        )
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
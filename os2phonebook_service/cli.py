@@ -1,7 +1,9 @@
 """Command-line util for OS2Phonebook."""
 import click
 from os2phonebook import helpers
+from os2phonebook.app import create_backend
 from os2phonebook.bootstrap import ping_datastore
+from os2phonebook.snapshots import restore_snapshots
 
 
 @click.group()
@@ -33,5 +35,42 @@ def pingdb(max_attempts, interval):
         click.echo(attempt)
 
 
+@cli.command()
+@click.option(
+    "--thread-count", default=4, help="Number of concurrent bulk requests"
+)
+def restore(thread_count):
+    """Restore empty indices from the snapshots of the last loads
+
+    Indices which are missing or empty, e.g. after Elasticsearch was
+    started without its data, are loaded from the snapshots kept in
+    OS2PHONEBOOK_SNAPSHOT_DIR. Indices holding documents are left as is.
+
+    """
+
+    config = helpers.config_factory()
+
+    snapshot_dir = config.get("OS2PHONEBOOK_SNAPSHOT_DIR")
+    if not snapshot_dir:
+        click.echo("No snapshot directory configured, nothing to restore")
+        return
+
+    backend = config["OS2PHONEBOOK_BACKEND"]
+    if backend == "memory":
+        click.echo("The memory backend is restored by the service itself")
+        return
+
+    connection, datastore_class = create_backend(backend, config)
+
+    restore_snapshots(
+        datastore_class(connection),
+        snapshot_dir,
+        click.echo,
+        thread_count=thread_count,
+        chunk_size=int(config["ELASTICSEARCH_BULK_CHUNK_SIZE"]),
+        max_chunk_bytes=int(config["ELASTICSEARCH_BULK_MAX_CHUNK_BYTES"]),
+    )
+
+
 if __name__ == "__main__":
     cli()
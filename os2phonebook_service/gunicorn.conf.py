@@ -0,0 +1,15 @@
+"""Gunicorn configuration, loaded from the working directory."""
+
+import os
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    """Discard the live gauges of a worker that exited.
+
+    Only relevant when the metrics are aggregated across the workers,
+    see `PROMETHEUS_MULTIPROC_DIR` in `os2phonebook.metrics`.
+
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
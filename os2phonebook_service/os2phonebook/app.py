@@ -1,9 +1,18 @@
+import os
+import tempfile
 from flask import Flask
 from werkzeug.security import generate_password_hash
 from os2phonebook import __version__
 from os2phonebook.controller import api
 from os2phonebook import helpers
 from os2phonebook import datastore
+from os2phonebook import memory_datastore
+from os2phonebook import sqlite_datastore
+from os2phonebook import json_provider
+from os2phonebook import metrics
+from os2phonebook import snapshots
+from os2phonebook.cache import SearchCache, DatasetVersions, PhoneIndex
+from os2phonebook.load_jobs import LoadJobs
 
 # Init & configure logging
 log = helpers.log_factory()
@@ -34,6 +43,72 @@ def gen_user_map(config):
     return {username: generate_password_hash(password)}
 
 
+def create_backend(backend: str, config: dict) -> tuple:
+    """Create the datastore connection of the configured backend
+
+    Backends:
+        * `elasticsearch`: Elasticsearch at `ELASTICSEARCH_HOST`.
+        * `memory`: The memory of the process, see :code:`MemoryStore`.
+          Every worker holds its own data, thus serve it by a single worker.
+        * `sqlite`: An SQLite database file at `OS2PHONEBOOK_SQLITE_PATH`,
+          see :code:`SQLiteStore`, shared by the workers.
+
+    Args:
+        backend (str): Name of the backend
+        config (dict): A dictionary containing configuration
+
+    Returns:
+        tuple: The connection and the :code:`DataStore` class using it.
+
+    Raises:
+        ValueError: If the backend is not available.
+
+    """
+    if backend == "elasticsearch":
+        connection = datastore.create_connection(
+            config["ELASTICSEARCH_HOST"],
+            int(config["ELASTICSEARCH_PORT"]),
+            **helpers.connection_options(config),
+        )
+        return connection, datastore.DataStore
+
+    if backend == "memory":
+        return memory_datastore.MemoryStore(), memory_datastore.MemoryDataStore
+
+    if backend == "sqlite":
+        connection = sqlite_datastore.SQLiteStore(
+            config["OS2PHONEBOOK_SQLITE_PATH"],
+            mmap_size=int(
+                config.get("OS2PHONEBOOK_SQLITE_MMAP_SIZE", 268435456)
+            ),
+        )
+        return connection, sqlite_datastore.SQLiteDataStore
+
+    raise ValueError(f"Datastore backend: {backend} is not available")
+
+
+def warm_phone_index(app: Flask) -> bool:
+    """Build the caller-ID index of a new worker in the background
+
+    Thus the first lookups are not kept waiting for the employees to be
+    read, see :code:`PhoneIndex`.
+
+    Args:
+        app (:obj:`Flask`): The application
+
+    Returns:
+        bool: True if the build was started.
+
+    """
+    db = app.datastore_class(app.connection)
+
+    def warm():
+        version = db.get_dataset_versions().get("employees")
+        app.phone_index.refresh(version, db.iter_employee_phone_numbers)
+
+    return app.phone_index.start(warm)
+
+
 def initiate_application(config: dict) -> Flask:
     """Initiate and configure Flask instance
 
@@ -46,22 +121,88 @@ def initiate_application(config: dict) -> Flask:
 
     # Config parameters
     organisation_name = config["OS2PHONEBOOK_COMPANY_NAME"]
-    db_host = config["ELASTICSEARCH_HOST"]
-    db_port = int(config["ELASTICSEARCH_PORT"])
+    backend = config.get("OS2PHONEBOOK_BACKEND", "elasticsearch")
+    bulk_options = {
+        "thread_count": int(config.get("ELASTICSEARCH_BULK_THREAD_COUNT", 1)),
+        "chunk_size": int(config.get("ELASTICSEARCH_BULK_CHUNK_SIZE", 500)),
+        "max_chunk_bytes": int(
+            config.get("ELASTICSEARCH_BULK_MAX_CHUNK_BYTES", 104857600)
+        ),
+    }
+    search_cache_size = int(config.get("OS2PHONEBOOK_SEARCH_CACHE_SIZE", 1024))
+    search_cache_ttl = float(config.get("OS2PHONEBOOK_SEARCH_CACHE_TTL", 300))
+    dataset_version_ttl = float(
+        config.get("OS2PHONEBOOK_DATASET_VERSION_TTL", 10)
+    )
+    http_cache_max_age = int(config.get("OS2PHONEBOOK_HTTP_CACHE_MAX_AGE", 60))
+    timing_log = helpers.parse_flag(
+        config.get("OS2PHONEBOOK_TIMING_LOG", False)
+    )
+    phone_index_warmup = helpers.parse_flag(
+        config.get("OS2PHONEBOOK_PHONE_INDEX_WARMUP", True)
+    )
+    snapshot_dir = config.get("OS2PHONEBOOK_SNAPSHOT_DIR")
+    snapshot_compression = config.get(
+        "OS2PHONEBOOK_SNAPSHOT_COMPRESSION", "gzip"
+    )
+    load_job_dir = config.get("OS2PHONEBOOK_LOAD_JOB_DIR") or os.path.join(
+        tempfile.gettempdir(), "os2phonebook-load-jobs"
+    )
 
     log.info("INITIATE_SERVICE - Config parameters loaded")
 
     # Init flask instance
     app = Flask(import_name=__name__, static_url_path="")
 
+    # Serialize responses and parse requests with the fastest json available
+    json_provider.init_app(app)
+    log.info(
+        f"INITIATE_SERVICE - JSON provider: {json_provider.provider_name()}"
+    )
+
     # Set metadata values
     app.os2phonebook_version = __version__
     app.organisation_name = organisation_name
     app.dataload_basic_auth = gen_user_map(config)
+    app.bulk_options = bulk_options
+    app.timing_log = timing_log
+
+    # Every successful load is kept as a snapshot, restored on startup
+    app.snapshot_dir = snapshot_dir
+    app.snapshot_compression = snapshot_compression
+
+    # Loads are indexed in the background, reported by any worker
+    app.load_jobs = LoadJobs(load_job_dir)
+
+    # Per worker cache for search results
+    app.search_cache = SearchCache(search_cache_size, search_cache_ttl)
+
+    # Per worker copy of the dataset versions, used as ETags
+    app.dataset_versions = DatasetVersions(dataset_version_ttl)
+    app.http_cache_max_age = http_cache_max_age
+
+    # Per worker caller-ID index, built on startup (see below)
+    app.phone_index = PhoneIndex()
 
     # Create datastore connection object
-    app.connection = datastore.create_connection(db_host, db_port)
-    log.info("INITIATE_SERVICE - Datastore connection created")
+    app.connection, app.datastore_class = create_backend(backend, config)
+    log.info(f"INITIATE_SERVICE - Datastore connection created ({backend})")
+
+    # The memory of a new process is always empty, other backends
+    # are restored before the service is started (see `cli.py restore`)
+    if backend == "memory" and snapshot_dir:
+        snapshots.restore_snapshots(
+            app.datastore_class(app.connection),
+            snapshot_dir,
+            lambda message: log.info(f"INITIATE_SERVICE - {message}"),
+        )
+
+    # Lookups are otherwise kept waiting until the index has been built
+    if phone_index_warmup:
+        warm_phone_index(app)
+
+    # Record request metrics, exposed on /api/metrics
+    metrics.init_app(app)
 
     # Blueprintes for api routes
     app.register_blueprint(api)
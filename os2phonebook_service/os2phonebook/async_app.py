@@ -0,0 +1,93 @@
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.routing import Mount
+from os2phonebook import helpers
+from os2phonebook.app import initiate_application
+from os2phonebook.async_controller import (
+    ServerTimingMiddleware,
+    routes,
+    exception_handlers,
+)
+from os2phonebook.async_datastore import (
+    AsyncDataStore,
+    create_async_connection,
+)
+
+# Init & configure logging
+log = helpers.log_factory()
+
+
+def initiate_async_application(config: dict) -> Starlette:
+    """Initiate and configure the ASGI (Starlette) instance
+
+    The read and search endpoints are served by async views using
+    the :code:`AsyncDataStore`. Every other request, e.g. the data loads,
+    is passed on to the Flask application, running in a thread pool.
+
+    Both applications share the per worker caches, thus a load
+    served by Flask invalidates the cached search results right away.
+
+    Args:
+        config (dict): A dictionary containing configuration
+
+    Returns:
+        :obj:`Starlette`: An instance of starlette
+
+    Raises:
+        ValueError: If the backend is not `elasticsearch`,
+            the other backends are served by the Flask application.
+    """
+
+    backend = config.get("OS2PHONEBOOK_BACKEND", "elasticsearch")
+    if backend != "elasticsearch":
+        raise ValueError(
+            f"Datastore backend: {backend} is not available in async"
+        )
+
+    # The Flask application serves everything not served async
+    flask_app = initiate_application(config)
+
+    db_host = config["ELASTICSEARCH_HOST"]
+    db_port = int(config["ELASTICSEARCH_PORT"])
+
+    # Create async datastore connection object
+    datastore = AsyncDataStore(
+        create_async_connection(
+            db_host, db_port, **helpers.connection_options(config)
+        ),
+        cache=flask_app.search_cache,
+    )
+    log.info("INITIATE_ASYNC_SERVICE - Async datastore connection created")
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await datastore.close()
+
+    app = Starlette(
+        routes=[*routes, Mount("/", app=WSGIMiddleware(flask_app))],
+        exception_handlers=exception_handlers,
+        middleware=[
+            Middleware(ServerTimingMiddleware, timing_log=flask_app.timing_log)
+        ],
+        lifespan=lifespan,
+    )
+
+    # Set metadata values
+    app.state.os2phonebook_version = flask_app.os2phonebook_version
+    app.state.organisation_name = flask_app.organisation_name
+    app.state.http_cache_max_age = flask_app.http_cache_max_age
+
+    # Per worker caches, shared with the Flask application
+    app.state.search_cache = flask_app.search_cache
+    app.state.dataset_versions = flask_app.dataset_versions
+    app.state.phone_index = flask_app.phone_index
+    app.state.phone_index_rebuild = None
+
+    app.state.datastore = datastore
+    app.state.flask_app = flask_app
+
+    log.info("INITIATE_ASYNC_SERVICE - Launching application service")
+    return app
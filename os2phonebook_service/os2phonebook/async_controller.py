@@ -0,0 +1,646 @@
+import asyncio
+from time import perf_counter
+from functools import wraps
+from elasticsearch.exceptions import NotFoundError, TransportError
+from starlette.requests import Request
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.datastructures import Headers, MutableHeaders
+from werkzeug.exceptions import NotFound
+from werkzeug.http import parse_etags, quote_etag
+from os2phonebook.async_datastore import AsyncDataStore
+from os2phonebook.helpers import log_factory
+from os2phonebook import metrics, timing
+from os2phonebook import json_provider
+from os2phonebook.exceptions import (
+    ExpiredCursor,
+    InvalidRequestBody,
+    InvalidRequestParameters,
+    InvalidSearchType,
+)
+from os2phonebook.controller import (
+    SEARCH_SCHEMA,
+    encode_cursor,
+    error_response,
+    expired_cursor,
+    find_phone_number,
+    find_phone_numbers,
+    parse_batch_request,
+    parse_page_parameters,
+    parse_phone_numbers_request,
+    parse_search_everything_request,
+    parse_search_request,
+)
+
+# Init logging
+log = log_factory()
+
+# The routes mirror those of the `controller` blueprint,
+# see the corresponding views there for the request and response formats.
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSON response serialized with the fastest json available"""
+
+    def render(self, content) -> bytes:
+        with timing.span("serialize"):
+            return json_provider.dumps(content)
+
+
+def get_datastore(request: Request) -> AsyncDataStore:
+    """The AsyncDataStore client of the application.
+
+    Args:
+        request (:obj:`Request`): The current request
+
+    Returns:
+        :obj:`AsyncDataStore`: Client using the shared connection and cache.
+
+    """
+    return request.app.state.datastore
+
+
+async def get_json_body(request: Request):
+    """Parse the json body of a request.
+
+    Args:
+        request (:obj:`Request`): The current request
+
+    Returns:
+        Any: The parsed json body.
+
+    Raises:
+        InvalidRequestBody: If the request body is missing or invalid.
+
+    """
+    body = await request.body()
+
+    if not body:
+        raise InvalidRequestBody("Request body (json) is missing")
+
+    try:
+        return json_provider.loads(body)
+    except ValueError:
+        raise InvalidRequestBody("Request body is not valid json")
+
+
+async def refresh_dataset_versions(
+    request: Request, force: bool = False
+) -> bool:
+    """Refresh the dataset versions from the DataStore once expired.
+
+    See :code:`controller.refresh_dataset_versions`.
+
+    Args:
+        request (:obj:`Request`): The current request
+        force (bool): Refresh even if the local copy has not expired
+
+    Returns:
+        bool: False if the versions could not be refreshed.
+
+    """
+    state = request.app.state
+    dataset_versions = state.dataset_versions
+
+    if force or dataset_versions.is_stale():
+        try:
+            versions = await get_datastore(request).get_dataset_versions()
+        except TransportError as error:
+            log.warning(f"DATASET_VERSION_UNAVAILABLE - {error}")
+            return False
+
+        if dataset_versions.refresh(versions):
+            state.search_cache.clear()
+
+    return True
+
+
+async def get_dataset_version(
+    request: Request, alias: str, force: bool = False
+):
+    """Look up the current dataset version of an index.
+
+    See :code:`controller.get_dataset_version`.
+
+    Args:
+        request (:obj:`Request`): The current request
+        alias (str): Name of the index alias, e.g. `employees`
+        force (bool): Refresh even if the local copy has not expired
+
+    Returns:
+        str: Dataset version or `None` if it cannot be determined.
+
+    """
+    if not await refresh_dataset_versions(request, force):
+        return None
+
+    return request.app.state.dataset_versions.get(alias)
+
+
+def cache_by_dataset_version(alias: str):
+    """Decorate a view to support conditional requests.
+
+    See :code:`controller.cache_by_dataset_version`.
+
+    Args:
+        alias (str): Name of the index alias the view reads from
+
+    Returns:
+        func: View decorator
+
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request: Request) -> Response:
+            if_none_match = parse_etags(request.headers.get("if-none-match"))
+
+            conditional = bool(if_none_match)
+            version = await get_dataset_version(
+                request, alias, force=conditional
+            )
+
+            if version is None:
+                return await view(request)
+
+            if if_none_match.contains(version):
+                response = Response(status_code=304)
+            else:
+                response = await view(request)
+
+            max_age = request.app.state.http_cache_max_age
+
+            response.headers["ETag"] = quote_etag(version)
+            response.headers["Cache-Control"] = f"public, max-age={max_age}"
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+class ServerTimingMiddleware(object):
+    """Report the timings of every request, see :code:`timing`.
+
+    ASGI middleware equivalent of :code:`controller.add_server_timing`.
+    Requests passed on to the Flask application are reported by Flask.
+
+    Args:
+        app (ASGI app): The application to wrap
+        timing_log (bool): Whether to log the timings of every request
+
+    """
+
+    def __init__(self, app, timing_log: bool = False):
+        self.app = app
+        self.timing_log = timing_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id")
+        server_timing = timing.start(request_id)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+
+                # Not reported yet, i.e. not served by Flask
+                if "server-timing" not in headers:
+                    headers["Server-Timing"] = server_timing.header()
+                    headers["X-Request-ID"] = server_timing.request_id
+
+                    if self.timing_log:
+                        log.info(
+                            server_timing.log_line(
+                                method=scope["method"],
+                                path=scope["path"],
+                                status=message["status"],
+                            )
+                        )
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timing.stop()
+
+
+def instrumented(view):
+    """Decorate a view to record the latency of its requests.
+
+    The endpoints are labelled as by :code:`metrics.init_app`,
+    e.g. `routes.show_employee`, thus the metrics of a view are
+    the same whether it is served by Flask or async.
+
+    Args:
+        view (func): Async view
+
+    Returns:
+        func: Async view recording request metrics
+
+    """
+    endpoint = f"routes.{view.__name__}"
+
+    @wraps(view)
+    async def wrapper(request: Request) -> Response:
+        start = metrics.start_request(endpoint)
+        status_code = 500
+
+        try:
+            response = await view(request)
+            status_code = response.status_code
+            return response
+        except Exception as error:
+            status_code = error_status_code(error)
+            raise
+        finally:
+            metrics.end_request(endpoint, request.method, status_code, start)
+
+    return wrapper
+
+
+async def show_status(request: Request) -> Response:
+    """Status endpoint shows application status and metadata."""
+
+    state = request.app.state
+
+    status_response = {
+        "app": "OS2Phonebook",
+        "version": state.os2phonebook_version,
+        "organisation": state.organisation_name,
+    }
+
+    return JSONResponse(status_response)
+
+
+async def show_metrics(request: Request) -> Response:
+    """Metrics endpoint in the Prometheus text exposition format."""
+
+    body, content_type = metrics.exposition()
+
+    return Response(body, headers={"Content-Type": content_type})
+
+
+async def show_search_cache_status(request: Request) -> Response:
+    """Search cache endpoint shows the search cache statistics."""
+
+    return JSONResponse(request.app.state.search_cache.stats())
+
+
+@cache_by_dataset_version("org_units")
+async def all_org_units(request: Request) -> Response:
+    """Return a list of all organisation units, optionally paginated."""
+
+    db = get_datastore(request)
+
+    args = request.query_params
+
+    if "limit" not in args and "cursor" not in args:
+        # Compatibility: Retrieve every page
+        results = await db.get_all_org_units()
+
+        if not results:
+            log.warning("NO_RESULTS_ALL_ORG_UNITS")
+
+        return JSONResponse(results)
+
+    limit, cursor = parse_page_parameters(args)
+
+    try:
+        results, next_cursor = await db.get_org_units_page(limit, cursor)
+    except NotFoundError as error:
+        if cursor is None:
+            raise
+        raise expired_cursor(error)
+
+    if next_cursor:
+        next_cursor = encode_cursor(next_cursor)
+
+    return JSONResponse({"results": results, "cursor": next_cursor})
+
+
+@cache_by_dataset_version("org_units")
+async def show_org_unit(request: Request) -> Response:
+    """Show org unit by uuid."""
+
+    db = get_datastore(request)
+
+    uuid = str(request.path_params["uuid"])
+
+    return JSONResponse(await db.get_org_unit(uuid=uuid))
+
+
+@cache_by_dataset_version("employees")
+async def show_employee(request: Request) -> Response:
+    """Show employee by uuid."""
+
+    db = get_datastore(request)
+
+    uuid = str(request.path_params["uuid"])
+
+    return JSONResponse(await db.get_employee(uuid=uuid))
+
+
+async def fetch_batch(request: Request, fetch_method) -> Response:
+    """Fetch a batch of documents by uuid.
+
+    Args:
+        request (:obj:`Request`): The current request
+        fetch_method (func): AsyncDataStore method fetching documents
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    """
+
+    uuids, fields = parse_batch_request(await get_json_body(request))
+
+    if not uuids:
+        return JSONResponse({"results": [], "missing": []})
+
+    results, missing = await fetch_method(uuids, fields)
+
+    return JSONResponse({"results": results, "missing": missing})
+
+
+async def show_employees_batch(request: Request) -> Response:
+    """Show several employees by uuid."""
+
+    return await fetch_batch(request, get_datastore(request).get_employees)
+
+
+async def show_org_units_batch(request: Request) -> Response:
+    """Show several org units by uuid."""
+
+    return await fetch_batch(request, get_datastore(request).get_org_units)
+
+
+async def show_search_schema(request: Request) -> Response:
+    """Show post data schema for performing searches."""
+
+    return JSONResponse(SEARCH_SCHEMA)
+
+
+async def call_search_method(request: Request) -> Response:
+    """Perform a high level search."""
+
+    search_type, search_value = parse_search_request(
+        await get_json_body(request)
+    )
+
+    # Cached results of datasets since loaded by other workers are cleared
+    await refresh_dataset_versions(request)
+
+    db = get_datastore(request)
+
+    results = await db.search_with_fallback(
+        search_type=search_type, search_value=search_value
+    )
+
+    if not results:
+        log.debug(
+            "NO_SEARCH_RESULTS "
+            f"search_type={search_type} search_value={search_value}"
+        )
+
+    return JSONResponse(results)
+
+
+async def call_search_everything(request: Request) -> Response:
+    """Search every search type for the same value."""
+
+    search_value, limit = parse_search_everything_request(
+        await get_json_body(request)
+    )
+
+    # Cached results of datasets since loaded by other workers are cleared
+    await refresh_dataset_versions(request)
+
+    db = get_datastore(request)
+
+    results = await db.search_everything(
+        search_value=search_value, limit=limit
+    )
+
+    return JSONResponse(results)
+
+
+async def refresh_phone_index(request: Request) -> float:
+    """Rebuild the caller-ID index if the employees have been reloaded.
+
+    The index is rebuilt by a task of its own, one at a time, and lookups
+    are served from the current index meanwhile, see
+    :code:`controller.refresh_phone_index`.
+
+    Args:
+        request (:obj:`Request`): The current request
+
+    Returns:
+        float: Time spent waiting for the index in milliseconds.
+
+    """
+    state = request.app.state
+    phone_index = state.phone_index
+
+    version = await get_dataset_version(request, "employees")
+
+    rebuild = state.phone_index_rebuild
+    running = rebuild is not None and not rebuild.done()
+
+    if phone_index.needs_rebuild(version) and not running:
+        datastore = get_datastore(request)
+
+        async def build():
+            try:
+                employees = [
+                    employee
+                    async for employee in (
+                        datastore.iter_employee_phone_numbers()
+                    )
+                ]
+            except Exception:
+                log.exception("PHONE_INDEX_REBUILD_FAILED")
+                return
+
+            phone_index.build(employees, version)
+            log.info(f"PHONE_INDEX_REBUILT numbers={len(phone_index)}")
+
+        rebuild = asyncio.ensure_future(build())
+        state.phone_index_rebuild = rebuild
+
+    if phone_index.built:
+        return 0.0
+
+    # Not even warmed up yet, see `initiate_application`
+    start = perf_counter()
+    await asyncio.shield(rebuild)
+
+    return (perf_counter() - start) * 1000
+
+
+async def timed_lookup(request: Request, lookup) -> Response:
+    """Answer a caller-ID lookup, reporting its latency.
+
+    See :code:`controller.timed_lookup`.
+
+    """
+    wait_duration = await refresh_phone_index(request)
+    if wait_duration:
+        timing.add("rebuild", wait_duration)
+
+    with timing.span("lookup"):
+        body = lookup(request.app.state.phone_index)
+
+    return JSONResponse(body)
+
+
+async def lookup_phone_number(request: Request) -> Response:
+    """Resolve a phone number to the employees using it (caller-ID)."""
+
+    phone_number = request.path_params["phone_number"]
+
+    return await timed_lookup(
+        request,
+        lambda phone_index: find_phone_number(phone_index, phone_number),
+    )
+
+
+async def lookup_phone_numbers(request: Request) -> Response:
+    """Resolve several phone numbers at once (caller-ID)."""
+
+    phone_numbers = parse_phone_numbers_request(await get_json_body(request))
+
+    return await timed_lookup(
+        request,
+        lambda phone_index: find_phone_numbers(phone_index, phone_numbers),
+    )
+
+
+routes = [
+    Route("/", instrumented(show_status), methods=["GET"]),
+    Route("/api/status", instrumented(show_status), methods=["GET"]),
+    Route("/api/metrics", instrumented(show_metrics), methods=["GET"]),
+    Route(
+        "/api/status/search-cache",
+        instrumented(show_search_cache_status),
+        methods=["GET"],
+    ),
+    Route("/api/org_units", instrumented(all_org_units), methods=["GET"]),
+    Route(
+        "/api/org_unit/{uuid:uuid}",
+        instrumented(show_org_unit),
+        methods=["GET"],
+    ),
+    Route(
+        "/api/employee/{uuid:uuid}",
+        instrumented(show_employee),
+        methods=["GET"],
+    ),
+    Route(
+        "/api/employees/batch",
+        instrumented(show_employees_batch),
+        methods=["POST"],
+    ),
+    Route(
+        "/api/org_units/batch",
+        instrumented(show_org_units_batch),
+        methods=["POST"],
+    ),
+    Route("/api/search", instrumented(show_search_schema), methods=["GET"]),
+    Route("/api/search", instrumented(call_search_method), methods=["POST"]),
+    Route(
+        "/api/search/all",
+        instrumented(call_search_everything),
+        methods=["POST"],
+    ),
+    Route(
+        "/api/lookup/phone/{phone_number}",
+        instrumented(lookup_phone_number),
+        methods=["GET"],
+    ),
+    Route(
+        "/api/lookup/phone",
+        instrumented(lookup_phone_numbers),
+        methods=["POST"],
+    ),
+]
+
+
+#####################################################################
+#   ERROR HANDLING SECTION                                          #
+#####################################################################
+
+
+async def invalid_validation_handler(request: Request, error) -> Response:
+    """Error handler for all common types
+
+    See :code:`controller.invalid_validation_handler`.
+
+    """
+
+    response, status_code = error_response(error)
+
+    log.warning(f"REQUEST_FAILED - {error}")
+
+    return JSONResponse(response, status_code=status_code)
+
+
+async def all_exception_handler(request: Request, error) -> Response:
+    """Catch all error handler for (almost) all unexpected things.
+
+    See :code:`controller.all_exception_handler`.
+
+    """
+
+    error_class = error.__class__.__name__
+
+    response = {
+        "error": {
+            "type": error_class,
+            "message": "Unknown error occured, please contact administrator",
+        }
+    }
+
+    log.error(f"UNKNOWN_EXCEPTION - {error_class}={error}")
+    log.debug(error)
+
+    return JSONResponse(response, status_code=500)
+
+
+def error_status_code(error) -> int:
+    """HTTP status code the exception handlers respond to an error with.
+
+    Args:
+        error (Exception): An exception type error object
+
+    Returns:
+        int: HTTP status code
+
+    """
+
+    for error_class in type(error).__mro__:
+        if error_class in exception_handlers:
+            break
+
+    if exception_handlers[error_class] is invalid_validation_handler:
+        _, status_code = error_response(error)
+        return status_code
+
+    return 500
+
+
+exception_handlers = {
+    NotFound: invalid_validation_handler,
+    NotFoundError: invalid_validation_handler,
+    InvalidSearchType: invalid_validation_handler,
+    ExpiredCursor: invalid_validation_handler,
+    InvalidRequestBody: invalid_validation_handler,
+    InvalidRequestParameters: invalid_validation_handler,
+    Exception: all_exception_handler,
+}
@@ -0,0 +1,401 @@
+from typing import Dict, List, Optional, Tuple, Union
+from elasticsearch import AsyncElasticsearch, AsyncTransport
+from elasticsearch.helpers import async_scan
+from os2phonebook import metrics, timing
+from os2phonebook.backend import PHONE_NUMBERS_FIELD
+from os2phonebook.datastore import (
+    DataStore,
+    DATASET_VERSIONS_INDEX,
+    client_options,
+    parse_hosts,
+)
+
+
+class TimedAsyncTransport(AsyncTransport):
+    """Async transport timing every request to Elasticsearch
+
+    See `datastore.TimedTransport`.
+
+    """
+
+    async def perform_request(self, *args, **kwargs):
+        with timing.span("es"):
+            response = await super().perform_request(*args, **kwargs)
+
+        timing.record_response(response)
+        return response
+
+
+def create_async_connection(
+    host: Union[str, List[str]], port: int, **options
+) -> AsyncElasticsearch:
+    """Async Elasticsearch connection factory.
+
+    This is a connection factory to connect to the
+    Elasticsearch backend from within an event loop
+
+    Args:
+        host (str): Hostname of the backend, or several comma separated
+            hostnames, see `parse_hosts`.
+        port (int): Service port
+        **options: Connection options, see `create_connection`
+
+    Returns:
+        :obj:`AsyncElasticsearch`: An instance of the async client
+
+    """
+    if not isinstance(host, (str, list)):
+        raise TypeError("Host description must be passed as a string")
+
+    if not isinstance(port, int):
+        raise TypeError("Port must be passed as an integer")
+
+    connection = AsyncElasticsearch(
+        parse_hosts(host, port),
+        transport_class=TimedAsyncTransport,
+        **client_options(**options),
+    )
+
+    return connection
+
+
+def sync_only(name: str):
+    """Method refusing an operation the async client does not support
+
+    The inherited synchronous implementation would call the
+    :code:`AsyncElasticsearch` client without awaiting it,
+    silently doing nothing, so it is replaced with an error.
+
+    Args:
+        name (str): Name of the :code:`DataStore` method
+
+    Returns:
+        func: Method raising :code:`NotImplementedError`
+
+    """
+
+    def method(self, *args, **kwargs):
+        raise NotImplementedError(
+            f"{name} is not available in AsyncDataStore, "
+            "use the synchronous DataStore"
+        )
+
+    method.__name__ = name
+    method.__doc__ = f"Not available in async, see `DataStore.{name}`"
+
+    return method
+
+
+class AsyncDataStore(DataStore):
+    """Async client for generating queries in backend datastore
+
+    Queries are generated exactly as by the :code:`DataStore`,
+    but the read and search methods are coroutines, sending
+    the queries using the :code:`AsyncElasticsearch` client.
+
+    The index lifecycle and loading methods are not available in async
+    and raise :code:`NotImplementedError`, loads are served by
+    the synchronous :code:`DataStore`.
+
+    Args:
+        db (:obj:`AsyncElasticsearch`): Instance of the async client.
+        cache (:obj:`SearchCache`): Optional cache for search results.
+
+    Example:
+
+        db = AsyncDataStore(create_async_connection("localhost", 9200))
+
+        results = await db.search_with_fallback("employee_by_name", "Riker")
+
+    """
+
+    client_class = AsyncElasticsearch
+
+    _scan = sync_only("_scan")
+    _run_search = sync_only("_run_search")
+    delete_index = sync_only("delete_index")
+    create_index = sync_only("create_index")
+    create_versioned_index = sync_only("create_versioned_index")
+    swap_alias = sync_only("swap_alias")
+    get_alias_indices = sync_only("get_alias_indices")
+    prune_versioned_indices = sync_only("prune_versioned_indices")
+    publish_index = sync_only("publish_index")
+    load_versioned_index = sync_only("load_versioned_index")
+    reindex = sync_only("reindex")
+    get_content_hashes = sync_only("get_content_hashes")
+    delta_index = sync_only("delta_index")
+    set_dataset_version = sync_only("set_dataset_version")
+    insert_index = sync_only("insert_index")
+    bulk_insert_index = sync_only("bulk_insert_index")
+
+    @metrics.timed("get_employee")
+    async def get_employee(self, uuid: str) -> dict:
+        """Retrieve employee document by identifer
+
+        See `DataStore.get_employee`.
+
+        """
+
+        response = await self.db.get(index="employees", id=uuid)
+
+        return self._strip_internal_fields(response["_source"])
+
+    @metrics.timed("get_org_unit")
+    async def get_org_unit(self, uuid: str) -> dict:
+        """Retrieve org_unit document by identifer
+
+        See `DataStore.get_org_unit`.
+
+        """
+
+        response = await self.db.get(index="org_units", id=uuid)
+
+        return self._strip_internal_fields(response["_source"])
+
+    async def get_documents(
+        self, index: str, uuids: List[str], fields: List[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """Retrieve several documents by identifier in a single request
+
+        See `DataStore.get_documents`.
+
+        """
+
+        response = await self.db.mget(
+            index=index, body=self._documents_query(uuids, fields)
+        )
+
+        return self._documents_from_response(response)
+
+    async def get_employees(
+        self, uuids: List[str], fields: List[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """Retrieve several employee documents by identifier
+
+        See `DataStore.get_documents`.
+
+        """
+        return await self.get_documents("employees", uuids, fields)
+
+    async def get_org_units(
+        self, uuids: List[str], fields: List[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """Retrieve several org_unit documents by identifier
+
+        See `DataStore.get_documents`.
+
+        """
+        return await self.get_documents("org_units", uuids, fields)
+
+    async def get_size(self, index: str) -> int:
+        """Get the total document count for a given index
+
+        See `DataStore.get_size`.
+
+        """
+
+        query = {"size": 0, "query": {"match_all": {}}}
+
+        response_data = await self.db.search(index=index, body=query)
+        total_size = response_data["hits"]["total"]["value"]
+
+        return int(total_size)
+
+    async def get_org_units_page(
+        self, limit: int, cursor: dict = None
+    ) -> Tuple[List[dict], Optional[dict]]:
+        """Retrieve a page of org unit documents from the store
+
+        See `DataStore.get_org_units_page`.
+
+        """
+
+        index, query = self._org_units_page_query(limit, cursor)
+
+        return_data = await self.db.search(index=index, body=query)
+
+        return self._org_units_page_from_response(return_data, limit)
+
+    async def iter_all_org_units(self, page_size: int = 1000):
+        """Iterate over all org unit documents, a page at a time
+
+        Args:
+            page_size (int): Number of documents to retrieve per request
+
+        Yields:
+            dict: Org unit document
+
+        """
+
+        cursor = None
+
+        while True:
+            org_units, cursor = await self.get_org_units_page(
+                page_size, cursor
+            )
+            for org_unit in org_units:
+                yield org_unit
+
+            if cursor is None:
+                return
+
+    @metrics.timed("get_all_org_units")
+    async def get_all_org_units(self) -> List[dict]:
+        """Retrieve all org unit documents from the store
+
+        Returns:
+            List[dict]: An array of org unit documents as dictionaries
+
+        """
+
+        return [org_unit async for org_unit in self.iter_all_org_units()]
+
+    async def iter_employee_phone_numbers(self):
+        """Iterate over all employees with a phone number
+
+        See `DataStore.iter_employee_phone_numbers`.
+
+        """
+
+        hits = async_scan(
+            client=self.db,
+            index="employees",
+            query={
+                "query": {"exists": {"field": PHONE_NUMBERS_FIELD}},
+                "_source": {
+                    "includes": [
+                        "uuid",
+                        "name",
+                        "addresses.PHONE",
+                        "engagements",
+                    ]
+                },
+            },
+        )
+
+        async for hit in hits:
+            yield hit.get("_source", {})
+
+    @metrics.timed("search")
+    async def search(
+        self, search_type, search_value, fuzzy_search=False
+    ) -> List[dict]:
+        """High level search method
+
+        See `DataStore.search`.
+
+        """
+
+        if self.cache is not None:
+            key = self.cache.key(search_type, search_value, fuzzy_search)
+            found, results = self.cache.get(key)
+            if found:
+                return results
+
+        index, query, processor = self._prepare_search(
+            search_type, search_value, fuzzy_search
+        )
+
+        with metrics.time_searches(
+            [search_type], metrics.pass_label(fuzzy_search)
+        ):
+            response = await self.db.search(index=index, body=query)
+
+        metrics.observe_search_pass(search_type, fuzzy_search, response)
+
+        with timing.span("process"):
+            results = [
+                processor(document) for document in response["hits"]["hits"]
+            ]
+
+        if self.cache is not None:
+            self.cache.set(key, results)
+
+        return results
+
+    @metrics.timed("search_with_fallback")
+    async def search_with_fallback(
+        self, search_type: str, search_value: str
+    ) -> List[dict]:
+        """Search with an exact pass and a fuzzy fallback in one request
+
+        See `DataStore.search_with_fallback`.
+
+        """
+
+        results = await self._search_types_with_fallback(
+            [search_type], search_value
+        )
+
+        return results[search_type]
+
+    @metrics.timed("search_everything")
+    async def search_everything(
+        self, search_value: str, limit: int = None
+    ) -> Dict[str, List[dict]]:
+        """Search every search type for the same value in one request
+
+        See `DataStore.search_everything`.
+
+        """
+
+        return await self._search_types_with_fallback(
+            list(self.search_type_map), search_value, limit
+        )
+
+    async def _search_types_with_fallback(
+        self, search_types: List[str], search_value: str, limit: int = None
+    ) -> Dict[str, List[dict]]:
+        """Search several search types with an exact and a fuzzy pass
+
+        See `DataStore._search_types_with_fallback`.
+
+        """
+
+        cached, searches = self._plan_fallback_searches(
+            search_types, search_value, limit
+        )
+
+        results_per_search = []
+        if searches:
+            searched_types = self._searched_types(search_types, cached)
+
+            with metrics.time_searches(searched_types, "fallback"):
+                results_per_search = await self._multi_search(
+                    searches, self._search_labels(searched_types)
+                )
+
+        return self._collect_fallback_results(
+            search_types, search_value, cached, results_per_search, limit
+        )
+
+    async def _multi_search(self, searches, labels=None) -> List[List[dict]]:
+        """Run several searches in a single `_msearch` request
+
+        See `DataStore._multi_search`.
+
+        """
+
+        response = await self.db.msearch(
+            body=self._multi_search_body(searches)
+        )
+
+        return self._multi_search_results(searches, response, labels)
+
+    async def get_dataset_versions(self) -> Dict[str, str]:
+        """Retrieve the dataset version of every loaded index
+
+        See `DataStore.get_dataset_versions`.
+
+        """
+
+        response = await self.db.mget(
+            index=DATASET_VERSIONS_INDEX,
+            body={"ids": list(self.index_definitions)},
+        )
+
+        return self._dataset_versions_from_response(response)
+
+    async def close(self) -> None:
+        """Close the connections of the underlying client"""
+        await self.db.close()
@@ -0,0 +1,1025 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from os2phonebook import metrics, timing
+from os2phonebook.cache import SearchCache
+from os2phonebook.exceptions import InvalidSearchType
+from os2phonebook.helpers import content_hash, normalise_phone_number
+
+# Fields added to the documents when indexing,
+# which are not part of the documents as loaded
+CONTENT_HASH_FIELD = "content_hash"
+PHONE_NUMBERS_FIELD = "phone_numbers"
+REVERSED_PHONE_NUMBERS_FIELD = "phone_numbers_reversed"
+INTERNAL_FIELDS = [
+    CONTENT_HASH_FIELD,
+    PHONE_NUMBERS_FIELD,
+    REVERSED_PHONE_NUMBERS_FIELD,
+]
+
+# Number of hits a search query returns if it does not set a size
+DEFAULT_SEARCH_SIZE = 10
+
+
+class Backend(ABC):
+    """Interface of the datastore backends
+
+    A backend stores the employee and org unit documents, builds the
+    queries of every search type and runs them. The search policy, e.g.
+    the fuzzy fallback, the search cache and the metrics, is shared by
+    every backend and implemented here, on top of the abstract methods.
+
+    Searches are run by `_run_search`, which answers with a response
+    shaped like that of Elasticsearch, i.e. the hits at `hits.hits`,
+    each with the document at `_source`. Thus the query builders of a
+    backend return the index, the query in the form the backend runs
+    and optionally a processor converting a hit into a document.
+
+    Args:
+        db (object): Connection of the backend, see `client_class`.
+
+        search_type_map (dict): A map of all the available search types.
+
+            Available search types:
+                * employee_by_name
+                * employee_by_phone
+                * employee_by_email
+                * employee_by_engagement
+                * org_unit_by_name
+                * org_unit_by_kle
+
+            Example:
+
+            {
+                "employee_by_name": {
+                    "description": "Navn",
+                    "query_method": "query_for_employee_by_name"
+            }
+
+            This particular search type has the canonical description `Navn`
+            and a query method which refers to the name of an attribute
+            on this class, e.g. `Backend.query_for_employee_by_name`.
+
+        cache (:obj:`SearchCache`): Optional cache for search results.
+
+    """
+
+    # Client class the backend is used with
+    client_class = object
+
+    # Searches with a fallback are searched exact, then fuzzy
+    fallback_passes = (False, True)
+
+    def __init__(self, db, cache: SearchCache = None):
+        if not isinstance(db, self.client_class):
+            raise TypeError(
+                "Datastore requires an instance of the "
+                f"{self.client_class.__name__} object"
+            )
+
+        self.db = db
+        self.cache = cache
+
+        self.search_type_map = {
+            "employee_by_name": {
+                "description": "Navn",
+                "query_method": "query_for_employee_by_name",
+            },
+            "employee_by_phone": {
+                "description": "Telefon",
+                "query_method": "query_for_employee_by_phone",
+            },
+            "employee_by_email": {
+                "description": "Email",
+                "query_method": "query_for_employee_by_email",
+            },
+            "employee_by_engagement": {
+                "description": "Stilling",
+                "query_method": "query_for_employee_by_engagement",
+            },
+            "org_unit_by_name": {
+                "description": "Enhed",
+                "query_method": "query_for_org_unit_by_name",
+            },
+            "org_unit_by_kle": {
+                "description": "Enhed",
+                "query_method": "query_for_org_unit_by_kle",
+            },
+        }
+
+    def _strip_internal_fields(self, document: dict) -> dict:
+        """Remove the fields added when indexing from a document
+
+        Args:
+            document (dict): Document as stored in the index
+
+        Returns:
+            dict: Document as loaded
+
+        """
+        return {
+            key: value
+            for key, value in document.items()
+            if key not in INTERNAL_FIELDS
+        }
+
+    def get_employees(
+        self, uuids: List[str], fields: List[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """Retrieve several employee documents by identifier
+
+        See `get_documents`.
+
+        """
+        return self.get_documents("employees", uuids, fields)
+
+    def get_org_units(
+        self, uuids: List[str], fields: List[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """Retrieve several org_unit documents by identifier
+
+        See `get_documents`.
+
+        """
+        return self.get_documents("org_units", uuids, fields)
+
+    def iter_all_org_units(self, page_size: int = 1000) -> Iterator[dict]:
+        """Iterate over all org unit documents, a page at a time
+
+        Args:
+            page_size (int): Number of documents to retrieve per request
+
+        Yields:
+            dict: Org unit document
+
+        """
+
+        cursor = None
+
+        while True:
+            org_units, cursor = self.get_org_units_page(page_size, cursor)
+            yield from org_units
+
+            if cursor is None:
+                return
+
+    @metrics.timed("get_all_org_units")
+    def get_all_org_units(self) -> List[dict]:
+        """Retrieve all org unit documents from the store
+
+        Returns:
+            List[dict]: An array of org unit documents as dictionaries
+
+        """
+
+        return list(self.iter_all_org_units())
+
+    def get_query_method(
+        self, search_type: str
+    ) -> Callable[[str, bool], Tuple[str, dict]]:
+        """Fetches query generator based on the `search_type`
+
+        Please see the `search_type_map` attribute
+        for more information on the available types.
+
+        Args:
+            search_type (str): This refers to the `search_type_map` key.
+
+        Returns:
+            Callable[[str, bool], Tuple[str, dict]: The query generator
+
+        Raises:
+            TypeError:
+                If the `search_type` is not a string value.
+            InvalidSearchType:
+                If the `search_type` does not exist.
+                (Meaning that it does not exist in the `search_type_map`)
+            ValueError:
+                If the query method is not defined for this type.
+            AttributeError:
+                If the query method defined does not exist as an attribute.
+        """
+
+        if not isinstance(search_type, str):
+            raise TypeError("Search type must be a string value")
+
+        if search_type not in self.search_type_map:
+            raise InvalidSearchType(
+                f"Search type: {search_type} is not available"
+            )
+
+        selected_type = self.search_type_map[search_type]
+
+        if "query_method" not in selected_type:
+            raise ValueError("No query method defined for this search type")
+
+        query_method = selected_type["query_method"]
+
+        if not hasattr(self, query_method):
+            AttributeError("Query method does not exist")
+
+        return getattr(self, query_method)
+
+    def _prepare_search(
+        self, search_type: str, search_value: str, fuzzy_search: bool
+    ) -> Tuple[str, dict, Callable[[dict], dict]]:
+        """Build the index, query and hit processor for a search
+
+        Fetches query generator based on the `search_type` by
+        calling `get_query_method` and pads the result with a
+        default processor if the query method did not supply one.
+
+        Args:
+            search_type (str): Search type (see `search_type_map`)
+            search_value (str): Arbitrary search string
+            fuzzy_search (bool): If True, use match_phrase_prefix
+
+        Returns:
+            Tuple[str, dict, Callable]: Index name, query (see
+                `_run_search`) and a processor converting a hit into a
+                document.
+
+        """
+
+        # Default processor simply returns the _source directly
+        def default_processor(document):
+            return document["_source"]
+
+        # Get the query generator method and run it to get our tuple
+        query_method = self.get_query_method(search_type)
+        result = query_method(search_value, fuzzy_search)
+
+        # Pad with default_processor if we only got a 2 tuple back.
+        if len(result) == 2:
+            result = (*result, default_processor)
+
+        return result
+
+    @metrics.timed("search")
+    def search(
+        self, search_type, search_value, fuzzy_search=False
+    ) -> List[dict]:
+        """High level search method
+
+        Fetches query generator based on the `search_type` by
+        calling `get_query_method`.
+
+        Please see the `search_type_map` attribute
+        for more information on the available types.
+
+        Args:
+            search_type (str): Search type (see available types above)
+            search_value (str): Arbitrary search string
+            fuzzy_search (bool): If True, use match_phrase_prefix
+
+        Returns:
+            List[dict]: A list of documents that matched the search
+
+        Example:
+
+            results = client.search(
+                search_type = "employee_by_name",
+                search_value = "Commander Riker",
+                fuzzy_search = True
+            )
+
+        """
+
+        if self.cache is not None:
+            key = self.cache.key(search_type, search_value, fuzzy_search)
+            found, results = self.cache.get(key)
+            if found:
+                return results
+
+        # Unpack 3-tuple into constituents
+        index, query, processor = self._prepare_search(
+            search_type, search_value, fuzzy_search
+        )
+
+        with metrics.time_searches(
+            [search_type], metrics.pass_label(fuzzy_search)
+        ):
+            response = self._run_search(index, query)
+
+        metrics.observe_search_pass(search_type, fuzzy_search, response)
+
+        with timing.span("process"):
+            results = [
+                processor(document) for document in response["hits"]["hits"]
+            ]
+
+        if self.cache is not None:
+            self.cache.set(key, results)
+
+        return results
+
+    @metrics.timed("search_with_fallback")
+    def search_with_fallback(
+        self, search_type: str, search_value: str
+    ) -> List[dict]:
+        """Search with an exact pass and a fuzzy fallback in one request
+
+        Both the exact and the fuzzy query are generated up front
+        and run together (see `_multi_search`), e.g. in a single
+        `_msearch` request to Elasticsearch, rather than issuing the fuzzy
+        search as a second round-trip only after the exact search came
+        back empty.
+
+        Args:
+            search_type (str): Search type (see `search_type_map`)
+            search_value (str): Arbitrary search string
+
+        Returns:
+            List[dict]: Documents from the first pass that matched,
+                exact before fuzzy, or an empty list.
+
+        Raises:
+            TransportError: If the backend failed one of the searches.
+
+        """
+
+        results = self._search_types_with_fallback([search_type], search_value)
+
+        return results[search_type]
+
+    @metrics.timed("search_everything")
+    def search_everything(
+        self, search_value: str, limit: int = None
+    ) -> Dict[str, List[dict]]:
+        """Search every search type for the same value in one request
+
+        Every search type in `search_type_map` is searched with the same
+        exact-then-fuzzy policy as `search_with_fallback`, and all of the
+        passes are run together (see `_multi_search`).
+
+        Args:
+            search_value (str): Arbitrary search string
+            limit (int): Maximum number of documents per search type,
+                passed on as the size of each query if it is smaller,
+                or `None` for no limit beyond that of each query.
+
+        Returns:
+            Dict[str, List[dict]]: Documents by search type,
+                in the order of `search_type_map`.
+
+        Raises:
+            TransportError: If the backend failed one of the searches.
+
+        Example:
+
+            results = client.search_everything("Riker", limit=5)
+            results["employee_by_name"]
+
+        """
+
+        return self._search_types_with_fallback(
+            list(self.search_type_map), search_value, limit
+        )
+
+    def _search_types_with_fallback(
+        self, search_types: List[str], search_value: str, limit: int = None
+    ) -> Dict[str, List[dict]]:
+        """Search several search types with an exact and a fuzzy pass
+
+        Search types with cached results are resolved from the cache,
+        the remaining ones are resolved together by `_multi_search`.
+
+        Args:
+            search_types (List[str]): Search types (see `search_type_map`)
+            search_value (str): Arbitrary search string
+            limit (int): Maximum number of documents per search type,
+                or `None` for the size of each query (see `_limit_query`).
+
+        Returns:
+            Dict[str, List[dict]]: Documents from the first pass that
+                matched by search type, exact before fuzzy.
+
+        Raises:
+            TransportError: If the backend failed one of the searches.
+
+        """
+
+        cached, searches = self._plan_fallback_searches(
+            search_types, search_value, limit
+        )
+
+        results_per_search = []
+        if searches:
+            searched_types = self._searched_types(search_types, cached)
+
+            with metrics.time_searches(searched_types, "fallback"):
+                results_per_search = self._multi_search(
+                    searches, self._search_labels(searched_types)
+                )
+
+        return self._collect_fallback_results(
+            search_types, search_value, cached, results_per_search, limit
+        )
+
+    def _limit_query(
+        self, search: Tuple[str, dict, Callable[[dict], dict]], limit: int
+    ) -> Tuple[str, dict, Callable[[dict], dict]]:
+        """Cap the size of a prepared search at `limit` hits
+
+        The backend is asked for no more hits than are returned,
+        rather than fetching and scoring hits only to drop them.
+
+        Args:
+            search (tuple): Search as returned by `_prepare_search`
+            limit (int): Maximum number of hits, or `None` for no cap
+
+        Returns:
+            tuple: The search with the size of the query capped.
+
+        """
+
+        if limit is None:
+            return search
+
+        index, query, processor = search
+        size = min(int(query.get("size", DEFAULT_SEARCH_SIZE)), int(limit))
+
+        return index, {**query, "size": size}, processor
+
+    def _plan_fallback_searches(
+        self, search_types: List[str], search_value: str, limit: int = None
+    ) -> Tuple[Dict[str, List[dict]], list]:
+        """Resolve cached search types and prepare the remaining searches
+
+        Args:
+            search_types (List[str]): Search types (see `search_type_map`)
+            search_value (str): Arbitrary search string
+            limit (int): Maximum number of documents per search type,
+                or `None` for no cap on the size of the queries.
+
+        Returns:
+            Tuple[Dict[str, List[dict]], list]: Cached documents by search
+                type and the searches (see `_prepare_search`) to run,
+                an exact and a fuzzy pass for every other search type.
+
+        """
+
+        cached = {}
+        searches = []
+
+        for search_type in search_types:
+            if self.cache is not None:
+                keys = [
+                    self.cache.key(
+                        search_type, search_value, fuzzy_search, limit
+                    )
+                    for fuzzy_search in self.fallback_passes
+                ]
+
+                # The fuzzy pass is only relevant
+                # if the exact pass came up empty
+                for key in keys:
+                    found, results = self.cache.get(key)
+                    if not found or results:
+                        break
+                if found:
+                    cached[search_type] = results
+                    continue
+
+            searches.extend(
+                self._limit_query(
+                    self._prepare_search(
+                        search_type, search_value, fuzzy_search
+                    ),
+                    limit,
+                )
+                for fuzzy_search in self.fallback_passes
+            )
+
+        return cached, searches
+
+    def _searched_types(
+        self, search_types: List[str], cached: Dict[str, List[dict]]
+    ) -> List[str]:
+        """Search types not resolved from the cache, in search order"""
+        return [
+            search_type
+            for search_type in search_types
+            if search_type not in cached
+        ]
+
+    def _search_labels(
+        self, searched_types: List[str]
+    ) -> List[Tuple[str, bool]]:
+        """Search type and pass of each of the fallback searches
+
+        Args:
+            searched_types (List[str]): Search types searched, see
+                `_searched_types`
+
+        Returns:
+            List[Tuple[str, bool]]: Search type and whether the pass
+                is fuzzy, in the order of `_plan_fallback_searches`.
+
+        """
+        return [
+            (search_type, fuzzy_search)
+            for search_type in searched_types
+            for fuzzy_search in self.fallback_passes
+        ]
+
+    def _collect_fallback_results(
+        self,
+        search_types: List[str],
+        search_value: str,
+        cached: Dict[str, List[dict]],
+        results_per_search: List[List[dict]],
+        limit: int = None,
+    ) -> Dict[str, List[dict]]:
+        """Pick the first pass that matched for every search type
+
+        The results of every pass are cached along the way.
+
+        Args:
+            search_types (List[str]): Search types (see `search_type_map`)
+            search_value (str): Arbitrary search string
+            cached (dict): Cached documents by search type
+            results_per_search (list): Documents matched by each of the
+                searches returned by `_plan_fallback_searches`
+            limit (int): Limit the searches were planned with
+
+        Returns:
+            Dict[str, List[dict]]: Documents by search type.
+
+        """
+
+        results_per_search = iter(results_per_search)
+
+        results_by_type = {}
+
+        for search_type in search_types:
+            if search_type in cached:
+                results_by_type[search_type] = cached[search_type]
+                continue
+
+            results_per_pass = [
+                next(results_per_search) for _ in self.fallback_passes
+            ]
+
+            if self.cache is not None:
+                for fuzzy_search, results in zip(
+                    self.fallback_passes, results_per_pass
+                ):
+                    key = self.cache.key(
+                        search_type, search_value, fuzzy_search, limit
+                    )
+                    self.cache.set(key, results)
+
+            matched = next(
+                (
+                    (fuzzy_search, results)
+                    for fuzzy_search, results in zip(
+                        self.fallback_passes, results_per_pass
+                    )
+                    if results
+                ),
+                None,
+            )
+
+            if matched is None:
+                metrics.count_search_result(search_type, "none")
+                results_by_type[search_type] = []
+            else:
+                fuzzy_search, results = matched
+                metrics.count_search_result(
+                    search_type, metrics.pass_label(fuzzy_search)
+                )
+                results_by_type[search_type] = results
+
+        return results_by_type
+
+    def _multi_search(
+        self,
+        searches: List[Tuple[str, dict, Callable[[dict], dict]]],
+        labels: List[Tuple[str, bool]] = None,
+    ) -> List[List[dict]]:
+        """Run several searches, one at a time by default
+
+        Backends able to run several searches in a single request,
+        e.g. Elasticsearch using `_msearch`, override this.
+
+        Args:
+            searches (list): Index name, query and processor for every
+                search, see `_prepare_search`.
+            labels (list): Search type and whether the pass is fuzzy
+                for every search, used to record metrics if given.
+
+        Returns:
+            List[List[dict]]: Documents matched by each of the searches.
+
+        """
+
+        results_per_search = []
+
+        for position, (index, query, processor) in enumerate(searches):
+            response = self._run_search(index, query)
+
+            if labels is not None:
+                metrics.observe_search_pass(*labels[position], response)
+
+            hits = response["hits"]["hits"]
+            with timing.span("process"):
+                results_per_search.append(
+                    [processor(document) for document in hits]
+                )
+
+        return results_per_search
+
+    def _phone_number_fields(self, document: dict) -> dict:
+        """Derive the normalised phone number fields of an employee
+
+        Args:
+            document (dict): Employee document
+
+        Returns:
+            dict: The normalised phone numbers and the same phone numbers
+                with their digits reversed, for suffix lookups.
+
+        """
+        phone_addresses = document.get("addresses", {}).get("PHONE", [])
+
+        phone_numbers = []
+        for address in phone_addresses:
+            phone_number = normalise_phone_number(address.get("value") or "")
+            if phone_number and phone_number not in phone_numbers:
+                phone_numbers.append(phone_number)
+
+        return {
+            PHONE_NUMBERS_FIELD: phone_numbers,
+            REVERSED_PHONE_NUMBERS_FIELD: [
+                phone_number[::-1] for phone_number in phone_numbers
+            ],
+        }
+
+    def _prepare_documents(self, alias: str, generator):
+        """Add the derived fields to every document of a bulk action generator
+
+        Every document gets its content hash, and employees additionally
+        get their normalised phone numbers.
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            generator (func): Generator function, generating dicts.
+
+        Returns:
+            func: Generator function, generating dicts.
+
+        """
+
+        def prepared_generator():
+            for action in generator():
+                document = action["_source"]
+
+                derived_fields = {CONTENT_HASH_FIELD: content_hash(document)}
+                if alias == "employees":
+                    derived_fields.update(self._phone_number_fields(document))
+
+                yield {**action, "_source": {**document, **derived_fields}}
+
+        return prepared_generator
+
+    def _delta_documents(
+        self,
+        alias: str,
+        generator,
+        indexed_hashes: Dict[str, str],
+        counts: Dict[str, int],
+    ):
+        """Bulk actions applying the changes of a delta load
+
+        The content hash of every given document is compared with the
+        hash of the indexed document:
+            * New documents are added.
+            * Documents with a different content hash are replaced.
+            * Documents with the same content hash are left untouched.
+            * Indexed documents not given are deleted.
+
+        A document given more than once is counted once, as its last
+        occurrence, which is the one left in the index.
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            generator (func): Generator function, generating dicts.
+            indexed_hashes (dict): Content hash by identifier of the
+                indexed documents, consumed by the actions.
+            counts (dict): Documents added, updated, deleted and
+                unchanged, counted as the actions are generated.
+
+        Returns:
+            func: Generator function, generating dicts.
+
+        """
+
+        def delta_generator():
+            # Whether every identifier given so far was indexed, its
+            # indexed hash and the count it was counted in
+            given = {}
+
+            for action in self._prepare_documents(alias, generator)():
+                identifier = action["_id"]
+                current_hash = action["_source"][CONTENT_HASH_FIELD]
+
+                if identifier in given:
+                    indexed, indexed_hash, previous = given[identifier]
+                    counts[previous] -= 1
+                else:
+                    indexed = identifier in indexed_hashes
+                    indexed_hash = indexed_hashes.pop(identifier, None)
+                    previous = None
+
+                if not indexed:
+                    change = "added"
+                elif indexed_hash != current_hash:
+                    change = "updated"
+                else:
+                    change = "unchanged"
+
+                counts[change] += 1
+                given[identifier] = (indexed, indexed_hash, change)
+
+                # Unless reverting the change of an earlier occurrence
+                if change == "unchanged" and previous in (None, "unchanged"):
+                    continue
+
+                yield action
+
+            # Whatever was not given is no longer part of the dataset
+            for identifier in indexed_hashes:
+                counts["deleted"] += 1
+                yield {"_op_type": "delete", "_id": identifier}
+
+        return delta_generator
+
+    # The methods below are implemented by every backend
+
+    @abstractmethod
+    def get_employee(self, uuid: str) -> dict:
+        """Retrieve employee document by identifer
+
+        Args:
+            uuid (str): Document identifier <uuid>
+
+        Returns:
+            dict: Document containing employee
+
+        Raises:
+            NotFoundError: If there is no such employee.
+
+        """
+
+    @abstractmethod
+    def get_org_unit(self, uuid: str) -> dict:
+        """Retrieve org_unit document by identifer
+
+        Args:
+            uuid (str): Document identifier <uuid>
+
+        Returns:
+            dict: Document containing org_unit
+
+        Raises:
+            NotFoundError: If there is no such org unit.
+
+        """
+
+    @abstractmethod
+    def get_documents(
+        self, index: str, uuids: List[str], fields: List[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """Retrieve several documents by identifier in a single request
+
+        Args:
+            index (str): Name of the index to query
+            uuids (List[str]): Document identifiers <uuid>
+            fields (List[str]): Document fields to return,
+                or `None` to return the entire documents.
+
+        Returns:
+            Tuple[List[dict], List[str]]: The documents found,
+                in the order requested, and the identifiers not found.
+
+        """
+
+    @abstractmethod
+    def get_size(self, index: str) -> int:
+        """Get the total document count for a given index
+
+        Args:
+            index (str): Name of the index to query
+
+        Returns:
+            int: Total documents value
+
+        """
+
+    @abstractmethod
+    def get_org_units_page(
+        self, limit: int, cursor: dict = None
+    ) -> Tuple[List[dict], Optional[dict]]:
+        """Retrieve a page of org unit documents, ordered by uuid
+
+        Args:
+            limit (int): Maximum number of documents on the page
+            cursor (dict): Cursor returned along with the previous page,
+                or `None` for the first page.
+
+        Returns:
+            Tuple[List[dict], Optional[dict]]: An array of org unit
+                documents, scoped to uuid, name and parent, and the cursor
+                for the next page, or `None` if this is the last page.
+
+        """
+
+    @abstractmethod
+    def iter_employee_phone_numbers(self) -> Iterator[dict]:
+        """Iterate over all employees with a phone number
+
+        Yields:
+            dict: Employee document, scoped to uuid, name,
+                phone addresses and engagements.
+
+        """
+
+    @abstractmethod
+    def _run_search(self, index: str, query) -> dict:
+        """Run a query built by one of the query builders
+
+        Args:
+            index (str): Name of the index to search
+            query: Query, as built by the query builder
+
+        Returns:
+            dict: Search response, with the hits at `hits.hits`
+                and the time taken in milliseconds at `took`.
+
+        """
+
+    @abstractmethod
+    def query_for_employee_by_name(self, name: str, fuzzy_search: bool):
+        """Search query for an employee by the full name
+
+        Every word must match, the last word as a prefix, in either the
+        name or the surname. The fuzzy search matches any of the words.
+
+        Returns:
+            tuple: Index name, query and optionally a hit processor.
+
+        """
+
+    @abstractmethod
+    def query_for_employee_by_phone(
+        self, phone_number: str, fuzzy_search: bool
+    ):
+        """Search query for an employee by phone number
+
+        The number is normalised, see `normalise_phone_number`, and looked
+        up exactly, or by prefix or suffix in the fuzzy search.
+
+        Returns:
+            tuple: Index name, query and optionally a hit processor.
+
+        """
+
+    @abstractmethod
+    def query_for_employee_by_email(
+        self, email_address: str, fuzzy_search: bool
+    ):
+        """Search query for an employee by email address, as a phrase prefix
+
+        Returns:
+            tuple: Index name, query and optionally a hit processor.
+
+        """
+
+    @abstractmethod
+    def query_for_employee_by_engagement(
+        self, engagement: str, fuzzy_search: bool
+    ):
+        """Search query for an engagement title, as a phrase prefix
+
+        Returns:
+            tuple: Index name, query and optionally a hit processor.
+
+        """
+
+    @abstractmethod
+    def query_for_org_unit_by_name(self, name: str, fuzzy_search: bool):
+        """Search query for an org unit by name, as a phrase prefix
+
+        Returns:
+            tuple: Index name, query and optionally a hit processor.
+
+        """
+
+    @abstractmethod
+    def query_for_org_unit_by_kle(self, kle: str, fuzzy_search: bool):
+        """Search query for an org unit by kle title, as a phrase prefix
+
+        The processor embeds the matching kles in the org unit.
+
+        Returns:
+            tuple: Index name, query and optionally a hit processor.
+
+        """
+
+    @abstractmethod
+    def create_index(self, index: str, mapping: dict) -> dict:
+        """Explicitly create an index
+
+        Args:
+            index (str): Name of the index to create
+            mapping (dict): Elasticsearch index definition, which
+                backends without mappings may ignore.
+
+        """
+
+    @abstractmethod
+    def delete_index(self, index: str) -> dict:
+        """Delete an entire index by name, ignoring missing indices
+
+        Args:
+            index (str): Name of the index
+
+        """
+
+    @abstractmethod
+    def insert_index(self, index: str, identifier: str, data: dict) -> dict:
+        """Insert a document into a datastore index
+
+        Args:
+            index (str): Name of the index
+            identifier (str): Create identifier for the document
+            data (dict): Document as a dictionary
+
+        """
+
+    @abstractmethod
+    def bulk_insert_index(self, index: str, generator, **bulk_options):
+        """Insert documents into a datastore index
+
+        Args:
+            index (str): Name of the index
+            generator (func): Generator function, generating bulk actions.
+            **bulk_options: Options of the backend, which backends
+                without the option ignore.
+
+        Returns:
+            int, int: Number of documents indexed, documents processed.
+
+        """
+
+    @abstractmethod
+    def reindex(self, alias: str, generator, **bulk_options):
+        """Replace the documents of an index with the generated documents
+
+        Readers keep reading the previous documents until the load is
+        complete, see `_prepare_documents` for the fields added.
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            generator (func): Generator function, generating dicts.
+            **bulk_options: Keyword arguments for `bulk_insert_index`
+
+        Returns:
+            int, int: Number of documents indexed, documents processed.
+
+        """
+
+    @abstractmethod
+    def delta_index(self, alias: str, generator, **bulk_options) -> dict:
+        """Only apply the changes between the given and the indexed documents
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            generator (func): Generator function, generating dicts.
+            **bulk_options: Keyword arguments for `bulk_insert_index`
+
+        Returns:
+            dict: Number of documents indexed, documents processed,
+                and documents added, updated, deleted and unchanged.
+
+        """
+
+    @abstractmethod
+    def get_dataset_versions(self) -> Dict[str, str]:
+        """Retrieve the dataset version of every loaded index
+
+        Returns:
+            Dict[str, str]: Dataset version by index alias.
+                Aliases which were never loaded are left out.
+
+        """
+
+    @abstractmethod
+    def set_dataset_version(self, alias: str, version: str) -> dict:
+        """Store the dataset version of an index after loading it
+
+        Args:
+            alias (str): Name of the index alias, e.g. `employees`
+            version (str): The new dataset version
+
+        """
@@ -35,6 +35,11 @@ def ping_datastore(config: dict, interval=5, max_attempts=15) -> Iterator[str]:
 
     """
 
+    backend = config.get("OS2PHONEBOOK_BACKEND", "elasticsearch")
+    if backend != "elasticsearch":
+        yield f"No datastore to connect to, using the {backend} backend"
+        return
+
     # Configuration parameters
     host = config["ELASTICSEARCH_HOST"]
     port = int(config["ELASTICSEARCH_PORT"])
@@ -43,7 +48,9 @@ def ping_datastore(config: dict, interval=5, max_attempts=15) -> Iterator[str]:
 
     yield "Setting up a connection to the datastore"
 
-    db = datastore.create_connection(host, port)
+    db = datastore.create_connection(
+        host, port, **helpers.connection_options(config)
+    )
 
     for retry in range(max_attempts):
         # Info
@@ -0,0 +1,435 @@
+from collections import OrderedDict
+from functools import partial
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Tuple
+from os2phonebook.helpers import log_factory, normalise_phone_number
+
+# Init logging
+log = log_factory()
+
+
+class SearchCache(object):
+    """Bounded in-process cache for search results
+
+    Entries are evicted when they are older than `ttl` seconds,
+    or when the cache is full, in which case the least recently used
+    entry is evicted first.
+
+    The cache is local to the process, as such every (gunicorn) worker
+    holds its own cache.
+
+    Args:
+        maxsize (int): Maximum number of cached results.
+            A maxsize of 0 disables the cache.
+        ttl (float): Time to live for a cached result in seconds.
+        clock (func): Monotonic clock returning seconds.
+
+    Example:
+
+        cache = SearchCache(maxsize=1024, ttl=300)
+        key = cache.key("employee_by_name", "Picard", False)
+
+        found, results = cache.get(key)
+        if not found:
+            results = ...
+            cache.set(key, results)
+
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def key(
+        search_type: str,
+        search_value: str,
+        fuzzy_search: bool,
+        limit: int = None,
+    ) -> Tuple:
+        """Generate the cache key for a search
+
+        The search value is normalised, as the searches are
+        case insensitive and ignore surrounding and repeated whitespace.
+
+        Args:
+            search_type (str): Search type
+            search_value (str): Arbitrary search string
+            fuzzy_search (bool): Whether the search is fuzzy
+            limit (int): Maximum number of hits of the search, if capped
+
+        Returns:
+            Tuple: Cache key
+
+        """
+        normalised_value = " ".join(str(search_value).split()).casefold()
+        key = (search_type, normalised_value, bool(fuzzy_search))
+        if limit is not None:
+            key += (int(limit),)
+        return key
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Look up a cached value
+
+        Args:
+            key (Hashable): Cache key
+
+        Returns:
+            Tuple[bool, Any]: Whether the key was found and the value.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                expires, value = entry
+                if expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+
+                del self._entries[key]
+                self.evictions += 1
+
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Cache a value, evicting the least recently used if full
+
+        Args:
+            key (Hashable): Cache key
+            value (Any): Value to cache
+
+        """
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every cached value"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Cache statistics
+
+        Returns:
+            dict: Counters for hits, misses and evictions,
+                along with the current size and configuration.
+
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+class DatasetVersions(object):
+    """Per process copy of the dataset versions with a time to live
+
+    The dataset versions are stored in the datastore, shared by all workers.
+    Each worker keeps a copy for up to `ttl` seconds, to avoid looking up
+    the versions on every request.
+
+    Args:
+        ttl (float): Time to live for the copy in seconds.
+        clock (func): Monotonic clock returning seconds.
+
+    """
+
+    def __init__(
+        self, ttl: float = 10, clock: Callable[[], float] = monotonic
+    ):
+        self.ttl = ttl
+        self.clock = clock
+
+        self._versions = {}
+        self._expires = None
+
+    def is_stale(self) -> bool:
+        """Whether the copy should be refreshed from the datastore
+
+        Returns:
+            bool: True if never refreshed or older than the ttl.
+
+        """
+        return self._expires is None or self._expires <= self.clock()
+
+    def refresh(self, versions: dict) -> bool:
+        """Replace the copy with the versions from the datastore
+
+        Args:
+            versions (dict): Dataset version by index alias
+
+        Returns:
+            bool: True if any of the versions changed.
+
+        """
+        changed = self._expires is not None and versions != self._versions
+
+        self._versions = dict(versions)
+        self._expires = self.clock() + self.ttl
+
+        return changed
+
+    def get(self, alias: str) -> Optional[str]:
+        """Current dataset version of an index
+
+        Args:
+            alias (str): Name of the index alias, e.g. `employees`
+
+        Returns:
+            Optional[str]: Dataset version or `None` if unknown.
+
+        """
+        return self._versions.get(alias)
+
+    def set(self, alias: str, version: str) -> None:
+        """Update the version of an index after loading it
+
+        Args:
+            alias (str): Name of the index alias, e.g. `employees`
+            version (str): The new dataset version
+
+        """
+        self._versions[alias] = version
+
+
+class PhoneIndex(object):
+    """Per process hash index of employees by normalised phone number
+
+    Used for caller-ID lookups, which must be answered without
+    a round-trip to the datastore. The index is built from the employees
+    in the datastore and rebuilt whenever their dataset version changes.
+
+    A rebuild creates a new dictionary, which replaces the current one
+    once complete, thus lookups are served from the current one meanwhile.
+    Rebuilds are run by a background thread (see `start`), as a lookup
+    should never wait for one.
+
+    Example:
+
+        phone_index = PhoneIndex()
+        phone_index.refresh_in_background(
+            version, db.iter_employee_phone_numbers
+        )
+
+        matches = phone_index.lookup("+45 22 72 22 22")
+
+    """
+
+    def __init__(self):
+        self.version = None
+        self.built = False
+
+        self._numbers = {}
+        self._lock = Lock()
+        self._rebuild = None
+        self._rebuild_lock = Lock()
+
+    def needs_rebuild(self, version: Optional[str]) -> bool:
+        """Whether the index is outdated
+
+        Args:
+            version (str): Current dataset version of the employees,
+                or `None` if it cannot be determined.
+
+        Returns:
+            bool: True if never built or built from another version.
+
+        """
+        if not self.built:
+            return True
+
+        return version is not None and version != self.version
+
+    def build(self, employees: Iterable[dict], version: Optional[str]) -> int:
+        """Replace the index with the phone numbers of the given employees
+
+        Args:
+            employees (Iterable[dict]): Employee documents
+            version (str): Dataset version of the employees
+
+        Returns:
+            int: Number of distinct phone numbers indexed.
+
+        """
+        numbers = {}
+
+        for employee in employees:
+            phone_addresses = employee.get("addresses", {}).get("PHONE", [])
+
+            for address in phone_addresses:
+                phone_number = normalise_phone_number(
+                    address.get("value") or ""
+                )
+                if not phone_number:
+                    continue
+
+                matches = numbers.setdefault(phone_number, [])
+
+                # An employee may list the same number more than once
+                if any(m["uuid"] == employee.get("uuid") for m in matches):
+                    continue
+
+                matches.append(
+                    {
+                        "uuid": employee.get("uuid"),
+                        "name": employee.get("name"),
+                        "phone": address,
+                        "engagements": employee.get("engagements", []),
+                    }
+                )
+
+        self._numbers = numbers
+        self.version = version
+        self.built = True
+
+        return len(numbers)
+
+    def refresh(
+        self,
+        version: Optional[str],
+        loader: Callable[[], Iterable[dict]],
+    ) -> bool:
+        """Rebuild the index if it is outdated
+
+        Only one rebuild runs at a time. While the index is being rebuilt,
+        other callers are served from the current index, unless it has
+        never been built, in which case they wait for the rebuild.
+
+        Args:
+            version (str): Current dataset version of the employees
+            loader (func): Function returning the employee documents
+
+        Returns:
+            bool: True if the index was rebuilt by this call.
+
+        """
+        if not self.needs_rebuild(version):
+            return False
+
+        if not self._lock.acquire(blocking=not self.built):
+            return False
+
+        try:
+            # Another caller may have rebuilt it while waiting
+            if not self.needs_rebuild(version):
+                return False
+
+            start = monotonic()
+            self.build(loader(), version)
+
+            duration = (monotonic() - start) * 1000
+            log.info(
+                f"PHONE_INDEX_REBUILT numbers={len(self)} "
+                f"duration={duration:.1f}ms"
+            )
+            return True
+        finally:
+            self._lock.release()
+
+    def start(self, rebuild: Callable[[], Any]) -> bool:
+        """Run a rebuild by a background thread, unless one is running
+
+        Args:
+            rebuild (func): Rebuilds the index, e.g. by calling `refresh`.
+                Exceptions are logged.
+
+        Returns:
+            bool: True if the rebuild was started.
+
+        """
+        with self._rebuild_lock:
+            if self._rebuild is not None and self._rebuild.is_alive():
+                return False
+
+            self._rebuild = Thread(
+                target=self._run,
+                args=(rebuild,),
+                name="phone-index-rebuild",
+                daemon=True,
+            )
+            self._rebuild.start()
+
+        return True
+
+    def _run(self, rebuild: Callable[[], Any]) -> None:
+        try:
+            rebuild()
+        except Exception:
+            log.exception("PHONE_INDEX_REBUILD_FAILED")
+
+    def refresh_in_background(
+        self,
+        version: Optional[str],
+        loader: Callable[[], Iterable[dict]],
+    ) -> bool:
+        """Rebuild the index by a background thread if it is outdated
+
+        Args:
+            version (str): Current dataset version of the employees
+            loader (func): Function returning the employee documents
+
+        Returns:
+            bool: True if a rebuild was started.
+
+        """
+        if not self.needs_rebuild(version):
+            return False
+
+        return self.start(partial(self.refresh, version, loader))
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for the running rebuild, if any, to finish
+
+        Args:
+            timeout (float): Seconds to wait at most, no limit if `None`
+
+        """
+        rebuild = self._rebuild
+        if rebuild is not None:
+            rebuild.join(timeout)
+
+    def lookup(self, phone_number: str) -> List[dict]:
+        """Look up the employees with a phone number
+
+        Args:
+            phone_number (str): Phone number in any format,
+                e.g. `+45 22 72 22 22`
+
+        Returns:
+            List[dict]: Matching employees, an empty list if none.
+
+        """
+        return self._numbers.get(normalise_phone_number(phone_number), [])
+
+    def __len__(self) -> int:
+        return len(self._numbers)
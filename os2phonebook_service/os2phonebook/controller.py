@@ -1,8 +1,18 @@
-from elasticsearch.exceptions import NotFoundError
-from os2phonebook.datastore import DataStore
-from os2phonebook.helpers import log_factory
+import os
+import re
+import json
+from time import perf_counter
+from uuid import uuid4
+from functools import partial, wraps
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from elasticsearch.exceptions import NotFoundError, TransportError
+from os2phonebook import metrics, snapshots, timing
+from os2phonebook.backend import Backend
+from os2phonebook.helpers import log_factory, iter_json_object, iter_ndjson
 from os2phonebook.exceptions import (
+    ExpiredCursor,
     InvalidRequestBody,
+    InvalidRequestParameters,
     InvalidSearchType,
     InvalidCredentials,
     InsufficientCredentials,
@@ -10,7 +20,15 @@ from os2phonebook.exceptions import (
 from flask_httpauth import HTTPBasicAuth
 from werkzeug.security import check_password_hash
 from werkzeug.exceptions import NotFound
-from flask import Response, Blueprint, jsonify, current_app, request
+from flask import (
+    Response,
+    Blueprint,
+    jsonify,
+    current_app,
+    request,
+    make_response,
+    url_for,
+)
 
 # Init logging
 log = log_factory()
@@ -18,6 +36,177 @@ log = log_factory()
 # Controller blueprint
 api = Blueprint("routes", __name__)
 
+# Indices a pagination cursor may point at: the org units alias
+# (or legacy index) and the versions published under it
+CURSOR_INDEX_PATTERN = re.compile(r"^org_units(-[0-9]+)?$")
+
+# Post data schema for performing searches
+SEARCH_SCHEMA = {
+    "method": "POST",
+    "format": "json",
+    "schema": {
+        "search_type": {"type": "string", "required": True},
+        "search_value": {"type": "string", "required": True},
+    },
+}
+
+
+def get_datastore() -> Backend:
+    """Create a DataStore client for the current application.
+
+    Returns:
+        :obj:`Backend`: Client of the configured backend, using the shared
+            connection and cache.
+
+    """
+    return current_app.datastore_class(
+        current_app.connection, cache=current_app.search_cache
+    )
+
+
+def refresh_dataset_versions(force: bool = False) -> bool:
+    """Refresh the dataset versions from the DataStore once expired.
+
+    If a version changed, it was changed by a load in another worker,
+    thus the cached search results are outdated too and are cleared.
+    Called before every search, as well as by :code:`get_dataset_version`.
+
+    Args:
+        force (bool): Refresh even if the local copy has not expired
+
+    Returns:
+        bool: False if the versions could not be refreshed.
+
+    """
+    dataset_versions = current_app.dataset_versions
+
+    if force or dataset_versions.is_stale():
+        try:
+            versions = get_datastore().get_dataset_versions()
+        except TransportError as error:
+            log.warning(f"DATASET_VERSION_UNAVAILABLE - {error}")
+            return False
+
+        if dataset_versions.refresh(versions):
+            current_app.search_cache.clear()
+
+    return True
+
+
+def get_dataset_version(alias: str, force: bool = False):
+    """Look up the current dataset version of an index.
+
+    The versions are refreshed from the DataStore once the local copy
+    has expired, see :code:`refresh_dataset_versions`.
+
+    Args:
+        alias (str): Name of the index alias, e.g. `employees`
+        force (bool): Refresh even if the local copy has not expired
+
+    Returns:
+        str: Dataset version or `None` if it cannot be determined.
+
+    """
+    if not refresh_dataset_versions(force):
+        return None
+
+    return current_app.dataset_versions.get(alias)
+
+
+def cache_by_dataset_version(alias: str):
+    """Decorate a view to support conditional requests.
+
+    The `ETag` of the response is the current dataset version of the index
+    the view reads from, as the response only changes when it is loaded.
+    A request with a matching `If-None-Match` header is answered with
+    `304 Not Modified`, without calling the view.
+
+    The versions are refreshed for every conditional request, as the
+    local copy may predate a load by another worker, and a `304` for the
+    previous dataset would be cached by the client for another max-age.
+
+    Args:
+        alias (str): Name of the index alias the view reads from
+
+    Returns:
+        func: View decorator
+
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            conditional = bool(request.if_none_match)
+            version = get_dataset_version(alias, force=conditional)
+
+            if version is None:
+                return view(*args, **kwargs)
+
+            if request.if_none_match.contains(version):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+
+            response.set_etag(version)
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.http_cache_max_age
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+@api.before_app_request
+def start_server_timing() -> None:
+    """Collect the timings of every request, see :code:`timing`.
+
+    The request is identified by the `X-Request-ID` header if given,
+    e.g. by a proxy, otherwise by a random identifier.
+
+    """
+    timing.start(request.headers.get("X-Request-ID"))
+
+
+@api.after_app_request
+def add_server_timing(response: Response) -> Response:
+    """Report the timings of the request in the `Server-Timing` header.
+
+    The breakdown, e.g. Elasticsearch round-trips, the time reported by
+    Elasticsearch, result processing and serialization, is shown in the
+    network panel of the browser devtools. The breakdown is logged too,
+    if `OS2PHONEBOOK_TIMING_LOG` is enabled.
+
+    Returns:
+        :obj:`Response`: The response with timing headers.
+
+    """
+    server_timing = timing.current()
+
+    if server_timing is None:
+        return response
+
+    response.headers["Server-Timing"] = server_timing.header()
+    response.headers["X-Request-ID"] = server_timing.request_id
+
+    if current_app.timing_log:
+        log.info(
+            server_timing.log_line(
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+            )
+        )
+
+    return response
+
+
+@api.teardown_app_request
+def stop_server_timing(error=None) -> None:
+    """Stop collecting timings once the request has been served."""
+    timing.stop()
+
 
 @api.route("/", methods=["GET"])
 @api.route("/api/status", methods=["GET"])
@@ -41,53 +230,230 @@ def show_status() -> Response:
     return jsonify(status_response)
 
 
+def encode_cursor(cursor: dict) -> str:
+    """Encode a pagination cursor as an opaque url safe string.
+
+    Args:
+        cursor (dict): Cursor as returned by the DataStore
+
+    Returns:
+        str: Url safe cursor
+
+    """
+    content = json.dumps(cursor, separators=(",", ":")).encode("utf-8")
+    return urlsafe_b64encode(content).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode an opaque pagination cursor.
+
+    Args:
+        cursor (str): Url safe cursor as returned by `encode_cursor`
+
+    Returns:
+        dict: Cursor as expected by the DataStore
+
+    Raises:
+        InvalidRequestParameters: If the cursor cannot be decoded.
+
+    """
+    try:
+        decoded = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+        if not {"index", "search_after"} <= set(decoded):
+            raise ValueError("Missing cursor attributes")
+
+        # The index is searched as is, thus it must be an org units index
+        if not CURSOR_INDEX_PATTERN.match(decoded["index"]):
+            raise ValueError("Cursor index is not an org units index")
+        if not isinstance(decoded["search_after"], list):
+            raise ValueError("Cursor position is not valid")
+    except (ValueError, TypeError):
+        raise InvalidRequestParameters(f"Cursor: {cursor} is not valid")
+
+    return decoded
+
+
+def expired_cursor(error: NotFoundError) -> ExpiredCursor:
+    """Describe a cursor pointing at an index version which was deleted.
+
+    Args:
+        error (:obj:`NotFoundError`): Error searching the cursor index
+
+    Returns:
+        :obj:`ExpiredCursor`: Error to raise instead.
+
+    """
+    log.info(f"EXPIRED_CURSOR - {error}")
+
+    return ExpiredCursor(
+        "Cursor has expired, as a newer version of the org units was "
+        "loaded. Restart from the first page"
+    )
+
+
+def parse_page_parameters(args) -> tuple:
+    """Parse the pagination query parameters of a request.
+
+    Args:
+        args (dict): Query parameters, `limit` and `cursor`
+
+    Returns:
+        tuple: The page size and the decoded cursor,
+            or `None` for the first page.
+
+    Raises:
+        InvalidRequestParameters: If the parameters are not valid.
+
+    """
+    limit = args.get("limit", 1000)
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+
+    if not 1 <= limit <= 10000:
+        raise InvalidRequestParameters(
+            "Limit must be an integer between 1 and 10000"
+        )
+
+    cursor = args.get("cursor")
+    if cursor:
+        cursor = decode_cursor(cursor)
+
+    return limit, cursor or None
+
+
+@api.route("/api/status/search-cache", methods=["GET"])
+def show_search_cache_status() -> Response:
+    """Search cache endpoint shows the search cache statistics.
+
+    The statistics are local to the worker serving the request.
+
+    Example:
+
+        The response body is formatted as follows:
+
+        {
+            "hits": 1021,
+            "misses": 212,
+            "evictions": 12,
+            "size": 200,
+            "maxsize": 1024,
+            "ttl": 300.0
+        }
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    """
+
+    return jsonify(current_app.search_cache.stats())
+
+
+@api.route("/api/metrics", methods=["GET"])
+def show_metrics() -> Response:
+    """Metrics endpoint in the Prometheus text exposition format.
+
+    The metrics include the latency of the requests and the datastore
+    operations, the time Elasticsearch spent on each search pass,
+    the number of hits and how often searches fall back to fuzzy.
+
+    With `PROMETHEUS_MULTIPROC_DIR` set, the metrics are aggregated
+    across every worker, otherwise they are local to the worker serving
+    the request.
+
+    Returns:
+        :obj:`Response`: Response with the metrics as plain text.
+
+    """
+
+    body, content_type = metrics.exposition()
+
+    return Response(body, content_type=content_type)
+
+
 @api.route("/api/org_units", methods=["GET"])
+@cache_by_dataset_version("org_units")
 def all_org_units() -> Response:
     """Return a list of all organisation units.
 
-    TODO:
-        This endpoind should accept parameters
-        to limit the amount of results.
+    The list can be retrieved a page at a time using the
+    query parameters:
+        * limit: Maximum number of org units per page (1-10000)
+        * cursor: The cursor returned along with the previous page
+
+    A cursor is only valid until the version of the org units it was
+    read from is deleted, after which `410 Gone` is returned.
 
     Example:
 
-        The response body is formatted as follows:
+        Without query parameters, the response body is formatted as follows:
+
+        [
+            {
+                "name": "Kolding Kommune",
+                "parent": null,
+                "uuid": "f06ee470-9f17-566f-acbe-e938112d46d9"
+            },
+            {
+                "name": "Skole og Børn",
+                "parent": "f06ee470-9f17-566f-acbe-e938112d46d9",
+                "uuid": "7a8e45f7-4de0-44c8-990f-43c0565ee505"
+            }
+        ]
+
+        A page, e.g. `?limit=2`, is formatted as follows:
 
         {
-            "request_id": "c2667d614c954f9599615129e4029060",
             "results": [
                 {
                     "name": "Kolding Kommune",
                     "parent": null,
                     "uuid": "f06ee470-9f17-566f-acbe-e938112d46d9"
                 },
-                {
-                    "name": "Skole og Børn",
-                    "parent": "f06ee470-9f17-566f-acbe-e938112d46d9",
-                    "uuid": "7a8e45f7-4de0-44c8-990f-43c0565ee505"
-                }
-            ]
+                ...
+            ],
+            "cursor": "eyJpbmRleCI6Im9yZ191bml0cy0yMDIwMDYxMjAz..."
         }
 
+        The cursor is `null` on the last page.
+
     Returns:
         :obj:`Response`: Response with json body.
 
     """
 
-    db = DataStore(current_app.connection)
+    db = get_datastore()
 
-    results = db.get_all_org_units()
+    if "limit" not in request.args and "cursor" not in request.args:
+        # Compatibility: Retrieve every page
+        results = db.get_all_org_units()
 
-    # There should be at least 1 org unit
-    # For now just create a warning in the logs
-    # Perhaps this should raise a `bad` type of exception instead
-    if not results:
-        log.warning("NO_RESULTS_ALL_ORG_UNITS")
+        # There should be at least 1 org unit
+        # For now just create a warning in the logs
+        # Perhaps this should raise a `bad` type of exception instead
+        if not results:
+            log.warning("NO_RESULTS_ALL_ORG_UNITS")
 
-    return jsonify(results)
+        return jsonify(results)
+
+    limit, cursor = parse_page_parameters(request.args)
+
+    try:
+        results, next_cursor = db.get_org_units_page(limit, cursor)
+    except NotFoundError as error:
+        if cursor is None:
+            raise
+        raise expired_cursor(error)
+
+    if next_cursor:
+        next_cursor = encode_cursor(next_cursor)
+
+    return jsonify({"results": results, "cursor": next_cursor})
 
 
 @api.route("/api/org_unit/<uuid:uuid>", methods=["GET"])
+@cache_by_dataset_version("org_units")
 def show_org_unit(uuid) -> Response:
     """Show org unit by uuid.
 
@@ -99,7 +465,7 @@ def show_org_unit(uuid) -> Response:
 
     """
 
-    db = DataStore(current_app.connection)
+    db = get_datastore()
 
     results = db.get_org_unit(uuid=uuid)
 
@@ -107,6 +473,7 @@ def show_org_unit(uuid) -> Response:
 
 
 @api.route("/api/employee/<uuid:uuid>", methods=["GET"])
+@cache_by_dataset_version("employees")
 def show_employee(uuid) -> Response:
     """Show employee by uuid.
 
@@ -118,7 +485,7 @@ def show_employee(uuid) -> Response:
 
     """
 
-    db = DataStore(current_app.connection)
+    db = get_datastore()
 
     # Retrieve employee by uuid
     results = db.get_employee(uuid=uuid)
@@ -126,6 +493,136 @@ def show_employee(uuid) -> Response:
     return jsonify(results)
 
 
+def fetch_batch(fetch_method) -> Response:
+    """Fetch a batch of documents by uuid.
+
+    Any batch must be submit as a POST request
+    and carry a json body with the following key value pairs,
+
+        uuids: <list of strings> (at most 1000)
+        fields: <list of strings> (optional)
+
+    Args:
+        fetch_method (func): DataStore method fetching documents by uuid
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    Raises:
+        InvalidRequestBody: If the request body is not valid.
+
+    """
+
+    if not request.data:
+        raise InvalidRequestBody("Request body (json) is missing")
+
+    uuids, fields = parse_batch_request(request.get_json())
+
+    if not uuids:
+        return jsonify({"results": [], "missing": []})
+
+    results, missing = fetch_method(uuids, fields)
+
+    return jsonify({"results": results, "missing": missing})
+
+
+def parse_batch_request(data) -> tuple:
+    """Validate the json body of a batch request.
+
+    See :code:`fetch_batch` for the format.
+
+    Args:
+        data (dict): Parsed json body
+
+    Returns:
+        tuple: The uuids and the fields, or `None` for all fields.
+
+    Raises:
+        InvalidRequestBody: If the request body is not valid.
+
+    """
+
+    if not isinstance(data, dict) or "uuids" not in data:
+        raise InvalidRequestBody("Uuids are missing from the request body")
+
+    uuids = data["uuids"]
+    fields = data.get("fields")
+
+    if not isinstance(uuids, list) or not all(
+        isinstance(uuid, str) for uuid in uuids
+    ):
+        raise InvalidRequestBody("Uuids must be a list of strings")
+
+    if len(uuids) > 1000:
+        raise InvalidRequestBody("At most 1000 uuids can be fetched at once")
+
+    if fields is not None and (
+        not isinstance(fields, list)
+        or not all(isinstance(field, str) for field in fields)
+    ):
+        raise InvalidRequestBody("Fields must be a list of strings")
+
+    return uuids, fields
+
+
+@api.route("/api/employees/batch", methods=["POST"])
+def show_employees_batch() -> Response:
+    """Show several employees by uuid.
+
+    Resolves every uuid in a single request to the DataStore,
+    see :code:`fetch_batch` for the request body.
+
+    Example:
+
+        Requesting the names of an employee and an unknown uuid:
+
+        {
+            "uuids": [
+                "f16eee45-d96a-4efb-bd17-667d1795e13d",
+                "00000000-0000-0000-0000-000000000000"
+            ],
+            "fields": ["uuid", "name"]
+        }
+
+        The response body is formatted as follows:
+
+        {
+            "results": [
+                {
+                    "uuid": "f16eee45-d96a-4efb-bd17-667d1795e13d",
+                    "name": "Jan Elkjær Winther Nielsen"
+                }
+            ],
+            "missing": ["00000000-0000-0000-0000-000000000000"]
+        }
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    """
+
+    db = get_datastore()
+
+    return fetch_batch(db.get_employees)
+
+
+@api.route("/api/org_units/batch", methods=["POST"])
+def show_org_units_batch() -> Response:
+    """Show several org units by uuid.
+
+    Resolves every uuid in a single request to the DataStore,
+    see :code:`show_employees_batch` for an example.
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    """
+
+    db = get_datastore()
+
+    return fetch_batch(db.get_org_units)
+
+
 @api.route("/api/search", methods=["GET"])
 def show_search_schema():
     """Show post data schema for performing searches.
@@ -148,16 +645,7 @@ def show_search_schema():
 
     """
 
-    search_schema = {
-        "method": "POST",
-        "format": "json",
-        "schema": {
-            "search_type": {"type": "string", "required": True},
-            "search_value": {"type": "string", "required": True},
-        },
-    }
-
-    return jsonify(search_schema)
+    return jsonify(SEARCH_SCHEMA)
 
 
 @api.route("/api/search", methods=["POST"])
@@ -180,48 +668,349 @@ def call_search_method():
     if not request.data:
         raise InvalidRequestBody("Request body (json) is missing")
 
-    data = request.get_json()
+    search_type, search_value = parse_search_request(request.get_json())
+
+    # Cached results of datasets since loaded by other workers are cleared
+    refresh_dataset_versions()
+
+    db = get_datastore()
+
+    # Exact and fuzzy passes are resolved in a single round-trip
+    results = db.search_with_fallback(
+        search_type=search_type, search_value=search_value
+    )
+
+    if not results:
+        log.debug(
+            "NO_SEARCH_RESULTS "
+            f"search_type={search_type} search_value={search_value}"
+        )
+
+    return jsonify(results)
+
+
+def refresh_phone_index() -> float:
+    """Rebuild the caller-ID index if the employees have been reloaded.
+
+    The index is rebuilt by a background thread, and lookups are served
+    from the current index meanwhile. Only until the index has been built
+    for the first time, e.g. while it is warmed up on startup, lookups
+    wait for it.
 
-    if "search_value" not in data:
+    Returns:
+        float: Time spent waiting for the index in milliseconds.
+
+    """
+    phone_index = current_app.phone_index
+    version = get_dataset_version("employees")
+
+    phone_index.refresh_in_background(
+        version, get_datastore().iter_employee_phone_numbers
+    )
+
+    if phone_index.built:
+        return 0.0
+
+    start = perf_counter()
+    phone_index.wait()
+    return (perf_counter() - start) * 1000
+
+
+def timed_lookup(lookup) -> Response:
+    """Answer a caller-ID lookup, reporting its latency.
+
+    The latency of the lookup, and the time spent waiting for the index
+    to be built if it was not yet, is reported in the `Server-Timing`
+    header, e.g.
+
+        Server-Timing: lookup;dur=0.004;desc="Caller-ID lookup", ...
+
+    Args:
+        lookup (func): Function looking up numbers in the
+            :code:`PhoneIndex`, returning the response body.
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    """
+    wait_duration = refresh_phone_index()
+    if wait_duration:
+        timing.add("rebuild", wait_duration)
+
+    with timing.span("lookup"):
+        body = lookup(current_app.phone_index)
+
+    return jsonify(body)
+
+
+def find_phone_number(phone_index, phone_number: str) -> list:
+    """Look up a single phone number, see :code:`lookup_phone_number`.
+
+    Raises:
+        NotFound: If no employee uses the phone number.
+
+    """
+    matches = phone_index.lookup(phone_number)
+    if not matches:
+        raise NotFound(f"Phone number: {phone_number} not found")
+    return matches
+
+
+def find_phone_numbers(phone_index, phone_numbers: list) -> dict:
+    """Look up several phone numbers, see :code:`lookup_phone_numbers`."""
+    results = {}
+    missing = []
+
+    for phone_number in phone_numbers:
+        matches = phone_index.lookup(phone_number)
+        if matches:
+            results[phone_number] = matches
+        elif phone_number not in missing:
+            missing.append(phone_number)
+
+    return {"results": results, "missing": missing}
+
+
+def parse_phone_numbers_request(data) -> list:
+    """Validate the json body of a caller-ID batch request.
+
+    See :code:`lookup_phone_numbers` for the format.
+
+    Args:
+        data (dict): Parsed json body
+
+    Returns:
+        list: The phone numbers.
+
+    Raises:
+        InvalidRequestBody: If the request body is not valid.
+
+    """
+
+    if not isinstance(data, dict) or "phone_numbers" not in data:
         raise InvalidRequestBody(
-            "Search value is missing from the request body"
+            "Phone numbers are missing from the request body"
         )
 
-    if "search_type" not in data:
+    phone_numbers = data["phone_numbers"]
+
+    if not isinstance(phone_numbers, list) or not all(
+        isinstance(phone_number, str) for phone_number in phone_numbers
+    ):
+        raise InvalidRequestBody("Phone numbers must be a list of strings")
+
+    if len(phone_numbers) > 1000:
         raise InvalidRequestBody(
-            "Search type is missing from the request body"
+            "At most 1000 phone numbers can be looked up at once"
         )
 
-    search_type = data["search_type"]
-    search_value = data["search_value"]
+    return phone_numbers
+
 
-    db = DataStore(current_app.connection)
+@api.route("/api/lookup/phone/<string:phone_number>", methods=["GET"])
+def lookup_phone_number(phone_number) -> Response:
+    """Resolve a phone number to the employees using it (caller-ID).
 
-    results = db.search(
-        search_type=search_type, search_value=search_value, fuzzy_search=False
+    Lookups are answered from a per worker in-memory index of the
+    normalised phone numbers, thus `+4522722222`, `0045 2272 2222`
+    and `22722222` are equivalent.
+
+    Example:
+
+        The response body of `/api/lookup/phone/22722222`
+        is formatted as follows:
+
+        [
+            {
+                "uuid": "f06ee470-9f17-566f-acbe-e938112d46d9",
+                "name": "Emil Madsen",
+                "phone": {
+                    "description": "Telefon",
+                    "value": "22722222"
+                },
+                "engagements": [
+                    {
+                        "title": "Software Udvikler",
+                        "name": "Teknisk Support",
+                        "uuid": "6fc9ba6b-ca5b-5e09-a594-40363c45aae0"
+                    }
+                ]
+            }
+        ]
+
+    Args:
+        phone_number (str): Phone number in any format
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    Raises:
+        NotFound: If no employee uses the phone number.
+
+    """
+
+    return timed_lookup(
+        lambda phone_index: find_phone_number(phone_index, phone_number)
     )
 
-    if not results:
-        log.debug(
-            "NO_SEARCH_RESULTS "
-            f"search_type={search_type} search_value={search_value} # 1"
-        )
 
-        results = db.search(
-            search_type=search_type,
-            search_value=search_value,
-            fuzzy_search=True,
+@api.route("/api/lookup/phone", methods=["POST"])
+def lookup_phone_numbers() -> Response:
+    """Resolve several phone numbers at once (caller-ID).
+
+    Any batch must be submit as a POST request
+    and carry a json body with the following key value pairs,
+
+        phone_numbers: <list of strings> (at most 1000)
+
+    Example:
+
+        {"phone_numbers": ["22722222", "+45 11 11 11 11"]}
+
+        The response body is formatted as follows,
+        see :code:`lookup_phone_number` for the matches:
+
+        {
+            "results": {
+                "22722222": [...]
+            },
+            "missing": ["+45 11 11 11 11"]
+        }
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    Raises:
+        InvalidRequestBody: If the request body is not valid.
+
+    """
+
+    if not request.data:
+        raise InvalidRequestBody("Request body (json) is missing")
+
+    phone_numbers = parse_phone_numbers_request(request.get_json())
+
+    return timed_lookup(
+        lambda phone_index: find_phone_numbers(phone_index, phone_numbers)
+    )
+
+
+def parse_search_request(data) -> tuple:
+    """Validate the json body of a search request.
+
+    See :code:`show_search_schema` for the format.
+
+    Args:
+        data (dict): Parsed json body
+
+    Returns:
+        tuple: The search type and the search value.
+
+    Raises:
+        InvalidRequestBody: If the request body is not valid.
+
+    """
+
+    if not isinstance(data, dict) or "search_value" not in data:
+        raise InvalidRequestBody(
+            "Search value is missing from the request body"
         )
 
-    if not results:
-        log.debug(
-            "NO_SEARCH_RESULTS "
-            f"search_type={search_type} search_value={search_value} # 2"
+    if "search_type" not in data:
+        raise InvalidRequestBody(
+            "Search type is missing from the request body"
         )
 
+    return data["search_type"], data["search_value"]
+
+
+@api.route("/api/search/all", methods=["POST"])
+def call_search_everything():
+    """Search every search type for the same value.
+
+    Every search type is searched with an exact pass and a fuzzy fallback,
+    all of which are resolved in a single round-trip to the DataStore.
+
+    Any search must be submit as a POST request
+    and carry a json body with the following key value pairs,
+
+        search_value: <string>
+        limit: <int> (optional, 1-100, default 5)
+
+    Where the limit caps the number of results per search type.
+
+    Example:
+
+        {"search_value": "Riker", "limit": 5}
+
+        The response body is formatted as follows:
+
+        {
+            "employee_by_name": [...],
+            "employee_by_phone": [],
+            "employee_by_email": [],
+            "employee_by_engagement": [],
+            "org_unit_by_name": [...],
+            "org_unit_by_kle": []
+        }
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    """
+
+    if not request.data:
+        raise InvalidRequestBody("Request body (json) is missing")
+
+    search_value, limit = parse_search_everything_request(request.get_json())
+
+    # Cached results of datasets since loaded by other workers are cleared
+    refresh_dataset_versions()
+
+    db = get_datastore()
+
+    results = db.search_everything(search_value=search_value, limit=limit)
+
     return jsonify(results)
 
 
+def parse_search_everything_request(data) -> tuple:
+    """Validate the json body of a search everything request.
+
+    See :code:`call_search_everything` for the format.
+
+    Args:
+        data (dict): Parsed json body
+
+    Returns:
+        tuple: The search value and the limit per search type.
+
+    Raises:
+        InvalidRequestBody: If the request body is not valid.
+
+    """
+
+    if not isinstance(data, dict) or "search_value" not in data:
+        raise InvalidRequestBody(
+            "Search value is missing from the request body"
+        )
+
+    search_value = data["search_value"]
+    limit = data.get("limit", 5)
+
+    if not isinstance(search_value, str):
+        raise InvalidRequestBody("Search value must be a string")
+
+    if (
+        not isinstance(limit, int)
+        or isinstance(limit, bool)
+        or not 1 <= limit <= 100
+    ):
+        raise InvalidRequestBody("Limit must be an integer between 1 and 100")
+
+    return search_value, limit
+
+
 #############
 # DATA LOAD #
 #############
@@ -270,13 +1059,226 @@ def verify_password(username, password):
     return None
 
 
+def require_request_body():
+    """Ensure a request carries a body without reading it into memory.
+
+    Raises:
+        InvalidRequestBody: If the request body is missing.
+
+    """
+    # Chunked uploads do not carry a content length
+    chunked = request.headers.get("Transfer-Encoding", "").lower()
+
+    if not request.content_length and chunked != "chunked":
+        raise InvalidRequestBody("Request body (json) is missing")
+
+
+def iter_request_documents():
+    """Incrementally parse the documents of a load request.
+
+    Two formats are accepted:
+        * `application/json`: One object mapping uuids to documents.
+        * `application/x-ndjson`: One document per line, identified
+          by its `uuid` attribute.
+
+    In either case the request body is parsed straight from the request
+    stream, thus only one document at a time is held in memory.
+
+    Yields:
+        Tuple[str, dict]: Document identifier and document.
+
+    Raises:
+        InvalidRequestBody: If the request body is not valid.
+
+    """
+    try:
+        if request.mimetype == "application/x-ndjson":
+            for document in iter_ndjson(request.stream):
+                if not isinstance(document, dict) or "uuid" not in document:
+                    raise InvalidRequestBody(
+                        "Request body (ndjson) contains a document "
+                        "without uuid"
+                    )
+                yield document["uuid"], document
+        else:
+            for uuid, document in iter_json_object(request.stream):
+                yield uuid, document
+    except ValueError as error:
+        raise InvalidRequestBody(f"Request body is invalid: {error}")
+
+
+def index_documents(alias: str, mode: str, generator) -> dict:
+    """Index the documents of a load into the DataStore.
+
+    Args:
+        alias (str): Name of the index alias, e.g. `employees`
+        mode (str): Load mode, `full` or `delta`, see `load_documents`
+        generator (func): Bulk action generator function
+
+    Returns:
+        dict: Load statistics.
+
+    """
+    db = get_datastore()
+
+    if mode == "delta":
+        return db.delta_index(
+            alias=alias, generator=generator, **current_app.bulk_options
+        )
+
+    # Load into a new index version, published once completely loaded
+    indexed, total = db.reindex(
+        alias=alias, generator=generator, **current_app.bulk_options
+    )
+    return {"indexed": indexed, "total": total}
+
+
+def run_load_job(
+    app, alias: str, mode: str, filename: str, version: str, progress
+) -> dict:
+    """Index the spooled documents of a load, see :code:`load_documents`.
+
+    Run by a background thread of :code:`LoadJobs`, within the
+    application context of the worker the load was submitted to.
+
+    Args:
+        app (:obj:`Flask`): The application
+        alias (str): Name of the index alias, e.g. `employees`
+        mode (str): Load mode, `full` or `delta`
+        filename (str): Path of the spooled documents
+        version (str): Dataset version set by the load
+        progress (func): Called with the number of documents processed
+
+    Returns:
+        dict: Load statistics.
+
+    """
+    with app.app_context():
+        try:
+            result = index_documents(
+                alias, mode, snapshots.snapshot_actions(filename, progress)
+            )
+        except BaseException:
+            os.remove(filename)
+            raise
+
+        # The spooled documents are kept as a snapshot (see `restore`)
+        if current_app.snapshot_dir:
+            snapshots.keep_snapshot(filename, current_app.snapshot_dir, alias)
+        else:
+            os.remove(filename)
+
+        get_datastore().set_dataset_version(alias, version)
+        current_app.dataset_versions.set(alias, version)
+
+        # Cached search results may be outdated by now
+        current_app.search_cache.clear()
+
+        # Rebuild the caller-ID index of this worker right away,
+        # other workers rebuild theirs once they see the new version
+        if alias == "employees":
+            current_app.phone_index.refresh(
+                version, get_datastore().iter_employee_phone_numbers
+            )
+
+        return result
+
+
+def load_documents(alias: str) -> Response:
+    """Accept the documents of a load request, indexed in the background.
+
+    The documents are spooled to a file while the request is read, then
+    indexed from the file by a background job, thus a load does not tie
+    up the worker for longer than the upload. Loads of the same index are
+    run one at a time. The response is `202 Accepted`, with the status of
+    the job, reported by `/api/load-jobs/<id>` until it has finished.
+
+    The load mode is selected with the `mode` query parameter:
+        * `full` (default): Replace the index with a new version.
+        * `delta`: Only index added and changed documents and
+          delete documents which are no longer present.
+
+    Args:
+        alias (str): Name of the index alias, e.g. `employees`
+
+    Returns:
+        :obj:`Response`: Response with the job status as json body.
+
+    Raises:
+        InvalidRequestBody: If the request is not valid.
+
+    """
+    require_request_body()
+
+    mode = request.args.get("mode", "full")
+    if mode not in ("full", "delta"):
+        raise InvalidRequestBody(f"Load mode: {mode} is not available")
+
+    log.info(f"LOAD_DOCUMENTS alias={alias} mode={mode}")
+
+    # Responses cached by clients are outdated once loaded
+    version = uuid4().hex
+
+    load_jobs = current_app.load_jobs
+
+    # The request body is read here, on the request thread, as the bulk
+    # helpers consume the documents from threads of their own (e.g.
+    # `parallel_bulk`), outside of the request context.
+    #
+    # Spooled along with the snapshots, replacing the snapshot of the
+    # index if the load succeeds, otherwise uncompressed for the job only
+    if current_app.snapshot_dir:
+        directory = current_app.snapshot_dir
+        compression = current_app.snapshot_compression
+    else:
+        directory = load_jobs.directory
+        compression = "none"
+
+    filename, header = snapshots.spool_documents(
+        directory, alias, iter_request_documents(), version, compression
+    )
+
+    job = load_jobs.create(alias, mode, header["count"])
+
+    # Described before submitting, as the job updates its status as it runs
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers["Location"] = url_for(
+        "routes.show_load_job", job_id=job["id"]
+    )
+
+    load_jobs.submit(
+        job,
+        partial(
+            run_load_job,
+            current_app._get_current_object(),
+            alias,
+            mode,
+            filename,
+            version,
+        ),
+    )
+
+    return response
+
+
 @api.route("/api/load-employees", methods=["POST"])
 @auth.login_required
 def load_employees():
-    """Clean out DataStore and load employees from provided JSON.
+    """Replace the employees in the DataStore with the provided JSON.
+
+    The employees are loaded in the background (see :code:`load_documents`)
+    into a new version of the index, which replaces the current one once
+    fully loaded. Searches are served from the current version in the
+    meantime.
+
+    With `?mode=delta` only the changes are applied to the current
+    version, see :code:`load_documents`.
 
     Args:
         request.data (json/dict): Employees to load into the data store.
+            Alternatively sent as `application/x-ndjson`, with one
+            document per line instead of the uuid-keyed object.
 
     Example:
 
@@ -327,49 +1329,46 @@ def load_employees():
             ...
         }
 
-        The response body is formatted as follows:
+        The response is `202 Accepted`, with the status of the load job
+        as body and its url in the `Location` header, e.g.
+        `/api/load-jobs/0f1c9b1e-4d3a-4a8e-9d57-2b6f3c0b5e11`.
+        Once the job has succeeded, its `result` is formatted as follows:
 
         {
             "indexed": 421, "total": 421
         }
 
-        If 421 org units were indexed, 421 were processed.
+        If 421 employees were indexed, 421 were processed.
+
+        A delta load additionally reports the number of documents
+        `added`, `updated`, `deleted` and `unchanged`.
 
     Returns:
         :obj:`Response`: Response with json body.
 
     """
-    if not request.data:
-        raise InvalidRequestBody("Request body (json) is missing")
-
     log.info("load_employees called")
 
-    # Fetch the entire bulk to be loaded
-    employees = request.get_json()
-
-    def generator():
-        for uuid, employee in employees.items():
-            entry = {"_id": uuid, "_source": employee}
-            yield entry
-
-    # Connect to datastore and clear it out
-    db = DataStore(current_app.connection)
-    db.delete_index("employees")
-    # Loading entries
-    indexed, total = db.bulk_insert_index(
-        index="employees", generator=generator
-    )
-
-    return jsonify({"indexed": indexed, "total": total})
+    return load_documents("employees")
 
 
 @api.route("/api/load-org-units", methods=["POST"])
 @auth.login_required
 def load_org_units():
-    """Clean out DataStore and load org units from provided JSON.
+    """Replace the org units in the DataStore with the provided JSON.
+
+    The org units are loaded in the background (see :code:`load_documents`)
+    into a new version of the index, which replaces the current one once
+    fully loaded. Searches are served from the current version in the
+    meantime.
+
+    With `?mode=delta` only the changes are applied to the current
+    version, see :code:`load_documents`.
 
     Args:
         request.data (json/dict): Org units to load into the data store.
+            Alternatively sent as `application/x-ndjson`, with one
+            document per line instead of the uuid-keyed object.
 
     Example:
 
@@ -420,7 +1419,10 @@ def load_org_units():
             ...
         }
 
-        The response body is formatted as follows:
+        The response is `202 Accepted`, with the status of the load job
+        as body and its url in the `Location` header, e.g.
+        `/api/load-jobs/0f1c9b1e-4d3a-4a8e-9d57-2b6f3c0b5e11`.
+        Once the job has succeeded, its `result` is formatted as follows:
 
         {
             "indexed": 421, "total": 421
@@ -428,39 +1430,62 @@ def load_org_units():
 
         If 421 org units were indexed, 421 were processed.
 
+        A delta load additionally reports the number of documents
+        `added`, `updated`, `deleted` and `unchanged`.
+
     Returns:
         :obj:`Response`: Response with json body.
 
     """
-    if not request.data:
-        raise InvalidRequestBody("Request body (json) is missing")
-
     log.info("load_org_units called")
 
-    # Fetch the entire bulk to be loaded
-    org_units = request.get_json()
-
-    def generator():
-        for uuid, org_unit in org_units.items():
-            entry = {"_id": uuid, "_source": org_unit}
-            yield entry
-
-    # Connect to datastore and clear it out
-    db = DataStore(current_app.connection)
-    db.delete_index("org_units")
-    # Create index for org_units.
-    # Normally indexes are created on bulk_insert / insert, however we want to
-    # explicitly create the index, to get KLEs as nested documents.
-    db.create_index(
-        "org_units", {"mappings": {"properties": {"kles": {"type": "nested"}}}}
-    )
+    return load_documents("org_units")
 
-    # Loading entries
-    indexed, total = db.bulk_insert_index(
-        index="org_units", generator=generator
-    )
 
-    return jsonify({"indexed": indexed, "total": total})
+@api.route("/api/load-jobs/<uuid:job_id>", methods=["GET"])
+@auth.login_required
+def show_load_job(job_id):
+    """Report the status of a load job, see :code:`load_documents`.
+
+    Args:
+        job_id (uuid): Job identifier, from the response to the load
+
+    Example:
+
+        The response body is formatted as follows:
+
+        {
+            "id": "0f1c9b1e-4d3a-4a8e-9d57-2b6f3c0b5e11",
+            "alias": "employees",
+            "mode": "full",
+            "state": "succeeded",
+            "created": "2020-06-12T08:00:00",
+            "started": "2020-06-12T08:00:00",
+            "finished": "2020-06-12T08:00:12",
+            "total": 421,
+            "processed": 421,
+            "indexed": 421,
+            "failed": 0,
+            "docs_per_second": 35.1,
+            "errors": [],
+            "result": {"indexed": 421, "total": 421},
+            "pid": 7
+        }
+
+        The state is one of `queued`, `running`, `succeeded` or `failed`.
+        While running, `processed` and `docs_per_second` are updated as
+        the documents are read from the spool file.
+
+    Returns:
+        :obj:`Response`: Response with json body.
+
+    """
+    job = current_app.load_jobs.get(str(job_id))
+
+    if job is None:
+        raise NotFound(f"Load job: {job_id} does not exist")
+
+    return jsonify(job)
 
 
 #####################################################################
@@ -471,7 +1496,9 @@ def load_org_units():
 @api.app_errorhandler(NotFound)
 @api.app_errorhandler(NotFoundError)
 @api.app_errorhandler(InvalidSearchType)
+@api.app_errorhandler(ExpiredCursor)
 @api.app_errorhandler(InvalidRequestBody)
+@api.app_errorhandler(InvalidRequestParameters)
 @api.app_errorhandler(InvalidCredentials)
 @api.app_errorhandler(InsufficientCredentials)
 def invalid_validation_handler(error) -> Response:
@@ -489,6 +1516,24 @@ def invalid_validation_handler(error) -> Response:
 
     """
 
+    response, status_code = error_response(error)
+
+    log.warning(f"REQUEST_FAILED - {error}")
+
+    return jsonify(response), status_code
+
+
+def error_response(error) -> tuple:
+    """Describe a common error, see :code:`invalid_validation_handler`.
+
+    Args:
+        error (Exception): An exception type error object
+
+    Returns:
+        tuple: Error description (dict) and HTTP status code (int).
+
+    """
+
     status_code = 400
 
     if hasattr(error, "status_code"):
@@ -501,9 +1546,7 @@ def invalid_validation_handler(error) -> Response:
         "error": {"type": error.__class__.__name__, "message": str(error)}
     }
 
-    log.warning(f"REQUEST_FAILED - {error}")
-
-    return jsonify(response), status_code
+    return response, status_code
 
 
 @api.app_errorhandler(Exception)
@@ -1,99 +1,239 @@
-from typing import List, Tuple, Callable
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import streaming_bulk
-from os2phonebook.exceptions import InvalidSearchType
+from datetime import datetime
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from elasticsearch import Elasticsearch, Transport
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import (
+    BulkIndexError,
+    parallel_bulk,
+    scan,
+    streaming_bulk,
+)
+from os2phonebook import metrics, timing
+from os2phonebook.backend import (
+    Backend,
+    CONTENT_HASH_FIELD,
+    PHONE_NUMBERS_FIELD,
+    REVERSED_PHONE_NUMBERS_FIELD,
+)
+from os2phonebook.cache import SearchCache
+from os2phonebook.helpers import normalise_phone_number
+from os2phonebook.json_provider import Serializer
+
+# Index holding the current dataset version of each index alias
+DATASET_VERSIONS_INDEX = "dataset_versions"
+
+
+def parse_hosts(host: Union[str, List[str]], port: int) -> List[dict]:
+    """Parse the Elasticsearch nodes to connect to.
 
+    Args:
+        host (str): Hostname of the backend, or several comma separated
+            hostnames, each optionally with a port, e.g. `es1,es2:9201`.
+            A list of hostnames is accepted as well.
+        port (int): Service port of the hosts without an explicit port
+
+    Returns:
+        List[dict]: Host and port of every node
+
+    Raises:
+        ValueError: If no host is given or a port is not a number.
+
+    """
+    if isinstance(host, str):
+        host = host.split(",")
+
+    hosts = []
+
+    for entry in host:
+        entry = entry.strip()
+        if not entry:
+            continue
+
+        name, separator, entry_port = entry.partition(":")
+        hosts.append(
+            {"host": name, "port": int(entry_port) if separator else port}
+        )
+
+    if not hosts:
+        raise ValueError("At least one host must be given")
+
+    return hosts
+
+
+def client_options(
+    maxsize: int = 10,
+    timeout: float = 10,
+    max_retries: int = 3,
+    retry_on_timeout: bool = False,
+    retry_on_status: Tuple[int, ...] = (502, 503, 504),
+    sniff: bool = False,
+) -> dict:
+    """Keyword arguments for the Elasticsearch client.
+
+    See `create_connection` for the options.
+
+    Returns:
+        dict: Keyword arguments for the client (and its transport)
 
-def create_connection(host: str, port: int) -> Elasticsearch:
+    """
+    options = {
+        "maxsize": int(maxsize),
+        "timeout": float(timeout),
+        "max_retries": int(max_retries),
+        "retry_on_timeout": bool(retry_on_timeout),
+        "retry_on_status": tuple(retry_on_status),
+        "serializer": Serializer(),
+    }
+
+    if sniff:
+        # Discover the nodes of the cluster when a node fails and every
+        # minute, thus nodes can be added or removed at runtime.
+        # Not on start, as the client is created before the cluster is up.
+        options.update(
+            {"sniff_on_connection_fail": True, "sniffer_timeout": 60}
+        )
+
+    return options
+
+
+class TimedTransport(Transport):
+    """Transport timing every request to Elasticsearch
+
+    The round-trip is recorded as span `es` of the current request,
+    and the time Elasticsearch reports as span `es-took`, see `timing`.
+
+    """
+
+    def perform_request(self, *args, **kwargs):
+        with timing.span("es"):
+            response = super().perform_request(*args, **kwargs)
+
+        timing.record_response(response)
+        return response
+
+
+def create_connection(
+    host: Union[str, List[str]],
+    port: int,
+    maxsize: int = 10,
+    timeout: float = 10,
+    max_retries: int = 3,
+    retry_on_timeout: bool = False,
+    retry_on_status: Tuple[int, ...] = (502, 503, 504),
+    sniff: bool = False,
+) -> Elasticsearch:
     """Elasticsearch connection factory.
 
     This is a connection factory to connect to the
     Elasticsearch backend
 
+    Requests are spread over the hosts, and retried on another host if
+    one fails. Each host has a pool of up to `maxsize` connections, which
+    should match the number of concurrent requests a worker serves.
+    Otherwise connections are opened and discarded for the requests
+    exceeding the pool.
+
     Args:
-        host (str): Hostname of the backend
+        host (str): Hostname of the backend, or several comma separated
+            hostnames, see `parse_hosts`.
         port (int): Service port
+        maxsize (int): Maximum number of connections kept per host
+        timeout (float): Request timeout in seconds
+        max_retries (int): Maximum number of retries of a failed request
+        retry_on_timeout (bool): Whether to retry timed out requests,
+            on another host if there are several.
+        retry_on_status (tuple): HTTP status codes to retry requests on
+        sniff (bool): Whether to discover the nodes of the cluster
 
     Returns:
         :obj:`Elasticsearch`: An instance of the elasticsearch client
 
     """
-    if not isinstance(host, str):
+    if not isinstance(host, (str, list)):
         raise TypeError("Host description must be passed as a string")
 
     if not isinstance(port, int):
         raise TypeError("Port identifier must be passed as an integer")
 
-    db = Elasticsearch([{"host": host, "port": port}])
+    db = Elasticsearch(
+        parse_hosts(host, port),
+        transport_class=TimedTransport,
+        **client_options(
+            maxsize=maxsize,
+            timeout=timeout,
+            max_retries=max_retries,
+            retry_on_timeout=retry_on_timeout,
+            retry_on_status=retry_on_status,
+            sniff=sniff,
+        ),
+    )
 
     return db
 
 
-class DataStore(object):
+class DataStore(Backend):
     """Client for generating queries in backend datastore
 
+    The Elasticsearch backend, see :code:`Backend` for the search types
+    and the search policy shared by the backends.
+
     Args:
         db (:obj:`Elasticsearch`): Instance of the elasticsearch client.
 
-        search_type_map (dict): A map of all the available search types.
-
-            Available search types:
-                * employee_by_name
-                * employee_by_phone
-                * employee_by_email
-                * employee_by_engagement
-                * org_unit_by_name
-                * org_unit_by_kle
+        cache (:obj:`SearchCache`): Optional cache for search results.
 
-            Example:
-
-            {
-                "employee_by_name": {
-                    "description": "Navn",
-                    "query_method": "query_for_employee_by_name"
-            }
-
-            This particular search type has the canonical description `Navn`
-            and a query method which refers to the name of an attribute
-            on this class, e.g. `Datastore.query_for_employee_by_name`.
+        index_definitions (dict): Index definitions (settings and mappings)
+            by index alias, used when creating a new version of an index.
 
     """
 
-    def __init__(self, db):
-        if not isinstance(db, Elasticsearch):
-            raise TypeError(
-                "Datastore requires an instance of the Elasticsearch object"
-            )
-
-        self.db = db
-
-        self.search_type_map = {
-            "employee_by_name": {
-                "description": "Navn",
-                "query_method": "query_for_employee_by_name",
-            },
-            "employee_by_phone": {
-                "description": "Telefon",
-                "query_method": "query_for_employee_by_phone",
-            },
-            "employee_by_email": {
-                "description": "Email",
-                "query_method": "query_for_employee_by_email",
-            },
-            "employee_by_engagement": {
-                "description": "Stilling",
-                "query_method": "query_for_employee_by_engagement",
-            },
-            "org_unit_by_name": {
-                "description": "Enhed",
-                "query_method": "query_for_org_unit_by_name",
+    # Client class the datastore is used with
+    client_class = Elasticsearch
+
+    def __init__(self, db, cache: SearchCache = None):
+        super().__init__(db, cache)
+
+        # The content hash is only ever compared, never searched
+        content_hash_mapping = {"type": "keyword", "index": False}
+
+        self.index_definitions = {
+            # Names are searched as you type, thus the prefixes (edge
+            # n-grams) and word shingles are prepared when indexing.
+            # Phone numbers are searched as digits only.
+            "employees": {
+                "mappings": {
+                    "properties": {
+                        "name": {"type": "search_as_you_type"},
+                        "surname": {"type": "search_as_you_type"},
+                        PHONE_NUMBERS_FIELD: {"type": "keyword"},
+                        REVERSED_PHONE_NUMBERS_FIELD: {"type": "keyword"},
+                        CONTENT_HASH_FIELD: content_hash_mapping,
+                    }
+                }
             },
-            "org_unit_by_kle": {
-                "description": "Enhed",
-                "query_method": "query_for_org_unit_by_kle",
+            # KLEs are nested documents, to be searched individually
+            # and org units are paginated by uuid
+            "org_units": {
+                "mappings": {
+                    "properties": {
+                        "uuid": {"type": "keyword"},
+                        "kles": {"type": "nested"},
+                        CONTENT_HASH_FIELD: content_hash_mapping,
+                    }
+                }
             },
         }
 
+    @metrics.timed("get_employee")
     def get_employee(self, uuid: str) -> dict:
         """Retrieve employee document by identifer
 
@@ -109,10 +249,11 @@ class DataStore(object):
         response = self.db.get(index=index, id=uuid)
 
         # _source contains the actual document
-        employee = response["_source"]
+        employee = self._strip_internal_fields(response["_source"])
 
         return employee
 
+    @metrics.timed("get_org_unit")
     def get_org_unit(self, uuid: str) -> dict:
         """Retrieve org_unit document by identifer
 
@@ -128,10 +269,60 @@ class DataStore(object):
         response = self.db.get(index=index, id=uuid)
 
         # _source contains the actual document
-        org_unit = response["_source"]
+        org_unit = self._strip_internal_fields(response["_source"])
 
         return org_unit
 
+    def get_documents(
+        self, index: str, uuids: List[str], fields: List[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """Retrieve several documents by identifier in a single request
+
+        Args:
+            index (str): Name of the index to query
+            uuids (List[str]): Document identifiers <uuid>
+            fields (List[str]): Document fields to return,
+                or `None` to return the entire documents.
+
+        Returns:
+            Tuple[List[dict], List[str]]: The documents found,
+                in the order requested, and the identifiers not found.
+
+        """
+
+        response = self.db.mget(
+            index=index, body=self._documents_query(uuids, fields)
+        )
+
+        return self._documents_from_response(response)
+
+    def _documents_query(
+        self, uuids: List[str], fields: List[str] = None
+    ) -> dict:
+        """Build the `_mget` request body for `get_documents`"""
+
+        source = {"includes": list(fields)} if fields is not None else True
+
+        return {"docs": [{"_id": uuid, "_source": source} for uuid in uuids]}
+
+    def _documents_from_response(
+        self, response: dict
+    ) -> Tuple[List[dict], List[str]]:
+        """Split an `_mget` response into the documents found and missing"""
+
+        documents = []
+        missing = []
+
+        for document in response["docs"]:
+            if document.get("found"):
+                documents.append(
+                    self._strip_internal_fields(document["_source"])
+                )
+            else:
+                missing.append(document["_id"])
+
+        return documents, missing
+
     def get_size(self, index: str) -> int:
         """Get the total document count for a given index
 
@@ -150,18 +341,42 @@ class DataStore(object):
 
         return int(total_size)
 
-    def get_all_org_units(self) -> List[dict]:
-        """Retrieve all org unit documents from the store
+    def get_org_units_page(
+        self, limit: int, cursor: dict = None
+    ) -> Tuple[List[dict], Optional[dict]]:
+        """Retrieve a page of org unit documents from the store
+
+        Pages are ordered by uuid and paginated using `search_after`,
+        thus there is no limit on how far one may page.
+
+        The cursor pins the concrete index version the first page was read
+        from, thus all pages are read from the same (point-in-time) version
+        of the index, even if a new version is published in the meantime.
+
+        Args:
+            limit (int): Maximum number of documents on the page
+            cursor (dict): Cursor returned along with the previous page,
+                or `None` for the first page.
 
         Returns:
-            List[dict]: An array of org unit documents as dictionaries
+            Tuple[List[dict], Optional[dict]]: An array of org unit
+                documents and the cursor for the next page,
+                or `None` if this is the last page.
 
         """
 
-        index = "org_units"
+        index, query = self._org_units_page_query(limit, cursor)
 
-        # Calculate total document size
-        total_size = self.get_size(index)
+        return_data = self.db.search(index=index, body=query)
+
+        return self._org_units_page_from_response(return_data, limit)
+
+    def _org_units_page_query(
+        self, limit: int, cursor: dict = None
+    ) -> Tuple[str, dict]:
+        """Build the index and query for `get_org_units_page`"""
+
+        index = cursor["index"] if cursor else "org_units"
 
         # Scoped query
         # Documents returned only contains values for
@@ -169,110 +384,146 @@ class DataStore(object):
         # * org unit name
         # * parent unit uuid
         query = {
-            "size": total_size,
+            "size": limit,
             "query": {"match_all": {}},
             "_source": {"includes": ["uuid", "name", "parent"]},
+            "sort": [{"uuid": "asc"}],
         }
 
-        return_data = self.db.search(index=index, body=query)
+        if cursor:
+            query["search_after"] = cursor["search_after"]
+
+        return index, query
+
+    def _org_units_page_from_response(
+        self, return_data: dict, limit: int
+    ) -> Tuple[List[dict], Optional[dict]]:
+        """Extract the page and next cursor for `get_org_units_page`"""
 
         hits = return_data["hits"]["hits"]
 
-        return [unit["_source"] for unit in hits if "_source" in unit]
+        org_units = [unit["_source"] for unit in hits if "_source" in unit]
 
-    def get_query_method(
-        self, search_type: str
-    ) -> Callable[[str, bool], Tuple[str, dict]]:
-        """Fetches query generator based on the `search_type`
+        # A short page is the last page
+        if len(hits) < limit:
+            return org_units, None
 
-        Please see the `search_type_map` attribute
-        for more information on the available types.
+        last_hit = hits[-1]
+        next_cursor = {
+            "index": last_hit["_index"],
+            "search_after": last_hit["sort"],
+        }
 
-        Args:
-            search_type (str): This refers to the `search_type_map` key.
+        return org_units, next_cursor
 
-        Returns:
-            Callable[[str, bool], Tuple[str, dict]: The query generator
+    def iter_employee_phone_numbers(self) -> Iterator[dict]:
+        """Iterate over all employees with a phone number
+
+        Used to build the caller-ID index, see :code:`PhoneIndex`.
+
+        Yields:
+            dict: Employee document, scoped to uuid, name,
+                phone addresses and engagements.
 
-        Raises:
-            TypeError:
-                If the `search_type` is not a string value.
-            InvalidSearchType:
-                If the `search_type` does not exist.
-                (Meaning that it does not exist in the `search_type_map`)
-            ValueError:
-                If the query method is not defined for this type.
-            AttributeError:
-                If the query method defined does not exist as an attribute.
         """
 
-        if not isinstance(search_type, str):
-            raise TypeError("Search type must be a string value")
+        hits = self._scan(
+            index="employees",
+            query={
+                "query": {"exists": {"field": PHONE_NUMBERS_FIELD}},
+                "_source": {
+                    "includes": [
+                        "uuid",
+                        "name",
+                        "addresses.PHONE",
+                        "engagements",
+                    ]
+                },
+            },
+        )
 
-        if search_type not in self.search_type_map:
-            raise InvalidSearchType(
-                f"Search type: {search_type} is not available"
-            )
+        for hit in hits:
+            yield hit.get("_source", {})
 
-        selected_type = self.search_type_map[search_type]
+    def _scan(self, index: str, query: dict) -> Iterator[dict]:
+        """Iterate over every hit of a search, see `scan`"""
+        return scan(client=self.db, index=index, query=query)
 
-        if "query_method" not in selected_type:
-            raise ValueError("No query method defined for this search type")
+    def _run_search(self, index: str, query: dict) -> dict:
+        """Run a search request, see `Backend._run_search`"""
+        return self.db.search(index=index, body=query)
 
-        query_method = selected_type["query_method"]
+    def _multi_search(
+        self,
+        searches: List[Tuple[str, dict, Callable[[dict], dict]]],
+        labels: List[Tuple[str, bool]] = None,
+    ) -> List[List[dict]]:
+        """Run several searches in a single `_msearch` request
 
-        if not hasattr(self, query_method):
-            AttributeError("Query method does not exist")
+        Args:
+            searches (list): Index name, Elastic search query and processor
+                for every search, see `_prepare_search`.
+            labels (list): Search type and whether the pass is fuzzy
+                for every search, used to record metrics if given.
 
-        return getattr(self, query_method)
+        Returns:
+            List[List[dict]]: Documents matched by each of the searches.
 
-    def search(
-        self, search_type, search_value, fuzzy_search=False
-    ) -> List[dict]:
-        """High level search method
+        Raises:
+            TransportError: If Elasticsearch failed one of the searches.
 
-        Fetches query generator based on the `search_type` by
-        calling `get_query_method`.
+        """
 
-        Please see the `search_type_map` attribute
-        for more information on the available types.
+        response = self.db.msearch(body=self._multi_search_body(searches))
 
-        Args:
-            search_type (str): Search type (see available types above)
-            search_value (str): Arbitrary search string
-            fuzzy_search (bool): If True, use match_phrase_prefix
+        return self._multi_search_results(searches, response, labels)
 
-        Returns:
-            List[dict]: A list of documents that matched the search
+    def _multi_search_body(
+        self, searches: List[Tuple[str, dict, Callable[[dict], dict]]]
+    ) -> List[dict]:
+        """Build the `_msearch` request body for `_multi_search`"""
 
-        Example:
+        body = []
+        for index, query, _ in searches:
+            body.extend([{"index": index}, query])
 
-            results = client.search(
-                search_type = "employee_by_name",
-                search_value = "Commander Riker",
-                fuzzy_search = True
-            )
+        return body
 
-        """
+    def _multi_search_results(
+        self,
+        searches: List[Tuple[str, dict, Callable[[dict], dict]]],
+        response: dict,
+        labels: List[Tuple[str, bool]] = None,
+    ) -> List[List[dict]]:
+        """Process the documents of an `_msearch` response per search
 
-        # Default processor simply returns the _source directly
-        def default_processor(document):
-            return document["_source"]
+        Raises:
+            TransportError: If Elasticsearch failed one of the searches.
 
-        # Get the query generator method and run it to get our tuple
-        query_method = self.get_query_method(search_type)
-        result = query_method(search_value, fuzzy_search)
+        """
+
+        results_per_search = []
 
-        # Pad with default_processor if we only got a 2 tuple back.
-        if len(result) == 2:
-            result = (*result, default_processor)
+        for position, ((_, _, processor), result) in enumerate(
+            zip(searches, response["responses"])
+        ):
+            if "error" in result:
+                raise TransportError(
+                    result.get("status", 500),
+                    "search_phase_execution_exception",
+                    result["error"],
+                )
 
-        # Unpack 3-tuple into constituents
-        index, query, processor = result
+            if labels is not None:
+                metrics.observe_search_pass(*labels[position], result)
 
-        response = self.db.search(index=index, body=query)
+            hits = result["hits"]["hits"]
+            with timing.span("process"):
+                results_per_search.append(
+                    [processor(document) for document in hits]
+                )
 
-        return [processor(document) for document in response["hits"]["hits"]]
+        return results_per_search
 
     def _query_match(
         self,
@@ -361,10 +612,18 @@ class DataStore(object):
     ) -> Tuple[str, dict]:
         """Search query for an employee by the full name (passed as a string).
 
-        For a regular search we are using a `multi_match` query in order to
-        match the full name against the `name` and the `surname` fields,
-        thus allowing the user to either search for a person by a full name,
-        only the first name or the last name.
+        The `name` and `surname` fields are indexed as `search_as_you_type`
+        fields, thus every prefix and every sequence of two and three words
+        is indexed on a subfield (`._index_prefix`, `._2gram`, `._3gram`).
+        Prefix searches are therefore term lookups rather than expansions
+        over every term in the index at query time.
+
+        For a regular search we are using a `bool_prefix` `multi_match`
+        query in order to match the full name against the `name` and the
+        `surname` fields and their shingle subfields, thus allowing the user
+        to either search for a person by a full name, only the first name or
+        the last name. Every word must match, the last word as a prefix.
+        Names matching the words in the order given are ranked higher.
 
         Example:
             Searching for `Picard` will yield the following matches:
@@ -406,7 +665,7 @@ class DataStore(object):
                     "bool": {
                         "must": [{"match": {"name": name}}],
                         "should": [
-                            {"match_phrase_prefix": {"surname": lastname}}
+                            {"match_bool_prefix": {"surname": lastname}}
                         ],
                     }
                 },
@@ -417,8 +676,16 @@ class DataStore(object):
                 "query": {
                     "multi_match": {
                         "query": str(name),
-                        "type": "phrase_prefix",
-                        "fields": ["surname", "name"],
+                        "type": "bool_prefix",
+                        "operator": "and",
+                        "fields": [
+                            "surname",
+                            "surname._2gram",
+                            "surname._3gram",
+                            "name",
+                            "name._2gram",
+                            "name._3gram",
+                        ],
                     }
                 },
             }
@@ -430,22 +697,27 @@ class DataStore(object):
     ) -> Tuple[str, dict]:
         """Search query for an employee by phone number.
 
-        We are using a regular token match or a phrase prefix match.
-        This mean we are trying to match the entire value.
+        Phone numbers are normalised to their digits, without the danish
+        country code, both when indexing and when searching, thus
+        `+45 22 72 22 22`, `22722222` and `2272 2222` are the same number.
+
+        The regular search is a term lookup on the normalised numbers.
 
         Example:
             Search value `22722222` will match the following only:
             * 22722222
 
-        A fuzzy query will use `phrase_prefix` matching in order to match on
-        the given prefix, the search for `2272` will yield following results:
+        A search value without digits matches nothing.
+
+        A fuzzy query will match on either the given prefix or suffix, using
+        the normalised numbers and the normalised numbers reversed.
+        The search for `2272` will yield the following results:
             * 22722222
             * 22723333
-            * 22724444
+            * 44442272
 
         But will not match
             * 43227233
-            * 44442272
 
         Args:
             phone_number (str): Phone number, e.g. 21223344.
@@ -457,18 +729,37 @@ class DataStore(object):
         """
 
         index = "employees"
-        search_field = "addresses.PHONE.value"
 
         source_filter = ["uuid", "name", "addresses.PHONE"]
 
-        if fuzzy_search:
-            query = self._query_match_phrase_prefix(
-                search_field, phone_number, 15, source_filter
-            )
+        digits = normalise_phone_number(phone_number)
+
+        if not digits:
+            # An empty prefix would match every phone number,
+            # e.g. when searching every search type for a name
+            search_query = {"match_none": {}}
+        elif fuzzy_search:
+            search_query = {
+                "bool": {
+                    "should": [
+                        {"prefix": {PHONE_NUMBERS_FIELD: digits}},
+                        {
+                            "prefix": {
+                                REVERSED_PHONE_NUMBERS_FIELD: digits[::-1]
+                            }
+                        },
+                    ],
+                    "minimum_should_match": 1,
+                }
+            }
         else:
-            query = self._query_match(
-                search_field, phone_number, 15, source_filter
-            )
+            search_query = {"term": {PHONE_NUMBERS_FIELD: digits}}
+
+        query = {
+            "size": 15,
+            "_source": {"includes": list(source_filter)},
+            "query": search_query,
+        }
 
         return (index, query)
 
@@ -641,6 +932,325 @@ class DataStore(object):
         response = self.db.indices.create(index=index, body=mapping)
         return response
 
+    def create_versioned_index(self, alias: str, mapping: dict = None) -> str:
+        """Create a fresh, timestamped index to be published under an alias
+
+        The index is named `<alias>-<timestamp>`, e.g.
+        `employees-20200612031500123456`, so versions sort chronologically.
+
+        Periodic refreshes are disabled on the new index, as nothing reads
+        from it until it is published by `publish_index`.
+
+        Args:
+            alias (str): Name of the alias the index will be published as
+            mapping (dict): Elasticsearch index definition
+
+        Returns:
+            str: Name of the created index
+
+        """
+        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+        index = f"{alias}-{timestamp}"
+
+        definition = dict(mapping or {})
+        settings = dict(definition.get("settings", {}))
+        settings["index"] = {
+            **settings.get("index", {}),
+            "refresh_interval": "-1",
+        }
+        definition["settings"] = settings
+
+        self.create_index(index, definition)
+        return index
+
+    def swap_alias(self, alias: str, index: str) -> dict:
+        """Atomically point an alias at the given index
+
+        Every index currently carrying the alias is detached from it in the
+        same request, thus readers will see either the old or the new index,
+        never both and never none.
+
+        An existing (legacy) index occupying the alias name is removed as
+        part of the very same request.
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            index (str): Name of the index to publish
+
+        Returns:
+            dict: Elasticsearch json response as dictionary
+
+        """
+        actions = [{"add": {"index": index, "alias": alias}}]
+
+        if self.db.indices.exists_alias(name=alias):
+            current = self.db.indices.get_alias(name=alias)
+            actions = [
+                {"remove": {"index": name, "alias": alias}} for name in current
+            ] + actions
+        elif self.db.indices.exists(index=alias):
+            actions.insert(0, {"remove_index": {"index": alias}})
+
+        response = self.db.indices.update_aliases(body={"actions": actions})
+        return response
+
+    def get_alias_indices(self, alias: str) -> List[str]:
+        """Names of the indices an alias points at
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+
+        Returns:
+            List[str]: Index names, empty if there is no such alias
+
+        """
+        if not self.db.indices.exists_alias(name=alias):
+            return []
+
+        return sorted(self.db.indices.get_alias(name=alias))
+
+    def prune_versioned_indices(
+        self, alias: str, index: str, keep: Iterable[str] = ()
+    ) -> List[str]:
+        """Delete stale versions of an aliased index
+
+        The published index and the versions in `keep` are retained,
+        the latter being the versions published before it, which allow a
+        rollback by pointing the alias back. Any other version is stale,
+        e.g. one left behind by a load which was interrupted.
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            index (str): Name of the currently published index
+            keep (Iterable[str]): Names of the previous versions to retain
+
+        Returns:
+            List[str]: Names of the deleted indices
+
+        """
+        versions = sorted(self.db.indices.get(index=f"{alias}-*"))
+        retained = set(keep)
+
+        # Versions newer than the published index may still be loading
+        stale = [
+            version
+            for version in versions
+            if version < index and version not in retained
+        ]
+
+        for version in stale:
+            self.delete_index(version)
+
+        return stale
+
+    def publish_index(self, alias: str, index: str) -> None:
+        """Make a fully loaded index visible to readers under its alias
+
+        Restores the refresh interval disabled by `create_versioned_index`,
+        refreshes the index so every document is searchable and then swaps
+        the alias over before pruning stale versions. The version the alias
+        pointed at until now is kept for a rollback.
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            index (str): Name of the index to publish
+
+        """
+        self.db.indices.put_settings(
+            index=index, body={"index": {"refresh_interval": None}}
+        )
+        self.db.indices.refresh(index=index)
+
+        previous = self.get_alias_indices(alias)
+        self.swap_alias(alias, index)
+        self.prune_versioned_indices(alias, index, keep=previous)
+
+    def load_versioned_index(
+        self, alias: str, index: str, generator, **bulk_options
+    ) -> Tuple[int, int]:
+        """Insert documents into a new index version, deleted on failure
+
+        A version which failed to load is never left behind, as it is
+        neither published nor retained for a rollback.
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            index (str): Name of the version, see `create_versioned_index`
+            generator (func): Generator function, generating dicts.
+            **bulk_options: Keyword arguments for `bulk_insert_index`
+
+        Returns:
+            int, int: Number of documents indexed, documents processed.
+
+        Raises:
+            BulkIndexError: If any of the documents failed to index.
+
+        """
+        try:
+            indexed, total = self.bulk_insert_index(
+                index=index, generator=generator, **bulk_options
+            )
+            if indexed < total:
+                raise BulkIndexError(
+                    f"{total - indexed} document(s) failed to index.", []
+                )
+        except BaseException:
+            self.delete_index(index)
+            raise
+
+        return indexed, total
+
+    def reindex(self, alias: str, generator, **bulk_options):
+        """Load documents into a new index version and publish it
+
+        Readers keep querying the previously published index until the new
+        one has been completely loaded, at which point the alias is swapped.
+        If the bulk insert fails, the alias is left untouched and the new
+        version is deleted.
+
+        Every document is stored with its content hash,
+        allowing subsequent loads to be delta loads (see `delta_index`).
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            generator (func): Generator function, generating dicts.
+            **bulk_options: Keyword arguments for `bulk_insert_index`
+
+        Returns:
+            int, int: Number of documents indexed, documents processed.
+
+        """
+        index = self.create_versioned_index(
+            alias, self.index_definitions.get(alias)
+        )
+
+        indexed, total = self.load_versioned_index(
+            alias,
+            index,
+            self._prepare_documents(alias, generator),
+            **bulk_options,
+        )
+
+        self.publish_index(alias, index)
+
+        return indexed, total
+
+    def get_content_hashes(self, index: str) -> Dict[str, str]:
+        """Retrieve the content hash of every document in an index
+
+        Args:
+            index (str): Name of the index (or alias)
+
+        Returns:
+            Dict[str, str]: Content hash by document identifier.
+                Documents indexed without a hash map to `None`.
+
+        """
+        hits = self._scan(
+            index=index,
+            query={
+                "query": {"match_all": {}},
+                "_source": {"includes": [CONTENT_HASH_FIELD]},
+            },
+        )
+
+        return {
+            hit["_id"]: hit.get("_source", {}).get(CONTENT_HASH_FIELD)
+            for hit in hits
+        }
+
+    def delta_index(self, alias: str, generator, **bulk_options) -> dict:
+        """Only apply the changes between the given and the indexed documents
+
+        The content hash of every given document is compared with the hash
+        stored alongside the currently published document:
+            * New documents are added.
+            * Documents with a different content hash are replaced.
+            * Documents with the same content hash are left untouched.
+            * Published documents not given are deleted.
+
+        Unlike `reindex`, the changes are applied to the published index,
+        thus only the changed documents are written, each of them
+        atomically. Readers may see some of the changes before the load
+        has completed, and a failed load leaves the changes applied so far,
+        which the next load completes. Without a published index, this is
+        a regular `reindex`.
+
+        Args:
+            alias (str): Name of the alias, e.g. `employees`
+            generator (func): Generator function, generating dicts.
+            **bulk_options: Keyword arguments for `bulk_insert_index`
+
+        Returns:
+            dict: Number of documents indexed, documents processed,
+                and documents added, updated, deleted and unchanged.
+
+        """
+        counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+        if not self.db.indices.exists_alias(name=alias):
+            indexed, total = self.reindex(alias, generator, **bulk_options)
+            counts["added"] = total
+            return {"indexed": indexed, "total": total, **counts}
+
+        indexed_hashes = self.get_content_hashes(alias)
+        delta_generator = self._delta_documents(
+            alias, generator, indexed_hashes, counts
+        )
+
+        indexed, total = self.bulk_insert_index(
+            index=alias, generator=delta_generator, **bulk_options
+        )
+
+        self.db.indices.refresh(index=alias)
+
+        return {"indexed": indexed, "total": total, **counts}
+
+    def get_dataset_versions(self) -> Dict[str, str]:
+        """Retrieve the dataset version of every loaded index
+
+        Returns:
+            Dict[str, str]: Dataset version by index alias.
+                Aliases which were never loaded are left out.
+
+        """
+        response = self.db.mget(
+            index=DATASET_VERSIONS_INDEX,
+            body={"ids": list(self.index_definitions)},
+        )
+
+        return self._dataset_versions_from_response(response)
+
+    def _dataset_versions_from_response(
+        self, response: dict
+    ) -> Dict[str, str]:
+        """Extract the versions from a `get_dataset_versions` response"""
+
+        return {
+            document["_id"]: document["_source"]["version"]
+            for document in response["docs"]
+            if document.get("found")
+        }
+
+    def set_dataset_version(self, alias: str, version: str) -> dict:
+        """Store the dataset version of an index after loading it
+
+        Args:
+            alias (str): Name of the index alias, e.g. `employees`
+            version (str): The new dataset version
+
+        Returns:
+            dict: Elasticsearch json response as dictionary
+
+        """
+        response = self.db.index(
+            index=DATASET_VERSIONS_INDEX,
+            id=alias,
+            body={"version": version},
+            refresh="true",
+        )
+        return response
+
     def insert_index(self, index: str, identifier: str, data: dict) -> dict:
         """Insert a document into a datastore index
 
@@ -658,22 +1268,54 @@ class DataStore(object):
         )
         return response
 
-    def bulk_insert_index(self, index: str, generator) -> dict:
+    @metrics.timed("bulk_insert_index")
+    def bulk_insert_index(
+        self,
+        index: str,
+        generator,
+        thread_count: int = 1,
+        chunk_size: int = 500,
+        max_chunk_bytes: int = 100 * 1024 * 1024,
+    ) -> dict:
         """Insert documents into a datastore index
 
+        With a `thread_count` above 1, the chunks are sent to Elasticsearch
+        concurrently from a pool of threads (see `parallel_bulk`),
+        otherwise one chunk at a time (see `streaming_bulk`).
+
         Args:
             index (str): Name of the index
             generator (func): Generator function, generating dicts.
+            thread_count (int): Number of concurrent bulk requests.
+            chunk_size (int): Maximum number of documents per bulk request.
+            max_chunk_bytes (int): Maximum size of a bulk request in bytes.
 
         Returns:
             int, int: Number of documents indexed, documents processed.
 
         """
+        if thread_count > 1:
+            results = parallel_bulk(
+                client=self.db,
+                index=index,
+                actions=generator(),
+                thread_count=thread_count,
+                queue_size=thread_count,
+                chunk_size=chunk_size,
+                max_chunk_bytes=max_chunk_bytes,
+            )
+        else:
+            results = streaming_bulk(
+                client=self.db,
+                index=index,
+                actions=generator(),
+                chunk_size=chunk_size,
+                max_chunk_bytes=max_chunk_bytes,
+            )
+
         indexed = 0
         total = 0
-        for ok, _ in streaming_bulk(
-            client=self.db, index=index, actions=generator()
-        ):
+        for ok, _ in results:
             indexed += ok
             total += 1
 
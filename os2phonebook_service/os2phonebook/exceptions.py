@@ -26,6 +26,18 @@ class InvalidRequestBody(Exception):
     status_code = 400
 
 
+class InvalidRequestParameters(Exception):
+    """Request query parameters are not valid"""
+
+    status_code = 400
+
+
+class ExpiredCursor(Exception):
+    """Pagination cursor refers to an index version which was deleted"""
+
+    status_code = 410
+
+
 class InvalidSearchType(Exception):
     """Search type is not supported"""
 
@@ -1,7 +1,43 @@
+import io
 import os
+import re
+import gzip
 import json
+import codecs
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import (
+    Any,
+    BinaryIO,
+    Iterable,
+    Iterator,
+    Mapping,
+    Tuple,
+    Union,
+)
 from logging import getLogger, Logger, Formatter
 from logging.handlers import RotatingFileHandler
+from os2phonebook import json_provider
+
+# zstandard is an optional dependency,
+# only required to write and read zstd compressed snapshots
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Snapshot file format, see `dump_file`
+SNAPSHOT_FORMAT = "os2phonebook-snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER_SIZE = 1024
+SNAPSHOT_COMPRESSIONS = ("none", "gzip", "zstd")
+
+# Literals a json value cut short by the end of a chunk may be part of
+JSON_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+
+# What may follow the digits of a number cut short, e.g. `1.` of `1.5`
+PARTIAL_NUMBER_PATTERN = re.compile(r"\.|[eE][+-]?")
 
 
 def config_factory():
@@ -15,13 +51,36 @@ def config_factory():
 
         * OS2PHONEBOOK_COMPANY_NAME
         * OS2PHONEBOOK_LOG_ROOT
-        * ELASTICSEARCH_HOST
+        * ELASTICSEARCH_HOST (comma separated for several hosts)
         * ELASTICSEARCH_PORT
 
+    Elasticsearch is only required by the `elasticsearch` backend,
+    and OS2PHONEBOOK_SQLITE_PATH (the database file) by the `sqlite` backend.
+
     The following parameters are optional:
 
+        * OS2PHONEBOOK_BACKEND (`elasticsearch`, `memory` or `sqlite`)
+        * OS2PHONEBOOK_SQLITE_MMAP_SIZE
+        * OS2PHONEBOOK_SNAPSHOT_DIR
+        * OS2PHONEBOOK_SNAPSHOT_COMPRESSION
+        * OS2PHONEBOOK_LOAD_JOB_DIR
         * OS2PHONEBOOK_DATALOADER_USERNAME
         * OS2PHONEBOOK_DATALOADER_PASSWORD
+        * ELASTICSEARCH_POOL_MAXSIZE
+        * ELASTICSEARCH_TIMEOUT
+        * ELASTICSEARCH_MAX_RETRIES
+        * ELASTICSEARCH_RETRY_ON_TIMEOUT
+        * ELASTICSEARCH_RETRY_ON_STATUS
+        * ELASTICSEARCH_SNIFF
+        * ELASTICSEARCH_BULK_THREAD_COUNT
+        * ELASTICSEARCH_BULK_CHUNK_SIZE
+        * ELASTICSEARCH_BULK_MAX_CHUNK_BYTES
+        * OS2PHONEBOOK_SEARCH_CACHE_SIZE
+        * OS2PHONEBOOK_SEARCH_CACHE_TTL
+        * OS2PHONEBOOK_DATASET_VERSION_TTL
+        * OS2PHONEBOOK_HTTP_CACHE_MAX_AGE
+        * OS2PHONEBOOK_TIMING_LOG
+        * OS2PHONEBOOK_PHONE_INDEX_WARMUP
 
     Raises:
         EnvironmentError:
@@ -30,16 +89,47 @@ def config_factory():
     # Prep dictionary for return
     configuration_dict = {}
 
+    backend = os.environ.get("OS2PHONEBOOK_BACKEND", "elasticsearch")
+
     required_parameters = [
         "OS2PHONEBOOK_COMPANY_NAME",
         "OS2PHONEBOOK_LOG_ROOT",
-        "ELASTICSEARCH_HOST",
-        "ELASTICSEARCH_PORT",
     ]
 
+    if backend == "elasticsearch":
+        required_parameters += ["ELASTICSEARCH_HOST", "ELASTICSEARCH_PORT"]
+    elif backend == "sqlite":
+        required_parameters += ["OS2PHONEBOOK_SQLITE_PATH"]
+
     optional_parameters = {
+        "OS2PHONEBOOK_BACKEND": "elasticsearch",
+        # Bytes of the SQLite database file to memory-map
+        "OS2PHONEBOOK_SQLITE_MMAP_SIZE": "268435456",
+        # Snapshots of the last loads, restored into empty indices
+        "OS2PHONEBOOK_SNAPSHOT_DIR": None,
+        "OS2PHONEBOOK_SNAPSHOT_COMPRESSION": "gzip",
+        # Statuses of the load jobs, shared by the workers
+        "OS2PHONEBOOK_LOAD_JOB_DIR": None,
         "OS2PHONEBOOK_DATALOADER_USERNAME": "dataloader",
         "OS2PHONEBOOK_DATALOADER_PASSWORD": None,
+        # Sized to the worker connections of a gunicorn (gevent) worker
+        "ELASTICSEARCH_POOL_MAXSIZE": "1000",
+        "ELASTICSEARCH_TIMEOUT": "10",
+        "ELASTICSEARCH_MAX_RETRIES": "3",
+        "ELASTICSEARCH_RETRY_ON_TIMEOUT": "false",
+        "ELASTICSEARCH_RETRY_ON_STATUS": "502,503,504",
+        "ELASTICSEARCH_SNIFF": "false",
+        "ELASTICSEARCH_BULK_THREAD_COUNT": "1",
+        "ELASTICSEARCH_BULK_CHUNK_SIZE": "500",
+        "ELASTICSEARCH_BULK_MAX_CHUNK_BYTES": "104857600",
+        "OS2PHONEBOOK_SEARCH_CACHE_SIZE": "1024",
+        "OS2PHONEBOOK_SEARCH_CACHE_TTL": "300",
+        "OS2PHONEBOOK_DATASET_VERSION_TTL": "10",
+        "OS2PHONEBOOK_HTTP_CACHE_MAX_AGE": "60",
+        # Log the Server-Timing breakdown of every request
+        "OS2PHONEBOOK_TIMING_LOG": "false",
+        # Build the caller-ID index of every worker on startup
+        "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "true",
     }
     for parameter_name in required_parameters:
         parameter_value = os.getenv(parameter_name)
@@ -60,6 +150,47 @@ def config_factory():
     return configuration_dict
 
 
+def parse_flag(value) -> bool:
+    """Parse a boolean configuration parameter.
+
+    Args:
+        value (str): Parameter value, e.g. `true`, `yes` or `1`
+
+    Returns:
+        bool: Whether the flag is set.
+
+    """
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def connection_options(config: dict) -> dict:
+    """Elasticsearch connection options from the configuration.
+
+    Args:
+        config (dict): A dictionary containing configuration
+
+    Returns:
+        dict: Keyword arguments for :code:`datastore.create_connection`
+
+    """
+    retry_on_status = config.get(
+        "ELASTICSEARCH_RETRY_ON_STATUS", "502,503,504"
+    )
+
+    return {
+        "maxsize": int(config.get("ELASTICSEARCH_POOL_MAXSIZE", 1000)),
+        "timeout": float(config.get("ELASTICSEARCH_TIMEOUT", 10)),
+        "max_retries": int(config.get("ELASTICSEARCH_MAX_RETRIES", 3)),
+        "retry_on_timeout": parse_flag(
+            config.get("ELASTICSEARCH_RETRY_ON_TIMEOUT", False)
+        ),
+        "retry_on_status": tuple(
+            int(status) for status in retry_on_status.split(",") if status
+        ),
+        "sniff": parse_flag(config.get("ELASTICSEARCH_SNIFF", False)),
+    }
+
+
 def log_factory(namespace: str = "os2phonebook") -> Logger:
     """Create an instance of the Logger class.
 
@@ -122,47 +253,443 @@ def configure_logging(log_root: str, log_file: str, logger: Logger) -> None:
     logger.addHandler(activity_log_handler)
 
 
-def dump_file(filename, data_as_dict) -> None:
+def content_hash(document: dict) -> str:
+    """
+    Compute a stable hash of a json document
+    Helper function
+
+    The document is serialized with sorted keys, thus the hash
+    only depends on the content and not on the order of the keys.
+
+    Args:
+        document (dict): Json serializable document
+
+    Returns:
+        str: Hex digest of the document content
+
+    """
+
+    content = json.dumps(
+        document, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def normalise_phone_number(phone_number: str) -> str:
+    """
+    Normalise a phone number to its digits
+    Helper function
+
+    Anything but digits is removed, as is the danish country code.
+    The country code is removed whenever the number starts with `+45` or
+    `0045`, thus partial numbers (searches) are normalised as well,
+    but without the international prefix only from danish (8 digit)
+    phone numbers.
+
+    Example:
+        `+45 22 72 22 22`, `0045 2272 2222` and `22722222`
+        are all normalised to `22722222`, `+45 22 7` to `227`.
+
+    Args:
+        phone_number (str): Phone number as entered
+
+    Returns:
+        str: Digits of the phone number
+
+    """
+
+    digits = re.sub(r"\D", "", phone_number)
+
+    # International call prefix, e.g. +45 or 0045
+    international = phone_number.lstrip().startswith("+")
+    if digits.startswith("00"):
+        digits = digits[2:]
+        international = True
+
+    if digits.startswith("45"):
+        if international or len(digits) == 10:
+            digits = digits[2:]
+
+    return digits
+
+
+def _snapshot_header_line(header: dict) -> bytes:
+    """The header line of a snapshot, padded to `SNAPSHOT_HEADER_SIZE`"""
+
+    line = json_provider.dumps(header)
+
+    if len(line) >= SNAPSHOT_HEADER_SIZE:
+        raise ValueError("Snapshot header exceeds the header size")
+
+    return line.ljust(SNAPSHOT_HEADER_SIZE - 1) + b"\n"
+
+
+@contextmanager
+def _compressed_writer(file: BinaryIO, compression: str) -> Iterator[Any]:
+    """Write to a file through the compression of a snapshot"""
+
+    if compression == "gzip":
+        with gzip.GzipFile(fileobj=file, mode="wb") as stream:
+            yield stream
+    elif compression == "zstd":
+        compressor = zstandard.ZstdCompressor()
+        with compressor.stream_writer(file, closefd=False) as stream:
+            yield stream
+    else:
+        yield file
+
+
+def _decompressed_reader(file: BinaryIO, compression: str) -> BinaryIO:
+    """Read from a file through the compression of a snapshot"""
+
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=file, mode="rb")
+
+    if compression == "zstd":
+        reader = zstandard.ZstdDecompressor().stream_reader(file)
+        return io.BufferedReader(reader)
+
+    return file
+
+
+def _check_compression(compression: str) -> None:
+    """Raise ValueError if a compression is not available"""
+
+    if compression not in SNAPSHOT_COMPRESSIONS:
+        raise ValueError(f"Compression: {compression} is not supported")
+
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("Compression: zstd requires the zstandard package")
+
+
+def dump_file(
+    filename: str,
+    records: Union[Mapping[str, Any], Iterable[Tuple[str, Any]]],
+    dataset_version: str = None,
+    compression: str = "gzip",
+) -> dict:
     """
-    Serialize dictionary to json file
+    Write a snapshot of a uuid-keyed dataset to a file
     Helper function
 
-    This is used to persist the imported
-    organisation units and employees to disk in a json format.
+    This is used to persist the imported organisation units
+    and employees to disk, to be loaded again later.
 
-    The reason for storing objects as json rather serialized python
-    is to allow other components to transfer the data to
-    elasticsearch.
+    A snapshot is a header line followed by the records as newline
+    delimited json (see `iter_ndjson`), one `[key, value]` array per line,
+    compressed as given by the header. The header line is padded to
+    `SNAPSHOT_HEADER_SIZE` bytes and never compressed, thus it is read
+    without reading the records (see `read_file_header`), e.g.
+
+        {"format":"os2phonebook-snapshot","version":1,
+         "compression":"gzip","dataset_version":"2020-06-12","count":2,...}
+
+    Records are written as they are generated, only the current record
+    is held in memory. The count is filled in once every record is
+    written, and the snapshot replaces the file only once it is complete.
 
     Args:
         filename (str): File destination (absolute)
-        data_as_dict (dict): Dictionary/Map of organisation units and employees
+        records (Iterable): Key value pairs, or a dict, of
+            organisation units or employees by uuid
+        dataset_version (str): Dataset version of the records, if any
+        compression (str): `gzip`, `zstd` (requires `zstandard`) or `none`
+
+    Returns:
+        dict: The header of the snapshot
+
+    Raises:
+        ValueError: If the compression is not available.
 
     """
 
-    with open(filename, "w") as file:
-        content = json.dumps(data_as_dict)
-        file.write(content)
+    _check_compression(compression)
+
+    if isinstance(records, Mapping):
+        records = records.items()
+
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "compression": compression,
+        "dataset_version": dataset_version,
+        "count": 0,
+        "created": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+
+    temporary_filename = f"{filename}.tmp"
+
+    try:
+        with open(temporary_filename, "wb") as file:
+            # Reserve the header line, rewritten with the count below
+            file.write(_snapshot_header_line(header))
+
+            with _compressed_writer(file, compression) as stream:
+                for key, value in records:
+                    stream.write(json_provider.dumps([key, value]) + b"\n")
+                    header["count"] += 1
+
+            file.seek(0)
+            file.write(_snapshot_header_line(header))
+
+        os.replace(temporary_filename, filename)
+    except BaseException:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+        raise
 
+    return header
 
-def load_file(filename) -> dict:
+
+def read_file_header(filename: str) -> dict:
     """
-    Load json formatted file as dictionary
+    Read the header of a snapshot written by `dump_file`
     Helper function
 
-    This is used to export the previously imported content
-    to the elasticsearch backend.
+    Only the header line is read, e.g. to pre-size or
+    report progress before loading the records.
 
     Args:
-        filename (str): Absolute path to a source (json) file
+        filename (str): Absolute path to a snapshot file
 
     Returns:
-        dict: A map of organisation units and employees as a dictionary.
+        dict: The header, including the record `count`
+            and the `dataset_version`.
+
+    Raises:
+        ValueError: If the file is not a snapshot.
+
+    """
+
+    with open(filename, "rb") as file:
+        return _read_snapshot_header(file)
+
+
+def _read_snapshot_header(file: BinaryIO) -> dict:
+    """Read and validate the header line of an open snapshot"""
 
+    line = file.read(SNAPSHOT_HEADER_SIZE)
+
+    try:
+        header = json_provider.loads(line)
+    except ValueError:
+        raise ValueError("Not a snapshot, the header is not valid json")
+
+    if not isinstance(header, dict) or "format" not in header:
+        raise ValueError("Not a snapshot, the header format is missing")
+
+    if header["format"] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Not a snapshot, but: {header['format']}")
+
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version: {header.get('version')}")
+
+    _check_compression(header.get("compression"))
+
+    return header
+
+
+def load_file(filename: str) -> Iterator[Tuple[str, Any]]:
     """
+    Load the records of a snapshot written by `dump_file`
+    Helper function
+
+    This is used to export the previously imported content
+    to the datastore. Records are read and parsed one at a time.
+
+    Args:
+        filename (str): Absolute path to a snapshot file
+
+    Yields:
+        Tuple[str, Any]: Key and value of every record,
+            e.g. the uuid and the document of an employee.
+
+    Raises:
+        ValueError: If the file is not a snapshot, or holds fewer
+            or more records than its header counts, e.g. if truncated.
+
+    """
+
+    with open(filename, "rb") as file:
+        header = _read_snapshot_header(file)
 
-    with open(filename, "r") as file:
-        content = file.read()
-        data_as_dict = json.loads(content)
+        count = 0
+        with _decompressed_reader(file, header["compression"]) as stream:
+            for key, value in iter_ndjson(stream):
+                yield key, value
+                count += 1
+
+    if count != header["count"]:
+        raise ValueError(
+            f"Snapshot holds {count} of {header['count']} records"
+        )
+
+
+def _json_cut_short(error: json.JSONDecodeError) -> bool:
+    """Whether a json value may only be invalid as it was cut short
+
+    Thus whether the error is at the end of the text decoded,
+    e.g. an unterminated string or the `tr` of `true`, rather than
+    followed by text which can never be valid json.
+    """
+    doc, pos = error.doc, error.pos
+    rest = doc[pos:]
+
+    if error.msg.startswith("Unterminated string"):
+        return True
+
+    # Also reported for a complete escape ending the text
+    if error.msg.startswith("Invalid \\uXXXX escape"):
+        return len(rest) <= len("uXXXX")
+
+    if PARTIAL_NUMBER_PATTERN.fullmatch(rest):
+        return True
+
+    return any(literal.startswith(rest) for literal in JSON_LITERALS)
+
+
+def iter_json_object(
+    stream: BinaryIO, chunk_size: int = 65536
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally parse a json object from a binary stream
+    Helper function
+
+    This is used to load large uuid-keyed payloads, yielding
+    one key value pair at a time rather than materialising the entire
+    object in memory first.
+
+    Only the current chunk and the value being parsed are held in memory.
+    Invalid json is reported as soon as it is read, without reading the
+    rest of the stream.
+
+    Example:
+        The stream `{"a": {"uuid": "a"}, "b": {"uuid": "b"}}` yields:
+        * ("a", {"uuid": "a"})
+        * ("b", {"uuid": "b"})
+
+    Args:
+        stream (BinaryIO): Readable stream of utf-8 encoded json
+        chunk_size (int): Number of bytes to read from the stream at a time
+
+    Yields:
+        Tuple[str, Any]: Key and value pairs of the top level json object
+
+    Raises:
+        ValueError: If the stream does not contain a valid json object.
+
+    """
+
+    decoder = json.JSONDecoder()
+    reader = codecs.getincrementaldecoder("utf-8")()
+    whitespace = " \t\n\r"
+
+    buffer = ""
+    position = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, position, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        # Drop the consumed part of the buffer before growing it
+        buffer = buffer[position:] + reader.decode(chunk, final=eof)
+        position = 0
+
+    def next_token() -> str:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in whitespace:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if eof:
+                raise ValueError("Unexpected end of json object")
+            read_more()
+
+    def next_value() -> Any:
+        nonlocal position
+        next_token()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                # Only the end of the buffer may be completed by reading on
+                if eof or not _json_cut_short(error):
+                    raise
+            else:
+                # A value ending with the buffer may be cut short, e.g. 12|3
+                rest = buffer[end:]
+                if eof or not (
+                    rest == "" or PARTIAL_NUMBER_PATTERN.fullmatch(rest)
+                ):
+                    position = end
+                    return value
+            read_more()
+
+    read_more()
+
+    if eof and not buffer.strip():
+        raise ValueError("Expected a json object, got nothing")
+
+    if next_token() != "{":
+        raise ValueError("Expected a json object")
+    position += 1
+
+    if next_token() == "}":
+        position += 1
+    else:
+        while True:
+            key = next_value()
+            if not isinstance(key, str):
+                raise ValueError("Expected a string key in json object")
+
+            if next_token() != ":":
+                raise ValueError("Expected ':' in json object")
+            position += 1
+
+            yield key, next_value()
+
+            token = next_token()
+            position += 1
+            if token == "}":
+                break
+            if token != ",":
+                raise ValueError("Expected ',' or '}' in json object")
+
+    # Nothing but whitespace may follow the object
+    while True:
+        if buffer[position:].strip():
+            raise ValueError("Unexpected data after json object")
+        if eof:
+            return
+        read_more()
+
+
+def iter_ndjson(stream: BinaryIO) -> Iterator[Any]:
+    """
+    Parse newline delimited json from a binary stream
+    Helper function
+
+    Every non-blank line holds exactly one json document, see
+    http://ndjson.org. Lines are parsed as they are read from the stream.
+
+    Args:
+        stream (BinaryIO): Readable stream of utf-8 encoded ndjson
+
+    Yields:
+        Any: One parsed document per line
+
+    Raises:
+        ValueError: If a line does not contain valid json.
+
+    """
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
 
-    return data_as_dict
+        try:
+            yield json_provider.loads(line)
+        except ValueError as error:
+            raise ValueError(f"Line {line_number}: {error}")
@@ -0,0 +1,156 @@
+import json
+from typing import Any, Union
+from flask import Flask
+from flask.json import JSONDecoder as FlaskJSONDecoder
+from flask.json import JSONEncoder as FlaskJSONEncoder
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+from os2phonebook import timing
+
+# orjson is an optional dependency,
+# the standard library is used when it is not installed
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def provider_name() -> str:
+    """Name of the JSON implementation in use.
+
+    Returns:
+        str: `orjson` or `json` (the standard library)
+
+    """
+    return "json" if orjson is None else "orjson"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Deserialize a json document
+
+    Args:
+        data (bytes): utf-8 encoded json document
+
+    Returns:
+        Any: The deserialized document
+
+    Raises:
+        ValueError: If the document is not valid json.
+
+    """
+    if orjson is None:
+        return json.loads(data)
+
+    return orjson.loads(data)
+
+
+def dumps(document: Any) -> bytes:
+    """Serialize a json document compactly
+
+    Args:
+        document (Any): Json serializable document
+
+    Returns:
+        bytes: utf-8 encoded json document
+
+    Raises:
+        TypeError: If the document is not json serializable.
+
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(document, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, left to the standard library
+            pass
+
+    return json.dumps(
+        document, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class JSONEncoder(FlaskJSONEncoder):
+    """Flask JSON encoder using orjson when it is available
+
+    Types orjson does not serialize natively, as well as dates, are passed
+    on to :code:`flask.json.JSONEncoder.default`, thus the output equals
+    that of the standard encoder, except that non-ascii characters are
+    not escaped. Indented output is left to the standard library.
+
+    The time spent is recorded as span `serialize` of the current request.
+
+    """
+
+    def encode(self, o: Any) -> str:
+        with timing.span("serialize"):
+            return self._encode(o)
+
+    def _encode(self, o: Any) -> str:
+        if orjson is None or self.indent is not None:
+            return super().encode(o)
+
+        option = (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+
+        try:
+            return orjson.dumps(o, default=self.default, option=option).decode(
+                "utf-8"
+            )
+        except orjson.JSONEncodeError:
+            return super().encode(o)
+
+
+class JSONDecoder(FlaskJSONDecoder):
+    """Flask JSON decoder using orjson when it is available"""
+
+    def decode(self, s: str, *args, **kwargs) -> Any:
+        if orjson is None or self.object_hook or self.object_pairs_hook:
+            return super().decode(s, *args, **kwargs)
+
+        return orjson.loads(s)
+
+
+class Serializer(JSONSerializer):
+    """Elasticsearch serializer using orjson when it is available
+
+    Used for the request bodies sent to and the responses
+    received from Elasticsearch, e.g. bulk loads and search results.
+
+    """
+
+    def loads(self, s: Union[bytes, str]) -> Any:
+        if orjson is None:
+            return super().loads(s)
+
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError as error:
+            raise SerializationError(s, error)
+
+    def dumps(self, data: Any) -> str:
+        # Strings are sent as is, e.g. the lines of a bulk request
+        if orjson is None or isinstance(data, str):
+            return super().dumps(data)
+
+        try:
+            return orjson.dumps(
+                data, default=self.default, option=orjson.OPT_NON_STR_KEYS
+            ).decode("utf-8")
+        except orjson.JSONEncodeError:
+            return super().dumps(data)
+
+
+def init_app(app: Flask) -> None:
+    """Configure a Flask application to use the fastest JSON provider
+
+    Args:
+        app (:obj:`Flask`): An instance of flask
+
+    """
+    app.json_encoder = JSONEncoder
+    app.json_decoder = JSONDecoder
@@ -0,0 +1,277 @@
+import os
+import fcntl
+import json
+from uuid import uuid4
+from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from time import perf_counter, sleep, time
+from typing import Callable, Dict, Iterator, Optional
+from os2phonebook.helpers import log_factory
+
+# Init logging
+log = log_factory()
+
+# States of a load job, in order
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+
+# Seconds between attempts to lock an index loaded by another worker
+LOCK_POLL_INTERVAL = 0.5
+
+# Seconds the status of a finished job is kept
+JOB_RETENTION = 7 * 24 * 3600
+
+# Number of errors reported per job
+MAX_ERRORS = 10
+
+
+def process_alive(pid: int) -> bool:
+    """Whether a process is running, used to detect interrupted jobs"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def describe_errors(error: BaseException) -> list:
+    """Describe the exception failing a job, and the documents it failed
+
+    Args:
+        error (Exception): Exception raised by the job, e.g. a
+            `BulkIndexError` carrying the failed documents.
+
+    Returns:
+        list: Up to `MAX_ERRORS` error descriptions.
+
+    """
+    errors = [f"{error.__class__.__name__}: {error}"]
+
+    # Bulk errors carry the response to every failed document
+    stop = MAX_ERRORS - 1
+    for item in getattr(error, "errors", [])[:stop]:
+        errors.append(json.dumps(item, default=str))
+
+    return errors
+
+
+class LoadJobs(object):
+    """Data loads, indexed in the background
+
+    The status of every job is written to a file of its own, thus it is
+    reported by any of the (gunicorn) workers sharing the directory,
+    while the job is run by the worker it was submitted to.
+
+    Jobs loading the same index are run one at a time, by a thread of
+    their own, and across the workers too, as two loads racing to replace
+    an index would leave it with either of them. Jobs loading different
+    indices are run concurrently.
+
+    Args:
+        directory (str): Directory holding the job statuses and locks
+        retention (float): Seconds the status of a finished job is kept
+
+    Example:
+
+        jobs = LoadJobs("/tmp/os2phonebook-load-jobs")
+        job = jobs.create("employees", "full", total=421)
+
+        jobs.submit(job, lambda progress: load(progress))
+        ...
+        jobs.get(job["id"])["state"]
+
+    """
+
+    def __init__(self, directory: str, retention: float = JOB_RETENTION):
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.retention = retention
+        self._executors = {}
+        self._executors_lock = Lock()
+
+    def _status_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def create(self, alias: str, mode: str, total: int) -> dict:
+        """Create a queued load job
+
+        Args:
+            alias (str): Name of the index alias, e.g. `employees`
+            mode (str): Load mode, `full` or `delta`
+            total (int): Number of documents to load
+
+        Returns:
+            dict: Job status.
+
+        """
+        self.prune()
+
+        job = {
+            "id": str(uuid4()),
+            "alias": alias,
+            "mode": mode,
+            "state": "queued",
+            "created": datetime.utcnow().isoformat(timespec="seconds"),
+            "started": None,
+            "finished": None,
+            "total": total,
+            "processed": 0,
+            "indexed": 0,
+            "failed": 0,
+            "docs_per_second": None,
+            "errors": [],
+            "result": None,
+            "pid": os.getpid(),
+        }
+        self.save(job)
+
+        return job
+
+    def save(self, job: dict) -> None:
+        """Write the status of a job, replacing the previous status"""
+        filename = self._status_path(job["id"])
+        temporary_filename = f"{filename}.{os.getpid()}.tmp"
+
+        with open(temporary_filename, "w") as file:
+            json.dump(job, file)
+
+        os.replace(temporary_filename, filename)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Read the status of a job
+
+        Jobs left unfinished by a worker which has since exited
+        are reported as failed.
+
+        Args:
+            job_id (str): Job identifier
+
+        Returns:
+            dict: Job status or `None` if there is no such job.
+
+        """
+        try:
+            with open(self._status_path(job_id)) as file:
+                job = json.load(file)
+        except FileNotFoundError:
+            return None
+
+        unfinished = job["state"] in ("queued", "running")
+        if unfinished and not process_alive(job["pid"]):
+            job["state"] = "failed"
+            job["errors"].append("The worker running the job has exited")
+
+        return job
+
+    def prune(self) -> None:
+        """Delete the statuses of jobs older than the retention"""
+        expired = time() - self.retention
+
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                if entry.stat().st_mtime < expired:
+                    os.remove(entry.path)
+
+    @contextmanager
+    def lock(self, alias: str) -> Iterator[None]:
+        """Lock an index against the loads of other workers
+
+        Waits for the loads of the index in other workers to finish,
+        then holds a lock on `<alias>.lock` for the duration of a load.
+
+        Args:
+            alias (str): Name of the index alias, e.g. `employees`
+
+        """
+        lock_path = os.path.join(self.directory, f"{alias}.lock")
+
+        with open(lock_path, "a") as file:
+            # Polled, as a blocking lock would block every greenlet
+            # of a gevent worker
+            while True:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    sleep(LOCK_POLL_INTERVAL)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def submit(
+        self, job: dict, run: Callable[[Callable[[int], None]], Dict]
+    ) -> Future:
+        """Run a job in the background
+
+        Args:
+            job (dict): Job status, see `create`
+            run (func): Loads the documents, called with a progress
+                function taking the number of documents processed so far.
+                Returns the load statistics, `indexed` and `total`.
+
+        Returns:
+            :obj:`Future`: Completed once the job has finished.
+
+        """
+        alias = job["alias"]
+
+        with self._executors_lock:
+            if alias not in self._executors:
+                self._executors[alias] = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"load-job-{alias}"
+                )
+            executor = self._executors[alias]
+
+        return executor.submit(self._run, job, run)
+
+    def _run(self, job: dict, run) -> dict:
+        with self.lock(job["alias"]):
+            start = perf_counter()
+
+            job["state"] = "running"
+            job["started"] = datetime.utcnow().isoformat(timespec="seconds")
+            self.save(job)
+
+            def progress(processed: int) -> None:
+                job["processed"] = processed
+                job["docs_per_second"] = round(
+                    processed / (perf_counter() - start), 1
+                )
+                self.save(job)
+
+            try:
+                result = run(progress)
+            except Exception as error:
+                log.exception(f"LOAD_JOB_FAILED id={job['id']}")
+                job["state"] = "failed"
+                job["errors"] = describe_errors(error)
+
+                # Bulk errors carry the documents which failed to index,
+                # the others processed so far were indexed
+                failed = len(getattr(error, "errors", []))
+                job["failed"] = failed
+                job["indexed"] = max(job["processed"] - failed, 0)
+            else:
+                job["state"] = "succeeded"
+                job["result"] = result
+                job["processed"] = result["total"]
+                job["indexed"] = result["indexed"]
+                job["failed"] = result["total"] - result["indexed"]
+                job["docs_per_second"] = round(
+                    result["total"] / (perf_counter() - start), 1
+                )
+
+            job["finished"] = datetime.utcnow().isoformat(timespec="seconds")
+            self.save(job)
+
+        log.info(
+            f"LOAD_JOB_FINISHED id={job['id']} alias={job['alias']} "
+            f"state={job['state']} indexed={job['indexed']}/{job['total']}"
+        )
+        return job
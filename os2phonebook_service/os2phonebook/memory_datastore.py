@@ -0,0 +1,1434 @@
+import re
+import json
+from fnmatch import fnmatchcase
+from bisect import bisect_right
+from heapq import nsmallest
+from itertools import count
+from math import log
+from operator import itemgetter
+from threading import RLock
+from time import perf_counter
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from elasticsearch.exceptions import (
+    HTTP_EXCEPTIONS,
+    NotFoundError,
+    TransportError,
+)
+from os2phonebook import metrics, timing
+from os2phonebook.datastore import DataStore
+
+# An in-memory stand-in for Elasticsearch.
+#
+# The store answers the requests of the Elasticsearch client used by the
+# `DataStore` with responses shaped as those of Elasticsearch, thus the
+# query builders and hit processors of the `DataStore` are used as is.
+# Only the subset of the query DSL generated by the `DataStore` is
+# emulated, see `MemoryIndex`.
+
+# Words as split by the standard analyzer, lowercased
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Subfields of a `search_as_you_type` field, searched on the field itself
+SHINGLE_SUBFIELDS = ("._2gram", "._3gram", "._index_prefix")
+
+# Default number of hits and inner hits, as in Elasticsearch
+DEFAULT_SIZE = 10
+DEFAULT_INNER_HITS_SIZE = 3
+
+# Bonus score of a multi word match in the order searched,
+# standing in for the shingle subfields of `search_as_you_type`
+PHRASE_BONUS = 1.0
+
+Key = Union[str, Tuple[str, int]]
+
+_MISSING = object()
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a text into lowercased words"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def raise_error(status: int, error_type: str, reason: str, ignore=()):
+    """Raise an error as raised by the Elasticsearch client
+
+    Args:
+        status (int): HTTP status code
+        error_type (str): Elasticsearch error type
+        reason (str): Error description
+        ignore (tuple): Status codes to return the error for, rather than
+            raising it, see the `ignore` parameter of the client.
+
+    Returns:
+        dict: Error response, if the status is ignored.
+
+    Raises:
+        TransportError: Otherwise, e.g. `NotFoundError` for status 404.
+
+    """
+    info = {"error": {"type": error_type, "reason": reason}, "status": status}
+
+    if status in ignore:
+        return info
+
+    raise HTTP_EXCEPTIONS.get(status, TransportError)(status, error_type, info)
+
+
+def field_values(value, path: List[str]) -> list:
+    """Values at a dotted path of a document, with arrays flattened"""
+    if isinstance(value, list):
+        return [item for entry in value for item in field_values(entry, path)]
+
+    if not path:
+        return [] if value is None else [value]
+
+    if not isinstance(value, dict) or path[0] not in value:
+        return []
+
+    return field_values(value[path[0]], path[1:])
+
+
+def copy_value(value):
+    """Copy a document, documents are never handed out by reference"""
+    if isinstance(value, dict):
+        return {key: copy_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_value(item) for item in value]
+    return value
+
+
+def source_filter(source) -> Optional[Union[bool, dict]]:
+    """Parse the `_source` parameter of a request into an include tree
+
+    Args:
+        source (Any): `True`, `False`, a field, a list of fields or
+            a dict with a list of `includes`.
+
+    Returns:
+        Union[bool, dict]: `True` to include the entire document, `False`
+            to include nothing or the included fields as a tree, e.g.
+            `{"uuid": True, "addresses": {"PHONE": True}}`.
+
+    """
+    if isinstance(source, bool):
+        return source
+
+    if isinstance(source, dict):
+        source = source.get("includes", True)
+        if isinstance(source, bool):
+            return source
+
+    if isinstance(source, str):
+        source = [source]
+
+    tree = {}
+    for field in source:
+        node = tree
+        *parents, name = field.split(".")
+        for parent in parents:
+            child = node.setdefault(parent, {})
+            if child is True:
+                break
+            node = child
+        else:
+            node[name] = True
+
+    return tree
+
+
+def filter_source(value, tree):
+    """Copy the fields of a document included by an include tree"""
+    if tree is True:
+        return copy_value(value)
+
+    if isinstance(value, list):
+        items = [filter_source(item, tree) for item in value]
+        return [item for item in items if item is not _MISSING]
+
+    if not isinstance(value, dict):
+        return _MISSING
+
+    result = {}
+    for name, subtree in tree.items():
+        if name in value:
+            filtered = filter_source(value[name], subtree)
+            if filtered is not _MISSING:
+                result[name] = filtered
+
+    return result
+
+
+def clause_list(clauses) -> list:
+    """Clauses of a `bool` query occurrence type, a clause or a list"""
+    if clauses is None:
+        return []
+    if isinstance(clauses, dict):
+        return [clauses]
+    return list(clauses)
+
+
+def field_clause(clause: dict, value_key: str = "query") -> Tuple[str, dict]:
+    """Split a field query, e.g. `{"name": "Jan"}`, into field and options"""
+    ((field, options),) = clause.items()
+
+    if not isinstance(options, dict):
+        options = {value_key: options}
+
+    return field, options
+
+
+class Descending(object):
+    """Sort key wrapper reversing the order of a value"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return other.value > self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def sort_entry(value, order: str) -> tuple:
+    """Sort key of a value, missing values sort last in either order"""
+    return (value is None, Descending(value) if order == "desc" else value)
+
+
+class FieldIndex(object):
+    """Inverted and prefix index of a single field
+
+    Text fields are split into lowercased words, keyword fields are indexed
+    as is. Every prefix of a word is indexed too, thus prefix queries are
+    lookups, as for the `search_as_you_type` fields of Elasticsearch.
+
+    Args:
+        keyword (bool): Whether values are indexed verbatim
+
+    """
+
+    def __init__(self, keyword: bool = False):
+        self.keyword = keyword
+
+        # Words of every value by key, in order
+        self.values = {}
+        self.postings = defaultdict(set)
+        self.prefixes = defaultdict(set)
+
+    def analyze(self, value) -> List[str]:
+        """Split a value into the words indexed or searched"""
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+
+        if self.keyword:
+            return [str(value)]
+
+        return tokenize(str(value))
+
+    def add(self, key: Key, values: list) -> None:
+        """Index the values of a document"""
+        analyzed = [self.analyze(value) for value in values]
+        analyzed = [words for words in analyzed if words]
+        if not analyzed:
+            return
+
+        self.values[key] = analyzed
+        for words in analyzed:
+            for word in words:
+                self.postings[word].add(key)
+                for end in range(1, len(word) + 1):
+                    self.prefixes[word[:end]].add(key)
+
+    def remove(self, key: Key) -> None:
+        """Remove the values of a document from the index"""
+        for words in self.values.pop(key, ()):
+            for word in words:
+                self._discard(self.postings, word, key)
+                for end in range(1, len(word) + 1):
+                    self._discard(self.prefixes, word[:end], key)
+
+    def _discard(self, index: dict, word: str, key: Key) -> None:
+        keys = index.get(word)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[word]
+
+    def idf(self, word: str) -> float:
+        """Inverse document frequency of a word, as in BM25"""
+        frequency = len(self.postings.get(word, ()))
+
+        return log(
+            1 + (len(self.values) - frequency + 0.5) / (frequency + 0.5)
+        )
+
+    def term(self, word: str) -> Tuple[set, float]:
+        """Documents containing a word and its score, the word's rarity"""
+        keys = self.postings.get(word, set())
+
+        return keys, self.idf(word) if keys else 0.0
+
+    def prefix(self, prefix: str) -> Tuple[set, float]:
+        """Documents containing a word starting with the prefix
+
+        Prefixes are scored constant, as the prefix queries of Elasticsearch.
+
+        """
+        return self.prefixes.get(prefix, set()), 1.0
+
+    def phrase(self, key: Key, words: List[str], prefix: bool) -> bool:
+        """Whether a value of a document contains the words in order
+
+        Args:
+            key (Key): Document key
+            words (List[str]): Words to find, next to each other
+            prefix (bool): Whether the last word may be a prefix
+
+        """
+        *leading, last = words
+
+        for value in self.values.get(key, ()):
+            end = len(value) - len(leading)
+            for start in range(end):
+                stop = start + len(leading)
+                if value[start:stop] != leading:
+                    continue
+                if value[stop] == last or (
+                    prefix and value[stop].startswith(last)
+                ):
+                    return True
+
+        return False
+
+
+class MemoryIndex(object):
+    """Documents of an index, searched with a subset of the query DSL
+
+    Emulated queries:
+        * `match_all`, `match_none`, `exists`
+        * `term` and `prefix`
+        * `match`, `match_bool_prefix` and `match_phrase_prefix`
+        * `multi_match` of type `bool_prefix`, the shingle subfields of
+          `search_as_you_type` fields rank matches in the order searched
+        * `bool` with `must`, `filter`, `should` and `must_not`
+        * `nested` with `inner_hits`
+
+    Fields are indexed on the first query using them, see `FieldIndex`.
+    Keyword and nested fields are taken from the mappings of the index,
+    any other field is searched as text, `<field>.keyword` as keyword.
+
+    Scores are the sum of the inverse document frequency of every word
+    matched, thus rare words rank higher, but they are not comparable
+    to the scores of Elasticsearch.
+
+    Args:
+        name (str): Name of the index
+        definition (dict): Index definition (settings and mappings)
+
+    """
+
+    def __init__(self, name: str, definition: dict = None):
+        self.name = name
+        self.definition = definition or {}
+
+        properties = self.definition.get("mappings", {}).get("properties", {})
+        self.keyword_fields = {
+            field
+            for field, mapping in properties.items()
+            if mapping.get("type") == "keyword"
+        }
+        self.nested_paths = {
+            field
+            for field, mapping in properties.items()
+            if mapping.get("type") == "nested"
+        }
+
+        self.documents = {}
+        self.sequence = {}
+        self.fields = {}
+        self.sort_values = {}
+        self.orderings = {}
+
+        self.lock = RLock()
+        self._counter = count()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def put(self, identifier: str, document: dict) -> bool:
+        """Add or replace a document
+
+        Returns:
+            bool: Whether the document was added rather than replaced.
+
+        """
+        with self.lock:
+            created = self.remove(identifier) is None
+
+            self.documents[identifier] = document
+            self.sequence[identifier] = next(self._counter)
+            for field, index in self.fields.items():
+                self._index_field(field, index, identifier, document)
+            for field, values in self.sort_values.items():
+                values[identifier] = self._first_value(field, document)
+            self.orderings.clear()
+
+        return created
+
+    def remove(self, identifier: str) -> Optional[dict]:
+        """Remove a document
+
+        Returns:
+            dict: The removed document, `None` if there was none.
+
+        """
+        with self.lock:
+            document = self.documents.pop(identifier, None)
+            if document is None:
+                return None
+
+            del self.sequence[identifier]
+            for field, index in self.fields.items():
+                for key in self._keys(field, identifier, document):
+                    index.remove(key)
+            for values in self.sort_values.values():
+                values.pop(identifier, None)
+            self.orderings.clear()
+
+        return document
+
+    def _nested_path(self, field: str) -> Optional[str]:
+        """The nested path a field is part of, if any"""
+        for path in self.nested_paths:
+            if field.startswith(path + "."):
+                return path
+        return None
+
+    def _nested_objects(self, path: str, document: dict) -> list:
+        return field_values(document, path.split("."))
+
+    def _keys(self, field: str, identifier: str, document: dict) -> list:
+        """Keys of a document in a field index, one per nested object"""
+        path = self._nested_path(field)
+        if path is None:
+            return [identifier]
+
+        return [
+            (identifier, offset)
+            for offset in range(len(self._nested_objects(path, document)))
+        ]
+
+    def _index_field(
+        self, field: str, index: FieldIndex, identifier: str, document: dict
+    ) -> None:
+        if field.endswith(".keyword"):
+            field = field[: -len(".keyword")]
+
+        path = self._nested_path(field)
+        if path is None:
+            index.add(identifier, field_values(document, field.split(".")))
+            return
+
+        depth = path.count(".") + 1
+        subfield = field.split(".")[depth:]
+        for offset, nested in enumerate(self._nested_objects(path, document)):
+            index.add((identifier, offset), field_values(nested, subfield))
+
+    def field(self, field: str) -> FieldIndex:
+        """The index of a field, indexing every document on first use"""
+        index = self.fields.get(field)
+        if index is not None:
+            return index
+
+        with self.lock:
+            if field not in self.fields:
+                keyword = field in self.keyword_fields or field.endswith(
+                    ".keyword"
+                )
+                index = FieldIndex(keyword)
+                for identifier, document in self.documents.items():
+                    self._index_field(field, index, identifier, document)
+                self.fields[field] = index
+
+        return self.fields[field]
+
+    def all_keys(self, nested: Optional[str]) -> Iterable[Key]:
+        """Every document, or every nested object of a path"""
+        if nested is None:
+            return list(self.documents)
+
+        return [
+            (identifier, offset)
+            for identifier, document in self.documents.items()
+            for offset in range(len(self._nested_objects(nested, document)))
+        ]
+
+    def _field_index(
+        self, field: str, nested: Optional[str]
+    ) -> Optional[FieldIndex]:
+        """The index of a field, if the field is searchable in the context
+
+        Fields of nested objects are only searchable by a `nested` query,
+        just as fields outside of the nested objects are not.
+
+        """
+        if self._nested_path(field) != nested:
+            return None
+
+        return self.field(field)
+
+    def evaluate(
+        self, query: dict, nested: Optional[str], inner_hits: dict
+    ) -> Dict[Key, float]:
+        """Score of every document matching a query
+
+        Args:
+            query (dict): Elasticsearch query
+            nested (str): Nested path queried, `None` for the documents
+            inner_hits (dict): Collects the matches of `nested` queries
+                with `inner_hits`, by name.
+
+        Returns:
+            dict: Score by document key
+
+        Raises:
+            RequestError: If the query is not supported.
+
+        """
+        ((query_type, clause),) = query.items()
+
+        method = getattr(self, f"_query_{query_type}", None)
+        if method is None:
+            raise_error(
+                400, "parsing_exception", f"Unsupported query [{query_type}]"
+            )
+
+        return method(clause, nested, inner_hits)
+
+    def _query_match_all(self, clause, nested, inner_hits):
+        return {key: 1.0 for key in self.all_keys(nested)}
+
+    def _query_match_none(self, clause, nested, inner_hits):
+        return {}
+
+    def _query_exists(self, clause, nested, inner_hits):
+        index = self._field_index(clause["field"], nested)
+        if index is None:
+            return {}
+
+        return {key: 1.0 for key in index.values}
+
+    def _query_term(self, clause, nested, inner_hits):
+        field, options = field_clause(clause, "value")
+        index = self._field_index(field, nested)
+        if index is None:
+            return {}
+
+        return {key: 1.0 for key in index.postings.get(options["value"], ())}
+
+    def _query_prefix(self, clause, nested, inner_hits):
+        field, options = field_clause(clause, "value")
+        index = self._field_index(field, nested)
+        if index is None:
+            return {}
+
+        keys, score = index.prefix(options["value"])
+        return dict.fromkeys(keys, score)
+
+    def _match_words(
+        self,
+        index: FieldIndex,
+        words: List[str],
+        operator: str,
+        prefix_last: bool,
+    ) -> Dict[Key, float]:
+        """Documents matching any or all words, the last as a prefix"""
+        matches = [index.term(word) for word in words]
+        if prefix_last:
+            matches[-1] = index.prefix(words[-1])
+
+        # Every document matching all words has the same score
+        if operator.lower() == "and":
+            keys = set.intersection(*(keys for keys, _ in matches))
+            return dict.fromkeys(keys, sum(score for _, score in matches))
+
+        scores = defaultdict(float)
+        for keys, score in matches:
+            for key in keys:
+                scores[key] += score
+
+        return dict(scores)
+
+    def _query_match(self, clause, nested, inner_hits):
+        field, options = field_clause(clause)
+        index = self._field_index(field, nested)
+        if index is None:
+            return {}
+
+        words = index.analyze(options["query"])
+        if not words:
+            return {}
+
+        return self._match_words(
+            index, words, options.get("operator", "or"), False
+        )
+
+    def _query_match_bool_prefix(self, clause, nested, inner_hits):
+        field, options = field_clause(clause)
+        index = self._field_index(field, nested)
+        if index is None:
+            return {}
+
+        words = index.analyze(options["query"])
+        if not words:
+            return {}
+
+        return self._match_words(
+            index, words, options.get("operator", "or"), True
+        )
+
+    def _query_match_phrase_prefix(self, clause, nested, inner_hits):
+        field, options = field_clause(clause)
+        index = self._field_index(field, nested)
+        if index is None:
+            return {}
+
+        words = index.analyze(options["query"])
+        if not words:
+            return {}
+
+        candidates = self._match_words(index, words, "and", True)
+        if len(words) == 1:
+            return candidates
+
+        return {
+            key: score
+            for key, score in candidates.items()
+            if index.phrase(key, words, prefix=True)
+        }
+
+    def _query_multi_match(self, clause, nested, inner_hits):
+        if clause.get("type", "best_fields") != "bool_prefix":
+            raise_error(
+                400,
+                "parsing_exception",
+                f"Unsupported multi_match type [{clause.get('type')}]",
+            )
+
+        # The shingle subfields are searched as the field itself
+        fields = {}
+        for field in clause["fields"]:
+            field = field.split("^")[0]
+            shingles = field.endswith(SHINGLE_SUBFIELDS)
+            if shingles:
+                field = field.rsplit(".", 1)[0]
+            fields[field] = fields.get(field, False) or shingles
+
+        scores = defaultdict(float)
+        for field, shingles in fields.items():
+            index = self._field_index(field, nested)
+            if index is None:
+                continue
+
+            words = index.analyze(clause["query"])
+            if not words:
+                continue
+
+            matches = self._match_words(
+                index, words, clause.get("operator", "or"), True
+            )
+            for key, score in matches.items():
+                if shingles and len(words) > 1:
+                    if index.phrase(key, words, prefix=True):
+                        score += PHRASE_BONUS * len(words)
+                scores[key] += score
+
+        return dict(scores)
+
+    def _query_bool(self, clause, nested, inner_hits):
+        must = [
+            self.evaluate(query, nested, inner_hits)
+            for query in clause_list(clause.get("must"))
+        ]
+        filters = [
+            self.evaluate(query, nested, inner_hits)
+            for query in clause_list(clause.get("filter"))
+        ]
+        should = [
+            self.evaluate(query, nested, inner_hits)
+            for query in clause_list(clause.get("should"))
+        ]
+        must_not = [
+            self.evaluate(query, nested, inner_hits)
+            for query in clause_list(clause.get("must_not"))
+        ]
+
+        required = must + filters
+        minimum_should_match = int(
+            clause.get(
+                "minimum_should_match", 0 if required or not should else 1
+            )
+        )
+
+        if required:
+            candidates = set(required[0]).intersection(*required[1:])
+        elif minimum_should_match > 0:
+            candidates = set().union(*should)
+        else:
+            candidates = self.all_keys(nested)
+
+        scores = {}
+        for key in candidates:
+            if any(key in excluded for excluded in must_not):
+                continue
+
+            matched = [match[key] for match in should if key in match]
+            if len(matched) < minimum_should_match:
+                continue
+
+            scores[key] = sum(match[key] for match in must) + sum(matched)
+
+        if not required and not should:
+            scores = {key: 1.0 for key in scores}
+
+        return scores
+
+    def _query_nested(self, clause, nested, inner_hits):
+        path = clause["path"]
+        matches = self.evaluate(clause["query"], path, inner_hits)
+
+        scores_by_document = defaultdict(list)
+        for (identifier, _), score in matches.items():
+            scores_by_document[identifier].append(score)
+
+        if "inner_hits" in clause:
+            options = clause["inner_hits"]
+            inner_hits[options.get("name", path)] = (path, matches, options)
+
+        return {
+            identifier: sum(scores) / len(scores)
+            for identifier, scores in scores_by_document.items()
+        }
+
+    def inner_hits(
+        self, identifier: str, document: dict, inner_hits: dict
+    ) -> dict:
+        """The `inner_hits` of a hit, see `_query_nested`"""
+        result = {}
+
+        for name, (path, matches, options) in inner_hits.items():
+            offsets = sorted(
+                (
+                    (-score, offset)
+                    for (match_identifier, offset), score in matches.items()
+                    if match_identifier == identifier
+                )
+            )
+            start = int(options.get("from", 0))
+            size = int(options.get("size", DEFAULT_INNER_HITS_SIZE))
+
+            tree = source_filter(options.get("_source", True))
+            if isinstance(tree, dict):
+                for part in path.split("."):
+                    tree = tree.get(part, {}) if tree is not True else True
+
+            objects = self._nested_objects(path, document)
+            hits = []
+            stop = start + size
+            for score, offset in offsets[start:stop]:
+                hit = {
+                    "_index": self.name,
+                    "_type": "_doc",
+                    "_id": identifier,
+                    "_nested": {"field": path, "offset": offset},
+                    "_score": -score,
+                }
+                if tree is not False:
+                    hit["_source"] = filter_source(objects[offset], tree)
+                hits.append(hit)
+
+            result[name] = {
+                "hits": {
+                    "total": {"value": len(offsets), "relation": "eq"},
+                    "max_score": -offsets[0][0] if offsets else None,
+                    "hits": hits,
+                }
+            }
+
+        return result
+
+    def sort_value(self, field: str, identifier: str):
+        """First value of a field of a document, to sort the document by
+
+        The values are collected on the first sort by the field
+        and kept up to date from then on, as the field indexes.
+
+        """
+        values = self.sort_values.get(field)
+        if values is None:
+            with self.lock:
+                values = {
+                    identifier: self._first_value(field, document)
+                    for identifier, document in self.documents.items()
+                }
+                self.sort_values[field] = values
+
+        return values.get(identifier)
+
+    def _first_value(self, field: str, document: dict):
+        found = field_values(document, field.split("."))
+        return found[0] if found else None
+
+    def ordering(self, field: str, order: str) -> Tuple[list, list]:
+        """Every document, ordered by a field
+
+        The ordering is kept until the next write to the index,
+        thus a search ordered by the same field, e.g. the next page,
+        starts right after the `search_after` key.
+
+        Returns:
+            Tuple[list, list]: Sort keys and identifiers, in order.
+
+        """
+        ordering = self.orderings.get((field, order))
+        if ordering is None:
+            with self.lock:
+                entries = sorted(
+                    (
+                        sort_entry(self.sort_value(field, identifier), order),
+                        sequence,
+                        identifier,
+                    )
+                    for identifier, sequence in self.sequence.items()
+                )
+                ordering = (
+                    [key for key, _, _ in entries],
+                    [identifier for _, _, identifier in entries],
+                )
+                self.orderings[(field, order)] = ordering
+
+        return ordering
+
+    def rank(
+        self,
+        scores: Dict[Key, float],
+        sort: list,
+        after: tuple = None,
+        limit: int = None,
+    ) -> list:
+        """Order the matches of a search
+
+        Args:
+            scores (dict): Score by document, see `evaluate`
+            sort (list): Field and order to sort by, by score if empty
+            after (tuple): Sort key to start after, see `search_after`
+            limit (int): Maximum number of matches, `None` for every match
+
+        Returns:
+            list: Sort key, identifier and score of the matches, in order.
+
+        """
+        if len(sort) == 1 and sort[0][0] != "_score":
+            keys, identifiers = self.ordering(*sort[0])
+            start = 0 if after is None else bisect_right(keys, after[0])
+
+            ranked = []
+            for position in range(start, len(keys)):
+                identifier = identifiers[position]
+                if identifier in scores:
+                    key = (keys[position],)
+                    ranked.append((key, identifier, scores[identifier]))
+                    if limit is not None and len(ranked) >= limit:
+                        break
+
+            return ranked
+
+        if not sort:
+            # By score, then in the order indexed
+            sequence = self.sequence
+
+            def by_score(match):
+                return (-match[1], sequence[match[0]])
+
+            if limit is None:
+                matches = sorted(scores.items(), key=by_score)
+            else:
+                matches = nsmallest(limit, scores.items(), key=by_score)
+
+            return [
+                ((-score, sequence[identifier]), identifier, score)
+                for identifier, score in matches
+            ]
+
+        ranked = [
+            (self.sort_key(identifier, score, sort)[0], identifier, score)
+            for identifier, score in scores.items()
+        ]
+        if after is not None:
+            ranked = [match for match in ranked if match[0] > after]
+
+        if limit is None:
+            return sorted(ranked, key=itemgetter(0))
+
+        return nsmallest(limit, ranked, key=itemgetter(0))
+
+    def sort_key(self, identifier: str, score: float, sort: list) -> tuple:
+        """Sort key and sort values of a hit, missing values sort last
+
+        Returns:
+            tuple: The sort key and the `sort` values of the hit.
+
+        """
+        values = [
+            score if field == "_score" else self.sort_value(field, identifier)
+            for field, _ in sort
+        ]
+        key = tuple(
+            sort_entry(value, order) for value, (_, order) in zip(values, sort)
+        )
+
+        return key, values
+
+
+class MemoryIndices(object):
+    """Index lifecycle requests of a `MemoryStore`
+
+    Answers the requests of the `indices` namespace of the
+    Elasticsearch client used by the `DataStore`.
+
+    """
+
+    def __init__(self, store: "MemoryStore"):
+        self.store = store
+
+    def create(self, index: str, body: dict = None, ignore=(), **kwargs):
+        with self.store.lock:
+            if (
+                index in self.store.memory_indices
+                or index in self.store.aliases
+            ):
+                return raise_error(
+                    400,
+                    "resource_already_exists_exception",
+                    f"index [{index}] already exists",
+                    ignore,
+                )
+
+            self.store.memory_indices[index] = MemoryIndex(index, body)
+
+        return {"acknowledged": True, "index": index}
+
+    def delete(self, index: str, ignore=(), **kwargs):
+        with self.store.lock:
+            names = self.store.matching_indices(index)
+            if not names:
+                return raise_error(
+                    404, "index_not_found_exception", index, ignore
+                )
+
+            for name in names:
+                del self.store.memory_indices[name]
+                for indices in self.store.aliases.values():
+                    indices.discard(name)
+
+            self.store.drop_empty_aliases()
+
+        return {"acknowledged": True}
+
+    def exists(self, index: str, **kwargs) -> bool:
+        return bool(
+            self.store.matching_indices(index) or index in self.store.aliases
+        )
+
+    def exists_alias(self, name: str, **kwargs) -> bool:
+        return name in self.store.aliases
+
+    def get_alias(self, name: str, **kwargs) -> dict:
+        if name not in self.store.aliases:
+            raise_error(404, "aliases_not_found_exception", name)
+
+        return {
+            index: {"aliases": {name: {}}}
+            for index in sorted(self.store.aliases[name])
+        }
+
+    def get(self, index: str, **kwargs) -> dict:
+        names = self.store.resolve(index)
+
+        return {
+            name: {
+                "aliases": {
+                    alias: {}
+                    for alias, indices in self.store.aliases.items()
+                    if name in indices
+                },
+                **self.store.memory_indices[name].definition,
+            }
+            for name in names
+        }
+
+    def update_aliases(self, body: dict, **kwargs) -> dict:
+        with self.store.lock:
+            aliases = {
+                alias: set(indices)
+                for alias, indices in self.store.aliases.items()
+            }
+            indices = dict(self.store.memory_indices)
+
+            for action in body["actions"]:
+                ((action_type, options),) = action.items()
+                index = options["index"]
+
+                if index not in indices:
+                    raise_error(404, "index_not_found_exception", index)
+
+                if action_type == "add":
+                    aliases.setdefault(options["alias"], set()).add(index)
+                elif action_type == "remove":
+                    aliases.get(options["alias"], set()).discard(index)
+                elif action_type == "remove_index":
+                    del indices[index]
+                else:
+                    raise_error(
+                        400,
+                        "illegal_argument_exception",
+                        f"Unsupported alias action [{action_type}]",
+                    )
+
+            self.store.memory_indices = indices
+            self.store.aliases = aliases
+            self.store.drop_empty_aliases()
+
+        return {"acknowledged": True}
+
+    def put_settings(self, index: str, body: dict, **kwargs) -> dict:
+        # Documents are searchable as soon as they are stored
+        self.store.resolve(index)
+        return {"acknowledged": True}
+
+    def refresh(self, index: str = None, **kwargs) -> dict:
+        # Documents are searchable as soon as they are stored
+        if index is not None:
+            self.store.resolve(index)
+        return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+
+class MemoryStore(object):
+    """In-memory stand-in for the Elasticsearch client
+
+    Holds indices and aliases in the memory of the process and answers
+    the requests of the `DataStore` with responses shaped as those of
+    Elasticsearch, including its errors, e.g. `NotFoundError`.
+
+    The store is local to the process, as such every (gunicorn) worker
+    holds its own copy of the data, and loads are only seen by the worker
+    serving them. Serve the memory backend by a single worker.
+
+    Example:
+
+        store = MemoryStore()
+        db = MemoryDataStore(store)
+
+    """
+
+    def __init__(self):
+        # Indices by name and the names of the indices by alias
+        self.memory_indices = {}
+        self.aliases = {}
+        self.lock = RLock()
+
+        # Index lifecycle requests, as `Elasticsearch.indices`
+        self.indices = MemoryIndices(self)
+
+    def matching_indices(self, pattern: str) -> List[str]:
+        """Names of the indices matching a name or a wildcard pattern"""
+        names = []
+        for part in pattern.split(","):
+            if "*" in part:
+                names.extend(
+                    sorted(
+                        name
+                        for name in self.memory_indices
+                        if fnmatchcase(name, part)
+                    )
+                )
+            elif part in self.memory_indices:
+                names.append(part)
+
+        return names
+
+    def resolve(self, index: str) -> List[str]:
+        """Names of the indices behind an index name, alias or pattern
+
+        Raises:
+            NotFoundError: If a name is neither an index nor an alias.
+
+        """
+        names = []
+        for part in index.split(","):
+            if part in self.aliases:
+                names.extend(sorted(self.aliases[part]))
+            elif "*" in part:
+                names.extend(self.matching_indices(part))
+            elif part in self.memory_indices:
+                names.append(part)
+            else:
+                raise_error(404, "index_not_found_exception", part)
+
+        return names
+
+    def drop_empty_aliases(self) -> None:
+        self.aliases = {
+            alias: indices
+            for alias, indices in self.aliases.items()
+            if indices
+        }
+
+    def _write_index(self, index: str) -> MemoryIndex:
+        """The index written to by name or alias, created if missing"""
+        with self.lock:
+            if index in self.aliases:
+                names = self.aliases[index]
+                if len(names) != 1:
+                    raise_error(
+                        400,
+                        "illegal_argument_exception",
+                        f"no write index is defined for alias [{index}]",
+                    )
+                (index,) = names
+
+            if index not in self.memory_indices:
+                self.memory_indices[index] = MemoryIndex(index)
+
+            return self.memory_indices[index]
+
+    def ping(self, **kwargs) -> bool:
+        return True
+
+    def info(self, **kwargs) -> dict:
+        return {"name": "memory", "version": {"number": "7.6.2"}}
+
+    def close(self) -> None:
+        pass
+
+    def get(self, index: str, id: str, **kwargs) -> dict:
+        """Retrieve a document by identifier
+
+        Raises:
+            NotFoundError: If the document or the index does not exist.
+
+        """
+        with timing.span("memory"):
+            for name in self.resolve(index):
+                document = self.memory_indices[name].documents.get(id)
+                if document is not None:
+                    return {
+                        "_index": name,
+                        "_type": "_doc",
+                        "_id": id,
+                        "found": True,
+                        "_source": copy_value(document),
+                    }
+
+        missing = {"_index": index, "_type": "_doc", "_id": id, "found": False}
+        raise NotFoundError(404, json.dumps(missing), missing)
+
+    def mget(self, body: dict, index: str = None, **kwargs) -> dict:
+        """Retrieve several documents by identifier"""
+        if "ids" in body:
+            requests = [{"_id": identifier} for identifier in body["ids"]]
+        else:
+            requests = body["docs"]
+
+        docs = []
+        with timing.span("memory"):
+            for request in requests:
+                name = request.get("_index", index)
+                document = None
+                if name in self.aliases or name in self.memory_indices:
+                    name = self.resolve(name)[0]
+                    document = self.memory_indices[name].documents.get(
+                        request["_id"]
+                    )
+
+                response = {
+                    "_index": name,
+                    "_type": "_doc",
+                    "_id": request["_id"],
+                }
+                if document is None:
+                    response["found"] = False
+                else:
+                    tree = source_filter(request.get("_source", True))
+                    response["found"] = True
+                    if tree is not False:
+                        response["_source"] = filter_source(document, tree)
+                docs.append(response)
+
+        return {"docs": docs}
+
+    def _hits(self, index: str, body: dict, all_hits: bool = False):
+        """Matching hits of a search, ordered and paged
+
+        Returns:
+            Tuple[int, float, list]: Total number of matches, the highest
+                score and the hits of the page.
+
+        """
+        query = body.get("query", {"match_all": {}})
+        sort = []
+        for spec in body.get("sort", []):
+            if isinstance(spec, str):
+                spec = {spec: "desc" if spec == "_score" else "asc"}
+            ((field, order),) = spec.items()
+            if isinstance(order, dict):
+                order = order.get("order", "asc")
+            sort.append((field, order))
+
+        after = None
+        if sort and "search_after" in body:
+            after = tuple(
+                sort_entry(value, order)
+                for value, (_, order) in zip(body["search_after"], sort)
+            )
+
+        start = int(body.get("from", 0))
+        stop = (
+            None if all_hits else start + int(body.get("size", DEFAULT_SIZE))
+        )
+
+        # The first matches of every index, merged
+        total = 0
+        max_score = None
+        matches = []
+        searched = []
+        for position, name in enumerate(self.resolve(index)):
+            memory_index = self.memory_indices[name]
+            inner_hits = {}
+            searched.append((memory_index, inner_hits))
+
+            with memory_index.lock:
+                scores = memory_index.evaluate(query, None, inner_hits)
+                ranked = memory_index.rank(scores, sort, after, stop)
+
+            total += len(scores)
+            if scores:
+                max_score = max(max_score or 0.0, max(scores.values()))
+            matches.extend(
+                (key, position, identifier, score)
+                for key, identifier, score in ranked
+            )
+
+        if len(searched) > 1:
+            matches.sort(key=itemgetter(0, 1))
+        matches = matches[start:stop]
+
+        tree = source_filter(body.get("_source", True))
+
+        hits = []
+        for _, position, identifier, score in matches:
+            memory_index, inner_hits = searched[position]
+            document = memory_index.documents.get(identifier)
+            if document is None:
+                # Deleted since the search
+                continue
+
+            hit = {
+                "_index": memory_index.name,
+                "_type": "_doc",
+                "_id": identifier,
+                "_score": None if sort else score,
+            }
+            if tree is not False:
+                hit["_source"] = filter_source(document, tree)
+            if sort:
+                _, hit["sort"] = memory_index.sort_key(identifier, score, sort)
+            if inner_hits:
+                hit["inner_hits"] = memory_index.inner_hits(
+                    identifier, document, inner_hits
+                )
+            hits.append(hit)
+
+        return total, max_score, hits
+
+    def search(self, body: dict = None, index: str = "_all", **kwargs):
+        """Search an index, see `MemoryIndex` for the queries emulated
+
+        Raises:
+            NotFoundError: If the index does not exist.
+            RequestError: If the query is not supported.
+
+        """
+        started = perf_counter()
+        with timing.span("memory"):
+            if index == "_all":
+                index = ",".join(self.memory_indices)
+            total, max_score, hits = self._hits(index, body or {})
+
+        return {
+            "took": int((perf_counter() - started) * 1000),
+            "timed_out": False,
+            "_shards": {
+                "total": 1,
+                "successful": 1,
+                "skipped": 0,
+                "failed": 0,
+            },
+            "hits": {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": max_score,
+                "hits": hits,
+            },
+        }
+
+    def msearch(self, body: list, index: str = None, **kwargs) -> dict:
+        """Run several searches, a header precedes every query"""
+        started = perf_counter()
+
+        responses = []
+        for header, query in zip(body[::2], body[1::2]):
+            try:
+                response = self.search(
+                    body=query, index=header.get("index", index)
+                )
+            except TransportError as error:
+                responses.append(dict(error.info, status=error.status_code))
+            else:
+                responses.append(dict(response, status=200))
+
+        return {
+            "took": int((perf_counter() - started) * 1000),
+            "responses": responses,
+        }
+
+    def scan(self, index: str, query: dict = None, **kwargs) -> Iterator[dict]:
+        """Every hit of a search, see `elasticsearch.helpers.scan`"""
+        _, _, hits = self._hits(index, query or {}, all_hits=True)
+
+        yield from hits
+
+    def index(
+        self, index: str, body: dict, id: str, refresh=None, **kwargs
+    ) -> dict:
+        """Add or replace a document, creating the index if missing"""
+        memory_index = self._write_index(index)
+        created = memory_index.put(id, copy_value(body))
+
+        return {
+            "_index": memory_index.name,
+            "_type": "_doc",
+            "_id": id,
+            "result": "created" if created else "updated",
+        }
+
+    def bulk(
+        self, actions: Iterable[dict], index: str = None
+    ) -> Iterator[Tuple[bool, dict]]:
+        """Apply bulk actions, see `elasticsearch.helpers.streaming_bulk`
+
+        Actions are `index` (default), `create`, `update` and `delete`.
+
+        Yields:
+            Tuple[bool, dict]: Whether each action succeeded and its result.
+
+        """
+        for action in actions:
+            operation = action.get("_op_type", "index")
+            identifier = action.get("_id")
+            memory_index = self._write_index(action.get("_index", index))
+
+            if "_source" in action:
+                source = action["_source"]
+            else:
+                source = {
+                    key: value
+                    for key, value in action.items()
+                    if not key.startswith("_")
+                }
+
+            status = 200
+            with memory_index.lock:
+                exists = identifier in memory_index.documents
+
+                if operation == "delete":
+                    status = 200 if memory_index.remove(identifier) else 404
+                elif operation == "create" and exists:
+                    status = 409
+                elif operation == "update":
+                    if not exists:
+                        status = 404
+                    else:
+                        document = dict(memory_index.documents[identifier])
+                        document.update(copy_value(source.get("doc", {})))
+                        memory_index.put(identifier, document)
+                elif operation in ("index", "create"):
+                    memory_index.put(identifier, copy_value(source))
+                    status = 200 if exists else 201
+                else:
+                    status = 400
+
+            yield 200 <= status < 300, {
+                operation: {
+                    "_index": memory_index.name,
+                    "_id": identifier,
+                    "status": status,
+                }
+            }
+
+
+class MemoryDataStore(DataStore):
+    """Datastore searching the memory of the process
+
+    Queries are generated exactly as by the :code:`DataStore`,
+    and answered by a :code:`MemoryStore` rather than Elasticsearch,
+    with inverted and prefix indexes standing in for the analyzers.
+
+    Intended for small installations and as a stand-in for Elasticsearch,
+    e.g. in benchmarks. The data is lost when the process exits.
+
+    Args:
+        db (:obj:`MemoryStore`): The in-memory store
+        cache (:obj:`SearchCache`): Optional cache for search results.
+
+    Example:
+
+        db = MemoryDataStore(MemoryStore())
+        db.reindex("employees", generator)
+
+        results = db.search_with_fallback("employee_by_name", "Riker")
+
+    """
+
+    client_class = MemoryStore
+
+    def _scan(self, index: str, query: dict) -> Iterator[dict]:
+        return self.db.scan(index=index, query=query)
+
+    @metrics.timed("bulk_insert_index")
+    def bulk_insert_index(self, index: str, generator, **bulk_options):
+        """Insert documents into a datastore index
+
+        The bulk options of `DataStore.bulk_insert_index` are accepted,
+        but there is nothing to send, thus they are ignored.
+
+        Args:
+            index (str): Name of the index
+            generator (func): Generator function, generating dicts.
+
+        Returns:
+            int, int: Number of documents indexed, documents processed.
+
+        """
+        indexed = 0
+        total = 0
+        for ok, _ in self.db.bulk(generator(), index=index):
+            indexed += ok
+            total += 1
+
+        return indexed, total
@@ -0,0 +1,286 @@
+import os
+import asyncio
+from time import perf_counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Iterable, Tuple
+from flask import Flask, Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# Metrics are aggregated across the (gunicorn) workers if the
+# environment variable `PROMETHEUS_MULTIPROC_DIR` points to a directory,
+# which must be emptied before the workers are started.
+
+# Search latencies are expected in the order of milliseconds
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Searches return at most 15 documents, see `DataStore.query_for_*`
+HITS_BUCKETS = (0, 1, 2, 5, 10, 15, 50, 100)
+
+DATASTORE_DURATION = Histogram(
+    "os2phonebook_datastore_duration_seconds",
+    "Latency of DataStore operations, including the Elasticsearch request",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DATASTORE_IN_PROGRESS = Gauge(
+    "os2phonebook_datastore_in_progress",
+    "DataStore operations in progress",
+    ["operation"],
+    multiprocess_mode="livesum",
+)
+
+SEARCH_DURATION = Histogram(
+    "os2phonebook_search_duration_seconds",
+    "Latency of searches, where pass `fallback` is an exact and a fuzzy "
+    "pass sent in one request",
+    ["search_type", "pass"],
+    buckets=LATENCY_BUCKETS,
+)
+
+SEARCH_TOOK = Histogram(
+    "os2phonebook_search_took_seconds",
+    "Time Elasticsearch reports to have spent on a search pass",
+    ["search_type", "pass"],
+    buckets=LATENCY_BUCKETS,
+)
+
+SEARCH_HITS = Histogram(
+    "os2phonebook_search_hits",
+    "Number of documents returned by a search pass",
+    ["search_type", "pass"],
+    buckets=HITS_BUCKETS,
+)
+
+SEARCH_RESULTS = Counter(
+    "os2phonebook_search_results_total",
+    "Searches with a fallback by the first pass that matched, "
+    "`none` if neither matched",
+    ["search_type", "matched"],
+)
+
+HTTP_DURATION = Histogram(
+    "os2phonebook_http_request_duration_seconds",
+    "Latency of HTTP requests by endpoint",
+    ["endpoint", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+HTTP_IN_PROGRESS = Gauge(
+    "os2phonebook_http_requests_in_progress",
+    "HTTP requests in progress by endpoint",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+
+
+def pass_label(fuzzy_search: bool) -> str:
+    """Label of a search pass
+
+    Args:
+        fuzzy_search (bool): Whether the pass is fuzzy
+
+    Returns:
+        str: `fuzzy` or `exact`
+
+    """
+    return "fuzzy" if fuzzy_search else "exact"
+
+
+def observe_search_pass(
+    search_type: str, fuzzy_search: bool, response: dict
+) -> None:
+    """Record the Elasticsearch time and hits of a search pass
+
+    Args:
+        search_type (str): Search type (see `DataStore.search_type_map`)
+        fuzzy_search (bool): Whether the pass is fuzzy
+        response (dict): Elasticsearch search response
+
+    """
+    labels = (search_type, pass_label(fuzzy_search))
+
+    if "took" in response:
+        SEARCH_TOOK.labels(*labels).observe(response["took"] / 1000)
+
+    hits = response.get("hits", {}).get("hits", [])
+    SEARCH_HITS.labels(*labels).observe(len(hits))
+
+
+def count_search_result(search_type: str, matched: str) -> None:
+    """Record which pass of a search with a fallback matched
+
+    The fuzzy-fallback rate is the rate of `matched="fuzzy"`
+    over the rate of all results of the search type.
+
+    Args:
+        search_type (str): Search type (see `DataStore.search_type_map`)
+        matched (str): `exact`, `fuzzy` or `none`
+
+    """
+    SEARCH_RESULTS.labels(search_type, matched).inc()
+
+
+def timed(operation: str):
+    """Decorate a DataStore method to record its latency
+
+    Both regular methods and coroutines are supported.
+
+    Args:
+        operation (str): Operation label, e.g. `get_employee`
+
+    Returns:
+        func: Method decorator
+
+    """
+
+    # The labelled metrics are created on the first call, not on import,
+    # as in multiprocess mode creating them writes to the metrics directory
+    # (see `PROMETHEUS_MULTIPROC_DIR`), which may not exist yet, e.g. when
+    # the datastore is imported by the cli.
+
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+
+            @wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                duration = DATASTORE_DURATION.labels(operation)
+                in_progress = DATASTORE_IN_PROGRESS.labels(operation)
+
+                with in_progress.track_inprogress(), duration.time():
+                    return await method(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            duration = DATASTORE_DURATION.labels(operation)
+            in_progress = DATASTORE_IN_PROGRESS.labels(operation)
+
+            with in_progress.track_inprogress(), duration.time():
+                return method(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def time_searches(search_types: Iterable[str], search_pass: str):
+    """Record the latency of a search request
+
+    With several search types searched in one request, e.g. by
+    `DataStore.search_everything`, the latency of the request is
+    recorded for each of them.
+
+    Args:
+        search_types (Iterable[str]): Search types (see
+            `DataStore.search_type_map`) searched in the request
+        search_pass (str): `exact`, `fuzzy` or `fallback`
+
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        duration = perf_counter() - start
+        for search_type in search_types:
+            SEARCH_DURATION.labels(search_type, search_pass).observe(duration)
+
+
+def start_request(endpoint: str) -> float:
+    """Record the start of an HTTP request
+
+    Args:
+        endpoint (str): Endpoint name, e.g. `routes.show_employee`
+
+    Returns:
+        float: Start time, to be passed on to `end_request`
+
+    """
+    HTTP_IN_PROGRESS.labels(endpoint).inc()
+    return perf_counter()
+
+
+def end_request(endpoint: str, method: str, status: int, start: float) -> None:
+    """Record the end of an HTTP request
+
+    Args:
+        endpoint (str): Endpoint name, e.g. `routes.show_employee`
+        method (str): HTTP method
+        status (int): HTTP status code
+        start (float): Start time as returned by `start_request`
+
+    """
+    HTTP_IN_PROGRESS.labels(endpoint).dec()
+    HTTP_DURATION.labels(endpoint, method, str(status)).observe(
+        perf_counter() - start
+    )
+
+
+def exposition() -> Tuple[bytes, str]:
+    """Render the metrics in the text exposition format
+
+    In multiprocess mode, the metrics of every worker are aggregated.
+
+    Returns:
+        Tuple[bytes, str]: Metrics and their content type
+
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app: Flask) -> None:
+    """Record the latency of the requests served by a Flask application
+
+    Args:
+        app (:obj:`Flask`): An instance of flask
+
+    """
+
+    @app.before_request
+    def start_request_timer():
+        # Requests not matching any route are not recorded
+        if request.endpoint is not None:
+            g.metrics_start = start_request(request.endpoint)
+
+    @app.after_request
+    def end_request_timer(response: Response) -> Response:
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            end_request(
+                request.endpoint, request.method, response.status_code, start
+            )
+        return response
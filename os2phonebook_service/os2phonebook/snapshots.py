@@ -0,0 +1,175 @@
+import os
+from uuid import uuid4
+from typing import Callable, Dict, Iterable, Tuple
+from elasticsearch.exceptions import NotFoundError
+from os2phonebook.backend import Backend
+from os2phonebook.helpers import dump_file, load_file, read_file_header
+
+# Index aliases with a snapshot of their last load
+SNAPSHOT_ALIASES = ("employees", "org_units")
+
+# Number of documents restored between progress reports
+PROGRESS_INTERVAL = 5000
+
+
+def snapshot_path(directory: str, alias: str) -> str:
+    """Path of the snapshot of the last load of an index
+
+    Args:
+        directory (str): Directory holding the snapshots
+        alias (str): Name of the index alias, e.g. `employees`
+
+    Returns:
+        str: Path of the snapshot, e.g. `/snapshots/employees.snapshot`
+
+    """
+    return os.path.join(directory, f"{alias}.snapshot")
+
+
+def snapshot_actions(filename: str, progress: Callable[[int], None] = None):
+    """Bulk action generator function for the documents of a snapshot
+
+    Args:
+        filename (str): Path of the snapshot
+        progress (func): Called with the number of documents generated
+            so far, every `PROGRESS_INTERVAL` documents.
+
+    Returns:
+        func: Generator function, generating dicts.
+
+    """
+
+    def actions():
+        count = 0
+        for uuid, document in load_file(filename):
+            yield {"_id": uuid, "_source": document}
+
+            count += 1
+            if progress is not None and count % PROGRESS_INTERVAL == 0:
+                progress(count)
+
+    return actions
+
+
+def spool_documents(
+    directory: str,
+    alias: str,
+    records: Iterable[Tuple[str, dict]],
+    dataset_version: str,
+    compression: str = "gzip",
+) -> Tuple[str, dict]:
+    """Write the documents of a load to a pending snapshot of their own
+
+    The load is indexed from the pending snapshot, which then either
+    replaces the snapshot of the index (see `keep_snapshot`) or is
+    removed. Thus the snapshot is always that of the last successful
+    load, even with concurrent loads.
+
+    Args:
+        directory (str): Directory holding the snapshots
+        alias (str): Name of the index alias, e.g. `employees`
+        records (Iterable): Documents by uuid, as loaded
+        dataset_version (str): Dataset version set by the load
+        compression (str): Compression, see `dump_file`
+
+    Returns:
+        Tuple[str, dict]: Path and header of the pending snapshot.
+
+    Example:
+
+        filename, header = spool_documents(directory, "employees", ...)
+        db.reindex("employees", snapshot_actions(filename))
+        keep_snapshot(filename, directory, "employees")
+
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    pending = os.path.join(directory, f"{alias}-{uuid4().hex}.pending")
+    header = dump_file(pending, records, dataset_version, compression)
+
+    return pending, header
+
+
+def keep_snapshot(pending: str, directory: str, alias: str) -> None:
+    """Replace the snapshot of an index by the pending snapshot of a load
+
+    Args:
+        pending (str): Path of the pending snapshot, see `spool_documents`
+        directory (str): Directory holding the snapshots
+        alias (str): Name of the index alias, e.g. `employees`
+
+    """
+    os.replace(pending, snapshot_path(directory, alias))
+
+
+def index_size(db: Backend, alias: str) -> int:
+    """Number of documents in an index, 0 if it does not exist"""
+    try:
+        return db.get_size(alias)
+    except NotFoundError:
+        return 0
+
+
+def restore_snapshots(
+    db: Backend,
+    directory: str,
+    progress: Callable[[str], None],
+    aliases: Iterable[str] = SNAPSHOT_ALIASES,
+    **bulk_options,
+) -> Dict[str, int]:
+    """Load the last snapshots into missing or empty indices
+
+    Used on startup, as an Elasticsearch started without its data
+    (e.g. in a fresh container) would serve empty results until the
+    next load. Indices holding documents are left untouched.
+
+    Args:
+        db (:obj:`Backend`): Datastore to restore into
+        directory (str): Directory holding the snapshots
+        progress (func): Called with progress update messages
+        aliases (Iterable[str]): Index aliases to restore
+        **bulk_options: Keyword arguments for `bulk_insert_index`, e.g.
+            a `thread_count` above 1 to restore using parallel bulks.
+
+    Returns:
+        Dict[str, int]: Number of documents restored by index alias.
+
+    """
+    restored = {}
+
+    for alias in aliases:
+        filename = snapshot_path(directory, alias)
+
+        if not os.path.exists(filename):
+            progress(f"No snapshot of {alias} to restore ({filename})")
+            continue
+
+        size = index_size(db, alias)
+        if size:
+            progress(f"Index {alias} holds {size} documents, not restored")
+            continue
+
+        header = read_file_header(filename)
+        total = header["count"]
+
+        progress(
+            f"Restoring {total} documents of {alias} from {filename} "
+            f"(created {header['created']})"
+        )
+
+        def report(count, alias=alias, total=total):
+            progress(f"Restoring {alias} {count}/{total}")
+
+        indexed, _ = db.reindex(
+            alias, snapshot_actions(filename, report), **bulk_options
+        )
+
+        # Conditional requests and cached searches of the restored
+        # dataset remain valid
+        dataset_version = header["dataset_version"] or uuid4().hex
+        db.set_dataset_version(alias, dataset_version)
+
+        progress(f"Restored {indexed}/{total} documents of {alias}")
+        restored[alias] = indexed
+
+    return restored
@@ -0,0 +1,726 @@
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+from elasticsearch.exceptions import NotFoundError
+from os2phonebook import json_provider, metrics, timing
+from os2phonebook.backend import (
+    Backend,
+    CONTENT_HASH_FIELD,
+    PHONE_NUMBERS_FIELD,
+    REVERSED_PHONE_NUMBERS_FIELD,
+)
+from os2phonebook.helpers import normalise_phone_number
+from os2phonebook.memory_datastore import filter_source, source_filter
+
+# A datastore in a single SQLite database file.
+#
+# Documents are stored as json, the fields searched are copied into a table
+# indexed by an FTS5 full-text index, with prefix indexes for the searches
+# as you type, and the phone numbers into a table with a b-tree index.
+
+# Words as split by the `unicode61` tokenizer, lowercased
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+# Searched fields by document path, and the full-text column holding them
+SEARCH_FIELDS = {
+    "name": "name",
+    "surname": "surname",
+    "addresses.EMAIL.value": "email",
+    "engagements.title": "engagement",
+    "kles.title": "kle",
+}
+
+# Fields holding nested documents, matched individually (see inner hits)
+NESTED_FIELDS = ("kles",)
+
+# Default number of hits and inner hits, as in Elasticsearch
+DEFAULT_SIZE = 10
+DEFAULT_INNER_HITS_SIZE = 3
+
+# Maximum number of identifiers per statement, see `get_documents`
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    index_name TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    content_hash TEXT,
+    source BLOB NOT NULL,
+    UNIQUE (index_name, uuid)
+);
+
+CREATE TABLE IF NOT EXISTS fields (
+    id INTEGER PRIMARY KEY,
+    document INTEGER NOT NULL,
+    position INTEGER,
+    {columns}
+);
+CREATE INDEX IF NOT EXISTS fields_document ON fields (document);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS terms USING fts5 (
+    {columns},
+    content='fields',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 0',
+    prefix='1 2 3 4'
+);
+
+CREATE TABLE IF NOT EXISTS phone_numbers (
+    document INTEGER NOT NULL,
+    number TEXT NOT NULL,
+    reversed TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS phone_numbers_document
+    ON phone_numbers (document);
+CREATE INDEX IF NOT EXISTS phone_numbers_number ON phone_numbers (number);
+CREATE INDEX IF NOT EXISTS phone_numbers_reversed
+    ON phone_numbers (reversed);
+
+CREATE TABLE IF NOT EXISTS dataset_versions (
+    alias TEXT PRIMARY KEY,
+    version TEXT NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS documents_delete AFTER DELETE ON documents
+BEGIN
+    DELETE FROM fields WHERE document = old.id;
+    DELETE FROM phone_numbers WHERE document = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS fields_insert AFTER INSERT ON fields
+BEGIN
+    INSERT INTO terms (rowid, {columns}) VALUES (new.id, {new_columns});
+END;
+
+CREATE TRIGGER IF NOT EXISTS fields_delete AFTER DELETE ON fields
+BEGIN
+    INSERT INTO terms (terms, rowid, {columns})
+    VALUES ('delete', old.id, {old_columns});
+END;
+""".format(
+    columns=", ".join(SEARCH_FIELDS.values()),
+    new_columns=", ".join(
+        f"new.{column}" for column in SEARCH_FIELDS.values()
+    ),
+    old_columns=", ".join(
+        f"old.{column}" for column in SEARCH_FIELDS.values()
+    ),
+)
+
+
+def words(text: str) -> List[str]:
+    """Split a text into lowercased words"""
+    return WORD_PATTERN.findall(str(text).lower())
+
+
+def match_expression(
+    columns: List[str], terms: List[str], operator: str
+) -> str:
+    """FTS5 query matching the words in the columns, the last as a prefix
+
+    Args:
+        columns (List[str]): Full-text columns, see `SEARCH_FIELDS`
+        terms (List[str]): Words, see `words`
+        operator (str): `AND` to match every word, `OR` for any word
+
+    Returns:
+        str: FTS5 query, e.g. `{name surname} : ("jean" AND "pic"*)`
+
+    """
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+
+    return f"{{{' '.join(columns)}}} : ({f' {operator} '.join(quoted)})"
+
+
+def phrase_expression(columns: List[str], terms: List[str]) -> str:
+    """FTS5 query matching the words in order, the last as a prefix"""
+    return f"{{{' '.join(columns)}}} : (\"{' '.join(terms)}\"*)"
+
+
+def field_rows(document: dict) -> Iterator[Tuple[Optional[int], str, str]]:
+    """Values of the searched fields of a document
+
+    Yields:
+        tuple: Offset of the nested document holding the value, if any,
+            the full-text column and the value.
+
+    """
+    for path, column in SEARCH_FIELDS.items():
+        head, _, rest = path.partition(".")
+
+        if head in NESTED_FIELDS:
+            for offset, nested in enumerate(document.get(head) or []):
+                for value in field_values(nested, rest.split(".")):
+                    yield offset, column, value
+        else:
+            for value in field_values(document, path.split(".")):
+                yield None, column, value
+
+
+def field_values(value, path: List[str]) -> List[str]:
+    """Text values at a dotted path of a document, with arrays flattened"""
+    if isinstance(value, list):
+        return [item for entry in value for item in field_values(entry, path)]
+
+    if not path:
+        return [] if value is None else [str(value)]
+
+    if not isinstance(value, dict):
+        return []
+
+    return field_values(value.get(path[0]), path[1:])
+
+
+class SQLiteStore(object):
+    """Connections to an SQLite database file
+
+    Every thread (or greenlet, when patched by gevent) uses a connection
+    of its own, reading from the last committed state in WAL mode, thus
+    searches are served while a load is written in a single transaction.
+
+    The database file is memory-mapped, serving reads from the page cache
+    of the operating system, shared by every worker process.
+
+    Args:
+        path (str): Path of the database file, created if missing
+        mmap_size (int): Maximum number of bytes of the file to map
+        timeout (float): Seconds to wait for the lock of another writer
+
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mmap_size: int = 256 * 1024 * 1024,
+        timeout: float = 30,
+    ):
+        self.path = path
+        self.mmap_size = int(mmap_size)
+        self.timeout = float(timeout)
+        self.local = threading.local()
+
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """The connection of the current thread, opened on first use"""
+        connection = getattr(self.local, "connection", None)
+
+        if connection is None:
+            # Transactions are explicit, see `transaction`
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+            self.local.connection = connection
+
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write in a transaction, committed unless an error is raised
+
+        Within a transaction, further transactions are part of it.
+
+        Yields:
+            :obj:`sqlite3.Connection`: Connection of the current thread
+
+        """
+        connection = self.connection()
+
+        if connection.in_transaction:
+            yield connection
+            return
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    def ping(self, **kwargs) -> bool:
+        return True
+
+    def close(self) -> None:
+        """Close the connection of the current thread"""
+        connection = getattr(self.local, "connection", None)
+
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+class SQLiteDataStore(Backend):
+    """Datastore in a single SQLite database file
+
+    The query builders return the full-text (FTS5) queries of the search
+    types rather than Elasticsearch queries, with these matching rules:
+
+        * Names: Every word, the last as a prefix, in either the name or
+          the surname. Names matching the words in order rank higher.
+          The fuzzy search matches any of the words.
+        * Phone numbers: The normalised number, or by prefix and suffix
+          in the fuzzy search.
+        * Emails, engagements, org unit names and kles: The words in order,
+          the last as a prefix.
+
+    Intended for small installations, without Elasticsearch. A load is
+    written in a single transaction, thus readers see either the previous
+    or the new documents, as with the alias swap of the :code:`DataStore`.
+
+    Args:
+        db (:obj:`SQLiteStore`): Connections to the database file
+        cache (:obj:`SearchCache`): Optional cache for search results.
+
+    Example:
+
+        db = SQLiteDataStore(SQLiteStore("/var/lib/os2phonebook.db"))
+        db.reindex("employees", generator)
+
+        results = db.search_with_fallback("employee_by_name", "Riker")
+
+    """
+
+    client_class = SQLiteStore
+
+    def _fetch(self, sql: str, parameters: tuple = ()) -> List[tuple]:
+        """Run a read query, timed as span `sqlite` of the current request"""
+        with timing.span("sqlite"):
+            return self.db.connection().execute(sql, parameters).fetchall()
+
+    def _get_document(self, index: str, uuid: str) -> dict:
+        """Retrieve a document by identifer
+
+        Raises:
+            NotFoundError: If there is no such document, as raised by the
+                Elasticsearch client.
+
+        """
+        rows = self._fetch(
+            "SELECT source FROM documents WHERE index_name = ? AND uuid = ?",
+            (index, uuid),
+        )
+
+        if not rows:
+            info = {"_index": index, "_id": uuid, "found": False}
+            raise NotFoundError(404, "not_found", info)
+
+        return json_provider.loads(rows[0][0])
+
+    @metrics.timed("get_employee")
+    def get_employee(self, uuid: str) -> dict:
+        return self._get_document("employees", uuid)
+
+    @metrics.timed("get_org_unit")
+    def get_org_unit(self, uuid: str) -> dict:
+        return self._get_document("org_units", uuid)
+
+    def get_documents(
+        self, index: str, uuids: List[str], fields: List[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        tree = source_filter(list(fields) if fields is not None else True)
+
+        found = {}
+        for start in range(0, len(uuids), BATCH_SIZE):
+            stop = start + BATCH_SIZE
+            batch = uuids[start:stop]
+            placeholders = ", ".join("?" for _ in batch)
+            found.update(
+                self._fetch(
+                    "SELECT uuid, source FROM documents "
+                    f"WHERE index_name = ? AND uuid IN ({placeholders})",
+                    (index, *batch),
+                )
+            )
+
+        documents = []
+        missing = []
+
+        for uuid in uuids:
+            if uuid in found:
+                document = json_provider.loads(found[uuid])
+                documents.append(filter_source(document, tree))
+            else:
+                missing.append(uuid)
+
+        return documents, missing
+
+    def get_size(self, index: str) -> int:
+        rows = self._fetch(
+            "SELECT count(*) FROM documents WHERE index_name = ?", (index,)
+        )
+
+        return rows[0][0]
+
+    def get_org_units_page(
+        self, limit: int, cursor: dict = None
+    ) -> Tuple[List[dict], Optional[dict]]:
+        index = cursor["index"] if cursor else "org_units"
+        after = cursor["search_after"][0] if cursor else ""
+
+        rows = self._fetch(
+            "SELECT uuid, source FROM documents "
+            "WHERE index_name = ? AND uuid > ? ORDER BY uuid LIMIT ?",
+            (index, after, limit),
+        )
+
+        tree = source_filter(["uuid", "name", "parent"])
+        org_units = [
+            filter_source(json_provider.loads(source), tree)
+            for _, source in rows
+        ]
+
+        # A short page is the last page
+        if len(rows) < limit:
+            return org_units, None
+
+        return org_units, {"index": index, "search_after": [rows[-1][0]]}
+
+    def iter_employee_phone_numbers(self) -> Iterator[dict]:
+        rows = self._fetch(
+            "SELECT source FROM documents AS d WHERE index_name = ? "
+            "AND EXISTS (SELECT 1 FROM phone_numbers WHERE document = d.id)",
+            ("employees",),
+        )
+
+        tree = source_filter(
+            ["uuid", "name", "addresses.PHONE", "engagements"]
+        )
+        for (source,) in rows:
+            yield filter_source(json_provider.loads(source), tree)
+
+    def _run_search(self, index: str, query: dict) -> dict:
+        """Run a query built by one of the query builders
+
+        Args:
+            index (str): Name of the index to search
+            query (dict): Query, with either the `phone_number` to look up
+                or the FTS5 queries to `match` (in order of precedence).
+
+        Returns:
+            dict: Search response, with the hits at `hits.hits`.
+
+        """
+        start = perf_counter()
+
+        if query.get("phone_number"):
+            rows = self._search_phone_number(index, query)
+        elif query.get("match"):
+            rows = self._search_text(index, query)
+        else:
+            rows = []
+
+        tree = source_filter(query["_source"])
+        inner_hits = query.get("inner_hits")
+
+        hits = []
+        for uuid, source, positions in rows:
+            document = json_provider.loads(source)
+            hit = {
+                "_index": index,
+                "_id": uuid,
+                "_source": filter_source(document, tree),
+            }
+
+            if inner_hits:
+                nested = document.get(inner_hits["path"]) or []
+                offsets = sorted(
+                    int(offset) for offset in positions.split(",")
+                )
+                stop = inner_hits.get("size", DEFAULT_INNER_HITS_SIZE)
+                hit["inner_hits"] = {
+                    inner_hits["path"]: [
+                        filter_source(nested[offset], inner_hits["_source"])
+                        for offset in offsets[:stop]
+                    ]
+                }
+
+            hits.append(hit)
+
+        took = int((perf_counter() - start) * 1000)
+
+        return {"took": took, "hits": {"hits": hits}}
+
+    def _search_text(self, index: str, query: dict) -> List[tuple]:
+        """Documents matching any of the FTS5 queries, best match first"""
+        alternatives = " UNION ALL ".join(
+            f"SELECT {precedence} AS precedence, rowid, rank "
+            "FROM terms WHERE terms MATCH ?"
+            for precedence, _ in enumerate(query["match"])
+        )
+
+        return self._fetch(
+            "SELECT d.uuid, d.source, group_concat(DISTINCT f.position) "
+            f"FROM ({alternatives}) AS m "
+            "JOIN fields AS f ON f.id = m.rowid "
+            "JOIN documents AS d ON d.id = f.document "
+            "WHERE d.index_name = ? "
+            "GROUP BY d.id "
+            "ORDER BY min(m.precedence), min(m.rank), d.id "
+            "LIMIT ?",
+            (*query["match"], index, query.get("size", DEFAULT_SIZE)),
+        )
+
+    def _search_phone_number(self, index: str, query: dict) -> List[tuple]:
+        """Documents with the phone number, or its prefix or suffix"""
+        digits = query["phone_number"]
+
+        if query.get("fuzzy"):
+            condition = "p.number GLOB ? OR p.reversed GLOB ?"
+            parameters = (f"{digits}*", f"{digits[::-1]}*")
+        else:
+            condition = "p.number = ?"
+            parameters = (digits,)
+
+        return self._fetch(
+            "SELECT d.uuid, d.source, NULL FROM documents AS d "
+            "WHERE d.index_name = ? AND d.id IN ("
+            f"SELECT p.document FROM phone_numbers AS p WHERE {condition}) "
+            "ORDER BY d.id LIMIT ?",
+            (index, *parameters, query.get("size", DEFAULT_SIZE)),
+        )
+
+    def _phrase_prefix_query(
+        self, column: str, value: str, size: int, includes: List[str]
+    ) -> dict:
+        """Query matching the words of a value in order, see `_run_search`"""
+        terms = words(value)
+
+        return {
+            "size": size,
+            "_source": {"includes": list(includes)},
+            "match": [phrase_expression([column], terms)] if terms else [],
+        }
+
+    def query_for_employee_by_name(
+        self, name: str, fuzzy_search: bool
+    ) -> Tuple[str, dict]:
+        columns = ["name", "surname"]
+        terms = words(name)
+
+        if not terms:
+            match = []
+        elif fuzzy_search:
+            match = [match_expression(columns, terms, "OR")]
+        else:
+            # Names matching the words in order first
+            match = [
+                phrase_expression(columns, terms),
+                match_expression(columns, terms, "AND"),
+            ]
+
+        query = {
+            "_source": {"includes": ["uuid", "name", "addresses.PHONE"]},
+            "match": match,
+        }
+
+        return ("employees", query)
+
+    def query_for_employee_by_phone(
+        self, phone_number: str, fuzzy_search: bool
+    ) -> Tuple[str, dict]:
+        query = {
+            "size": 15,
+            "_source": {"includes": ["uuid", "name", "addresses.PHONE"]},
+            "phone_number": normalise_phone_number(phone_number),
+            "fuzzy": fuzzy_search,
+        }
+
+        return ("employees", query)
+
+    def query_for_employee_by_email(
+        self, email_address: str, fuzzy_search: bool
+    ) -> Tuple[str, dict]:
+        query = self._phrase_prefix_query(
+            "email", email_address, 15, ["uuid", "name", "addresses.EMAIL"]
+        )
+        return ("employees", query)
+
+    def query_for_employee_by_engagement(
+        self, engagement: str, fuzzy_search: bool
+    ) -> Tuple[str, dict]:
+        query = self._phrase_prefix_query(
+            "engagement", engagement, 15, ["uuid", "name", "engagements"]
+        )
+        return ("employees", query)
+
+    def query_for_org_unit_by_name(
+        self, name: str, fuzzy_search: bool
+    ) -> Tuple[str, dict]:
+        query = self._phrase_prefix_query(
+            "name", name, 15, ["uuid", "name", "addresses"]
+        )
+        return ("org_units", query)
+
+    def query_for_org_unit_by_kle(self, kle: str, fuzzy_search: bool):
+        query = self._phrase_prefix_query("kle", kle, 15, ["uuid", "name"])
+        query["inner_hits"] = {"path": "kles", "_source": {"title": True}}
+
+        def processor(document):
+            # Embed the matching kles within the org unit
+            org_unit = document["_source"]
+            org_unit["kles"] = document["inner_hits"]["kles"]
+            return org_unit
+
+        return ("org_units", query, processor)
+
+    def create_index(self, index: str, mapping: dict = None) -> dict:
+        """Indices are created by their first document, nothing to do"""
+        return {"acknowledged": True, "index": index}
+
+    def delete_index(self, index: str) -> dict:
+        with self.db.transaction() as connection:
+            connection.execute(
+                "DELETE FROM documents WHERE index_name = ?", (index,)
+            )
+
+        return {"acknowledged": True}
+
+    def insert_index(self, index: str, identifier: str, data: dict) -> dict:
+        with self.db.transaction() as connection:
+            self._write(connection, index, identifier, data)
+
+        return {"_index": index, "_id": identifier, "result": "created"}
+
+    def _write(
+        self,
+        connection: sqlite3.Connection,
+        index: str,
+        identifier: str,
+        document: Optional[dict],
+    ) -> bool:
+        """Replace or delete a document and its searched fields
+
+        Args:
+            connection (:obj:`sqlite3.Connection`): Connection writing
+            index (str): Name of the index
+            identifier (str): Document identifier
+            document (dict): Document, with the fields added by
+                `_prepare_documents` if any, or `None` to delete it.
+
+        Returns:
+            bool: Whether the document was written or deleted.
+
+        """
+        deleted = connection.execute(
+            "DELETE FROM documents WHERE index_name = ? AND uuid = ?",
+            (index, identifier),
+        ).rowcount
+
+        if document is None:
+            return deleted > 0
+
+        source = dict(document)
+        digest = source.pop(CONTENT_HASH_FIELD, None)
+        phone_numbers = source.pop(PHONE_NUMBERS_FIELD, [])
+        source.pop(REVERSED_PHONE_NUMBERS_FIELD, None)
+
+        document_id = connection.execute(
+            "INSERT INTO documents (index_name, uuid, content_hash, source) "
+            "VALUES (?, ?, ?, ?)",
+            (index, identifier, digest, json_provider.dumps(source)),
+        ).lastrowid
+
+        columns = list(SEARCH_FIELDS.values())
+        connection.executemany(
+            f"INSERT INTO fields (document, position, {', '.join(columns)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in columns)})",
+            [
+                (
+                    document_id,
+                    position,
+                    *(value if name == column else None for name in columns),
+                )
+                for position, column, value in field_rows(source)
+            ],
+        )
+        connection.executemany(
+            "INSERT INTO phone_numbers (document, number, reversed) "
+            "VALUES (?, ?, ?)",
+            [(document_id, number, number[::-1]) for number in phone_numbers],
+        )
+
+        return True
+
+    @metrics.timed("bulk_insert_index")
+    def bulk_insert_index(self, index: str, generator, **bulk_options):
+        """Insert documents into a datastore index, in a single transaction
+
+        The bulk options of `DataStore.bulk_insert_index` are accepted,
+        but there is nothing to send, thus they are ignored.
+
+        Args:
+            index (str): Name of the index
+            generator (func): Generator function, generating dicts.
+
+        Returns:
+            int, int: Number of documents indexed, documents processed.
+
+        """
+        indexed = 0
+        total = 0
+
+        with self.db.transaction() as connection:
+            for action in generator():
+                if action.get("_op_type") == "delete":
+                    document = None
+                else:
+                    document = action["_source"]
+
+                indexed += self._write(
+                    connection, index, action["_id"], document
+                )
+                total += 1
+
+        return indexed, total
+
+    def reindex(self, alias: str, generator, **bulk_options):
+        with self.db.transaction() as connection:
+            connection.execute(
+                "DELETE FROM documents WHERE index_name = ?", (alias,)
+            )
+            return self.bulk_insert_index(
+                alias, self._prepare_documents(alias, generator)
+            )
+
+    def delta_index(self, alias: str, generator, **bulk_options) -> dict:
+        counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+        with self.db.transaction() as connection:
+            indexed_hashes = dict(
+                connection.execute(
+                    "SELECT uuid, content_hash FROM documents "
+                    "WHERE index_name = ?",
+                    (alias,),
+                )
+            )
+
+            indexed, total = self.bulk_insert_index(
+                alias,
+                self._delta_documents(
+                    alias, generator, indexed_hashes, counts
+                ),
+            )
+
+        return {"indexed": indexed, "total": total, **counts}
+
+    def get_dataset_versions(self) -> Dict[str, str]:
+        return dict(self._fetch("SELECT alias, version FROM dataset_versions"))
+
+    def set_dataset_version(self, alias: str, version: str) -> dict:
+        with self.db.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO dataset_versions (alias, version) "
+                "VALUES (?, ?)",
+                (alias, version),
+            )
+
+        return {"_index": "dataset_versions", "_id": alias}
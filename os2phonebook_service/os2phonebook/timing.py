@@ -0,0 +1,184 @@
+import re
+from uuid import uuid4
+from time import perf_counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import OrderedDict
+from typing import Optional
+
+# Request scoped timings, reported in the `Server-Timing` header.
+#
+# The timings of a request are collected in a context variable,
+# thus they are local to the thread, greenlet or task serving the request,
+# and code outside of a request, e.g. the cli, records nothing.
+
+SPAN_DESCRIPTIONS = {
+    "es": "Elasticsearch round-trips",
+    "es-took": "Elasticsearch reported time",
+    "memory": "In-memory datastore",
+    "sqlite": "SQLite datastore",
+    "process": "Result processing",
+    "serialize": "JSON serialization",
+    "rebuild": "Caller-ID index rebuild",
+    "lookup": "Caller-ID lookup",
+    "total": "Total",
+}
+
+# Request ids passed by the client, e.g. a proxy, are used as is if sane
+REQUEST_ID_PATTERN = re.compile(r"^[\w.:-]{1,128}$")
+
+_current = ContextVar("server_timing", default=None)
+
+
+class ServerTiming(object):
+    """Durations of the spans of a request
+
+    Spans of the same name are summed up,
+    e.g. every Elasticsearch request of a search.
+
+    Args:
+        request_id (str): Identifier of the request, used in the logs
+
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.start = perf_counter()
+        self.spans = OrderedDict()
+
+    def add(self, name: str, duration: float) -> None:
+        """Add to the duration of a span
+
+        Args:
+            name (str): Span name, see `SPAN_DESCRIPTIONS`
+            duration (float): Duration in milliseconds
+
+        """
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    def durations(self) -> "OrderedDict[str, float]":
+        """Durations in milliseconds by span, including the total so far"""
+        durations = OrderedDict(self.spans)
+        durations["total"] = (perf_counter() - self.start) * 1000
+
+        return durations
+
+    def header(self) -> str:
+        """Format the `Server-Timing` header
+
+        Example:
+
+            es;dur=3.120;desc="Elasticsearch round-trips",
+            es-took;dur=2.000;desc="Elasticsearch reported time",
+            total;dur=4.811;desc="Total"
+
+        Returns:
+            str: Header value.
+
+        """
+        timings = []
+        for name, duration in self.durations().items():
+            timing = f"{name};dur={duration:.3f}"
+            if name in SPAN_DESCRIPTIONS:
+                timing += f';desc="{SPAN_DESCRIPTIONS[name]}"'
+            timings.append(timing)
+
+        return ", ".join(timings)
+
+    def log_line(self, **fields) -> str:
+        """Format the timings as a structured log line
+
+        Example:
+
+            REQUEST_TIMING request_id=5c1d... method=POST path=/api/search
+            status=200 es=3.120ms es-took=2.000ms total=4.811ms
+
+        Args:
+            **fields: Fields describing the request, logged before the
+                timings.
+
+        Returns:
+            str: Log line.
+
+        """
+        values = [f"request_id={self.request_id}"]
+        values.extend(f"{key}={value}" for key, value in fields.items())
+        values.extend(
+            f"{name}={duration:.3f}ms"
+            for name, duration in self.durations().items()
+        )
+        return "REQUEST_TIMING " + " ".join(values)
+
+
+def start(request_id: Optional[str] = None) -> ServerTiming:
+    """Start collecting the timings of a request
+
+    Args:
+        request_id (str): Identifier of the request, e.g. from the
+            `X-Request-ID` header. A random one is generated if missing.
+
+    Returns:
+        :obj:`ServerTiming`: Timings of the request.
+
+    """
+    if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid4().hex
+
+    server_timing = ServerTiming(request_id)
+    _current.set(server_timing)
+
+    return server_timing
+
+
+def stop() -> None:
+    """Stop collecting timings in the current context"""
+    _current.set(None)
+
+
+def current() -> Optional[ServerTiming]:
+    """Timings of the current request, `None` outside of a request"""
+    return _current.get()
+
+
+def add(name: str, duration: float) -> None:
+    """Add to a span of the current request, if any
+
+    Args:
+        name (str): Span name, see `SPAN_DESCRIPTIONS`
+        duration (float): Duration in milliseconds
+
+    """
+    server_timing = _current.get()
+    if server_timing is not None:
+        server_timing.add(name, duration)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block of code as a span of the current request, if any
+
+    Args:
+        name (str): Span name, see `SPAN_DESCRIPTIONS`
+
+    """
+    server_timing = _current.get()
+    if server_timing is None:
+        yield
+        return
+
+    start_time = perf_counter()
+    try:
+        yield
+    finally:
+        server_timing.add(name, (perf_counter() - start_time) * 1000)
+
+
+def record_response(response) -> None:
+    """Record the time Elasticsearch reports to have spent on a request
+
+    Args:
+        response (Any): Deserialized Elasticsearch response
+
+    """
+    if isinstance(response, dict) and "took" in response:
+        add("es-took", response["took"])
@@ -417,3 +417,72 @@ def one_employee_by_name_from_elasticsearch() -> dict:
             ],
         },
     }
+
+
+def multi_search_from_elasticsearch(*responses) -> dict:
+    """Wrap search results as an msearch response
+
+    GET /_msearch
+
+    {"index": "employees"}
+    {"query": {"multi_match": {...}}}
+    {"index": "employees"}
+    {"query": {"bool": {...}}}
+
+    Args:
+        *responses (dict): Search results in the order of the searches
+
+    Returns:
+        dict: Result object from Elasticsearch
+
+    """
+
+    return {"took": 2, "responses": [dict(r, status=200) for r in responses]}
+
+
+def employees_by_ids_from_elasticsearch() -> dict:
+    """Get employees by uuid, one of which does not exist
+
+    GET /employees/_mget
+
+    {
+        "docs": [
+            {
+                "_id": "f16eee45-d96a-4efb-bd17-667d1795e13d",
+                "_source": {"includes": ["uuid", "name"]}
+            },
+            {
+                "_id": "00000000-0000-0000-0000-000000000000",
+                "_source": {"includes": ["uuid", "name"]}
+            }
+        ]
+    }
+
+    Returns:
+        dict: Result object from Elasticsearch
+
+    """
+
+    return {
+        "docs": [
+            {
+                "_index": "employees-20200612031500123456",
+                "_type": "_doc",
+                "_id": "f16eee45-d96a-4efb-bd17-667d1795e13d",
+                "_version": 1,
+                "_seq_no": 341,
+                "_primary_term": 1,
+                "found": True,
+                "_source": {
+                    "name": "Jan Elkjær Winther Nielsen",
+                    "uuid": "f16eee45-d96a-4efb-bd17-667d1795e13d",
+                },
+            },
+            {
+                "_index": "employees-20200612031500123456",
+                "_type": "_doc",
+                "_id": "00000000-0000-0000-0000-000000000000",
+                "found": False,
+            },
+        ]
+    }
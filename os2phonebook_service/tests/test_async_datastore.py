@@ -0,0 +1,218 @@
+import asyncio
+import pytest
+from unittest import mock
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import TransportError
+
+from os2phonebook.async_datastore import (
+    create_async_connection,
+    AsyncDataStore,
+)
+from os2phonebook.cache import SearchCache
+from os2phonebook.datastore import create_connection
+
+from tests.fixtures.elasticsearch_data import (
+    all_org_units_from_elasticsearch,
+    one_employee_from_elasticsearch,
+    no_matches_from_elasticsearch,
+    one_employee_by_name_from_elasticsearch,
+    multi_search_from_elasticsearch,
+    employees_by_ids_from_elasticsearch,
+)
+
+
+def async_return(value):
+    """Mock an async client method returning the given value"""
+
+    async def coroutine(*args, **kwargs):
+        return value
+
+    return mock.Mock(side_effect=coroutine)
+
+
+@pytest.fixture
+def db() -> AsyncDataStore:
+    """Create AsyncDataStore client instance"""
+
+    connection = create_async_connection(host="testhost", port=9090)
+    return AsyncDataStore(connection, cache=SearchCache())
+
+
+def test_async_connection():
+    """Should return an instance of the AsyncElasticsearch client"""
+
+    connection = create_async_connection(host="testhost", port=9090)
+
+    assert isinstance(connection, AsyncElasticsearch)
+
+
+def test_requires_async_client():
+    """Should refuse the synchronous client"""
+
+    with pytest.raises(TypeError):
+        AsyncDataStore(create_connection(host="testhost", port=9090))
+
+
+def test_get_employee(db):
+    """Should return the employee without internal fields"""
+
+    response = one_employee_from_elasticsearch()
+    response["_source"]["content_hash"] = "3f2a"
+
+    with mock.patch.object(db.db, "get", async_return(response)) as mock_get:
+        employee = asyncio.run(db.get_employee("some-uuid"))
+
+    mock_get.assert_called_once_with(index="employees", id="some-uuid")
+    assert employee["name"] == response["_source"]["name"]
+    assert "content_hash" not in employee
+
+
+def test_get_employees(db):
+    """Should resolve several employees in one mget request"""
+
+    with mock.patch.object(
+        db.db, "mget", async_return(employees_by_ids_from_elasticsearch())
+    ) as mock_mget:
+        results, missing = asyncio.run(
+            db.get_employees(
+                [
+                    "f16eee45-d96a-4efb-bd17-667d1795e13d",
+                    "00000000-0000-0000-0000-000000000000",
+                ],
+                ["uuid", "name"],
+            )
+        )
+
+    assert mock_mget.call_count == 1
+    assert [result["uuid"] for result in results] == [
+        "f16eee45-d96a-4efb-bd17-667d1795e13d"
+    ]
+    assert missing == ["00000000-0000-0000-0000-000000000000"]
+
+
+def test_get_all_org_units(db):
+    """Should page through the org units until a short page"""
+
+    hits = all_org_units_from_elasticsearch()["hits"]["hits"]
+
+    with mock.patch.object(
+        db.db, "search", async_return(all_org_units_from_elasticsearch())
+    ):
+        results = asyncio.run(db.get_all_org_units())
+
+    assert len(results) == len(hits)
+    assert results[0]["name"] == "Kolding Kommune"
+
+
+def test_search_with_fallback(db):
+    """Should send both passes in one msearch and prefer the first match"""
+
+    response = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(),
+        one_employee_by_name_from_elasticsearch(),
+    )
+
+    with mock.patch.object(
+        db.db, "msearch", async_return(response)
+    ) as mock_msearch:
+        first = asyncio.run(
+            db.search_with_fallback("employee_by_name", "Anne Yas")
+        )
+        second = asyncio.run(
+            db.search_with_fallback("employee_by_name", "Anne Yas")
+        )
+
+    assert [result["name"] for result in first] == ["Anne Yassen"]
+    assert first == second
+    assert mock_msearch.call_count == 1
+
+    body = mock_msearch.call_args[1]["body"]
+    assert (
+        body[1] == db._prepare_search("employee_by_name", "Anne Yas", False)[1]
+    )
+    assert (
+        body[3] == db._prepare_search("employee_by_name", "Anne Yas", True)[1]
+    )
+
+
+def test_search_everything(db):
+    """Should search every search type in one msearch"""
+
+    search_types = list(db.search_type_map)
+
+    response = multi_search_from_elasticsearch(
+        *[no_matches_from_elasticsearch() for _ in search_types * 2]
+    )
+
+    with mock.patch.object(
+        db.db, "msearch", async_return(response)
+    ) as mock_msearch:
+        results = asyncio.run(db.search_everything("Riker", limit=3))
+
+    assert list(results) == search_types
+
+    body = mock_msearch.call_args[1]["body"]
+    assert len(body) == 4 * len(search_types)
+    assert all(query["size"] == 3 for query in body[1::2])
+
+
+def test_search_error(db):
+    """A failed search within the msearch should raise TransportError"""
+
+    response = {
+        "responses": [
+            {"error": {"type": "index_not_found_exception"}, "status": 404},
+            no_matches_from_elasticsearch(),
+        ]
+    }
+
+    with mock.patch.object(db.db, "msearch", async_return(response)):
+        with pytest.raises(TransportError):
+            asyncio.run(db.search_with_fallback("employee_by_name", "Anne"))
+
+
+def test_get_dataset_versions(db):
+    """Should return the versions of the loaded indices"""
+
+    response = {
+        "docs": [
+            {"_id": "employees", "found": True, "_source": {"version": "a"}},
+            {"_id": "org_units", "found": False},
+        ]
+    }
+
+    with mock.patch.object(db.db, "mget", async_return(response)):
+        versions = asyncio.run(db.get_dataset_versions())
+
+    assert versions == {"employees": "a"}
+
+
+def test_get_size(db):
+    """Should await the document count of the index"""
+
+    response = {"hits": {"total": {"value": 42}, "hits": []}}
+
+    with mock.patch.object(db.db, "search", async_return(response)):
+        assert asyncio.run(db.get_size("employees")) == 42
+
+
+@pytest.mark.parametrize(
+    "method, args",
+    [
+        ("reindex", ("employees", iter)),
+        ("delta_index", ("employees", iter)),
+        ("bulk_insert_index", ("employees", iter)),
+        ("create_versioned_index", ("employees",)),
+        ("publish_index", ("employees", "employees_1")),
+        ("set_dataset_version", ("employees", "1")),
+        ("get_content_hashes", ("employees",)),
+    ],
+)
+def test_lifecycle_methods_unavailable(db, method, args):
+    """Index lifecycle methods should refuse rather than silently not run"""
+
+    with mock.patch.object(db, "db") as mock_client:
+        with pytest.raises(NotImplementedError, match=method):
+            getattr(db, method)(*args)
+
+    assert mock_client.mock_calls == []
@@ -0,0 +1,312 @@
+import pytest
+from unittest import mock
+from base64 import b64encode
+from starlette.testclient import TestClient
+from elasticsearch.exceptions import NotFoundError
+
+from os2phonebook import __version__
+from os2phonebook.async_app import initiate_async_application
+from os2phonebook.controller import encode_cursor
+
+from tests.fixtures.elasticsearch_data import (
+    one_employee_from_elasticsearch,
+    no_matches_from_elasticsearch,
+    one_employee_by_name_from_elasticsearch,
+    multi_search_from_elasticsearch,
+)
+
+# Settings
+ORGANISATION_NAME = "Magenta Aps"
+
+
+def async_return(value):
+    """Mock an async method returning the given value"""
+
+    async def coroutine(*args, **kwargs):
+        return value
+
+    return mock.Mock(side_effect=coroutine)
+
+
+@pytest.fixture
+def app():
+    """Create the service (starlette) app instance"""
+
+    config = {
+        "OS2PHONEBOOK_COMPANY_NAME": ORGANISATION_NAME,
+        "ELASTICSEARCH_HOST": "elasticsearch",
+        "ELASTICSEARCH_PORT": 9600,
+        "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "false",
+        "OS2PHONEBOOK_DATALOADER_USERNAME": "dataloader",
+        "OS2PHONEBOOK_DATALOADER_PASSWORD": "Password1",
+    }
+
+    app = initiate_async_application(config)
+
+    # Dataset versions are stored alongside the data, in Elasticsearch
+    with mock.patch(
+        "os2phonebook.async_datastore.AsyncDataStore.get_dataset_versions",
+        async_return({}),
+    ):
+        yield app
+
+
+@pytest.fixture
+def http_client(app):
+    """Create a test client for the app instance"""
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_get_status(http_client):
+    """Should return the configured name and current version"""
+
+    response = http_client.get("/api/status")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "app": "OS2Phonebook",
+        "organisation": ORGANISATION_NAME,
+        "version": __version__,
+    }
+
+
+def test_get_employee(app, http_client):
+    """Should return the employee, tagged with the dataset version"""
+
+    datastore = app.state.datastore
+
+    with mock.patch.object(
+        datastore.db, "get", async_return(one_employee_from_elasticsearch())
+    ), mock.patch.object(
+        datastore, "get_dataset_versions", async_return({"employees": "3f2a"})
+    ):
+        response = http_client.get(
+            "/api/employee/f16eee45-d96a-4efb-bd17-667d1795e13d"
+        )
+        not_modified = http_client.get(
+            "/api/employee/f16eee45-d96a-4efb-bd17-667d1795e13d",
+            headers={"If-None-Match": '"3f2a"'},
+        )
+
+    assert response.status_code == 200
+    assert response.json() == one_employee_from_elasticsearch()["_source"]
+    assert response.headers["ETag"] == '"3f2a"'
+    assert "max-age=" in response.headers["Cache-Control"]
+
+    assert not_modified.status_code == 304
+
+
+def test_get_employee_modified_by_other_worker(app, http_client):
+    """A conditional request should see loads by other workers at once"""
+
+    url = "/api/employee/f16eee45-d96a-4efb-bd17-667d1795e13d"
+    datastore = app.state.datastore
+
+    with mock.patch.object(
+        datastore.db, "get", async_return(one_employee_from_elasticsearch())
+    ):
+        with mock.patch.object(
+            datastore,
+            "get_dataset_versions",
+            async_return({"employees": "3f2a"}),
+        ):
+            not_modified = http_client.get(
+                url, headers={"If-None-Match": '"3f2a"'}
+            )
+
+        # Loaded by another worker, within the time to live of the versions
+        with mock.patch.object(
+            datastore,
+            "get_dataset_versions",
+            async_return({"employees": "9c1b"}),
+        ):
+            response = http_client.get(
+                url, headers={"If-None-Match": '"3f2a"'}
+            )
+
+    assert not_modified.status_code == 304
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"9c1b"'
+
+
+def test_get_employee_not_found(app, http_client):
+    """Should return status code 404 for an unknown employee"""
+
+    async def not_found(*args, **kwargs):
+        raise NotFoundError(404, "not_found", {})
+
+    with mock.patch.object(
+        app.state.datastore.db, "get", mock.Mock(side_effect=not_found)
+    ):
+        response = http_client.get(
+            "/api/employee/f16eee45-d96a-4efb-bd17-667d1795e13d"
+        )
+
+    assert response.status_code == 404
+    assert response.json()["error"]["type"] == "NotFoundError"
+
+
+def test_get_org_units_page_expired_cursor(app, http_client):
+    """A cursor of a deleted index version should return status code 410"""
+
+    async def not_found(*args, **kwargs):
+        raise NotFoundError(404, "index_not_found_exception", {})
+
+    cursor = encode_cursor(
+        {"index": "org_units-20200101000000", "search_after": ["a"]}
+    )
+
+    with mock.patch.object(
+        app.state.datastore.db, "search", mock.Mock(side_effect=not_found)
+    ):
+        response = http_client.get(f"/api/org_units?cursor={cursor}")
+        invalid = http_client.get(
+            "/api/org_units?cursor="
+            + encode_cursor({"index": "employees", "search_after": ["a"]})
+        )
+
+    assert response.status_code == 410
+    assert response.json()["error"]["type"] == "ExpiredCursor"
+    assert invalid.status_code == 400
+
+
+def test_post_search_after_load_by_other_worker():
+    """A load by another worker should invalidate the cached results"""
+
+    app = initiate_async_application(
+        {
+            "OS2PHONEBOOK_COMPANY_NAME": ORGANISATION_NAME,
+            "ELASTICSEARCH_HOST": "elasticsearch",
+            "ELASTICSEARCH_PORT": 9600,
+            "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "false",
+            "OS2PHONEBOOK_DATASET_VERSION_TTL": 0,
+        }
+    )
+    http_client = TestClient(app)
+
+    response = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(),
+        one_employee_by_name_from_elasticsearch(),
+    )
+    msearch = async_return(response)
+    post_payload = {"search_type": "employee_by_name", "search_value": "Anne"}
+
+    with mock.patch.object(app.state.datastore.db, "msearch", msearch):
+        with mock.patch(
+            "os2phonebook.async_datastore.AsyncDataStore.get_dataset_versions",
+            async_return({"employees": "3f2a"}),
+        ):
+            http_client.post("/api/search", json=post_payload)
+            http_client.post("/api/search", json=post_payload)
+
+        assert msearch.call_count == 1
+
+        with mock.patch(
+            "os2phonebook.async_datastore.AsyncDataStore.get_dataset_versions",
+            async_return({"employees": "9c1b"}),
+        ):
+            http_client.post("/api/search", json=post_payload)
+
+        assert msearch.call_count == 2
+
+
+def test_post_search(app, http_client):
+    """Should return the results of the first pass that matched"""
+
+    response = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(),
+        one_employee_by_name_from_elasticsearch(),
+    )
+
+    with mock.patch.object(
+        app.state.datastore.db, "msearch", async_return(response)
+    ):
+        response = http_client.post(
+            "/api/search",
+            json={
+                "search_type": "employee_by_name",
+                "search_value": "Anne Yas",
+            },
+        )
+
+    assert response.status_code == 200
+    assert [result["name"] for result in response.json()] == ["Anne Yassen"]
+
+
+@pytest.mark.parametrize(
+    "payload", [None, {"search_type": "employee_by_name"}]
+)
+def test_post_search_invalid(http_client, payload):
+    """Should return status code 400 for an invalid request body"""
+
+    response = http_client.post("/api/search", json=payload)
+
+    assert response.status_code == 400
+    assert response.json()["error"]["type"] == "InvalidRequestBody"
+
+
+def test_post_search_invalid_type(app, http_client):
+    """Should return status code 400 for an unknown search type"""
+
+    response = http_client.post(
+        "/api/search",
+        json={"search_type": "employee_by_nothing", "search_value": "x"},
+    )
+
+    assert response.status_code == 400
+    assert response.json()["error"]["type"] == "InvalidSearchType"
+
+
+def test_lookup_phone_number(app, http_client):
+    """Should resolve the number from the shared in-memory index"""
+
+    async def employees(self):
+        yield {
+            "uuid": "a",
+            "name": "Jean-Luc Picard",
+            "addresses": {
+                "PHONE": [{"description": "Telefon", "value": "22722222"}]
+            },
+        }
+
+    with mock.patch(
+        "os2phonebook.async_datastore.AsyncDataStore"
+        ".iter_employee_phone_numbers",
+        employees,
+    ):
+        response = http_client.get("/api/lookup/phone/+4522722222")
+        missing = http_client.get("/api/lookup/phone/11111111")
+
+    assert response.status_code == 200
+    assert response.json()[0]["uuid"] == "a"
+    assert "rebuild;dur=" in response.headers["Server-Timing"]
+    assert missing.status_code == 404
+    assert app.state.flask_app.phone_index is app.state.phone_index
+
+
+def test_load_served_by_flask(http_client):
+    """Requests without an async view should be passed on to Flask"""
+
+    credentials = b64encode(b"dataloader:wrong").decode("utf-8")
+
+    response = http_client.post(
+        "/api/load-employees",
+        content=b"{}",
+        headers={"Authorization": f"Basic {credentials}"},
+    )
+
+    assert response.status_code == 401
+    assert response.json()["error"]["type"] == "InvalidCredentials"
+
+
+def test_get_metrics(http_client):
+    """Should expose the metrics, labelled as by the Flask application"""
+
+    http_client.get("/api/status")
+
+    response = http_client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'endpoint="routes.show_status"' in response.text
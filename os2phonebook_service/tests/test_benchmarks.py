@@ -0,0 +1,42 @@
+from benchmarks import suite
+
+
+def test_benchmark_suite():
+    """Should run every case against the stand-in without errors"""
+
+    report = suite.run(size=20, number=1, repeat=1)
+
+    groups = {result["group"] for result in report["results"]}
+    assert groups == {
+        "query",
+        "process",
+        "search",
+        "memory",
+        "serialize",
+        "endpoint",
+    }
+    assert report["size"] == 20
+
+    names = {result["name"] for result in report["results"]}
+    assert "process org_unit_by_kle" in names
+    assert "query_for_employee_by_phone[fuzzy]" in names
+    assert all(result["best_ms"] > 0 for result in report["results"])
+
+
+def test_compare():
+    """Should report the cases slower than the threshold allows"""
+
+    def report(*times):
+        return {
+            "results": [
+                {"group": "search", "name": name, "best_ms": best_ms}
+                for name, best_ms in times
+            ]
+        }
+
+    baseline = report(("a", 1.0), ("b", 1.0))
+    current = report(("a", 1.2), ("b", 1.5), ("new", 9.0))
+
+    assert suite.compare(current, baseline, threshold=1.25) == [
+        {"group": "search", "name": "b", "ratio": 1.5}
+    ]
@@ -0,0 +1,230 @@
+from unittest import mock
+from threading import Event
+from os2phonebook.cache import SearchCache, DatasetVersions, PhoneIndex
+
+
+class FakeClock(object):
+    """Manually advanced clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_normalises_search_value():
+    """Case and whitespace should not affect the cache key"""
+
+    key = SearchCache.key("employee_by_name", "  Jean   Luc PICARD ", False)
+
+    assert key == ("employee_by_name", "jean luc picard", False)
+
+
+def test_get_missing():
+    """Should report a miss for an unknown key"""
+
+    cache = SearchCache()
+
+    assert cache.get("unknown") == (False, None)
+    assert cache.stats()["misses"] == 1
+
+
+def test_get_cached():
+    """Should report a hit for a cached key, including empty results"""
+
+    cache = SearchCache()
+    cache.set("empty", [])
+
+    assert cache.get("empty") == (True, [])
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_expiry():
+    """Entries older than the ttl should be evicted"""
+
+    clock = FakeClock()
+    cache = SearchCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("key", ["value"])
+
+    clock.now = 59
+    assert cache.get("key") == (True, ["value"])
+
+    clock.now = 60
+    assert cache.get("key") == (False, None)
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["size"] == 0
+
+
+def test_lru_eviction():
+    """The least recently used entry should be evicted when full"""
+
+    cache = SearchCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    # Use "a", making "b" the least recently used
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == (True, 1)
+    assert cache.get("b") == (False, None)
+    assert cache.get("c") == (True, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disabled():
+    """A maxsize of 0 should not cache anything"""
+
+    cache = SearchCache(maxsize=0)
+    cache.set("key", "value")
+
+    assert cache.get("key") == (False, None)
+
+
+def test_clear():
+    """Should remove every entry but keep the counters"""
+
+    cache = SearchCache()
+    cache.set("key", "value")
+    cache.get("key")
+    cache.clear()
+
+    assert cache.get("key") == (False, None)
+
+    stats = cache.stats()
+    assert stats["size"] == 0
+    assert stats["hits"] == 1
+
+
+def test_dataset_versions_stale():
+    """The versions should be stale until refreshed and after the ttl"""
+
+    clock = FakeClock()
+    versions = DatasetVersions(ttl=10, clock=clock)
+
+    assert versions.is_stale()
+    assert versions.get("employees") is None
+
+    versions.refresh({"employees": "9c1b"})
+    assert not versions.is_stale()
+    assert versions.get("employees") == "9c1b"
+
+    clock.now = 10
+    assert versions.is_stale()
+
+
+def test_dataset_versions_refresh_changed():
+    """Refreshing should report whether a version changed"""
+
+    versions = DatasetVersions()
+
+    # The first refresh has nothing to compare with
+    assert not versions.refresh({"employees": "9c1b"})
+    assert not versions.refresh({"employees": "9c1b"})
+    assert versions.refresh({"employees": "4d2e"})
+
+
+def test_dataset_versions_set():
+    """A local load should update the version immediately"""
+
+    versions = DatasetVersions()
+    versions.refresh({"employees": "9c1b"})
+    versions.set("employees", "4d2e")
+
+    assert versions.get("employees") == "4d2e"
+
+
+def test_phone_index_lookup():
+    """Should resolve any format of a number to its employees"""
+
+    phone_index = PhoneIndex()
+    phone_index.build(
+        [
+            {
+                "uuid": "a",
+                "name": "Picard",
+                "addresses": {
+                    "PHONE": [
+                        {"description": "Telefon", "value": "+45 2272 2222"},
+                        {"description": "Mobil", "value": "22722222"},
+                    ]
+                },
+            },
+            {
+                "uuid": "b",
+                "name": "Riker",
+                "addresses": {
+                    "PHONE": [{"description": "Telefon", "value": "22722222"}]
+                },
+            },
+            {"uuid": "c", "name": "Data", "addresses": {}},
+        ],
+        version="v1",
+    )
+
+    matches = phone_index.lookup("0045 22 72 22 22")
+
+    assert [match["uuid"] for match in matches] == ["a", "b"]
+    assert matches[0]["phone"] == {
+        "description": "Telefon",
+        "value": "+45 2272 2222",
+    }
+    assert phone_index.lookup("11111111") == []
+    assert len(phone_index) == 1
+
+
+def test_phone_index_refresh():
+    """Should only rebuild when the dataset version changes"""
+
+    phone_index = PhoneIndex()
+    loader = mock.Mock(return_value=[])
+
+    assert phone_index.refresh(None, loader)
+    assert not phone_index.refresh(None, loader)
+
+    assert phone_index.refresh("v1", loader)
+    assert not phone_index.refresh("v1", loader)
+
+    # The version is unknown if the datastore is unavailable
+    assert not phone_index.refresh(None, loader)
+
+    assert loader.call_count == 2
+
+
+def test_phone_index_refresh_in_background():
+    """Should rebuild by a background thread, one at a time"""
+
+    phone_index = PhoneIndex()
+    release = Event()
+
+    def loader():
+        release.wait(5)
+        return []
+
+    assert phone_index.refresh_in_background("v1", loader)
+    assert not phone_index.refresh_in_background("v1", loader)
+    assert not phone_index.built
+
+    release.set()
+    phone_index.wait(5)
+
+    assert phone_index.built
+    assert phone_index.version == "v1"
+    assert not phone_index.refresh_in_background("v1", loader)
+
+
+def test_phone_index_failed_rebuild():
+    """A failed rebuild should be logged, leaving the index as it was"""
+
+    phone_index = PhoneIndex()
+    loader = mock.Mock(side_effect=RuntimeError("Unavailable"))
+
+    with mock.patch("os2phonebook.cache.log") as mock_log:
+        assert phone_index.refresh_in_background("v1", loader)
+        phone_index.wait(5)
+
+    assert not phone_index.built
+    mock_log.exception.assert_called_once_with("PHONE_INDEX_REBUILD_FAILED")
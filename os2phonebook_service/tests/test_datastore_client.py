@@ -2,14 +2,21 @@ import pytest
 import inspect
 from unittest import mock
 from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import BulkIndexError
 
 from os2phonebook.exceptions import InvalidSearchType
-from os2phonebook.datastore import create_connection, DataStore
+from os2phonebook.cache import SearchCache
+from os2phonebook.datastore import create_connection, parse_hosts, DataStore
+from os2phonebook.helpers import content_hash
 
 from tests.fixtures.elasticsearch_data import (
     all_org_units_from_elasticsearch,
     one_employee_from_elasticsearch,
     no_matches_from_elasticsearch,
+    one_employee_by_name_from_elasticsearch,
+    multi_search_from_elasticsearch,
+    employees_by_ids_from_elasticsearch,
 )
 
 
@@ -29,6 +36,65 @@ def test_connection(db):
     assert isinstance(connection, Elasticsearch)
 
 
+@pytest.mark.parametrize(
+    "host,expected",
+    [
+        ("es1", [{"host": "es1", "port": 9200}]),
+        (
+            "es1, es2:9201,",
+            [{"host": "es1", "port": 9200}, {"host": "es2", "port": 9201}],
+        ),
+        (
+            ["es1", "es2"],
+            [{"host": "es1", "port": 9200}, {"host": "es2", "port": 9200}],
+        ),
+    ],
+)
+def test_parse_hosts(host, expected):
+    """Should parse one or several hosts, with or without a port"""
+
+    assert parse_hosts(host, 9200) == expected
+
+
+@pytest.mark.parametrize("host", ["", " , ", "es1:port"])
+def test_parse_hosts_invalid(host):
+    """Should refuse empty host lists and invalid ports"""
+
+    with pytest.raises(ValueError):
+        parse_hosts(host, 9200)
+
+
+def test_connection_options():
+    """Should configure the pool, timeouts and retries of every host"""
+
+    connection = create_connection(
+        host="es1,es2:9201",
+        port=9200,
+        maxsize=250,
+        timeout=2.5,
+        max_retries=1,
+        retry_on_timeout=True,
+        retry_on_status=(503,),
+        sniff=True,
+    )
+
+    transport = connection.transport
+    nodes = transport.connection_pool.connections
+
+    # The hosts are shuffled by the client
+    assert sorted(node.host for node in nodes) == [
+        "http://es1:9200",
+        "http://es2:9201",
+    ]
+    assert all(node.pool.pool.maxsize == 250 for node in nodes)
+    assert all(node.timeout == 2.5 for node in nodes)
+    assert transport.max_retries == 1
+    assert transport.retry_on_timeout
+    assert transport.retry_on_status == (503,)
+    assert transport.sniff_on_connection_fail
+    assert transport.sniffer_timeout == 60
+
+
 @mock.patch("os2phonebook.datastore.Elasticsearch.search")
 def test_get_all_org_units(mock_search, db):
     """Should return a list of org unit dictionaries"""
@@ -196,8 +262,16 @@ def test_query_for_employee_by_name(db):
         "query": {
             "multi_match": {
                 "query": "Diana Troy",
-                "type": "phrase_prefix",
-                "fields": ["surname", "name"],
+                "type": "bool_prefix",
+                "operator": "and",
+                "fields": [
+                    "surname",
+                    "surname._2gram",
+                    "surname._3gram",
+                    "name",
+                    "name._2gram",
+                    "name._3gram",
+                ],
             }
         },
     }
@@ -218,7 +292,7 @@ def test_fuzzy_query_for_employee_by_name(db):
         "query": {
             "bool": {
                 "must": [{"match": {"name": "Diana Troy"}}],
-                "should": [{"match_phrase_prefix": {"surname": "Troy"}}],
+                "should": [{"match_bool_prefix": {"surname": "Troy"}}],
             }
         },
     }
@@ -229,17 +303,17 @@ def test_fuzzy_query_for_employee_by_name(db):
 
 
 def test_query_for_employee_by_phone(db):
-    """Should return a `match` query with the given arguments"""
+    """Should return a `term` query with the normalised phone number"""
 
     query = db.query_for_employee_by_phone(
-        phone_number="2233", fuzzy_search=False
+        phone_number="+45 22 33 44 55", fuzzy_search=False
     )
 
     expected_index = "employees"
     expected_query = {
         "size": 15,
         "_source": {"includes": ["uuid", "name", "addresses.PHONE"]},
-        "query": {"match": {"addresses.PHONE.value": "2233"}},
+        "query": {"term": {"phone_numbers": "22334455"}},
     }
 
     expected = (expected_index, expected_query)
@@ -248,17 +322,25 @@ def test_query_for_employee_by_phone(db):
 
 
 def test_fuzzy_query_for_employee_by_phone(db):
-    """Should return a `match_phrase_prefix` query with the given arguments"""
+    """Should return a prefix or suffix query with the given arguments"""
 
     query = db.query_for_employee_by_phone(
-        phone_number="3344", fuzzy_search=True
+        phone_number="33 44", fuzzy_search=True
     )
 
     expected_index = "employees"
     expected_query = {
         "size": 15,
         "_source": {"includes": ["uuid", "name", "addresses.PHONE"]},
-        "query": {"match_phrase_prefix": {"addresses.PHONE.value": "3344"}},
+        "query": {
+            "bool": {
+                "should": [
+                    {"prefix": {"phone_numbers": "3344"}},
+                    {"prefix": {"phone_numbers_reversed": "4433"}},
+                ],
+                "minimum_should_match": 1,
+            }
+        },
     }
 
     expected = (expected_index, expected_query)
@@ -416,3 +498,795 @@ def test_query_for_org_unit_by_kle(db):
 
     assert index == expected_index
     assert query == expected_query
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_with_fallback_single_request(mock_msearch, db):
+    """Should send the exact and the fuzzy query in one msearch request"""
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(), no_matches_from_elasticsearch()
+    )
+
+    db.search_with_fallback("employee_by_phone", "2233")
+
+    _, exact_query = db.query_for_employee_by_phone("2233", False)
+    _, fuzzy_query = db.query_for_employee_by_phone("2233", True)
+
+    expected_body = [
+        {"index": "employees"},
+        exact_query,
+        {"index": "employees"},
+        fuzzy_query,
+    ]
+
+    mock_msearch.assert_called_once_with(body=expected_body)
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_with_fallback_prefers_exact(mock_msearch, db):
+    """Should return the exact results when the exact pass matched"""
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        one_employee_by_name_from_elasticsearch(),
+        all_org_units_from_elasticsearch(),
+    )
+
+    results = db.search_with_fallback("employee_by_name", "Anne Yassen")
+
+    assert [result["name"] for result in results] == ["Anne Yassen"]
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_with_fallback_uses_fuzzy(mock_msearch, db):
+    """Should return the fuzzy results when the exact pass came back empty"""
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(),
+        one_employee_by_name_from_elasticsearch(),
+    )
+
+    results = db.search_with_fallback("employee_by_name", "Anne Yas")
+
+    assert [result["name"] for result in results] == ["Anne Yassen"]
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_with_fallback_error(mock_msearch, db):
+    """A failed search within the msearch should raise TransportError"""
+
+    mock_msearch.return_value = {
+        "responses": [
+            {"error": {"type": "index_not_found_exception"}, "status": 404},
+            no_matches_from_elasticsearch(),
+        ]
+    }
+
+    with pytest.raises(TransportError):
+        db.search_with_fallback("employee_by_name", "Anne Yassen")
+
+
+def test_create_versioned_index(db):
+    """Should create a timestamped index with refreshes disabled"""
+
+    with mock.patch.object(db.db, "indices") as mock_indices:
+        index = db.create_versioned_index(
+            "org_units", {"mappings": {"properties": {}}}
+        )
+
+    assert index.startswith("org_units-")
+
+    mock_indices.create.assert_called_once_with(
+        index=index,
+        body={
+            "mappings": {"properties": {}},
+            "settings": {"index": {"refresh_interval": "-1"}},
+        },
+    )
+
+
+def test_swap_alias_replaces_previous_version(db):
+    """Should move the alias from the previous version in one request"""
+
+    with mock.patch.object(db.db, "indices") as mock_indices:
+        mock_indices.exists_alias.return_value = True
+        mock_indices.get_alias.return_value = {
+            "employees-20200101000000": {"aliases": {"employees": {}}}
+        }
+
+        db.swap_alias("employees", "employees-20200102000000")
+
+    mock_indices.update_aliases.assert_called_once_with(
+        body={
+            "actions": [
+                {
+                    "remove": {
+                        "index": "employees-20200101000000",
+                        "alias": "employees",
+                    }
+                },
+                {
+                    "add": {
+                        "index": "employees-20200102000000",
+                        "alias": "employees",
+                    }
+                },
+            ]
+        }
+    )
+
+
+def test_swap_alias_replaces_legacy_index(db):
+    """Should remove a concrete index occupying the alias name"""
+
+    with mock.patch.object(db.db, "indices") as mock_indices:
+        mock_indices.exists_alias.return_value = False
+        mock_indices.exists.return_value = True
+
+        db.swap_alias("employees", "employees-20200102000000")
+
+    mock_indices.update_aliases.assert_called_once_with(
+        body={
+            "actions": [
+                {"remove_index": {"index": "employees"}},
+                {
+                    "add": {
+                        "index": "employees-20200102000000",
+                        "alias": "employees",
+                    }
+                },
+            ]
+        }
+    )
+
+
+def test_prune_versioned_indices(db):
+    """Should keep the published, the previous and any newer version"""
+
+    with mock.patch.object(db.db, "indices") as mock_indices:
+        mock_indices.get.return_value = {
+            "employees-20200101000000": {},
+            "employees-20200102000000": {},
+            "employees-20200103000000": {},
+            "employees-20200104000000": {},
+        }
+
+        stale = db.prune_versioned_indices(
+            "employees",
+            "employees-20200103000000",
+            keep=["employees-20200101000000"],
+        )
+
+    assert stale == ["employees-20200102000000"]
+    mock_indices.delete.assert_called_once_with(
+        index="employees-20200102000000", ignore=[400, 404]
+    )
+
+
+class FakeIndices(object):
+    """Indices and aliases of a cluster, as far as loads use them"""
+
+    def __init__(self, indices: dict):
+        self.indices = indices
+
+    def create(self, index, body):
+        self.indices[index] = set()
+
+    def delete(self, index, ignore=None):
+        self.indices.pop(index, None)
+
+    def get(self, index):
+        prefix = index.rstrip("*")
+        return {name: {} for name in self.indices if name.startswith(prefix)}
+
+    def exists_alias(self, name):
+        return any(name in aliases for aliases in self.indices.values())
+
+    def get_alias(self, name):
+        return {
+            index: {"aliases": {name: {}}}
+            for index, aliases in self.indices.items()
+            if name in aliases
+        }
+
+    def update_aliases(self, body):
+        for action in body["actions"]:
+            for kind, target in action.items():
+                aliases = self.indices[target["index"]]
+                if kind == "add":
+                    aliases.add(target["alias"])
+                else:
+                    aliases.discard(target["alias"])
+
+    def put_settings(self, index, body):
+        pass
+
+    def refresh(self, index):
+        pass
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk")
+def test_failed_load_does_not_replace_rollback_version(
+    mock_streaming_bulk, db
+):
+    """A failed load should neither be published nor kept for a rollback"""
+
+    indices = FakeIndices(
+        {
+            "employees-20200101000000": set(),
+            "employees-20200102000000": {"employees"},
+        }
+    )
+
+    with mock.patch.object(db.db, "indices", indices):
+        mock_streaming_bulk.side_effect = TransportError(500, "bulk failed")
+        with pytest.raises(TransportError):
+            db.reindex("employees", lambda: iter([{}]))
+
+        assert sorted(indices.indices) == [
+            "employees-20200101000000",
+            "employees-20200102000000",
+        ]
+
+        # Loaded partially, then rejecting a document
+        mock_streaming_bulk.side_effect = None
+        mock_streaming_bulk.return_value = [(True, None), (False, None)]
+        with pytest.raises(BulkIndexError):
+            db.reindex("employees", lambda: iter([{}, {}]))
+
+        mock_streaming_bulk.return_value = [(True, None)]
+        db.reindex("employees", lambda: iter([{}]))
+
+        published = db.get_alias_indices("employees")
+
+    assert len(published) == 1
+    assert sorted(indices.indices) == ["employees-20200102000000"] + published
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk")
+def test_reindex_publishes_after_loading(mock_streaming_bulk, db):
+    """Should only publish the new version once the bulk has completed"""
+
+    calls = []
+
+    def fake_bulk(*args, **kwargs):
+        calls.append("bulk")
+        return [(True, None), (True, None)]
+
+    mock_streaming_bulk.side_effect = fake_bulk
+
+    with mock.patch.object(db.db, "indices") as mock_indices:
+        mock_indices.exists_alias.return_value = True
+        mock_indices.get_alias.return_value = {}
+        mock_indices.get.return_value = {}
+        mock_indices.update_aliases.side_effect = lambda **kwargs: (
+            calls.append("swap")
+        )
+
+        result = db.reindex("employees", lambda: iter([{}, {}]))
+
+    assert result == (2, 2)
+    assert calls == ["bulk", "swap"]
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk")
+def test_reindex_keeps_alias_on_failure(mock_streaming_bulk, db):
+    """A failing bulk should leave the published version untouched"""
+
+    mock_streaming_bulk.side_effect = TransportError(500, "bulk failed")
+
+    with mock.patch.object(db.db, "indices") as mock_indices:
+        with pytest.raises(TransportError):
+            db.reindex("employees", lambda: iter([{}]))
+
+    mock_indices.update_aliases.assert_not_called()
+
+
+@mock.patch("os2phonebook.datastore.parallel_bulk")
+@mock.patch("os2phonebook.datastore.streaming_bulk")
+def test_bulk_insert_index_sequential(
+    mock_streaming_bulk, mock_parallel_bulk, db
+):
+    """A single thread should stream the chunks one at a time"""
+
+    mock_streaming_bulk.return_value = [(True, None), (False, None)]
+
+    result = db.bulk_insert_index(
+        "employees", lambda: iter([]), chunk_size=100, max_chunk_bytes=1024
+    )
+
+    assert result == (1, 2)
+    mock_parallel_bulk.assert_not_called()
+
+    _, kwargs = mock_streaming_bulk.call_args
+    assert kwargs["chunk_size"] == 100
+    assert kwargs["max_chunk_bytes"] == 1024
+
+
+@mock.patch("os2phonebook.datastore.parallel_bulk")
+@mock.patch("os2phonebook.datastore.streaming_bulk")
+def test_bulk_insert_index_parallel(
+    mock_streaming_bulk, mock_parallel_bulk, db
+):
+    """Several threads should send the chunks concurrently"""
+
+    mock_parallel_bulk.return_value = [(True, None)] * 3
+
+    result = db.bulk_insert_index(
+        "employees", lambda: iter([]), thread_count=4, chunk_size=250
+    )
+
+    assert result == (3, 3)
+    mock_streaming_bulk.assert_not_called()
+
+    _, kwargs = mock_parallel_bulk.call_args
+    assert kwargs["thread_count"] == 4
+    assert kwargs["chunk_size"] == 250
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk")
+def test_delta_index(mock_streaming_bulk, db):
+    """Should only index changes and delete documents no longer present"""
+
+    unchanged = {"uuid": "a", "name": "Unchanged"}
+    updated = {"uuid": "b", "name": "Updated"}
+    added = {"uuid": "c", "name": "Added"}
+
+    indexed = []
+
+    def consume(client, index, actions, **kwargs):
+        indexed.extend(actions)
+        return [(True, action) for action in indexed]
+
+    mock_streaming_bulk.side_effect = consume
+
+    def generator():
+        for document in (unchanged, updated, added):
+            yield {"_id": document["uuid"], "_source": document}
+
+    indexed_hashes = {
+        "a": content_hash(unchanged),
+        "b": content_hash({"uuid": "b", "name": "Outdated"}),
+        "d": content_hash({"uuid": "d", "name": "Deleted"}),
+    }
+
+    with mock.patch.object(
+        db.db, "indices"
+    ) as mock_indices, mock.patch.object(
+        db, "get_content_hashes", return_value=indexed_hashes
+    ) as mock_hashes:
+        result = db.delta_index("employees", generator)
+
+    # Only the changes are written, to the published index
+    mock_hashes.assert_called_once_with("employees")
+    mock_indices.create.assert_not_called()
+    mock_indices.update_aliases.assert_not_called()
+
+    _, kwargs = mock_streaming_bulk.call_args
+    assert kwargs["index"] == "employees"
+
+    assert result == {
+        "indexed": 3,
+        "total": 3,
+        "added": 1,
+        "updated": 1,
+        "deleted": 1,
+        "unchanged": 1,
+    }
+
+    assert [(a.get("_op_type", "index"), a["_id"]) for a in indexed] == [
+        ("index", "b"),
+        ("index", "c"),
+        ("delete", "d"),
+    ]
+    assert indexed[0]["_source"]["content_hash"] == content_hash(updated)
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk")
+def test_delta_index_counts_duplicates_once(mock_streaming_bulk, db):
+    """A document given twice should be counted as its last occurrence"""
+
+    indexed = []
+
+    def consume(client, index, actions, **kwargs):
+        indexed.extend(actions)
+        return [(True, action) for action in indexed]
+
+    mock_streaming_bulk.side_effect = consume
+
+    unchanged = {"uuid": "a", "name": "Unchanged"}
+
+    def generator():
+        yield {"_id": "b", "_source": {"uuid": "b", "name": "Added"}}
+        yield {"_id": "b", "_source": {"uuid": "b", "name": "Added again"}}
+        yield {"_id": "a", "_source": {"uuid": "a", "name": "Changed"}}
+        yield {"_id": "a", "_source": unchanged}
+
+    with mock.patch.object(db.db, "indices"), mock.patch.object(
+        db, "get_content_hashes", return_value={"a": content_hash(unchanged)}
+    ):
+        result = db.delta_index("employees", generator)
+
+    assert result["added"] == 1
+    assert result["updated"] == 0
+    assert result["unchanged"] == 1
+    assert result["deleted"] == 0
+
+    # The change of the first occurrence of "a" is reverted
+    assert [a["_source"]["name"] for a in indexed] == [
+        "Added",
+        "Added again",
+        "Changed",
+        "Unchanged",
+    ]
+
+
+def test_delta_index_without_published_index(db):
+    """Should fall back to a full reindex"""
+
+    with mock.patch.object(
+        db.db, "indices"
+    ) as mock_indices, mock.patch.object(
+        db, "reindex", return_value=(2, 2)
+    ) as mock_reindex:
+        mock_indices.exists_alias.return_value = False
+
+        result = db.delta_index("employees", lambda: iter([]))
+
+    mock_reindex.assert_called_once()
+    assert result["indexed"] == 2
+    assert result["added"] == 2
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.get")
+def test_get_employee_strips_content_hash(mock_result, db):
+    """The content hash added when indexing should not be returned"""
+
+    response = one_employee_from_elasticsearch()
+    response["_source"]["content_hash"] = "3b4c"
+    mock_result.return_value = response
+
+    employee = db.get_employee("f16eee45-d96a-4efb-bd17-667d1795e13d")
+
+    assert "content_hash" not in employee
+
+
+def org_unit_hits(*uuids, index="org_units-20200101000000") -> dict:
+    """Search result containing org units with the given uuids, sorted"""
+
+    return {
+        "hits": {
+            "hits": [
+                {
+                    "_index": index,
+                    "_id": uuid,
+                    "_source": {"uuid": uuid, "name": uuid, "parent": None},
+                    "sort": [uuid],
+                }
+                for uuid in uuids
+            ]
+        }
+    }
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.search")
+def test_get_org_units_page(mock_search, db):
+    """A full page should return a cursor pinned to the index version"""
+
+    mock_search.return_value = org_unit_hits("a", "b")
+
+    org_units, cursor = db.get_org_units_page(2)
+
+    assert [org_unit["uuid"] for org_unit in org_units] == ["a", "b"]
+    assert cursor == {
+        "index": "org_units-20200101000000",
+        "search_after": ["b"],
+    }
+
+    _, kwargs = mock_search.call_args
+    assert kwargs["index"] == "org_units"
+    assert kwargs["body"]["size"] == 2
+    assert "search_after" not in kwargs["body"]
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.search")
+def test_get_org_units_page_with_cursor(mock_search, db):
+    """The cursor should continue on the pinned index version"""
+
+    mock_search.return_value = org_unit_hits("c")
+
+    cursor = {"index": "org_units-20200101000000", "search_after": ["b"]}
+    org_units, next_cursor = db.get_org_units_page(2, cursor)
+
+    assert [org_unit["uuid"] for org_unit in org_units] == ["c"]
+    assert next_cursor is None
+
+    _, kwargs = mock_search.call_args
+    assert kwargs["index"] == "org_units-20200101000000"
+    assert kwargs["body"]["search_after"] == ["b"]
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.search")
+def test_iter_all_org_units(mock_search, db):
+    """Should page through every org unit without asking for the size"""
+
+    mock_search.side_effect = [
+        org_unit_hits("a", "b"),
+        org_unit_hits("c", "d"),
+        org_unit_hits(),
+    ]
+
+    org_units = list(db.iter_all_org_units(page_size=2))
+
+    assert [org_unit["uuid"] for org_unit in org_units] == [
+        "a",
+        "b",
+        "c",
+        "d",
+    ]
+    assert mock_search.call_count == 3
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.search")
+def test_search_cached(mock_search):
+    """Repeated searches should be served from the cache"""
+
+    connection = create_connection(host="testhost", port=9090)
+    db = DataStore(connection, cache=SearchCache())
+
+    mock_search.return_value = one_employee_by_name_from_elasticsearch()
+
+    first = db.search("employee_by_name", "Anne Yassen")
+    second = db.search("employee_by_name", "anne  yassen")
+
+    assert first == second
+    assert mock_search.call_count == 1
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_with_fallback_cached(mock_msearch):
+    """Both passes should be cached, including an empty exact pass"""
+
+    connection = create_connection(host="testhost", port=9090)
+    cache = SearchCache()
+    db = DataStore(connection, cache=cache)
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(),
+        one_employee_by_name_from_elasticsearch(),
+    )
+
+    first = db.search_with_fallback("employee_by_name", "Anne Yas")
+    second = db.search_with_fallback("employee_by_name", "Anne Yas")
+
+    assert first == second
+    assert [result["name"] for result in second] == ["Anne Yassen"]
+    assert mock_msearch.call_count == 1
+
+    # The fuzzy pass is cached for regular searches as well
+    found, _ = cache.get(cache.key("employee_by_name", "Anne Yas", True))
+    assert found
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.mget")
+def test_get_dataset_versions(mock_mget, db):
+    """Should return the version of every loaded index"""
+
+    mock_mget.return_value = {
+        "docs": [
+            {
+                "_index": "dataset_versions",
+                "_id": "employees",
+                "found": True,
+                "_source": {"version": "9c1b"},
+            },
+            {"_index": "dataset_versions", "_id": "org_units", "found": False},
+        ]
+    }
+
+    assert db.get_dataset_versions() == {"employees": "9c1b"}
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.mget")
+def test_get_employees(mock_mget, db):
+    """Should fetch every document in one request and report missing ids"""
+
+    mock_mget.return_value = employees_by_ids_from_elasticsearch()
+
+    uuids = [
+        "f16eee45-d96a-4efb-bd17-667d1795e13d",
+        "00000000-0000-0000-0000-000000000000",
+    ]
+    employees, missing = db.get_employees(uuids, ["uuid", "name"])
+
+    assert [employee["uuid"] for employee in employees] == uuids[:1]
+    assert missing == uuids[1:]
+
+    mock_mget.assert_called_once_with(
+        index="employees",
+        body={
+            "docs": [
+                {"_id": uuid, "_source": {"includes": ["uuid", "name"]}}
+                for uuid in uuids
+            ]
+        },
+    )
+
+
+def test_employees_index_definition(db):
+    """Names should be indexed for search as you type"""
+
+    properties = db.index_definitions["employees"]["mappings"]["properties"]
+
+    assert properties["name"] == {"type": "search_as_you_type"}
+    assert properties["surname"] == {"type": "search_as_you_type"}
+
+
+def test_query_for_employee_by_name_fields_are_mapped(db):
+    """Every field searched should exist in the index definition"""
+
+    _, query = db.query_for_employee_by_name("Diana Troy", False)
+
+    properties = db.index_definitions["employees"]["mappings"]["properties"]
+
+    for field in query["query"]["multi_match"]["fields"]:
+        root_field, _, subfield = field.partition(".")
+        assert properties[root_field]["type"] == "search_as_you_type"
+        assert subfield in ("", "_2gram", "_3gram")
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk")
+def test_reindex_employees_phone_numbers(mock_streaming_bulk, db):
+    """Employees should be indexed with their normalised phone numbers"""
+
+    indexed = []
+
+    def consume(client, index, actions, **kwargs):
+        indexed.extend(actions)
+        return [(True, action) for action in indexed]
+
+    mock_streaming_bulk.side_effect = consume
+
+    employee = {
+        "uuid": "a",
+        "addresses": {
+            "PHONE": [
+                {"description": "Telefon", "value": "+45 22 72 22 22"},
+                {"description": "Mobil", "value": "2272 2222"},
+                {"description": "Lokal", "value": "4512"},
+            ]
+        },
+    }
+
+    def generator():
+        yield {"_id": "a", "_source": employee}
+
+    with mock.patch.object(db.db, "indices") as mock_indices:
+        mock_indices.get.return_value = {}
+        db.reindex("employees", generator)
+
+    document = indexed[0]["_source"]
+
+    assert document["phone_numbers"] == ["22722222", "4512"]
+    assert document["phone_numbers_reversed"] == ["22222722", "2154"]
+    assert document["content_hash"] == content_hash(employee)
+
+
+@mock.patch("os2phonebook.datastore.scan")
+def test_iter_employee_phone_numbers(mock_scan, db):
+    """Should scan the employees with a phone number"""
+
+    mock_scan.return_value = iter(
+        [{"_id": "a", "_source": {"uuid": "a", "name": "Picard"}}]
+    )
+
+    employees = list(db.iter_employee_phone_numbers())
+
+    assert employees == [{"uuid": "a", "name": "Picard"}]
+
+    query = mock_scan.call_args[1]["query"]
+    assert query["query"] == {"exists": {"field": "phone_numbers"}}
+    assert mock_scan.call_args[1]["index"] == "employees"
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_everything_single_request(mock_msearch, db):
+    """Should send both passes of every search type in one msearch"""
+
+    search_types = list(db.search_type_map)
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        *[no_matches_from_elasticsearch() for _ in search_types * 2]
+    )
+
+    results = db.search_everything("Riker")
+
+    assert list(results) == search_types
+    assert all(documents == [] for documents in results.values())
+
+    expected_body = []
+    for search_type in search_types:
+        for fuzzy_search in (False, True):
+            index, query, _ = db._prepare_search(
+                search_type, "Riker", fuzzy_search
+            )
+            expected_body.extend([{"index": index}, query])
+
+    mock_msearch.assert_called_once_with(body=expected_body)
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_everything_fallback_and_limit(mock_msearch, db):
+    """Should fall back per search type and cap the size of the queries"""
+
+    responses = [no_matches_from_elasticsearch() for _ in range(12)]
+
+    # Fuzzy employee_by_name, exact org_unit_by_name
+    responses[1] = one_employee_by_name_from_elasticsearch()
+    responses[8] = all_org_units_from_elasticsearch()
+    responses[9] = one_employee_by_name_from_elasticsearch()
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(*responses)
+
+    results = db.search_everything("Anne", limit=2)
+
+    assert [r["name"] for r in results["employee_by_name"]] == ["Anne Yassen"]
+    assert results["org_unit_by_name"][0]["name"] != "Anne Yassen"
+    assert results["employee_by_email"] == []
+
+    queries = mock_msearch.call_args[1]["body"][1::2]
+    assert [query["size"] for query in queries] == [2] * 12
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_everything_limit_cached_separately(mock_msearch):
+    """Capped searches should not be served from uncapped results"""
+
+    connection = create_connection(host="testhost", port=9090)
+    cache = SearchCache()
+    db = DataStore(connection, cache=cache)
+
+    cache.set(cache.key("employee_by_name", "Anne", False), ["a", "b", "c"])
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        *[no_matches_from_elasticsearch() for _ in range(12)]
+    )
+
+    results = db.search_everything("Anne", limit=2)
+
+    assert results["employee_by_name"] == []
+    assert len(mock_msearch.call_args[1]["body"]) == 24
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_everything_cached(mock_msearch):
+    """Search types with cached results should not be searched again"""
+
+    connection = create_connection(host="testhost", port=9090)
+    cache = SearchCache()
+    db = DataStore(connection, cache=cache)
+
+    cache.set(cache.key("employee_by_name", "Anne", False), ["cached"])
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        *[no_matches_from_elasticsearch() for _ in range(10)]
+    )
+
+    results = db.search_everything("Anne")
+
+    assert results["employee_by_name"] == ["cached"]
+    assert len(mock_msearch.call_args[1]["body"]) == 20
+
+    # Every search type is cached by now
+    db.search_everything("Anne")
+    assert mock_msearch.call_count == 1
+
+
+def test_query_for_employee_by_phone_without_digits(db):
+    """A search value without digits should not match every number"""
+
+    _, exact_query = db.query_for_employee_by_phone("Riker", False)
+    _, fuzzy_query = db.query_for_employee_by_phone("Riker", True)
+
+    assert exact_query["query"] == {"match_none": {}}
+    assert fuzzy_query["query"] == {"match_none": {}}
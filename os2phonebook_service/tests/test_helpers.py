@@ -0,0 +1,265 @@
+import io
+import json
+import pytest
+
+from os2phonebook import helpers
+from os2phonebook.helpers import (
+    connection_options,
+    content_hash,
+    dump_file,
+    iter_json_object,
+    iter_ndjson,
+    load_file,
+    normalise_phone_number,
+    read_file_header,
+)
+
+
+def test_iter_json_object():
+    """Should yield every key value pair of the object in order"""
+
+    payload = {
+        "f06ee470-9f17-566f-acbe-e938112d46d9": {"name": "Kolding Kommune"},
+        "7a8e45f7-4de0-44c8-990f-43c0565ee505": {"name": "Skole og Børn"},
+    }
+    stream = io.BytesIO(json.dumps(payload).encode("utf-8"))
+
+    assert list(iter_json_object(stream)) == list(payload.items())
+
+
+def test_iter_json_object_small_chunks():
+    """Values and multi-byte characters split across chunks should parse"""
+
+    payload = {
+        "a": {"name": "Skole og Børn", "kles": [{"title": "Æ Ø Å"}]},
+        "b": 12345,
+        "c": [1.5, None, True],
+    }
+    stream = io.BytesIO(json.dumps(payload, ensure_ascii=False).encode())
+
+    assert dict(iter_json_object(stream, chunk_size=3)) == payload
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 12))
+def test_iter_json_object_split_tokens(chunk_size):
+    """Literals, escapes and numbers split across chunks should parse"""
+
+    payload = b'{"a": [true, false, null], "b": "\\u00e6", "c": [1.5e-3, -2]}'
+
+    assert dict(iter_json_object(io.BytesIO(payload), chunk_size)) == {
+        "a": [True, False, None],
+        "b": "æ",
+        "c": [1.5e-3, -2],
+    }
+
+
+def test_iter_json_object_invalid_before_tail():
+    """Invalid json should be reported without reading the rest"""
+
+    tail = b", ".join(b'"%d": {"uuid": "%d"}' % (i, i) for i in range(50000))
+    stream = io.BytesIO(b'{"a": {"uuid": x}, ' + tail + b"}")
+
+    with pytest.raises(ValueError):
+        list(iter_json_object(stream, chunk_size=1024))
+
+    assert stream.tell() == 1024
+
+
+def test_iter_json_object_empty_object():
+    """An empty object should yield nothing"""
+
+    assert list(iter_json_object(io.BytesIO(b" { } \n"))) == []
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        b"",
+        b"[]",
+        b'{"a": 1',
+        b'{"a" 1}',
+        b'{"a": 1 "b": 2}',
+        b'{"a": 1} {"b": 2}',
+        b'{"a": tru}',
+        b'{"a": "b\n"}',
+        b'{"a": 1.x}',
+    ],
+)
+def test_iter_json_object_invalid(payload):
+    """Anything but a single complete json object should raise ValueError"""
+
+    with pytest.raises(ValueError):
+        list(iter_json_object(io.BytesIO(payload), chunk_size=2))
+
+
+def test_iter_ndjson():
+    """Should yield one document per non-blank line"""
+
+    stream = io.BytesIO(
+        b'{"uuid": "a", "name": "Skole og B\xc3\xb8rn"}\n'
+        b"\n"
+        b'{"uuid": "b"}'
+    )
+
+    assert list(iter_ndjson(stream)) == [
+        {"uuid": "a", "name": "Skole og Børn"},
+        {"uuid": "b"},
+    ]
+
+
+def test_iter_ndjson_invalid_line():
+    """A malformed line should raise ValueError naming the line"""
+
+    stream = io.BytesIO(b'{"uuid": "a"}\n{"uuid": \n')
+
+    with pytest.raises(ValueError, match="Line 2"):
+        list(iter_ndjson(stream))
+
+
+@pytest.mark.parametrize("compression", ["gzip", "none"])
+def test_snapshot(tmp_path, compression):
+    """Should write and read the records along with a header"""
+
+    filename = str(tmp_path / "employees.snapshot")
+    payload = {
+        "a": {"uuid": "a", "name": "Skole og Børn"},
+        "b": {"uuid": "b", "name": "Emil"},
+    }
+
+    header = dump_file(filename, iter(payload.items()), "v1", compression)
+
+    assert header["count"] == 2
+    assert read_file_header(filename) == header
+    assert dict(load_file(filename)) == payload
+
+
+def test_snapshot_header_is_not_compressed(tmp_path):
+    """Should read the header without the compressed records"""
+
+    filename = str(tmp_path / "org_units.snapshot")
+    dump_file(filename, {"a": {"uuid": "a"}}, dataset_version="v1")
+
+    with open(filename, "rb") as file:
+        header = json.loads(file.readline())
+
+    assert header["dataset_version"] == "v1"
+    assert header["compression"] == "gzip"
+
+
+def test_snapshot_truncated(tmp_path):
+    """Should refuse a snapshot holding fewer records than counted"""
+
+    filename = str(tmp_path / "employees.snapshot")
+    dump_file(filename, {"a": 1, "b": 2}, compression="none")
+
+    with open(filename, "rb+") as file:
+        file.truncate(helpers.SNAPSHOT_HEADER_SIZE + len(b'["a",1]\n'))
+
+    with pytest.raises(ValueError, match="1 of 2"):
+        list(load_file(filename))
+
+
+def test_snapshot_failed_dump_keeps_file(tmp_path):
+    """Should leave the previous snapshot if writing fails"""
+
+    filename = str(tmp_path / "employees.snapshot")
+    dump_file(filename, {"a": 1})
+
+    def records():
+        yield "b", 2
+        raise RuntimeError("Load failed")
+
+    with pytest.raises(RuntimeError):
+        dump_file(filename, records())
+
+    assert dict(load_file(filename)) == {"a": 1}
+    assert not (tmp_path / "employees.snapshot.tmp").exists()
+
+
+def test_snapshot_invalid(tmp_path):
+    """Should refuse anything but a snapshot"""
+
+    filename = tmp_path / "employees.json"
+    filename.write_text(json.dumps({"a": 1}))
+
+    with pytest.raises(ValueError):
+        read_file_header(str(filename))
+
+    with pytest.raises(ValueError):
+        dump_file(str(filename), {}, compression="lzma")
+
+
+def test_content_hash_ignores_key_order():
+    """Documents with the same content should have the same hash"""
+
+    first = {"uuid": "a", "name": "Emil", "addresses": {"PHONE": []}}
+    second = {"addresses": {"PHONE": []}, "name": "Emil", "uuid": "a"}
+
+    assert content_hash(first) == content_hash(second)
+
+
+def test_content_hash_changes_with_content():
+    """Any change to the content should change the hash"""
+
+    first = {"uuid": "a", "name": "Emil"}
+    second = {"uuid": "a", "name": "Emil Madsen"}
+
+    assert content_hash(first) != content_hash(second)
+
+
+@pytest.mark.parametrize(
+    "phone_number,expected",
+    [
+        ("22722222", "22722222"),
+        ("2272 2222", "22722222"),
+        ("+45 22 72 22 22", "22722222"),
+        ("0045 22722222", "22722222"),
+        ("45 22 72 22 22", "22722222"),
+        ("+46 8 123 456 78", "46812345678"),
+        ("4512", "4512"),
+        ("+45 22 7", "227"),
+        ("004522", "22"),
+        ("+4522", "22"),
+        (" +45", ""),
+        ("+46 8 1", "4681"),
+        ("0046 8 1", "4681"),
+        ("tlf.", ""),
+    ],
+)
+def test_normalise_phone_number(phone_number, expected):
+    """Should reduce phone numbers to their digits, without +45"""
+
+    assert normalise_phone_number(phone_number) == expected
+
+
+def test_connection_options():
+    """Should parse the connection options of the configuration"""
+
+    config = {
+        "ELASTICSEARCH_POOL_MAXSIZE": "1000",
+        "ELASTICSEARCH_TIMEOUT": "2.5",
+        "ELASTICSEARCH_MAX_RETRIES": "1",
+        "ELASTICSEARCH_RETRY_ON_TIMEOUT": "true",
+        "ELASTICSEARCH_RETRY_ON_STATUS": "502,503",
+        "ELASTICSEARCH_SNIFF": "no",
+    }
+
+    assert connection_options(config) == {
+        "maxsize": 1000,
+        "timeout": 2.5,
+        "max_retries": 1,
+        "retry_on_timeout": True,
+        "retry_on_status": (502, 503),
+        "sniff": False,
+    }
+
+
+def test_connection_options_defaults():
+    """Should fall back to the defaults of config_factory"""
+
+    options = connection_options({})
+
+    assert options["maxsize"] == 1000
+    assert options["retry_on_status"] == (502, 503, 504)
+    assert not options["retry_on_timeout"]
+    assert not options["sniff"]
@@ -0,0 +1,144 @@
+import json
+import pytest
+from uuid import UUID
+from datetime import datetime
+from unittest import mock
+from flask import Flask, jsonify, request
+from elasticsearch.exceptions import SerializationError
+
+from os2phonebook import json_provider
+
+from tests.fixtures.elasticsearch_data import (
+    all_org_units_from_elasticsearch,
+    one_employee_from_elasticsearch,
+)
+
+
+@pytest.fixture(params=["orjson", "json"])
+def provider(request):
+    """Run the test with orjson and with the standard library"""
+
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+        yield request.param
+    else:
+        with mock.patch.object(json_provider, "orjson", None):
+            yield request.param
+
+
+@pytest.fixture
+def app(provider) -> Flask:
+    """Flask app using the JSON provider"""
+
+    app = Flask(__name__)
+    json_provider.init_app(app)
+
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        return jsonify(request.get_json())
+
+    return app
+
+
+def test_provider_name(provider):
+    """Should report the implementation in use"""
+
+    assert json_provider.provider_name() == provider
+
+
+def test_dumps_loads(provider):
+    """Should round trip the fixture documents"""
+
+    document = one_employee_from_elasticsearch()
+
+    encoded = json_provider.dumps(document)
+
+    assert isinstance(encoded, bytes)
+    assert json_provider.loads(encoded) == document
+    assert json.loads(encoded) == document
+
+
+def test_dumps_big_integer(provider):
+    """Integers beyond 64 bits should be left to the standard library"""
+
+    assert json_provider.dumps({"value": 2**70}) == b'{"value":%d}' % (2**70)
+
+
+def test_loads_invalid(provider):
+    """Invalid json should raise ValueError"""
+
+    with pytest.raises(ValueError):
+        json_provider.loads(b'{"uuid": ')
+
+
+def test_jsonify_matches_standard_library(app):
+    """The response should equal the one of the standard encoder"""
+
+    document = {
+        "name": "Skole og Børn",
+        "uuid": UUID("7a8e45f7-4de0-44c8-990f-43c0565ee505"),
+        "changed": datetime(2020, 6, 12, 10, 0, 0),
+        "parent": None,
+    }
+
+    with app.app_context():
+        response = jsonify(document)
+
+    expected = {
+        "name": "Skole og Børn",
+        "uuid": "7a8e45f7-4de0-44c8-990f-43c0565ee505",
+        "changed": "Fri, 12 Jun 2020 10:00:00 GMT",
+        "parent": None,
+    }
+
+    assert json.loads(response.get_data()) == expected
+
+    # Keys are sorted as configured by JSON_SORT_KEYS
+    keys = list(json.loads(response.get_data(), object_pairs_hook=list))
+    assert [key for key, _ in keys] == sorted(expected)
+
+
+def test_get_json(app):
+    """Request bodies should be parsed by the provider"""
+
+    document = all_org_units_from_elasticsearch()
+
+    response = app.test_client().post("/echo", json=document)
+
+    assert response.status_code == 200
+    assert response.get_json() == document
+
+
+def test_get_json_invalid(app):
+    """Invalid request bodies should be refused"""
+
+    response = app.test_client().post(
+        "/echo", data=b"{", content_type="application/json"
+    )
+
+    assert response.status_code == 400
+
+
+def test_serializer(provider):
+    """Should serialize requests to and responses from Elasticsearch"""
+
+    serializer = json_provider.Serializer()
+
+    document = {
+        "uuid": UUID("7a8e45f7-4de0-44c8-990f-43c0565ee505"),
+        "name": "Skole og Børn",
+    }
+
+    encoded = serializer.dumps(document)
+
+    assert isinstance(encoded, str)
+    assert serializer.loads(encoded) == {
+        "uuid": "7a8e45f7-4de0-44c8-990f-43c0565ee505",
+        "name": "Skole og Børn",
+    }
+
+    # Bulk request lines are already serialized
+    assert serializer.dumps('{"index":{}}') == '{"index":{}}'
+
+    with pytest.raises(SerializationError):
+        serializer.loads("{")
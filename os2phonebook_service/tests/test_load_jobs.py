@@ -0,0 +1,185 @@
+import os
+import pytest
+from base64 import b64encode
+from threading import Event
+from elasticsearch.helpers import BulkIndexError
+
+from os2phonebook.app import initiate_application
+from os2phonebook.load_jobs import LoadJobs, describe_errors
+
+from tests.test_memory_datastore import employees
+from tests.test_service_api import wait_for_load_job
+
+
+@pytest.fixture
+def jobs(tmp_path) -> LoadJobs:
+    """Create a LoadJobs keeping its statuses in a temporary directory"""
+
+    return LoadJobs(str(tmp_path))
+
+
+def test_job_succeeds(jobs):
+    """Should report the statistics of the load"""
+
+    job = jobs.create("employees", "full", total=3)
+
+    assert jobs.get(job["id"])["state"] == "queued"
+
+    def run(progress):
+        progress(2)
+        return {"indexed": 2, "total": 3}
+
+    jobs.submit(job, run).result()
+
+    status = jobs.get(job["id"])
+
+    assert status["state"] == "succeeded"
+    assert status["indexed"] == 2
+    assert status["failed"] == 1
+    assert status["docs_per_second"] > 0
+    assert status["result"] == {"indexed": 2, "total": 3}
+
+
+def test_job_fails(jobs):
+    """Should report the errors failing the load"""
+
+    job = jobs.create("employees", "full", total=1)
+
+    def run(progress):
+        raise BulkIndexError("1 document(s) failed to index.", [{"a": 1}])
+
+    jobs.submit(job, run).result()
+
+    status = jobs.get(job["id"])
+
+    assert status["state"] == "failed"
+    assert status["indexed"] == 0
+    assert status["failed"] == 1
+    assert status["errors"] == [
+        "BulkIndexError: ('1 document(s) failed to index.', [{'a': 1}])",
+        '{"a": 1}',
+    ]
+
+
+def test_job_fails_partially(jobs):
+    """Should report the documents indexed before the load failed"""
+
+    job = jobs.create("employees", "full", total=10)
+
+    def run(progress):
+        progress(5)
+        raise BulkIndexError(
+            "2 document(s) failed to index.", [{"a": 1}, {"b": 2}]
+        )
+
+    jobs.submit(job, run).result()
+
+    status = jobs.get(job["id"])
+
+    assert status["state"] == "failed"
+    assert status["processed"] == 5
+    assert status["indexed"] == 3
+    assert status["failed"] == 2
+    assert len(status["errors"]) == 3
+
+
+def test_loads_of_an_index_are_serialized(jobs):
+    """Should only run one load of an index at a time"""
+
+    started = Event()
+    release = Event()
+
+    def blocking(progress):
+        started.set()
+        release.wait(5)
+        return {"indexed": 1, "total": 1}
+
+    first = jobs.create("employees", "full", total=1)
+    second = jobs.create("employees", "full", total=1)
+    other = jobs.create("org_units", "full", total=1)
+
+    first_future = jobs.submit(first, blocking)
+    started.wait(5)
+
+    second_future = jobs.submit(second, lambda progress: blocking(progress))
+    jobs.submit(other, lambda progress: {"indexed": 1, "total": 1}).result(5)
+
+    assert jobs.get(second["id"])["state"] == "queued"
+    assert jobs.get(other["id"])["state"] == "succeeded"
+
+    release.set()
+    first_future.result(5)
+    second_future.result(5)
+
+    assert jobs.get(second["id"])["state"] == "succeeded"
+
+
+def test_interrupted_job(jobs):
+    """Should report jobs of exited workers as failed"""
+
+    job = jobs.create("employees", "full", total=1)
+    job["state"] = "running"
+    job["pid"] = 2**22 + 1
+    jobs.save(job)
+
+    assert jobs.get(job["id"])["state"] == "failed"
+
+
+def test_prune(jobs, tmp_path):
+    """Should delete the statuses of expired jobs"""
+
+    job = jobs.create("employees", "full", total=1)
+    os.utime(tmp_path / f"{job['id']}.json", (0, 0))
+
+    jobs.prune()
+
+    assert jobs.get(job["id"]) is None
+
+
+def test_describe_errors():
+    """Should describe the exception"""
+
+    assert describe_errors(RuntimeError("Failed")) == ["RuntimeError: Failed"]
+
+
+def test_load_job_api(tmp_path):
+    """Should report the job of a load, to the data loader only"""
+
+    app = initiate_application(
+        {
+            "OS2PHONEBOOK_COMPANY_NAME": "Magenta Aps",
+            "OS2PHONEBOOK_BACKEND": "memory",
+            "OS2PHONEBOOK_LOAD_JOB_DIR": str(tmp_path),
+            "OS2PHONEBOOK_DATALOADER_USERNAME": "dataloader",
+            "OS2PHONEBOOK_DATALOADER_PASSWORD": "Password1",
+        }
+    )
+    http_client = app.test_client()
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+
+    response = http_client.post(
+        "/api/load-employees", json=employees(), headers=headers
+    )
+
+    assert response.status_code == 202
+    assert response.get_json()["state"] == "queued"
+    assert response.get_json()["total"] == 2
+
+    job = wait_for_load_job(http_client, response, headers)
+
+    assert job["state"] == "succeeded"
+    assert job["indexed"] == 2
+
+    # The spooled documents are removed without a snapshot directory
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [
+        ".json",
+        ".lock",
+    ]
+
+    assert http_client.get(response.headers["Location"]).status_code == 401
+
+    missing = "/api/load-jobs/00000000-0000-0000-0000-000000000000"
+
+    assert http_client.get(missing, headers=headers).status_code == 404
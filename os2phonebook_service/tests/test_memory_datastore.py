@@ -0,0 +1,356 @@
+import copy
+import pytest
+from base64 import b64encode
+from elasticsearch.exceptions import NotFoundError, RequestError
+
+from os2phonebook.app import initiate_application
+from os2phonebook.async_app import initiate_async_application
+from os2phonebook.memory_datastore import (
+    FieldIndex,
+    MemoryDataStore,
+    MemoryStore,
+)
+
+from tests.fixtures.elasticsearch_data import (
+    one_employee_from_elasticsearch,
+    one_unit_from_elasticsearch,
+)
+from tests.test_service_api import wait_for_load_job
+
+
+def employees() -> dict:
+    """Employees by uuid, as sent to `/api/load-employees`"""
+
+    employee = one_employee_from_elasticsearch()["_source"]
+
+    other = copy.deepcopy(employee)
+    other.update(
+        {
+            "uuid": "0b0cd4a6-5c69-4d1c-a5a5-1a4d3c1a3ad2",
+            "name": "Anne Winther Jensen",
+            "surname": "Jensen",
+            "engagements": [{"title": "Overlærer"}],
+        }
+    )
+    other["addresses"]["PHONE"] = [{"value": "+45 22 72 22 22"}]
+    other["addresses"]["EMAIL"] = [{"value": "anne@kolding.dk"}]
+
+    return {employee["uuid"]: employee, other["uuid"]: other}
+
+
+def org_units() -> dict:
+    """Org units by uuid, as sent to `/api/load-org-units`"""
+
+    org_unit = one_unit_from_elasticsearch()["_source"]
+    org_unit["kles"] = [
+        {"title": "00.01 Skoleadministration"},
+        {"title": "05.04 Veje"},
+        {"title": "17.01 Skolevæsenet"},
+    ]
+
+    return {org_unit["uuid"]: org_unit}
+
+
+def generator(documents: dict):
+    """Bulk action generator function for the documents"""
+
+    def actions():
+        for uuid, document in documents.items():
+            yield {"_id": uuid, "_source": document}
+
+    return actions
+
+
+@pytest.fixture
+def db() -> MemoryDataStore:
+    """Create a MemoryDataStore holding the test documents"""
+
+    db = MemoryDataStore(MemoryStore())
+    db.reindex("employees", generator(employees()))
+    db.reindex("org_units", generator(org_units()))
+
+    return db
+
+
+def names(results: list) -> list:
+    return [document["name"] for document in results]
+
+
+def test_requires_a_memory_store():
+    """Should refuse any other client"""
+
+    with pytest.raises(TypeError):
+        MemoryDataStore(object())
+
+
+def test_field_index_prefix():
+    """Should find every word starting with a prefix"""
+
+    index = FieldIndex()
+    index.add("a", ["Jean Luc Picard"])
+    index.add("b", ["Mario Picardo"])
+    index.remove("b")
+
+    assert index.prefix("pic") == ({"a"}, 1.0)
+    assert index.phrase("a", ["luc", "pi"], prefix=True)
+    assert not index.phrase("a", ["jean", "pi"], prefix=True)
+
+
+def test_get_employee(db):
+    """Should return the document without the fields added when indexing"""
+
+    employee = db.get_employee("f16eee45-d96a-4efb-bd17-667d1795e13d")
+
+    assert employee == one_employee_from_elasticsearch()["_source"]
+
+
+def test_get_employee_not_found(db):
+    """Should raise the error raised by the Elasticsearch client"""
+
+    with pytest.raises(NotFoundError):
+        db.get_employee("missing")
+
+
+def test_get_employees(db):
+    """Should return the documents found and the identifiers missing"""
+
+    documents, missing = db.get_employees(
+        ["0b0cd4a6-5c69-4d1c-a5a5-1a4d3c1a3ad2", "missing"], ["name"]
+    )
+
+    assert documents == [{"name": "Anne Winther Jensen"}]
+    assert missing == ["missing"]
+
+
+def test_documents_are_copies(db):
+    """Should not hand out the stored documents"""
+
+    employee = db.get_employee("f16eee45-d96a-4efb-bd17-667d1795e13d")
+    employee["addresses"]["PHONE"].clear()
+
+    assert db.search("employee_by_phone", "64535362")
+
+
+def test_get_all_org_units(db):
+    """Should return the paged org units"""
+
+    assert db.get_all_org_units() == [
+        {
+            "uuid": "1f06ed67-aa6e-4bbc-96d9-2f262b9202b5",
+            "name": "Budget og Planlægning",
+            "parent": "b6c11152-0645-4712-a207-ba2c53b391ab",
+        }
+    ]
+
+
+@pytest.mark.parametrize(
+    "search_type,search_value,fuzzy_search,expected",
+    [
+        # Every word, the last as a prefix, in any of the name fields
+        (
+            "employee_by_name",
+            "Jan Niel",
+            False,
+            ["Jan Elkjær Winther Nielsen"],
+        ),
+        ("employee_by_name", "jensen", False, ["Anne Winther Jensen"]),
+        ("employee_by_name", "Jan Jensen", False, []),
+        # Any word of the name, ranking the last name as a prefix higher
+        (
+            "employee_by_name",
+            "Jan Jensen",
+            True,
+            ["Anne Winther Jensen", "Jan Elkjær Winther Nielsen"],
+        ),
+        ("employee_by_phone", "22 72 22 22", False, ["Anne Winther Jensen"]),
+        ("employee_by_phone", "2272", False, []),
+        ("employee_by_phone", "5362", True, ["Jan Elkjær Winther Nielsen"]),
+        ("employee_by_phone", "+45 22 7", True, ["Anne Winther Jensen"]),
+        ("employee_by_phone", "004522", True, ["Anne Winther Jensen"]),
+        ("employee_by_phone", "Jan", True, []),
+        ("employee_by_email", "anne@kol", False, ["Anne Winther Jensen"]),
+        (
+            "employee_by_email",
+            "jann@kolding.dk",
+            False,
+            ["Jan Elkjær Winther Nielsen"],
+        ),
+        (
+            "employee_by_engagement",
+            "lærer",
+            False,
+            ["Jan Elkjær Winther Nielsen"],
+        ),
+        # Words are split on any character other than letters and digits
+        (
+            "employee_by_engagement",
+            "over",
+            False,
+            ["Jan Elkjær Winther Nielsen", "Anne Winther Jensen"],
+        ),
+        ("org_unit_by_name", "Budget og pl", False, ["Budget og Planlægning"]),
+        ("org_unit_by_name", "Planlægning og", False, []),
+    ],
+)
+def test_search(db, search_type, search_value, fuzzy_search, expected):
+    """Should emulate the query semantics of Elasticsearch"""
+
+    results = db.search(search_type, search_value, fuzzy_search)
+
+    assert names(results) == expected
+
+
+def test_search_ranks_names_in_order(db):
+    """Should rank names matching the words in the order searched higher"""
+
+    results = db.search("employee_by_name", "Winther")
+
+    assert len(results) == 2
+
+    results = db.search("employee_by_name", "Anne Winther")
+
+    assert names(results) == ["Anne Winther Jensen"]
+
+
+def test_search_by_kle(db):
+    """Should embed the matching kles, as the nested inner hits"""
+
+    results = db.search("org_unit_by_kle", "skole")
+
+    assert results == [
+        {
+            "uuid": "1f06ed67-aa6e-4bbc-96d9-2f262b9202b5",
+            "name": "Budget og Planlægning",
+            "kles": [
+                {"title": "00.01 Skoleadministration"},
+                {"title": "17.01 Skolevæsenet"},
+            ],
+        }
+    ]
+
+
+def test_search_everything(db):
+    """Should search every search type with a fuzzy fallback"""
+
+    results = db.search_everything("Jensen")
+
+    assert names(results["employee_by_name"]) == ["Anne Winther Jensen"]
+    assert results["org_unit_by_kle"] == []
+
+
+def test_search_everything_limit(db):
+    """Should return no more documents per search type than the limit"""
+
+    results = db.search_everything("Winther", limit=1)
+
+    assert len(results["employee_by_name"]) == 1
+
+
+def test_unsupported_query(db):
+    """Should refuse queries outside of the emulated query DSL"""
+
+    with pytest.raises(RequestError):
+        db.db.search(index="employees", body={"query": {"fuzzy": {}}})
+
+
+def test_delta_index(db):
+    """Should apply the changes to the published index"""
+
+    documents = employees()
+    documents.pop("f16eee45-d96a-4efb-bd17-667d1795e13d")
+    documents["0b0cd4a6-5c69-4d1c-a5a5-1a4d3c1a3ad2"]["name"] = "Anne Berg"
+
+    published = db.get_alias_indices("employees")
+
+    result = db.delta_index("employees", generator(documents))
+
+    assert result["updated"] == 1
+    assert result["deleted"] == 1
+    assert db.get_alias_indices("employees") == published
+    assert db.get_size("employees") == 1
+    assert names(db.search("employee_by_name", "Anne")) == ["Anne Berg"]
+    assert db.search("employee_by_name", "Jan") == []
+
+
+def test_reindex_publishes_new_version(db):
+    """Should swap the alias and keep a single previous version"""
+
+    for _ in range(3):
+        db.reindex("employees", generator(employees()))
+
+    versions = db.db.indices.get("employees-*")
+
+    assert len(versions) == 2
+    assert len(db.db.indices.get_alias("employees")) == 1
+    assert db.get_size("employees") == 2
+
+
+def test_create_and_delete_index(db):
+    """Should create and delete indices, ignoring missing ones"""
+
+    db.create_index("extra", {})
+
+    assert db.db.indices.exists("extra")
+
+    db.delete_index("extra")
+    db.delete_index("extra")
+
+    assert not db.db.indices.exists("extra")
+
+
+def test_dataset_versions(db):
+    """Should store the dataset versions alongside the data"""
+
+    assert db.get_dataset_versions() == {}
+
+    db.set_dataset_version("employees", "v1")
+
+    assert db.get_dataset_versions() == {"employees": "v1"}
+
+
+def test_memory_backend_service():
+    """Should serve loads and searches from memory"""
+
+    app = initiate_application(
+        {
+            "OS2PHONEBOOK_COMPANY_NAME": "Magenta Aps",
+            "OS2PHONEBOOK_BACKEND": "memory",
+            "OS2PHONEBOOK_DATALOADER_USERNAME": "dataloader",
+            "OS2PHONEBOOK_DATALOADER_PASSWORD": "Password1",
+        }
+    )
+    http_client = app.test_client()
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+
+    response = http_client.post(
+        "/api/load-employees", json=employees(), headers=headers
+    )
+    job = wait_for_load_job(http_client, response, headers)
+
+    assert job["result"] == {"indexed": 2, "total": 2}
+
+    response = http_client.post(
+        "/api/search",
+        json={"search_type": "employee_by_name", "search_value": "Anne"},
+    )
+
+    assert names(response.get_json()) == ["Anne Winther Jensen"]
+    assert "memory;dur=" in response.headers["Server-Timing"]
+
+    response = http_client.get("/api/employee/missing")
+
+    assert response.status_code == 404
+
+
+def test_unknown_backend():
+    """Should refuse backends which are not available"""
+
+    config = {"OS2PHONEBOOK_COMPANY_NAME": "Magenta Aps"}
+
+    with pytest.raises(ValueError):
+        initiate_application(dict(config, OS2PHONEBOOK_BACKEND="sql"))
+
+    with pytest.raises(ValueError):
+        initiate_async_application(dict(config, OS2PHONEBOOK_BACKEND="memory"))
@@ -0,0 +1,271 @@
+import os
+import sys
+import asyncio
+import pytest
+import subprocess
+from unittest import mock
+from prometheus_client import REGISTRY
+from elasticsearch.exceptions import NotFoundError
+
+from os2phonebook import metrics
+from os2phonebook.app import initiate_application
+from os2phonebook.async_controller import error_status_code
+from os2phonebook.datastore import create_connection, DataStore
+from os2phonebook.exceptions import InvalidSearchType
+
+from tests.fixtures.elasticsearch_data import (
+    one_employee_from_elasticsearch,
+    no_matches_from_elasticsearch,
+    one_employee_by_name_from_elasticsearch,
+    multi_search_from_elasticsearch,
+)
+
+
+def sample(name: str, **labels) -> float:
+    """Current value of a metric sample, 0 if not recorded yet"""
+
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def db() -> DataStore:
+    """Create DataStore client instance"""
+
+    connection = create_connection(host="testhost", port=9090)
+    return DataStore(connection)
+
+
+@pytest.fixture
+def http_client():
+    """Create the service (flask) app instance"""
+
+    config = {
+        "OS2PHONEBOOK_COMPANY_NAME": "Magenta Aps",
+        "ELASTICSEARCH_HOST": "elasticsearch",
+        "ELASTICSEARCH_PORT": 9600,
+        "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "false",
+    }
+
+    app = initiate_application(config)
+
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.get_dataset_versions",
+        return_value={},
+    ):
+        yield app.test_client()
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.get")
+def test_datastore_operation_latency(mock_get, db):
+    """Should record the latency of every datastore operation"""
+
+    mock_get.return_value = one_employee_from_elasticsearch()
+
+    name = "os2phonebook_datastore_duration_seconds_count"
+    before = sample(name, operation="get_employee")
+
+    db.get_employee("f16eee45-d96a-4efb-bd17-667d1795e13d")
+
+    assert sample(name, operation="get_employee") == before + 1
+    assert (
+        sample("os2phonebook_datastore_in_progress", operation="get_employee")
+        == 0
+    )
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.search")
+def test_search_pass_metrics(mock_search, db):
+    """Should record the latency, took time and hits of a search pass"""
+
+    mock_search.return_value = one_employee_by_name_from_elasticsearch()
+
+    labels = {"search_type": "employee_by_name", "pass": "fuzzy"}
+    duration = sample("os2phonebook_search_duration_seconds_count", **labels)
+    took = sample("os2phonebook_search_took_seconds_sum", **labels)
+    hits = sample("os2phonebook_search_hits_sum", **labels)
+
+    db.search("employee_by_name", "Anne Yassen", fuzzy_search=True)
+
+    assert (
+        sample("os2phonebook_search_duration_seconds_count", **labels)
+        == duration + 1
+    )
+    assert sample(
+        "os2phonebook_search_took_seconds_sum", **labels
+    ) == pytest.approx(took + 0.002)
+    assert sample("os2phonebook_search_hits_sum", **labels) == hits + 1
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_with_fallback_metrics(mock_msearch, db):
+    """Should record both passes and that the fuzzy pass matched"""
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(),
+        one_employee_by_name_from_elasticsearch(),
+    )
+
+    search_type = "employee_by_name"
+    name = "os2phonebook_search_results_total"
+    matched = {
+        outcome: sample(name, search_type=search_type, matched=outcome)
+        for outcome in ("exact", "fuzzy", "none")
+    }
+    exact = {"search_type": search_type, "pass": "exact"}
+    exact_hits_count = sample("os2phonebook_search_hits_count", **exact)
+    exact_hits_sum = sample("os2phonebook_search_hits_sum", **exact)
+    fallback = {"search_type": search_type, "pass": "fallback"}
+    duration = sample("os2phonebook_search_duration_seconds_count", **fallback)
+
+    db.search_with_fallback(search_type, "Anne Yas")
+
+    assert sample(name, search_type=search_type, matched="fuzzy") == (
+        matched["fuzzy"] + 1
+    )
+    assert sample(name, search_type=search_type, matched="exact") == (
+        matched["exact"]
+    )
+    assert sample(name, search_type=search_type, matched="none") == (
+        matched["none"]
+    )
+    assert (
+        sample("os2phonebook_search_hits_count", **exact)
+        == exact_hits_count + 1
+    )
+    assert sample("os2phonebook_search_hits_sum", **exact) == exact_hits_sum
+    assert (
+        sample("os2phonebook_search_duration_seconds_count", **fallback)
+        == duration + 1
+    )
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch")
+def test_search_with_fallback_no_match(mock_msearch, db):
+    """Should count searches where neither pass matched"""
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(), no_matches_from_elasticsearch()
+    )
+
+    name = "os2phonebook_search_results_total"
+    before = sample(name, search_type="employee_by_email", matched="none")
+
+    db.search_with_fallback("employee_by_email", "nobody@example.org")
+
+    assert (
+        sample(name, search_type="employee_by_email", matched="none")
+        == before + 1
+    )
+
+
+def test_timed_coroutine():
+    """Should record the latency of coroutines once awaited"""
+
+    @metrics.timed("test_coroutine")
+    async def coroutine():
+        return "done"
+
+    name = "os2phonebook_datastore_duration_seconds_count"
+    before = sample(name, operation="test_coroutine")
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(coroutine()) == "done"
+    finally:
+        loop.close()
+
+    assert sample(name, operation="test_coroutine") == before + 1
+
+
+def test_timed_labels_on_first_call():
+    """Should not create the labelled metrics when decorating"""
+
+    name = "os2phonebook_datastore_duration_seconds_count"
+
+    @metrics.timed("test_first_call")
+    def method():
+        return "done"
+
+    assert (
+        REGISTRY.get_sample_value(name, {"operation": "test_first_call"})
+        is None
+    )
+
+    method()
+
+    assert sample(name, operation="test_first_call") == 1
+
+
+def test_import_without_metrics_directory(tmp_path):
+    """Importing the datastore should not write metrics, e.g. in the cli"""
+
+    environment = dict(
+        os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path / "missing")
+    )
+
+    subprocess.run(
+        [sys.executable, "-c", "import os2phonebook.app, cli"],
+        env=environment,
+        check=True,
+    )
+
+    assert not (tmp_path / "missing").exists()
+
+
+def test_get_metrics(http_client):
+    """Should expose the metrics in the text exposition format"""
+
+    http_client.get("/api/status")
+
+    response = http_client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+
+    body = response.get_data(as_text=True)
+    assert "os2phonebook_http_request_duration_seconds_count" in body
+    assert 'endpoint="routes.show_status"' in body
+
+
+def test_request_metrics(http_client):
+    """Should record the latency and status of requests by endpoint"""
+
+    name = "os2phonebook_http_request_duration_seconds_count"
+    labels = {
+        "endpoint": "routes.show_employee",
+        "method": "GET",
+        "status": "404",
+    }
+    before = sample(name, **labels)
+
+    with mock.patch(
+        "os2phonebook.datastore.Elasticsearch.get",
+        side_effect=NotFoundError(404, "not_found"),
+    ):
+        response = http_client.get(
+            "/api/employee/f16eee45-d96a-4efb-bd17-667d1795e13d"
+        )
+
+    assert response.status_code == 404
+    assert sample(name, **labels) == before + 1
+    assert (
+        sample(
+            "os2phonebook_http_requests_in_progress",
+            endpoint="routes.show_employee",
+        )
+        == 0
+    )
+
+
+@pytest.mark.parametrize(
+    "error,status_code",
+    [
+        (NotFoundError(404, "not_found"), 404),
+        (InvalidSearchType("unknown"), 400),
+        (RuntimeError("unexpected"), 500),
+    ],
+)
+def test_error_status_code(error, status_code):
+    """Should match the status code of the async exception handlers"""
+
+    assert error_status_code(error) == status_code
@@ -1,10 +1,13 @@
 import pytest
+from time import monotonic, sleep
+from threading import Event
 from unittest import mock
 from elasticsearch.exceptions import NotFoundError
 from base64 import b64encode
 
 from os2phonebook import __version__
 from os2phonebook.app import initiate_application
+from os2phonebook.controller import encode_cursor
 
 from tests.fixtures.elasticsearch_data import (
     all_org_units_from_elasticsearch,
@@ -12,15 +15,32 @@ from tests.fixtures.elasticsearch_data import (
     one_employee_from_elasticsearch,
     no_matches_from_elasticsearch,
     one_employee_by_name_from_elasticsearch,
+    multi_search_from_elasticsearch,
+    employees_by_ids_from_elasticsearch,
 )
 
-
 # Settings
 ORGANISATION_NAME = "Magenta Aps"
 
 
+def wait_for_load_job(http_client, response, headers, timeout=5.0):
+    """Poll the status of the job accepted by a load request until done"""
+
+    deadline = monotonic() + timeout
+
+    while True:
+        job = http_client.get(
+            response.headers["Location"], headers=headers
+        ).get_json()
+
+        if job["state"] in ("succeeded", "failed") or monotonic() > deadline:
+            return job
+
+        sleep(0.01)
+
+
 @pytest.fixture
-def http_client():
+def http_client(tmp_path):
     """Create the service (flask) app instance"""
 
     config = {
@@ -28,12 +48,25 @@ def http_client():
         "OS2PHONEBOOK_STATIC_ROOT": "/static",
         "ELASTICSEARCH_HOST": "elasticsearch",
         "ELASTICSEARCH_PORT": 9600,
+        "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "false",
         "OS2PHONEBOOK_DATALOADER_USERNAME": "dataloader",
         "OS2PHONEBOOK_DATALOADER_PASSWORD": "Password1",
+        "OS2PHONEBOOK_LOAD_JOB_DIR": str(tmp_path),
     }
 
     app = initiate_application(config)
-    return app.test_client()
+
+    # Dataset versions are stored alongside the data, in Elasticsearch
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.get_dataset_versions",
+        return_value={},
+    ), mock.patch(
+        "os2phonebook.datastore.DataStore.set_dataset_version"
+    ), mock.patch(
+        "os2phonebook.datastore.DataStore.iter_employee_phone_numbers",
+        return_value=[],
+    ):
+        yield app.test_client()
 
 
 def test_get_status_http_status(http_client):
@@ -201,11 +234,13 @@ def test_post_search_error_type_with_incorrect_body(http_client):
     assert error_type == expected_error_type
 
 
-@mock.patch("os2phonebook.datastore.Elasticsearch.search", autospec=True)
-def test_post_search_with_no_results(mock_search, http_client):
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch", autospec=True)
+def test_post_search_with_no_results(mock_msearch, http_client):
     """Should return an empty list"""
 
-    mock_search.return_value = no_matches_from_elasticsearch()
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(), no_matches_from_elasticsearch()
+    )
 
     post_payload = {
         "search_type": "employee_by_name",
@@ -221,11 +256,14 @@ def test_post_search_with_no_results(mock_search, http_client):
     assert results == expected_results
 
 
-@mock.patch("os2phonebook.datastore.Elasticsearch.search", autospec=True)
-def test_post_search_with_one_result(mock_search, http_client):
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch", autospec=True)
+def test_post_search_with_one_result(mock_msearch, http_client):
     """Should return an employee object (mock) with the given arguments"""
 
-    mock_search.return_value = one_employee_by_name_from_elasticsearch()
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        one_employee_by_name_from_elasticsearch(),
+        no_matches_from_elasticsearch(),
+    )
 
     post_payload = {
         "search_type": "employee_by_name",
@@ -257,9 +295,13 @@ def test_post_search_with_one_result(mock_search, http_client):
     ],
 )
 @mock.patch("os2phonebook.datastore.streaming_bulk", autospec=True)
-@mock.patch("os2phonebook.datastore.DataStore.delete_index", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.publish_index", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.create_versioned_index", autospec=True
+)
 def test_post_load_employees(
-    mock_delete_index,
+    mock_create_versioned_index,
+    mock_publish_index,
     mock_streaming_bulk,
     http_client,
     set_credentials,
@@ -267,7 +309,8 @@ def test_post_load_employees(
 ):
     """Should return an employee object (mock) with the given arguments"""
 
-    mock_delete_index.return_value = None
+    mock_create_versioned_index.return_value = "employees-20200101000000"
+    mock_publish_index.return_value = None
     mock_streaming_bulk.return_value = [(1, None)]
 
     post_payload = {
@@ -318,5 +361,771 @@ def test_post_load_employees(
     )
 
     results = response.get_json()
+    if response.status_code == 202:
+        results = wait_for_load_job(http_client, response, headers)["result"]
 
     assert results == expected
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.publish_index", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.create_versioned_index", autospec=True
+)
+def test_post_load_org_units_publishes_new_version(
+    mock_create_versioned_index,
+    mock_publish_index,
+    mock_streaming_bulk,
+    http_client,
+):
+    """Should load into a new index version and publish it as `org_units`"""
+
+    mock_create_versioned_index.return_value = "org_units-20200101000000"
+    mock_streaming_bulk.return_value = [(1, None)]
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+
+    post_payload = {
+        "582d0b5e-3c3b-52e8-8d93-42573a6a3d88": {
+            "uuid": "582d0b5e-3c3b-52e8-8d93-42573a6a3d88",
+            "name": "Magenta ApS",
+            "kles": [],
+        }
+    }
+
+    response = http_client.post(
+        "/api/load-org-units", json=post_payload, headers=headers
+    )
+    job = wait_for_load_job(http_client, response, headers)
+
+    assert job["result"] == {"indexed": 1, "total": 1}
+
+    _, alias, mapping = mock_create_versioned_index.call_args[0]
+    assert alias == "org_units"
+    assert mapping["mappings"]["properties"]["kles"] == {"type": "nested"}
+
+    _, kwargs = mock_streaming_bulk.call_args
+    assert kwargs["index"] == "org_units-20200101000000"
+
+    mock_publish_index.assert_called_once_with(
+        mock.ANY, "org_units", "org_units-20200101000000"
+    )
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.publish_index", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.create_versioned_index", autospec=True
+)
+def test_post_load_employees_invalid_json(
+    mock_create_versioned_index,
+    mock_publish_index,
+    mock_streaming_bulk,
+    http_client,
+):
+    """A truncated body should be rejected without publishing the index"""
+
+    def consume(client, index, actions, **kwargs):
+        return [(True, action) for action in actions]
+
+    mock_create_versioned_index.return_value = "employees-20200101000000"
+    mock_streaming_bulk.side_effect = consume
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {
+        "Authorization": f"Basic {credentials}",
+        "Content-Type": "application/json",
+    }
+
+    response = http_client.post(
+        "/api/load-employees",
+        data='{"f06ee470-9f17-566f-acbe-e938112d46d9": {"name": "Em',
+        headers=headers,
+    )
+
+    assert response.status_code == 400
+    assert response.get_json()["error"]["type"] == "InvalidRequestBody"
+    mock_publish_index.assert_not_called()
+
+
+def test_post_load_employees_with_no_body(http_client):
+    """Should return status code 400"""
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+
+    response = http_client.post("/api/load-employees", headers=headers)
+
+    assert response.status_code == 400
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.publish_index", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.create_versioned_index", autospec=True
+)
+def test_post_load_employees_ndjson(
+    mock_create_versioned_index,
+    mock_publish_index,
+    mock_streaming_bulk,
+    http_client,
+):
+    """Should index one document per ndjson line, keyed by its uuid"""
+
+    indexed = []
+
+    def consume(client, index, actions, **kwargs):
+        indexed.extend(actions)
+        return [(True, action) for action in indexed]
+
+    mock_create_versioned_index.return_value = "employees-20200101000000"
+    mock_streaming_bulk.side_effect = consume
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {
+        "Authorization": f"Basic {credentials}",
+        "Content-Type": "application/x-ndjson",
+    }
+
+    response = http_client.post(
+        "/api/load-employees",
+        data='{"uuid": "a", "name": "Emil"}\n{"uuid": "b", "name": "Anne"}\n',
+        headers=headers,
+    )
+    job = wait_for_load_job(http_client, response, headers)
+
+    assert job["result"] == {"indexed": 2, "total": 2}
+    assert [action["_id"] for action in indexed] == ["a", "b"]
+
+
+@mock.patch("os2phonebook.datastore.streaming_bulk", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.publish_index", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.create_versioned_index", autospec=True
+)
+def test_post_load_employees_ndjson_without_uuid(
+    mock_create_versioned_index,
+    mock_publish_index,
+    mock_streaming_bulk,
+    http_client,
+):
+    """A document without uuid should be rejected"""
+
+    def consume(client, index, actions, **kwargs):
+        return [(True, action) for action in actions]
+
+    mock_create_versioned_index.return_value = "employees-20200101000000"
+    mock_streaming_bulk.side_effect = consume
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {
+        "Authorization": f"Basic {credentials}",
+        "Content-Type": "application/x-ndjson",
+    }
+
+    response = http_client.post(
+        "/api/load-employees", data='{"name": "Emil"}\n', headers=headers
+    )
+
+    assert response.status_code == 400
+    mock_publish_index.assert_not_called()
+
+
+@mock.patch("os2phonebook.datastore.DataStore.delta_index", autospec=True)
+def test_post_load_employees_delta(mock_delta_index, http_client):
+    """Should run a delta load and report its statistics"""
+
+    statistics = {
+        "indexed": 1,
+        "total": 1,
+        "added": 0,
+        "updated": 1,
+        "deleted": 0,
+        "unchanged": 41,
+    }
+    mock_delta_index.return_value = statistics
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+
+    response = http_client.post(
+        "/api/load-employees?mode=delta",
+        json={"a": {"uuid": "a"}},
+        headers=headers,
+    )
+    job = wait_for_load_job(http_client, response, headers)
+
+    assert job["mode"] == "delta"
+    assert job["result"] == statistics
+
+
+def test_post_load_employees_unknown_mode(http_client):
+    """Should return status code 400"""
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+
+    response = http_client.post(
+        "/api/load-employees?mode=partial",
+        json={"a": {"uuid": "a"}},
+        headers=headers,
+    )
+
+    assert response.status_code == 400
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.search", autospec=True)
+def test_get_org_units_page(mock_search, http_client):
+    """Should return a page of org units and a cursor for the next page"""
+
+    mock_search.return_value = all_org_units_from_elasticsearch()
+    hits = mock_search.return_value["hits"]["hits"]
+    for hit in hits:
+        hit["sort"] = [hit["_id"]]
+
+    response = http_client.get(f"/api/org_units?limit={len(hits)}")
+    page = response.get_json()
+
+    assert len(page["results"]) == len(hits)
+    assert page["cursor"] is not None
+
+    # Less than the (default) limit, thus the last page
+    response = http_client.get(f"/api/org_units?cursor={page['cursor']}")
+    page = response.get_json()
+
+    assert page["cursor"] is None
+
+    _, kwargs = mock_search.call_args
+    assert kwargs["index"] == "org_units"
+    assert kwargs["body"]["search_after"] == [hits[-1]["_id"]]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "limit=0",
+        "limit=10001",
+        "limit=many",
+        "cursor=notacursor",
+        "cursor=" + encode_cursor({"index": "employees", "search_after": []}),
+        "cursor="
+        + encode_cursor({"index": "org_units-*", "search_after": []}),
+        "cursor="
+        + encode_cursor({"index": "org_units,.security", "search_after": []}),
+        "cursor=" + encode_cursor({"index": "org_units", "search_after": 1}),
+    ],
+)
+def test_get_org_units_page_invalid_parameters(http_client, query):
+    """Should return status code 400"""
+
+    response = http_client.get(f"/api/org_units?{query}")
+
+    assert response.status_code == 400
+    error_type = response.get_json()["error"]["type"]
+    assert error_type == "InvalidRequestParameters"
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.search", autospec=True)
+def test_get_org_units_page_expired_cursor(mock_search, http_client):
+    """A cursor of a deleted index version should return status code 410"""
+
+    mock_search.side_effect = NotFoundError(404, "index_not_found_exception")
+
+    cursor = encode_cursor(
+        {"index": "org_units-20200101000000", "search_after": ["a"]}
+    )
+    response = http_client.get(f"/api/org_units?cursor={cursor}")
+
+    assert response.status_code == 410
+    assert response.get_json()["error"]["type"] == "ExpiredCursor"
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch", autospec=True)
+def test_post_search_cached(mock_msearch, http_client):
+    """Repeated searches should only reach Elasticsearch once"""
+
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        one_employee_by_name_from_elasticsearch(),
+        no_matches_from_elasticsearch(),
+    )
+
+    post_payload = {
+        "search_type": "employee_by_name",
+        "search_value": "Anne Yassen",
+    }
+
+    for _ in range(3):
+        response = http_client.post("/api/search", json=post_payload)
+        assert len(response.get_json()) == 1
+
+    assert mock_msearch.call_count == 1
+
+    response = http_client.get("/api/status/search-cache")
+    stats = response.get_json()
+
+    assert stats["hits"] == 2
+    assert stats["size"] == 2
+
+
+@pytest.mark.parametrize(
+    "url,post_payload",
+    [
+        (
+            "/api/search",
+            {"search_type": "employee_by_name", "search_value": "Anne"},
+        ),
+        ("/api/search/all", {"search_value": "Anne"}),
+    ],
+)
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.get_dataset_versions")
+def test_post_search_after_load_by_other_worker(
+    mock_versions, mock_msearch, url, post_payload
+):
+    """A load by another worker should invalidate the cached results"""
+
+    mock_versions.return_value = {"employees": "3f2a"}
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        *[no_matches_from_elasticsearch()] * 12
+    )
+
+    # The dataset versions are looked up again on every request
+    app = initiate_application(
+        {
+            "OS2PHONEBOOK_COMPANY_NAME": ORGANISATION_NAME,
+            "ELASTICSEARCH_HOST": "elasticsearch",
+            "ELASTICSEARCH_PORT": 9600,
+            "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "false",
+            "OS2PHONEBOOK_DATASET_VERSION_TTL": 0,
+        }
+    )
+    http_client = app.test_client()
+
+    http_client.post(url, json=post_payload)
+    http_client.post(url, json=post_payload)
+
+    assert mock_msearch.call_count == 1
+
+    mock_versions.return_value = {"employees": "9c1b"}
+    http_client.post(url, json=post_payload)
+
+    assert mock_msearch.call_count == 2
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.msearch", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.reindex", autospec=True)
+def test_post_load_clears_search_cache(
+    mock_reindex, mock_msearch, http_client
+):
+    """A completed load should invalidate the cached search results"""
+
+    mock_reindex.return_value = (1, 1)
+    mock_msearch.return_value = multi_search_from_elasticsearch(
+        one_employee_by_name_from_elasticsearch(),
+        no_matches_from_elasticsearch(),
+    )
+
+    post_payload = {
+        "search_type": "employee_by_name",
+        "search_value": "Anne Yassen",
+    }
+    http_client.post("/api/search", json=post_payload)
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+    response = http_client.post(
+        "/api/load-employees", json={"a": {"uuid": "a"}}, headers=headers
+    )
+    wait_for_load_job(http_client, response, headers)
+
+    http_client.post("/api/search", json=post_payload)
+
+    assert mock_msearch.call_count == 2
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.get", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.get_dataset_versions",
+    return_value={"org_units": "3f2a", "employees": "9c1b"},
+)
+def test_get_org_unit_etag(mock_versions, mock_get, http_client):
+    """Should tag the response with the dataset version of the index"""
+
+    mock_get.return_value = one_unit_from_elasticsearch()
+
+    url = "/api/org_unit/1f06ed67-aa6e-4bbc-96d9-2f262b9202b5"
+    response = http_client.get(url)
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"3f2a"'
+    assert "public" in response.headers["Cache-Control"]
+    assert "max-age=60" in response.headers["Cache-Control"]
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.get", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.get_dataset_versions",
+    return_value={"org_units": "3f2a", "employees": "9c1b"},
+)
+def test_get_employee_not_modified(mock_versions, mock_get, http_client):
+    """A matching If-None-Match should be answered without a lookup"""
+
+    url = "/api/employee/f16eee45-d96a-4efb-bd17-667d1795e13d"
+    response = http_client.get(url, headers={"If-None-Match": '"9c1b"'})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == '"9c1b"'
+    assert not response.data
+    mock_get.assert_not_called()
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.search", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.reindex", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.get_dataset_versions",
+    return_value={"org_units": "3f2a", "employees": "9c1b"},
+)
+def test_get_org_units_modified_by_load(
+    mock_versions, mock_reindex, mock_search, http_client
+):
+    """A load should assign a new dataset version"""
+
+    mock_search.return_value = all_org_units_from_elasticsearch()
+    mock_reindex.return_value = (1, 1)
+
+    response = http_client.get(
+        "/api/org_units", headers={"If-None-Match": '"3f2a"'}
+    )
+    assert response.status_code == 304
+
+    def set_dataset_version(alias, version):
+        mock_versions.return_value = {
+            **mock_versions.return_value,
+            alias: version,
+        }
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.set_dataset_version",
+        side_effect=set_dataset_version,
+    ):
+        response = http_client.post(
+            "/api/load-org-units", json={"a": {"uuid": "a"}}, headers=headers
+        )
+        wait_for_load_job(http_client, response, headers)
+
+    response = http_client.get(
+        "/api/org_units", headers={"If-None-Match": '"3f2a"'}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != '"3f2a"'
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.get", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.get_dataset_versions",
+    return_value={"org_units": "3f2a", "employees": "3f2a"},
+)
+def test_get_employee_modified_by_other_worker(
+    mock_versions, mock_get, http_client
+):
+    """A conditional request should see loads by other workers at once"""
+
+    mock_get.return_value = one_employee_from_elasticsearch()
+
+    url = "/api/employee/f16eee45-d96a-4efb-bd17-667d1795e13d"
+    response = http_client.get(url, headers={"If-None-Match": '"3f2a"'})
+    assert response.status_code == 304
+
+    # Loaded by another worker, within the time to live of the versions
+    mock_versions.return_value = {"org_units": "3f2a", "employees": "9c1b"}
+
+    response = http_client.get(url, headers={"If-None-Match": '"3f2a"'})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"9c1b"'
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.get", autospec=True)
+def test_get_employee_without_dataset_version(mock_get, http_client):
+    """Without a dataset version, the response should not be tagged"""
+
+    mock_get.return_value = one_employee_from_elasticsearch()
+
+    url = "/api/employee/f16eee45-d96a-4efb-bd17-667d1795e13d"
+    response = http_client.get(url)
+
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.mget", autospec=True)
+def test_post_employees_batch(mock_mget, http_client):
+    """Should return the employees found and the missing uuids"""
+
+    mock_mget.return_value = employees_by_ids_from_elasticsearch()
+
+    post_payload = {
+        "uuids": [
+            "f16eee45-d96a-4efb-bd17-667d1795e13d",
+            "00000000-0000-0000-0000-000000000000",
+        ],
+        "fields": ["uuid", "name"],
+    }
+
+    response = http_client.post("/api/employees/batch", json=post_payload)
+
+    assert response.get_json() == {
+        "results": [
+            {
+                "name": "Jan Elkjær Winther Nielsen",
+                "uuid": "f16eee45-d96a-4efb-bd17-667d1795e13d",
+            }
+        ],
+        "missing": ["00000000-0000-0000-0000-000000000000"],
+    }
+    assert mock_mget.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "post_payload",
+    [
+        {},
+        {"uuids": "f16eee45-d96a-4efb-bd17-667d1795e13d"},
+        {"uuids": [1, 2]},
+        {"uuids": ["a"] * 1001},
+        {"uuids": ["a"], "fields": "name"},
+    ],
+)
+def test_post_org_units_batch_invalid_body(http_client, post_payload):
+    """Should return status code 400"""
+
+    response = http_client.post("/api/org_units/batch", json=post_payload)
+
+    assert response.status_code == 400
+    assert response.get_json()["error"]["type"] == "InvalidRequestBody"
+
+
+def phone_directory():
+    """Employees as returned by `iter_employee_phone_numbers`"""
+
+    return [
+        {
+            "uuid": "a",
+            "name": "Jean-Luc Picard",
+            "addresses": {
+                "PHONE": [{"description": "Telefon", "value": "22 72 22 22"}]
+            },
+            "engagements": [{"title": "Kaptajn", "name": "Bro", "uuid": "b"}],
+        }
+    ]
+
+
+def test_lookup_phone_number(http_client):
+    """Should resolve the number from the in-memory index"""
+
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.iter_employee_phone_numbers",
+        return_value=phone_directory(),
+    ) as mock_iter:
+        response = http_client.get("/api/lookup/phone/+4522722222")
+        assert response.status_code == 200
+
+        # Served from the index without rebuilding
+        response = http_client.get("/api/lookup/phone/0045%202272%202222")
+        assert response.status_code == 200
+        assert "lookup;dur=" in response.headers["Server-Timing"]
+        assert "rebuild" not in response.headers["Server-Timing"]
+
+    assert mock_iter.call_count == 1
+    assert response.get_json() == [
+        {
+            "uuid": "a",
+            "name": "Jean-Luc Picard",
+            "phone": {"description": "Telefon", "value": "22 72 22 22"},
+            "engagements": [{"title": "Kaptajn", "name": "Bro", "uuid": "b"}],
+        }
+    ]
+
+
+def test_lookup_served_while_rebuilding(http_client):
+    """A reload should be indexed in the background, not by the lookup"""
+
+    phone_index = http_client.application.phone_index
+    phone_index.build(phone_directory(), "v1")
+
+    started = Event()
+    release = Event()
+
+    def reloaded():
+        started.set()
+        release.wait(5)
+        return []
+
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.get_dataset_versions",
+        return_value={"employees": "v2"},
+    ), mock.patch(
+        "os2phonebook.datastore.DataStore.iter_employee_phone_numbers",
+        side_effect=reloaded,
+    ):
+        response = http_client.get("/api/lookup/phone/22722222")
+        started.wait(5)
+
+        assert response.status_code == 200
+        assert "rebuild" not in response.headers["Server-Timing"]
+        assert phone_index.version == "v1"
+
+        release.set()
+        phone_index.wait(5)
+
+    assert phone_index.version == "v2"
+    assert http_client.get("/api/lookup/phone/22722222").status_code == 404
+
+
+def test_lookup_unknown_phone_number(http_client):
+    """Should return status code 404 for an unknown number"""
+
+    response = http_client.get("/api/lookup/phone/11111111")
+
+    assert response.status_code == 404
+    assert "lookup;dur=" in response.headers["Server-Timing"]
+
+
+def test_lookup_phone_numbers_batch(http_client):
+    """Should resolve every number and list the missing ones"""
+
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.iter_employee_phone_numbers",
+        return_value=phone_directory(),
+    ):
+        response = http_client.post(
+            "/api/lookup/phone",
+            json={"phone_numbers": ["22722222", "11111111"]},
+        )
+
+    assert response.status_code == 200
+    assert "Server-Timing" in response.headers
+
+    body = response.get_json()
+    assert list(body["results"]) == ["22722222"]
+    assert body["results"]["22722222"][0]["uuid"] == "a"
+    assert body["missing"] == ["11111111"]
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [{}, {"phone_numbers": "22722222"}, {"phone_numbers": ["1"] * 1001}],
+)
+def test_lookup_phone_numbers_batch_invalid(http_client, payload):
+    """Should return status code 400 for an invalid batch"""
+
+    response = http_client.post("/api/lookup/phone", json=payload)
+
+    assert response.status_code == 400
+
+
+def test_lookup_phone_number_rebuilt_on_new_version(http_client):
+    """Should rebuild the index once the employees are reloaded"""
+
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.iter_employee_phone_numbers",
+        return_value=phone_directory(),
+    ) as mock_iter:
+        http_client.get("/api/lookup/phone/22722222")
+        http_client.application.dataset_versions.set("employees", "v2")
+        http_client.get("/api/lookup/phone/22722222")
+        http_client.get("/api/lookup/phone/22722222")
+
+    assert mock_iter.call_count == 2
+
+
+def test_search_everything(http_client):
+    """Should return the results grouped by search type"""
+
+    grouped = {"employee_by_name": [{"name": "Anne Yassen"}]}
+
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.search_everything",
+        return_value=grouped,
+    ) as mock_search_everything:
+        response = http_client.post(
+            "/api/search/all", json={"search_value": "Anne", "limit": 3}
+        )
+
+    assert response.status_code == 200
+    assert response.get_json() == grouped
+    mock_search_everything.assert_called_once_with(
+        search_value="Anne", limit=3
+    )
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {},
+        {"search_value": 42},
+        {"search_value": "Anne", "limit": 0},
+        {"search_value": "Anne", "limit": "5"},
+    ],
+)
+def test_search_everything_invalid(http_client, payload):
+    """Should return status code 400 for an invalid request body"""
+
+    response = http_client.post("/api/search/all", json=payload)
+
+    assert response.status_code == 400
+
+
+@mock.patch("os2phonebook.datastore.Elasticsearch.bulk", autospec=True)
+@mock.patch("os2phonebook.datastore.DataStore.publish_index", autospec=True)
+@mock.patch(
+    "os2phonebook.datastore.DataStore.create_versioned_index", autospec=True
+)
+def test_post_load_employees_parallel_bulk(
+    mock_create_versioned_index, mock_publish_index, mock_bulk, tmp_path
+):
+    """Should read the request on the request thread, not the bulk threads"""
+
+    def bulk(client, *args, body=None, **kwargs):
+        actions = [line for line in body if "index" not in line]
+        return {
+            "errors": False,
+            "items": [{"index": {"status": 201}} for _ in actions],
+        }
+
+    mock_create_versioned_index.return_value = "employees-20200101000000"
+    mock_bulk.side_effect = bulk
+
+    app = initiate_application(
+        {
+            "OS2PHONEBOOK_COMPANY_NAME": ORGANISATION_NAME,
+            "ELASTICSEARCH_HOST": "elasticsearch",
+            "ELASTICSEARCH_PORT": 9600,
+            "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "false",
+            "ELASTICSEARCH_BULK_THREAD_COUNT": 4,
+            "ELASTICSEARCH_BULK_CHUNK_SIZE": 2,
+            "OS2PHONEBOOK_LOAD_JOB_DIR": str(tmp_path),
+            "OS2PHONEBOOK_DATALOADER_USERNAME": "dataloader",
+            "OS2PHONEBOOK_DATALOADER_PASSWORD": "Password1",
+        }
+    )
+    http_client = app.test_client()
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+    payload = {str(number): {"uuid": str(number)} for number in range(9)}
+
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.get_dataset_versions",
+        return_value={},
+    ), mock.patch("os2phonebook.datastore.DataStore.set_dataset_version"):
+        response = http_client.post(
+            "/api/load-org-units", json=payload, headers=headers
+        )
+        job = wait_for_load_job(http_client, response, headers)
+
+    assert job["state"] == "succeeded"
+    assert job["result"] == {"indexed": 9, "total": 9}
+    assert mock_bulk.call_count == 5
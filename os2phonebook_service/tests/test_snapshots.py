@@ -0,0 +1,154 @@
+from base64 import b64encode
+from unittest import mock
+from click.testing import CliRunner
+
+from cli import cli
+from os2phonebook.app import initiate_application
+from os2phonebook.helpers import dump_file, read_file_header
+from os2phonebook.memory_datastore import MemoryDataStore, MemoryStore
+from os2phonebook.snapshots import restore_snapshots, snapshot_path
+
+from tests.test_memory_datastore import employees, generator, names
+from tests.test_service_api import wait_for_load_job
+
+
+def memory_application(snapshot_dir: str):
+    """Application serving from memory, with snapshots of every load"""
+
+    return initiate_application(
+        {
+            "OS2PHONEBOOK_COMPANY_NAME": "Magenta Aps",
+            "OS2PHONEBOOK_BACKEND": "memory",
+            "OS2PHONEBOOK_SNAPSHOT_DIR": snapshot_dir,
+            "OS2PHONEBOOK_DATALOADER_USERNAME": "dataloader",
+            "OS2PHONEBOOK_DATALOADER_PASSWORD": "Password1",
+        }
+    )
+
+
+def load_employees(app, payload):
+    """Load employees, returning the finished job or the error response"""
+
+    http_client = app.test_client()
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+
+    response = http_client.post(
+        "/api/load-employees", json=payload, headers=headers
+    )
+    if response.status_code != 202:
+        return response
+
+    return wait_for_load_job(http_client, response, headers)
+
+
+def test_load_writes_snapshot(tmp_path):
+    """Should keep a snapshot of every successful load"""
+
+    app = memory_application(str(tmp_path))
+
+    job = load_employees(app, employees())
+
+    assert job["result"] == {"indexed": 2, "total": 2}
+
+    header = read_file_header(snapshot_path(str(tmp_path), "employees"))
+
+    assert header["count"] == 2
+    assert header["dataset_version"] == app.dataset_versions.get("employees")
+
+
+def test_invalid_load_keeps_snapshot(tmp_path):
+    """Should neither load nor keep the documents of an invalid load"""
+
+    app = memory_application(str(tmp_path))
+    load_employees(app, employees())
+
+    response = load_employees(app, ["not", "an", "object"])
+
+    assert response.status_code == 400
+    assert [path.name for path in tmp_path.iterdir()] == ["employees.snapshot"]
+
+
+def test_failed_load_keeps_snapshot(tmp_path):
+    """Should keep the snapshot of the last successful load"""
+
+    app = memory_application(str(tmp_path))
+    load_employees(app, employees())
+
+    with mock.patch(
+        "os2phonebook.memory_datastore.MemoryDataStore.reindex",
+        side_effect=RuntimeError("Indexing failed"),
+    ):
+        job = load_employees(app, {"a": {"uuid": "a"}})
+
+    assert job["state"] == "failed"
+
+    header = read_file_header(snapshot_path(str(tmp_path), "employees"))
+
+    assert header["count"] == 2
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_memory_backend_restored_on_startup(tmp_path):
+    """Should serve the last load after a restart"""
+
+    load_employees(memory_application(str(tmp_path)), employees())
+
+    app = memory_application(str(tmp_path))
+    response = app.test_client().post(
+        "/api/search",
+        json={"search_type": "employee_by_name", "search_value": "Anne"},
+    )
+
+    assert names(response.get_json()) == ["Anne Winther Jensen"]
+
+
+def test_phone_index_warmed_up_on_startup(tmp_path):
+    """Should build the caller-ID index before the first lookup"""
+
+    load_employees(memory_application(str(tmp_path)), employees())
+
+    app = memory_application(str(tmp_path))
+    app.phone_index.wait(5)
+
+    assert app.phone_index.built
+    assert app.phone_index.lookup("+45 22 72 22 22")
+
+
+def test_restore_skips_loaded_indices(tmp_path):
+    """Should only restore missing or empty indices"""
+
+    dump_file(snapshot_path(str(tmp_path), "employees"), employees(), "v1")
+    dump_file(snapshot_path(str(tmp_path), "org_units"), {})
+
+    db = MemoryDataStore(MemoryStore())
+    db.reindex("org_units", generator({"a": {"uuid": "a"}}))
+
+    messages = []
+    restored = restore_snapshots(
+        db, str(tmp_path), messages.append, thread_count=4
+    )
+
+    assert restored == {"employees": 2}
+    assert db.get_dataset_versions() == {"employees": "v1"}
+    assert db.get_size("org_units") == 1
+    assert messages[-1] == "Index org_units holds 1 documents, not restored"
+
+
+def test_restore_command(tmp_path, monkeypatch):
+    """Should restore from the snapshot directory of the configuration"""
+
+    dump_file(snapshot_path(str(tmp_path), "employees"), employees())
+
+    monkeypatch.setenv("OS2PHONEBOOK_COMPANY_NAME", "Magenta Aps")
+    monkeypatch.setenv("OS2PHONEBOOK_LOG_ROOT", str(tmp_path))
+    monkeypatch.setenv("OS2PHONEBOOK_BACKEND", "sqlite")
+    monkeypatch.setenv("OS2PHONEBOOK_SQLITE_PATH", str(tmp_path / "db"))
+    monkeypatch.setenv("OS2PHONEBOOK_SNAPSHOT_DIR", str(tmp_path))
+
+    result = CliRunner().invoke(cli, ["restore"])
+
+    assert result.exit_code == 0
+    assert "Restored 2/2 documents of employees" in result.output
+    assert "No snapshot of org_units" in result.output
@@ -0,0 +1,272 @@
+import pytest
+from base64 import b64encode
+from elasticsearch.exceptions import NotFoundError
+
+from os2phonebook.app import initiate_application
+from os2phonebook.backend import Backend
+from os2phonebook.sqlite_datastore import (
+    SQLiteDataStore,
+    SQLiteStore,
+    match_expression,
+    phrase_expression,
+)
+
+from tests.fixtures.elasticsearch_data import one_employee_from_elasticsearch
+from tests.test_memory_datastore import (
+    employees,
+    generator,
+    names,
+    org_units,
+)
+from tests.test_service_api import wait_for_load_job
+
+
+@pytest.fixture
+def db(tmp_path) -> SQLiteDataStore:
+    """Create an SQLiteDataStore holding the test documents"""
+
+    db = SQLiteDataStore(SQLiteStore(str(tmp_path / "os2phonebook.db")))
+    db.reindex("employees", generator(employees()))
+    db.reindex("org_units", generator(org_units()))
+
+    return db
+
+
+def test_backend_interface():
+    """Should refuse backends missing any of the backend methods"""
+
+    class IncompleteBackend(Backend):
+        def get_employee(self, uuid):
+            return {}
+
+    with pytest.raises(TypeError):
+        IncompleteBackend(object())
+
+
+def test_requires_an_sqlite_store():
+    """Should refuse any other client"""
+
+    with pytest.raises(TypeError):
+        SQLiteDataStore(object())
+
+
+def test_expressions():
+    """Should build FTS5 queries, the last word as a prefix"""
+
+    assert (
+        match_expression(["name", "surname"], ["jean", "pic"], "AND")
+        == '{name surname} : ("jean" AND "pic"*)'
+    )
+    assert phrase_expression(["kle"], ["skole"]) == '{kle} : ("skole"*)'
+
+
+def test_get_employee(db):
+    """Should return the document without the fields added when indexing"""
+
+    employee = db.get_employee("f16eee45-d96a-4efb-bd17-667d1795e13d")
+
+    assert employee == one_employee_from_elasticsearch()["_source"]
+
+    with pytest.raises(NotFoundError):
+        db.get_employee("missing")
+
+
+def test_get_employees(db):
+    """Should return the documents found and the identifiers missing"""
+
+    documents, missing = db.get_employees(
+        ["0b0cd4a6-5c69-4d1c-a5a5-1a4d3c1a3ad2", "missing"], ["name"]
+    )
+
+    assert documents == [{"name": "Anne Winther Jensen"}]
+    assert missing == ["missing"]
+
+
+def test_get_org_units_page(db):
+    """Should page the org units by uuid"""
+
+    org_units, cursor = db.get_org_units_page(1)
+
+    assert names(org_units) == ["Budget og Planlægning"]
+    assert db.get_org_units_page(1, cursor) == ([], None)
+
+
+@pytest.mark.parametrize(
+    "search_type,search_value,fuzzy_search,expected",
+    [
+        (
+            "employee_by_name",
+            "Jan Niel",
+            False,
+            ["Jan Elkjær Winther Nielsen"],
+        ),
+        ("employee_by_name", "Jan Jensen", False, []),
+        (
+            "employee_by_name",
+            "Jan Jensen",
+            True,
+            ["Anne Winther Jensen", "Jan Elkjær Winther Nielsen"],
+        ),
+        ("employee_by_name", "?", False, []),
+        ("employee_by_phone", "22 72 22 22", False, ["Anne Winther Jensen"]),
+        ("employee_by_phone", "2272", False, []),
+        ("employee_by_phone", "5362", True, ["Jan Elkjær Winther Nielsen"]),
+        ("employee_by_phone", "Jan", True, []),
+        ("employee_by_email", "anne@kol", False, ["Anne Winther Jensen"]),
+        (
+            "employee_by_engagement",
+            "lærer",
+            False,
+            ["Jan Elkjær Winther Nielsen"],
+        ),
+        ("org_unit_by_name", "Budget og pl", False, ["Budget og Planlægning"]),
+        ("org_unit_by_name", "Planlægning og", False, []),
+    ],
+)
+def test_search(db, search_type, search_value, fuzzy_search, expected):
+    """Should match as the Elasticsearch queries do"""
+
+    results = db.search(search_type, search_value, fuzzy_search)
+
+    assert names(results) == expected
+
+
+def test_search_by_kle(db):
+    """Should embed the matching kles"""
+
+    results = db.search("org_unit_by_kle", "skole")
+
+    assert results == [
+        {
+            "uuid": "1f06ed67-aa6e-4bbc-96d9-2f262b9202b5",
+            "name": "Budget og Planlægning",
+            "kles": [
+                {"title": "00.01 Skoleadministration"},
+                {"title": "17.01 Skolevæsenet"},
+            ],
+        }
+    ]
+
+
+def test_search_everything(db):
+    """Should search every search type with a fuzzy fallback"""
+
+    results = db.search_everything("Jensen")
+
+    assert names(results["employee_by_name"]) == ["Anne Winther Jensen"]
+    assert results["org_unit_by_kle"] == []
+
+
+def test_reindex_replaces_documents(db):
+    """Should replace every document of the index"""
+
+    documents = employees()
+    documents.pop("f16eee45-d96a-4efb-bd17-667d1795e13d")
+
+    assert db.reindex("employees", generator(documents)) == (1, 1)
+    assert db.get_size("employees") == 1
+    assert db.search("employee_by_phone", "64535362") == []
+
+
+def test_failed_reindex_keeps_documents(db):
+    """Should roll the load back if it fails"""
+
+    def failing():
+        yield from generator(employees())()
+        raise RuntimeError("Load failed")
+
+    with pytest.raises(RuntimeError):
+        db.reindex("employees", failing)
+
+    assert db.get_size("employees") == 2
+
+
+def test_delta_index(db):
+    """Should only apply the changes"""
+
+    documents = employees()
+    documents.pop("f16eee45-d96a-4efb-bd17-667d1795e13d")
+    documents["0b0cd4a6-5c69-4d1c-a5a5-1a4d3c1a3ad2"]["name"] = "Anne Berg"
+
+    result = db.delta_index("employees", generator(documents))
+
+    assert result["updated"] == 1
+    assert result["deleted"] == 1
+    assert names(db.search("employee_by_name", "Anne")) == ["Anne Berg"]
+    assert db.search("employee_by_name", "Jan") == []
+
+
+def test_delta_index_duplicates(db):
+    """Should count a document given twice once, as its last occurrence"""
+
+    documents = employees()
+    uuid = "0b0cd4a6-5c69-4d1c-a5a5-1a4d3c1a3ad2"
+    added = {**documents[uuid], "uuid": "a", "name": "Anne Berg"}
+
+    def actions():
+        yield from generator(documents)()
+        yield {"_id": "a", "_source": {**added, "name": "Anne Bech"}}
+        yield {"_id": "a", "_source": added}
+
+    result = db.delta_index("employees", actions)
+
+    assert result["added"] == 1
+    assert result["unchanged"] == 2
+    assert db.get_size("employees") == 3
+    assert db.get_employee("a")["name"] == "Anne Berg"
+
+
+def test_dataset_versions(db):
+    """Should store the dataset versions alongside the data"""
+
+    assert db.get_dataset_versions() == {}
+
+    db.set_dataset_version("employees", "v1")
+
+    assert db.get_dataset_versions() == {"employees": "v1"}
+
+
+def test_documents_survive_restart(db):
+    """Should read the documents from the database file"""
+
+    db.db.close()
+    other = SQLiteDataStore(SQLiteStore(db.db.path))
+
+    assert other.get_size("employees") == 2
+
+
+def test_sqlite_backend_service(tmp_path):
+    """Should serve loads and searches from the database file"""
+
+    app = initiate_application(
+        {
+            "OS2PHONEBOOK_COMPANY_NAME": "Magenta Aps",
+            "OS2PHONEBOOK_BACKEND": "sqlite",
+            "OS2PHONEBOOK_SQLITE_PATH": str(tmp_path / "os2phonebook.db"),
+            "OS2PHONEBOOK_DATALOADER_USERNAME": "dataloader",
+            "OS2PHONEBOOK_DATALOADER_PASSWORD": "Password1",
+        }
+    )
+    http_client = app.test_client()
+
+    credentials = b64encode(b"dataloader:Password1").decode("utf-8")
+    headers = {"Authorization": f"Basic {credentials}"}
+
+    response = http_client.post(
+        "/api/load-employees", json=employees(), headers=headers
+    )
+    job = wait_for_load_job(http_client, response, headers)
+
+    assert job["result"] == {"indexed": 2, "total": 2}
+
+    response = http_client.post(
+        "/api/search",
+        json={"search_type": "employee_by_name", "search_value": "Anne"},
+    )
+
+    assert names(response.get_json()) == ["Anne Winther Jensen"]
+    assert "sqlite;dur=" in response.headers["Server-Timing"]
+
+    response = http_client.get("/api/employee/missing")
+
+    assert response.status_code == 404
@@ -0,0 +1,171 @@
+import re
+import pytest
+from unittest import mock
+from starlette.testclient import TestClient
+
+from os2phonebook import timing
+from os2phonebook.app import initiate_application
+from os2phonebook.async_app import initiate_async_application
+
+from tests.fixtures.elasticsearch_data import (
+    no_matches_from_elasticsearch,
+    one_employee_by_name_from_elasticsearch,
+    multi_search_from_elasticsearch,
+)
+
+CONFIG = {
+    "OS2PHONEBOOK_COMPANY_NAME": "Magenta Aps",
+    "ELASTICSEARCH_HOST": "elasticsearch",
+    "ELASTICSEARCH_PORT": 9600,
+    "OS2PHONEBOOK_PHONE_INDEX_WARMUP": "false",
+    "OS2PHONEBOOK_TIMING_LOG": "true",
+}
+
+
+def span_names(header: str) -> list:
+    """Names of the spans of a `Server-Timing` header"""
+
+    return [timing.split(";")[0] for timing in header.split(", ")]
+
+
+def msearch_response(*args, **kwargs) -> dict:
+    """Respond to any request to Elasticsearch with an msearch response"""
+
+    return multi_search_from_elasticsearch(
+        no_matches_from_elasticsearch(),
+        one_employee_by_name_from_elasticsearch(),
+    )
+
+
+@pytest.fixture
+def http_client():
+    """Create the service (flask) app instance"""
+
+    app = initiate_application(CONFIG)
+
+    with mock.patch(
+        "os2phonebook.datastore.DataStore.get_dataset_versions",
+        return_value={},
+    ):
+        yield app.test_client()
+
+
+def test_server_timing_header():
+    """Should sum up spans of the same name and report the total"""
+
+    server_timing = timing.ServerTiming("abc")
+    server_timing.add("es", 1.5)
+    server_timing.add("es", 2.0)
+    server_timing.add("custom", 1.0)
+
+    header = server_timing.header()
+
+    assert header.startswith(
+        'es;dur=3.500;desc="Elasticsearch round-trips", custom;dur=1.000, '
+    )
+    assert re.search(r'total;dur=[\d.]+;desc="Total"$', header)
+
+
+def test_log_line():
+    """Should log the request id and fields before the timings"""
+
+    server_timing = timing.ServerTiming("abc")
+    server_timing.add("es", 1.5)
+
+    line = server_timing.log_line(method="GET", status=200)
+
+    assert line.startswith(
+        "REQUEST_TIMING request_id=abc method=GET status=200 es=1.500ms"
+    )
+
+
+@pytest.mark.parametrize(
+    "request_id,accepted",
+    [("5c1d-42.a:b", True), ("evil\nline", False), ("x" * 129, False)],
+)
+def test_request_id(request_id, accepted):
+    """Should only use sane request ids passed by the client"""
+
+    server_timing = timing.start(request_id)
+    timing.stop()
+
+    assert (server_timing.request_id == request_id) is accepted
+
+
+def test_span_outside_request():
+    """Should record nothing outside of a request"""
+
+    with timing.span("es"):
+        pass
+
+    timing.add("es", 1.0)
+
+    assert timing.current() is None
+
+
+def test_search_breakdown(http_client):
+    """Should report Elasticsearch, processing and serialization time"""
+
+    with mock.patch(
+        "elasticsearch.Transport.perform_request",
+        side_effect=msearch_response,
+    ):
+        response = http_client.post(
+            "/api/search",
+            json={"search_type": "employee_by_name", "search_value": "Anne"},
+        )
+
+    assert response.status_code == 200
+    assert span_names(response.headers["Server-Timing"]) == [
+        "es",
+        "es-took",
+        "process",
+        "serialize",
+        "total",
+    ]
+    assert "es-took;dur=2.000" in response.headers["Server-Timing"]
+
+
+def test_request_id_header(http_client):
+    """Should tag the response and the log line with the request id"""
+
+    with mock.patch("os2phonebook.controller.log") as mock_log:
+        response = http_client.get(
+            "/api/status", headers={"X-Request-ID": "req-1"}
+        )
+
+    assert response.headers["X-Request-ID"] == "req-1"
+    mock_log.info.assert_called_once()
+    assert "request_id=req-1 method=GET path=/api/status status=200" in (
+        mock_log.info.call_args[0][0]
+    )
+
+
+def test_async_search_breakdown():
+    """Should report the same breakdown for async views"""
+
+    async def perform_request(*args, **kwargs):
+        return msearch_response()
+
+    app = initiate_async_application(CONFIG)
+    app.state.dataset_versions.refresh({})
+
+    with mock.patch(
+        "elasticsearch.AsyncTransport.perform_request",
+        side_effect=perform_request,
+    ), TestClient(app) as http_client:
+        response = http_client.post(
+            "/api/search",
+            json={"search_type": "employee_by_name", "search_value": "Anne"},
+        )
+        status = http_client.get("/api/status")
+
+    assert response.status_code == 200
+    assert span_names(response.headers["Server-Timing"]) == [
+        "es",
+        "es-took",
+        "process",
+        "serialize",
+        "total",
+    ]
+    assert "X-Request-ID" in status.headers